@@ -14,6 +14,8 @@ import importlib.metadata
 
 import qbreader.types as types
 from qbreader.asynchronous import Async
+from qbreader.frame import QuestionFrame
+from qbreader.local import Local
 from qbreader.synchronous import Sync
 from qbreader.types import *  # noqa: F401, F403
 
@@ -21,6 +23,8 @@ __version__ = importlib.metadata.version("qbreader")
 __all__ = (
     "Async",
     "Sync",
+    "QuestionFrame",
+    "Local",
     "types",
 )
 
@@ -8,13 +8,18 @@ from typing import Iterable, Optional, Tuple, Union
 
 from qbreader.types import (
     AlternateSubcategory,
+    Bonus,
     Category,
     Difficulty,
+    QuestionType,
+    SearchType,
     Subcategory,
+    Tossup,
     UnnormalizedAlternateSubcategory,
     UnnormalizedCategory,
     UnnormalizedDifficulty,
     UnnormalizedSubcategory,
+    Year,
 )
 
 
@@ -187,7 +192,7 @@ def normalize_cats(
     elif isinstance(unnormalized_cats, Iterable):
         for unnormalized_cat in unnormalized_cats:
             final_cats.append(Category(unnormalized_cat))
-        final_cats.append(*to_be_pushed_cats)
+        final_cats.extend(to_be_pushed_cats)
 
     final_subcats = []
     if unnormalized_subcats is None:
@@ -197,7 +202,7 @@ def normalize_cats(
     elif isinstance(unnormalized_subcats, Iterable):
         for unnormalized_subcat in unnormalized_subcats:
             final_subcats.append(Subcategory(unnormalized_subcat))
-        final_subcats.append(*to_be_pushed_subcats)
+        final_subcats.extend(to_be_pushed_subcats)
 
     return (
         normalize_enumlike(final_cats, Category),
@@ -213,3 +218,108 @@ def prune_none(params: dict) -> dict:
         for key, value in params.items()
         if (value is not None and key is not None)
     }
+
+
+def query_params(
+    questionType: QuestionType = "all",
+    searchType: SearchType = "all",
+    queryString: Optional[str] = "",
+    exactPhrase: Optional[bool] = False,
+    ignoreDiacritics: Optional[bool] = False,
+    ignoreWordOrder: Optional[bool] = False,
+    regex: Optional[bool] = False,
+    randomize: Optional[bool] = False,
+    setName: Optional[str] = None,
+    difficulties: UnnormalizedDifficulty = None,
+    categories: UnnormalizedCategory = None,
+    subcategories: UnnormalizedSubcategory = None,
+    alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+    maxReturnLength: Optional[int] = 25,
+    tossupPagination: Optional[int] = 1,
+    bonusPagination: Optional[int] = 1,
+    min_year: int = Year.MIN_YEAR,
+    max_year: int = Year.CURRENT_YEAR,
+) -> dict:
+    """Type check and normalize the parameters of an `api/query` request.
+
+    See `qbreader.synchronous.Sync.query()` for the meaning of each parameter.
+    """
+    # normalize and type check parameters
+    if questionType == Tossup:
+        questionType = "tossup"
+    elif questionType == Bonus:
+        questionType = "bonus"
+    if questionType not in ["tossup", "bonus", "all"]:
+        raise ValueError("questionType must be either 'tossup', 'bonus', or 'all'.")
+
+    if searchType not in ["question", "answer", "all"]:
+        raise ValueError("searchType must be either 'question', 'answer', or 'all'.")
+
+    if not isinstance(queryString, str):
+        raise TypeError(
+            f"queryString must be a string, not {type(queryString).__name__}."
+        )
+
+    for name, param in tuple(
+        zip(
+            (
+                "exactPhrase",
+                "ignoreDiacritics",
+                "ignoreWordOrder",
+                "regex",
+                "randomize",
+            ),
+            (exactPhrase, ignoreDiacritics, ignoreWordOrder, regex, randomize),
+        )
+    ):
+        if not isinstance(param, bool):
+            raise TypeError(f"{name} must be a boolean, not {type(param).__name__}.")
+
+    if setName is not None and not isinstance(setName, str):
+        raise TypeError(f"setName must be a string, not {type(setName).__name__}.")
+
+    for name, param in tuple(  # type: ignore
+        zip(
+            ("maxReturnLength", "tossupPagination", "bonusPagination"),
+            (maxReturnLength, tossupPagination, bonusPagination),
+        )
+    ):
+        if not isinstance(param, int):
+            raise TypeError(f"{name} must be an integer, not {type(param).__name__}.")
+        elif param < 1:
+            raise ValueError(f"{name} must be at least 1.")
+
+    for name, year in {
+        "minYear": min_year,
+        "maxYear": max_year,
+    }.items():
+        if not isinstance(year, int):
+            raise TypeError(f"{name} must be an integer, not {type(year).__name__}.")
+
+    (
+        normalized_categories,
+        normalized_subcategories,
+        normalized_alternate_subcategories,
+    ) = normalize_cats(categories, subcategories, alternate_subcategories)
+
+    data = {
+        "questionType": questionType,
+        "searchType": searchType,
+        "queryString": queryString,
+        "exactPhrase": normalize_bool(exactPhrase),
+        "ignoreDiacritics": normalize_bool(ignoreDiacritics),
+        "ignoreWordOrder": normalize_bool(ignoreWordOrder),
+        "regex": normalize_bool(regex),
+        "randomize": normalize_bool(randomize),
+        "setName": setName,
+        "difficulties": normalize_diff(difficulties),
+        "categories": normalized_categories,
+        "subcategories": normalized_subcategories,
+        "alternateSubcategories": normalized_alternate_subcategories,
+        "maxReturnLength": maxReturnLength,
+        "tossupPagination": tossupPagination,
+        "bonusPagination": bonusPagination,
+        "minYear": min_year,
+        "maxYear": max_year,
+    }
+    return prune_none(data)
@@ -0,0 +1,705 @@
+"""Compact serialization for questions and packets.
+
+Two representations are provided. The *state* of a question is a flat tuple of its
+strings, enum codes, metadata objects and integers; it is what `__reduce__()` hands to
+`pickle`, which is much faster and smaller than pickling the instance dictionaries.
+
+The *binary format* is for long-term storage. An encoded object is a short versioned
+header followed by two sections, one holding the set and packet metadata it references
+and one holding the object itself. Each section is an array of integers, packed with
+the narrowest type code that fits, followed by a table of strings stored as one UTF-8
+blob. Enums are stored as their index in a fixed table, and each distinct
+`SetMetadata` and `PacketMetadata` is stored once and referenced by index.
+"""
+
+from __future__ import annotations
+
+import enum
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, Optional, Self, Type, TypeVar, Union
+
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    DifficultyModifier,
+    Packet,
+    PacketMetadata,
+    SetMetadata,
+    Subcategory,
+    Tossup,
+)
+
+_T = TypeVar("_T", bound=Tossup)
+_B = TypeVar("_B", bound=Bonus)
+_P = TypeVar("_P", bound=Packet)
+_E = TypeVar("_E", bound=enum.Enum)
+
+MAGIC = b"QB"
+VERSION = 1
+
+TOSSUP = ord("T")
+BONUS = ord("B")
+PACKET = ord("P")
+
+_HEADER = struct.Struct("<2sBB")
+_ARRAY_HEADER = struct.Struct("<cI")
+_STRS_HEADER = struct.Struct("<?II")
+
+
+def _table(enum: type[_E], values: tuple[str, ...]) -> tuple[_E, ...]:
+    """Return the members of an enum with the given values, in that order."""
+    return tuple(enum(value) for value in values)
+
+
+# Enums are stored as their position in these tables, so the tables are part of the
+# format: new members may only be added at the end, and any other change needs a
+# new VERSION. They are spelled out instead of following the order of the enums.
+DIFFICULTIES = _table(
+    Difficulty,
+    (
+        "0",
+        "1",
+        "2",
+        "3",
+        "4",
+        "5",
+        "6",
+        "7",
+        "8",
+        "9",
+        "10",
+    ),
+)
+
+CATEGORIES = _table(
+    Category,
+    (
+        "Literature",
+        "History",
+        "Science",
+        "Fine Arts",
+        "Religion",
+        "Mythology",
+        "Philosophy",
+        "Social Science",
+        "Current Events",
+        "Geography",
+        "Other Academic",
+        "Pop Culture",
+    ),
+)
+
+SUBCATEGORIES = _table(
+    Subcategory,
+    (
+        "Literature",
+        "History",
+        "Science",
+        "Fine Arts",
+        "Religion",
+        "Mythology",
+        "Philosophy",
+        "Social Science",
+        "Current Events",
+        "Geography",
+        "Other Academic",
+        "Pop Culture",
+        "American Literature",
+        "British Literature",
+        "Classical Literature",
+        "European Literature",
+        "World Literature",
+        "Other Literature",
+        "American History",
+        "Ancient History",
+        "European History",
+        "World History",
+        "Other History",
+        "Biology",
+        "Chemistry",
+        "Physics",
+        "Other Science",
+        "Visual Fine Arts",
+        "Auditory Fine Arts",
+        "Other Fine Arts",
+        "Movies",
+        "Music",
+        "Sports",
+        "Television",
+        "Video Games",
+        "Other Pop Culture",
+    ),
+)
+
+ALTERNATE_SUBCATEGORIES = _table(
+    AlternateSubcategory,
+    (
+        "Drama",
+        "Long Fiction",
+        "Poetry",
+        "Short Fiction",
+        "Misc Literature",
+        "Math",
+        "Astronomy",
+        "Computer Science",
+        "Earth Science",
+        "Engineering",
+        "Misc Science",
+        "Architecture",
+        "Dance",
+        "Film",
+        "Jazz",
+        "Musicals",
+        "Opera",
+        "Photography",
+        "Misc Arts",
+        "Anthropology",
+        "Economics",
+        "Linguistics",
+        "Psychology",
+        "Sociology",
+        "Other Social Science",
+        "Beliefs",
+        "Practices",
+    ),
+)
+
+DIFFICULTY_MODIFIERS = _table(
+    DifficultyModifier,
+    (
+        "e",
+        "m",
+        "h",
+    ),
+)
+
+# the enums are string enums with overlapping values, so each needs its own table
+DIFFICULTY_CODES = {member: code for code, member in enumerate(DIFFICULTIES)}
+CATEGORY_CODES = {member: code for code, member in enumerate(CATEGORIES)}
+SUBCATEGORY_CODES = {member: code for code, member in enumerate(SUBCATEGORIES)}
+ALTERNATE_SUBCATEGORY_CODES = {
+    member: code + 1 for code, member in enumerate(ALTERNATE_SUBCATEGORIES)
+}
+DIFFICULTY_MODIFIER_CODES = {
+    member: code for code, member in enumerate(DIFFICULTY_MODIFIERS)
+}
+
+
+def _check(condition: bool) -> None:
+    """Raise a ValueError about corrupt data unless `condition` holds."""
+    if not condition:
+        raise ValueError("Data is not a valid encoded qbreader object.")
+
+
+def _pack_ints(values: list[int]) -> bytes:
+    """Pack integers into the narrowest little-endian array that holds all of them."""
+    low, high = (min(values), max(values)) if values else (0, 0)
+    for typecode in "bhiq":
+        bound = 1 << (array(typecode).itemsize * 8 - 1)
+        if -bound <= low and high < bound:
+            break
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return _ARRAY_HEADER.pack(typecode.encode(), len(packed)) + packed.tobytes()
+
+
+def _unpack_ints(data: memoryview, offset: int) -> tuple[array, int]:
+    _check(offset + _ARRAY_HEADER.size <= len(data))
+    typecode, count = _ARRAY_HEADER.unpack_from(data, offset)
+    offset += _ARRAY_HEADER.size
+    _check(typecode in (b"b", b"h", b"i", b"q"))
+    values = array(typecode.decode())
+    end = offset + count * values.itemsize
+    _check(end <= len(data))
+    values.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+class _Section:
+    """The integers and strings of one section of an encoded object.
+
+    Strings are normally stored NUL-separated, so that they can be split apart in one
+    call. If any of them contains a NUL, their lengths are stored instead.
+    """
+
+    def __init__(self: Self):
+        self.ints: list[int] = []
+        self.strs: list[str] = []
+
+    def to_bytes(self: Self) -> bytes:
+        text = "\0".join(self.strs)
+        lengths = b""
+        if text.count("\0") != max(len(self.strs) - 1, 0):
+            text = "".join(self.strs)
+            lengths = _pack_ints([len(s) for s in self.strs])
+        blob = text.encode()
+        return b"".join(
+            (
+                _pack_ints(self.ints),
+                _STRS_HEADER.pack(bool(lengths), len(self.strs), len(blob)),
+                lengths,
+                blob,
+            )
+        )
+
+    @staticmethod
+    def from_bytes(data: memoryview, offset: int) -> tuple[list[int], list[str], int]:
+        ints, offset = _unpack_ints(data, offset)
+        _check(offset + _STRS_HEADER.size <= len(data))
+        has_lengths, count, size = _STRS_HEADER.unpack_from(data, offset)
+        offset += _STRS_HEADER.size
+        if has_lengths:
+            lengths, offset = _unpack_ints(data, offset)
+            _check(len(lengths) == count and min(lengths, default=0) >= 0)
+        end = offset + size
+        _check(end <= len(data))
+        text = str(data[offset:end], "utf-8")
+        if not count:
+            _check(not text)
+            strs = []
+        elif has_lengths:
+            _check(sum(lengths) == len(text))
+            bounds = zip(accumulate(lengths, initial=0), accumulate(lengths))
+            strs = [text[start:stop] for start, stop in bounds]
+        else:
+            strs = text.split("\0")
+            _check(len(strs) == count)
+        return ints.tolist(), strs, end
+
+
+def tossup_state(tossup: Tossup) -> tuple[Any, ...]:
+    """Return the fields of a tossup, with enums replaced by their codes."""
+    alternate = tossup.alternate_subcategory
+    return (
+        tossup.question,
+        tossup.question_sanitized,
+        tossup.answer,
+        tossup.answer_sanitized,
+        DIFFICULTY_CODES[tossup.difficulty],
+        CATEGORY_CODES[tossup.category],
+        SUBCATEGORY_CODES[tossup.subcategory],
+        ALTERNATE_SUBCATEGORY_CODES[alternate] if alternate else 0,
+        tossup.set,
+        tossup.packet,
+        tossup.number,
+    )
+
+
+def tossup_from_state(
+    cls: Type[_T],
+    question: str,
+    question_sanitized: str,
+    answer: str,
+    answer_sanitized: str,
+    difficulty: int,
+    category: int,
+    subcategory: int,
+    alternate: int,
+    set: SetMetadata,
+    packet: PacketMetadata,
+    number: int,
+) -> _T:
+    """Rebuild a tossup from the output of `tossup_state()`.
+
+    Like `pickle`, this fills in the attributes directly instead of calling
+    `__init__()`.
+    """
+    tossup = object.__new__(cls)
+    tossup.__dict__ = {
+        "question": question,
+        "question_sanitized": question_sanitized,
+        "answer": answer,
+        "answer_sanitized": answer_sanitized,
+        "difficulty": DIFFICULTIES[difficulty],
+        "category": CATEGORIES[category],
+        "subcategory": SUBCATEGORIES[subcategory],
+        "packet": packet,
+        "set": set,
+        "number": number,
+        "alternate_subcategory": (
+            ALTERNATE_SUBCATEGORIES[alternate - 1] if alternate else None
+        ),
+    }
+    return tossup
+
+
+def bonus_state(bonus: Bonus) -> tuple[Any, ...]:
+    """Return the fields of a bonus, with enums replaced by their codes."""
+    alternate = bonus.alternate_subcategory
+    modifiers = bonus.difficultyModifiers
+    return (
+        bonus.leadin,
+        bonus.leadin_sanitized,
+        bonus.parts,
+        bonus.parts_sanitized,
+        bonus.answers,
+        bonus.answers_sanitized,
+        DIFFICULTY_CODES[bonus.difficulty],
+        CATEGORY_CODES[bonus.category],
+        SUBCATEGORY_CODES[bonus.subcategory],
+        ALTERNATE_SUBCATEGORY_CODES[alternate] if alternate else 0,
+        bonus.set,
+        bonus.packet,
+        bonus.number,
+        bonus.values,
+        (
+            None
+            if modifiers is None
+            else tuple(DIFFICULTY_MODIFIER_CODES[modifier] for modifier in modifiers)
+        ),
+    )
+
+
+def bonus_from_state(
+    cls: Type[_B],
+    leadin: str,
+    leadin_sanitized: str,
+    parts: tuple[str, ...],
+    parts_sanitized: tuple[str, ...],
+    answers: tuple[str, ...],
+    answers_sanitized: tuple[str, ...],
+    difficulty: int,
+    category: int,
+    subcategory: int,
+    alternate: int,
+    set: SetMetadata,
+    packet: PacketMetadata,
+    number: int,
+    values: Optional[tuple[int, ...]],
+    modifiers: Optional[tuple[int, ...]],
+) -> _B:
+    """Rebuild a bonus from the output of `bonus_state()`."""
+    bonus = object.__new__(cls)
+    bonus.__dict__ = {
+        "leadin": leadin,
+        "leadin_sanitized": leadin_sanitized,
+        "parts": parts,
+        "parts_sanitized": parts_sanitized,
+        "answers": answers,
+        "answers_sanitized": answers_sanitized,
+        "difficulty": DIFFICULTIES[difficulty],
+        "category": CATEGORIES[category],
+        "subcategory": SUBCATEGORIES[subcategory],
+        "set": set,
+        "packet": packet,
+        "number": number,
+        "alternate_subcategory": (
+            ALTERNATE_SUBCATEGORIES[alternate - 1] if alternate else None
+        ),
+        "values": values,
+        "difficultyModifiers": (
+            None
+            if modifiers is None
+            else tuple(DIFFICULTY_MODIFIERS[code] for code in modifiers)
+        ),
+    }
+    return bonus
+
+
+def packet_state(packet: Packet) -> tuple[Any, ...]:
+    """Return the fields of a packet."""
+    return (packet.tossups, packet.bonuses, packet.number, packet.name, packet.year)
+
+
+def packet_from_state(
+    cls: Type[_P],
+    tossups: tuple[Tossup, ...],
+    bonuses: tuple[Bonus, ...],
+    number: Optional[int],
+    name: Optional[str],
+    year: Optional[int],
+) -> _P:
+    """Rebuild a packet from the output of `packet_state()`."""
+    packet = object.__new__(cls)
+    packet.__dict__ = {
+        "tossups": tossups,
+        "bonuses": bonuses,
+        "number": number,
+        "name": name,
+        "year": year,
+    }
+    return packet
+
+
+class Encoder:
+    """Encode questions and packets into the binary format."""
+
+    def __init__(self: Self):
+        self._meta = _Section()
+        self._body = _Section()
+        self._sets: dict[tuple, int] = {}
+        self._packets: dict[tuple, int] = {}
+        # keyed by id(), so the metadata objects are kept alive in `_seen`
+        self._set_ids: dict[int, int] = {}
+        self._packet_ids: dict[int, int] = {}
+        self._seen: list[SetMetadata | PacketMetadata] = []
+
+    def finish(self: Self, kind: int) -> bytes:
+        """Return the encoded bytes of everything written so far."""
+        return (
+            _HEADER.pack(MAGIC, VERSION, kind)
+            + self._meta.to_bytes()
+            + self._body.to_bytes()
+        )
+
+    def _set(self: Self, set: SetMetadata) -> int:
+        # questions usually share metadata objects, so check identity first
+        if (index := self._set_ids.get(id(set))) is not None:
+            return index
+        key = (set._id, set.name, set.year, set.standard)
+        if key not in self._sets:
+            self._sets[key] = len(self._sets)
+            self._meta.strs += (set._id, set.name)
+            self._meta.ints += (0, set.year, set.standard)
+        index = self._set_ids[id(set)] = self._sets[key]
+        self._seen.append(set)
+        return index
+
+    def _packet(self: Self, packet: PacketMetadata) -> int:
+        if (index := self._packet_ids.get(id(packet))) is not None:
+            return index
+        key = (packet._id, packet.name, packet.number)
+        if key not in self._packets:
+            self._packets[key] = len(self._packets)
+            self._meta.strs += (packet._id, packet.name)
+            self._meta.ints += (1, packet.number)
+        index = self._packet_ids[id(packet)] = self._packets[key]
+        self._seen.append(packet)
+        return index
+
+    def tossup(self: Self, tossup: Tossup) -> None:
+        """Write a tossup."""
+        state = tossup_state(tossup)
+        self._body.strs += state[:4]
+        self._body.ints += state[4:8]
+        self._body.ints += (self._set(state[8]), self._packet(state[9]), state[10])
+
+    def bonus(self: Self, bonus: Bonus) -> None:
+        """Write a bonus."""
+        state = bonus_state(bonus)
+        strs, ints = self._body.strs, self._body.ints
+        strs += state[:2]
+        for texts in state[2:6]:
+            strs += texts
+            ints.append(len(texts))
+        ints += state[6:10]
+        ints += (self._set(state[10]), self._packet(state[11]), state[12])
+        # optional sequences are stored as their length + 1, or 0 for None
+        for optional in state[13:]:
+            if optional is None:
+                ints.append(0)
+            else:
+                ints.append(len(optional) + 1)
+                ints += optional
+
+    def packet(self: Self, packet: Packet) -> None:
+        """Write a packet and all of its questions."""
+        self._body.ints += (
+            len(packet.tossups),
+            len(packet.bonuses),
+            -1 if packet.number is None else packet.number,
+            -1 if packet.year is None else packet.year,
+            packet.name is not None,
+        )
+        if packet.name is not None:
+            self._body.strs.append(packet.name)
+        for tossup in packet.tossups:
+            self.tossup(tossup)
+        for bonus in packet.bonuses:
+            self.bonus(bonus)
+
+
+class Decoder:
+    """Decode questions and packets from the binary format."""
+
+    def __init__(self: Self, data: Union[bytes, bytearray, memoryview]):
+        view = memoryview(data)
+        if len(view) < _HEADER.size:
+            raise ValueError("Data is too short to be an encoded qbreader object.")
+        magic, version, self.kind = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Data is not an encoded qbreader object.")
+        if version != VERSION:
+            raise ValueError(
+                f"Unsupported encoding version {version}, expected {VERSION}."
+            )
+
+        meta_ints, meta_strs, offset = _Section.from_bytes(view, _HEADER.size)
+        self._ints, self._strs, end = _Section.from_bytes(view, offset)
+        _check(end == len(view))
+
+        self._sets: list[SetMetadata] = []
+        self._packets: list[PacketMetadata] = []
+        self._ints, body_ints = meta_ints, self._ints
+        self._strs, body_strs = meta_strs, self._strs
+        self._i = self._s = 0
+        while self._i < len(meta_ints):
+            tag = self._take_ints(1)[0]
+            _id, name = self._take_strs(2)
+            if tag == 0:
+                year, standard = self._take_ints(2)
+                self._sets.append(SetMetadata(_id, name, year, bool(standard)))
+            else:
+                self._packets.append(PacketMetadata(_id, name, self._take_ints(1)[0]))
+        _check(self._s == len(meta_strs))
+        self._ints, self._strs = body_ints, body_strs
+        self._i = self._s = 0
+
+    def expect(self: Self, kind: int) -> Self:
+        """Check that the encoded object is of the given kind."""
+        if self.kind != kind:
+            raise ValueError(
+                f"Data encodes a {chr(self.kind)!r} object, expected {chr(kind)!r}."
+            )
+        return self
+
+    def finish(self: Self) -> None:
+        """Check that every integer and string of the data has been read."""
+        _check(self._i == len(self._ints) and self._s == len(self._strs))
+
+    def _take_ints(self: Self, n: int) -> list[int]:
+        start = self._i
+        stop = self._i = start + n
+        _check(0 <= n and stop <= len(self._ints))
+        return self._ints[start:stop]
+
+    def _take_strs(self: Self, n: int) -> tuple[str, ...]:
+        start = self._s
+        stop = self._s = start + n
+        _check(0 <= n and stop <= len(self._strs))
+        return tuple(self._strs[start:stop])
+
+    def _set(self: Self, index: int) -> SetMetadata:
+        _check(0 <= index < len(self._sets))
+        return self._sets[index]
+
+    def _packet(self: Self, index: int) -> PacketMetadata:
+        _check(0 <= index < len(self._packets))
+        return self._packets[index]
+
+    @staticmethod
+    def _codes(*pairs: tuple[int, int]) -> None:
+        """Check that enum codes are within the sizes of their tables."""
+        for code, size in pairs:
+            _check(0 <= code < size)
+
+    def _take_optional(self: Self) -> Optional[tuple[int, ...]]:
+        length = self._take_ints(1)[0]
+        return tuple(self._take_ints(length - 1)) if length else None
+
+    def tossup(self: Self, cls: Type[_T] = Tossup) -> _T:  # type: ignore[assignment]
+        """Read a tossup."""
+        question, question_sanitized, answer, answer_sanitized = self._take_strs(4)
+        (
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            set,
+            packet,
+            number,
+        ) = self._take_ints(7)
+        self._codes(
+            (difficulty, len(DIFFICULTIES)),
+            (category, len(CATEGORIES)),
+            (subcategory, len(SUBCATEGORIES)),
+            (alternate, len(ALTERNATE_SUBCATEGORIES) + 1),
+        )
+        return tossup_from_state(
+            cls,
+            question,
+            question_sanitized,
+            answer,
+            answer_sanitized,
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            self._set(set),
+            self._packet(packet),
+            number,
+        )
+
+    def bonus(self: Self, cls: Type[_B] = Bonus) -> _B:  # type: ignore[assignment]
+        """Read a bonus."""
+        leadin, leadin_sanitized = self._take_strs(2)
+        parts, parts_sanitized, answers, answers_sanitized = (
+            self._take_strs(self._take_ints(1)[0]) for _ in range(4)
+        )
+        (
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            set,
+            packet,
+            number,
+        ) = self._take_ints(7)
+        self._codes(
+            (difficulty, len(DIFFICULTIES)),
+            (category, len(CATEGORIES)),
+            (subcategory, len(SUBCATEGORIES)),
+            (alternate, len(ALTERNATE_SUBCATEGORIES) + 1),
+        )
+        values, modifiers = self._take_optional(), self._take_optional()
+        for modifier in modifiers or ():
+            self._codes((modifier, len(DIFFICULTY_MODIFIERS)))
+        return bonus_from_state(
+            cls,
+            leadin,
+            leadin_sanitized,
+            parts,
+            parts_sanitized,
+            answers,
+            answers_sanitized,
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            self._set(set),
+            self._packet(packet),
+            number,
+            values,
+            modifiers,
+        )
+
+    def packet(self: Self, cls: Type[_P] = Packet) -> _P:  # type: ignore[assignment]
+        """Read a packet and all of its questions."""
+        tossups, bonuses, number, year, has_name = self._take_ints(5)
+        name = self._take_strs(1)[0] if has_name else None
+        return packet_from_state(
+            cls,
+            tuple(self.tossup() for _ in range(tossups)),
+            tuple(self.bonus() for _ in range(bonuses)),
+            None if number == -1 else number,
+            name,
+            None if year == -1 else year,
+        )
+
+
+def decode(data: Union[bytes, bytearray, memoryview], kind: int, cls: type) -> Any:
+    """Decode data that holds a single object of the given kind as a `cls`.
+
+    Raises
+    ------
+    ValueError
+        If the data is not exactly one encoded object of that kind.
+    """
+    decoder = Decoder(data).expect(kind)
+    value: Any
+    if kind == TOSSUP:
+        value = decoder.tossup(cls)
+    elif kind == BONUS:
+        value = decoder.bonus(cls)
+    else:
+        value = decoder.packet(cls)
+    decoder.finish()
+    return value
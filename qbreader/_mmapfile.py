@@ -0,0 +1,134 @@
+"""Write and map files of aligned binary sections described by a JSON header.
+
+Indexes and frames that are saved to disk share one layout: a fixed header with a
+magic string, a format version and the length of a JSON header, then the JSON
+header, then every section, each starting at a multiple of 8 bytes so that it can be
+cast to any array type. The JSON header records the byte order of the writer and the
+offset and size of every section, next to whatever else the caller puts in it.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Iterable
+from typing import Any, Union
+
+_HEADER = struct.Struct("<6sHI")
+
+Buffer = Union[bytes, bytearray, memoryview, array]
+
+
+def write_sections(
+    path: Union[str, os.PathLike],
+    magic: bytes,
+    version: int,
+    header: dict[str, Any],
+    sections: Iterable[tuple[str, Buffer]],
+) -> None:
+    """Atomically write sections to a file that `read_sections()` can map.
+
+    The file is written next to `path` and then renamed over it, so readers see
+    either the old file or the complete new one.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The file to write.
+    magic : bytes
+        The 6 bytes that identify the kind of file.
+    version : int
+        The version of the format of the kind of file.
+    header : dict[str, Any]
+        JSON-serializable values to store with the sections. The ``byteorder`` and
+        ``sections`` keys are reserved.
+    sections : Iterable[tuple[str, bytes | bytearray | memoryview | array]]
+        The name and contents of each section.
+    """
+    views = [(name, memoryview(data).cast("B")) for name, data in sections]
+    spans = {}
+    offset = 0
+    for name, data in views:
+        spans[name] = [offset, data.nbytes]
+        offset += data.nbytes + (-data.nbytes % 8)
+
+    encoded = json.dumps(
+        {**header, "byteorder": sys.byteorder, "sections": spans}
+    ).encode()
+    encoded += b" " * (-(_HEADER.size + len(encoded)) % 8)
+    directory = os.path.dirname(os.fspath(path)) or "."
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(_HEADER.pack(magic, version, len(encoded)))
+            file.write(encoded)
+            for _, data in views:
+                file.write(data)
+                file.write(bytes(-data.nbytes % 8))
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def read_sections(
+    path: Union[str, os.PathLike], magic: bytes, version: int, kind: str
+) -> tuple[dict[str, Any], dict[str, memoryview]]:
+    """Map a file written by `write_sections()`.
+
+    The file is memory-mapped read-only, so sections are only read from disk when
+    they are used, and processes that open the same file share its pages.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The file to open.
+    magic : bytes
+        The 6 bytes that the file must start with.
+    version : int
+        The version of the format that the file must have.
+    kind : str
+        What the file holds, e.g. ``"search index"``, for error messages.
+
+    Returns
+    -------
+    tuple[dict[str, Any], dict[str, memoryview]]
+        The JSON header, and a byte view of each section by name.
+
+    Raises
+    ------
+    ValueError
+        If the file is not of this kind, has another version, or was written on a
+        machine with another byte order.
+    """
+    with open(path, "rb") as file:
+        prefix = file.read(_HEADER.size)
+        if len(prefix) < _HEADER.size:
+            raise ValueError(f"{os.fspath(path)} is not a qbreader {kind}.")
+        found_magic, found_version, length = _HEADER.unpack(prefix)
+        if found_magic != magic:
+            raise ValueError(f"{os.fspath(path)} is not a qbreader {kind}.")
+        if found_version != version:
+            raise ValueError(
+                f"Unsupported {kind} version {found_version} in {os.fspath(path)}."
+            )
+        header = json.loads(file.read(length))
+        data = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(
+            f"{os.fspath(path)} was written on a {header['byteorder']}-endian "
+            + "machine and must be rebuilt."
+        )
+
+    base = _HEADER.size + length
+    sections = {}
+    for name, (offset, size) in header["sections"].items():
+        start = base + offset
+        stop = start + size
+        sections[name] = data[start:stop]
+    return header, sections
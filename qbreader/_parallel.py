@@ -0,0 +1,119 @@
+"""Decode API responses in worker processes while the event loop keeps fetching."""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Optional, TypeVar, Union
+
+from qbreader.types import Packet, QueryResponse
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def decode_packet(body: bytes, number: int, as_bytes: bool) -> Union[Packet, bytes]:
+    """Build a Packet from the raw body of an `api/packet` response.
+
+    Runs in a worker process. With `as_bytes`, the packet is returned already encoded
+    with `Packet.to_bytes()`, which is cheaper to send back to the parent process.
+    """
+    packet = Packet.from_json(json.loads(body), number=number)
+    return packet.to_bytes() if as_bytes else packet
+
+
+def decode_mirror_packet(body: bytes, number: int) -> tuple[bytes, list[str]]:
+    """Build the stored form of a packet and the ``_id`` of each of its questions.
+
+    Runs in a worker process. The ``_id`` of the tossups come before those of the
+    bonuses, like in `qbreader.mirror.Store.put_packet()`.
+    """
+    json_packet = json.loads(body)
+    packet = Packet.from_json(json_packet, number=number)
+    ids = [
+        question.get("_id", "")
+        for question in (*json_packet["tossups"], *json_packet["bonuses"])
+    ]
+    return packet.to_bytes(), ids
+
+
+def decode_query(body: bytes) -> QueryResponse:
+    """Build a QueryResponse from the raw body of an `api/query` response.
+
+    Runs in a worker process.
+    """
+    return QueryResponse.from_json(json.loads(body))
+
+
+def check_workers(workers: Optional[int], concurrency: int) -> None:
+    """Type check the worker and concurrency settings of an ingestion pipeline."""
+    if workers is not None:
+        if not isinstance(workers, int) or isinstance(workers, bool):
+            raise TypeError(f"workers must be an int, not {type(workers).__name__}.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool):
+        raise TypeError(
+            f"concurrency must be an int, not {type(concurrency).__name__}."
+        )
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1.")
+
+
+async def pipeline(
+    items: Iterable[_T],
+    fetch: Callable[[_T], Awaitable[bytes]],
+    decode: Callable[..., _R],
+    decode_args: Callable[[_T], tuple[Any, ...]],
+    workers: Optional[int],
+    concurrency: int,
+    executor: Optional[Executor],
+) -> AsyncIterator[_R]:
+    """Fetch raw bodies concurrently and decode them in a process pool, in order.
+
+    At most `concurrency` items are in flight (downloading or decoding) at a time, and
+    results are yielded in the order of `items`.
+
+    Parameters
+    ----------
+    items : Iterable
+        The requests to make.
+    fetch : Callable[[item], Awaitable[bytes]]
+        Downloads the raw response body of an item.
+    decode : Callable[[bytes, *args], result]
+        A picklable function run in the pool on each body.
+    decode_args : Callable[[item], tuple]
+        Extra arguments passed to `decode` after the body.
+    workers : int, optional
+        The number of worker processes. Defaults to `os.cpu_count()`.
+    concurrency : int
+        The maximum number of items in flight.
+    executor : concurrent.futures.Executor, optional
+        An existing pool to use instead of creating one. It is not shut down.
+    """
+    loop = asyncio.get_running_loop()
+    pool = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+
+    async def process(item: _T) -> _R:
+        body = await fetch(item)
+        return await loop.run_in_executor(pool, decode, body, *decode_args(item))
+
+    pending: collections.deque[asyncio.Task[_R]] = collections.deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(process(item)))
+            if len(pending) >= concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if executor is None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,150 @@
+"""Query semantics shared by the local query engines."""
+
+from __future__ import annotations
+
+import random
+import re
+from typing import Optional, Union
+
+import qbreader._api_utils as api_utils
+from qbreader._text import strip_diacritics
+from qbreader.types import (
+    Bonus,
+    Tossup,
+    UnnormalizedAlternateSubcategory,
+    UnnormalizedCategory,
+    UnnormalizedDifficulty,
+    UnnormalizedSubcategory,
+)
+
+FLAGS = ("exactPhrase", "ignoreDiacritics", "ignoreWordOrder", "regex", "randomize")
+"""The boolean parameters of `api/query`."""
+
+
+def order_key(question: Union[Tossup, Bonus]) -> tuple:
+    """Sort key matching the order of `api/query` results."""
+    return (
+        -question.set.year,
+        question.set.name,
+        question.packet.number,
+        question.number,
+    )
+
+
+def compile_query(
+    queryString: str,
+    exactPhrase: bool = False,
+    ignoreDiacritics: bool = False,
+    ignoreWordOrder: bool = False,
+    regex: bool = False,
+) -> Optional[re.Pattern]:
+    """Compile the query string of an `api/query` request into a regular expression.
+
+    Mirrors the server: unless `regex` is set the query is matched literally, with
+    word boundaries around it if `exactPhrase` is set, and with every word required
+    in any order if `ignoreWordOrder` is set. Matching is case-insensitive. If
+    `ignoreDiacritics` is set, diacritics are removed from the query here and must
+    also be removed from the searched text.
+
+    Returns
+    -------
+    re.Pattern | None
+        The compiled pattern, or None if the query matches every question.
+
+    Raises
+    ------
+    ValueError
+        If `regex` is set and `queryString` is not a valid regular expression.
+    """
+    if ignoreDiacritics:
+        queryString = strip_diacritics(queryString)
+
+    if regex:
+        pattern = queryString
+    else:
+        words = queryString.split() if ignoreWordOrder else [queryString.strip()]
+        words = [re.escape(word) for word in words if word]
+        if exactPhrase:
+            words = [rf"\b{word}\b" for word in words]
+        if ignoreWordOrder and words:
+            # anchored, so a failed search does not retry from every offset
+            pattern = r"\A" + "".join(f"(?=.*{word})" for word in words)
+        else:
+            pattern = words[0] if words else ""
+
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression {queryString!r}: {e}") from e
+
+
+def query_flags(data: dict) -> dict[str, bool]:
+    """Return the `FLAGS` of parameters normalized by `query_params()`."""
+    return {name: data[name] == "true" for name in FLAGS}
+
+
+def page_ranks(found: int, page: int, data: dict, flags: dict[str, bool]) -> list[int]:
+    """Return which of the `found` results of a query to return, in order."""
+    maxReturnLength = data["maxReturnLength"]
+    if flags["randomize"]:
+        return random.sample(range(found), min(maxReturnLength, found))
+    start = (page - 1) * maxReturnLength
+    return list(range(start, min(start + maxReturnLength, found)))
+
+
+def random_params(
+    difficulties: UnnormalizedDifficulty,
+    categories: UnnormalizedCategory,
+    subcategories: UnnormalizedSubcategory,
+    alternate_subcategories: UnnormalizedAlternateSubcategory,
+    number: int,
+    min_year: int,
+    max_year: int,
+    three_part_bonuses: bool = False,
+) -> dict:
+    """Check and normalize the parameters of `random_tossup()` or `random_bonus()`.
+
+    Returns
+    -------
+    dict
+        The filters, with the same keys as the output of `query_params()`.
+    """
+    for name, param in (
+        ("number", number),
+        ("min_year", min_year),
+        ("max_year", max_year),
+    ):
+        if not isinstance(param, int):
+            raise TypeError(f"{name} must be an integer, not {type(param).__name__}.")
+        elif param < 1:
+            raise ValueError(f"{name} must be at least 1.")
+
+    if not isinstance(three_part_bonuses, bool):
+        raise TypeError(
+            "three_part_bonuses must be a boolean, not "
+            + f"{type(three_part_bonuses).__name__}."
+        )
+
+    (
+        normalized_categories,
+        normalized_subcategories,
+        normalized_alternate_subcategories,
+    ) = api_utils.normalize_cats(categories, subcategories, alternate_subcategories)
+
+    return {
+        "difficulties": api_utils.normalize_diff(difficulties),
+        "categories": normalized_categories,
+        "subcategories": normalized_subcategories,
+        "alternateSubcategories": normalized_alternate_subcategories,
+        "minYear": min_year,
+        "maxYear": max_year,
+    }
+
+
+def enum_set(normalized: Optional[str], enum_type: type) -> set:
+    """Parse a comma-separated string from `query_params()` into a set of enums."""
+    if not normalized:
+        return set()
+    return {enum_type(value) for value in normalized.split(",")}
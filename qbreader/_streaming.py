@@ -0,0 +1,197 @@
+"""Incremental JSON parsing for large, streamed API responses."""
+
+from __future__ import annotations
+
+import codecs
+import json
+from collections.abc import Iterable
+from typing import Any, Self, Union
+
+from qbreader.types import Bonus, Tossup, _MetadataCache
+
+CHUNK_SIZE = 64 * 1024
+"""Number of bytes read from the response body at a time."""
+
+_WHITESPACE = " \t\n\r"
+
+# parser states
+_VALUE = 0  # expecting a value
+_KEY = 1  # expecting an object key or the end of the object
+_COLON = 2  # expecting the colon after an object key
+_NEXT = 3  # expecting a comma or the end of the container
+_END = 4  # the top-level value has been read
+
+_TOSSUPS = ("tossups", "questionArray")
+_BONUSES = ("bonuses", "questionArray")
+
+
+class JSONStreamParser:
+    """Incrementally parse a JSON document from text chunks.
+
+    Containers are walked one token at a time, but every element of an array whose
+    key path is in `targets` is decoded as a whole by the C `json` decoder and
+    reported as soon as its closing character arrives. Scalars outside of those arrays
+    are reported as well. Only the enclosing structure, the unfinished tail of the last
+    chunk, and a single element are ever held in memory.
+
+    Key paths are tuples of object keys from the root, ignoring array nesting, e.g.
+    ``("tossups", "questionArray")``.
+    """
+
+    def __init__(self: Self, targets: Iterable[tuple[str, ...]]):
+        self.targets: frozenset[tuple[str, ...]] = frozenset(targets)
+        self._decoder = json.JSONDecoder()
+        self._buffer: str = ""
+        self._pos: int = 0
+        self._closed: bool = False
+        self._state: int = _VALUE
+        # one entry per open container: "{" or "["
+        self._containers: list[str] = []
+        # the current key of every open object
+        self._keys: list[str] = []
+
+    def feed(self: Self, chunk: str) -> list[tuple[tuple[str, ...], Any]]:
+        """Parse another chunk and return the `(path, value)` pairs it completed."""
+        pos, self._pos = self._pos, 0
+        self._buffer = self._buffer[pos:] + chunk
+        return self._parse()
+
+    def close(self: Self) -> list[tuple[tuple[str, ...], Any]]:
+        """Signal the end of the document and return any remaining pairs."""
+        self._closed = True
+        events = self.feed("")
+        if self._state != _END or self._pos < len(self._buffer):
+            raise json.JSONDecodeError("Unexpected end of data", self._buffer, 0)
+        return events
+
+    def _decode(self: Self) -> tuple[Any, int] | None:
+        """Decode the value at the cursor, or return None if it may be incomplete."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return None
+        # a number at the end of the buffer may continue in the next chunk
+        if end == len(self._buffer) and not self._closed:
+            return None
+        return value, end
+
+    def _parse(self: Self) -> list[tuple[tuple[str, ...], Any]]:
+        events: list[tuple[tuple[str, ...], Any]] = []
+        buffer = self._buffer
+        length = len(buffer)
+
+        while True:
+            while self._pos < length and buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos >= length or self._state == _END:
+                return events
+
+            char = buffer[self._pos]
+            state = self._state
+
+            if state == _VALUE:
+                path = tuple(self._keys)
+                in_target = bool(self._containers) and (
+                    self._containers[-1] == "[" and path in self.targets
+                )
+                if char == "]" and self._containers and self._containers[-1] == "[":
+                    self._pos += 1
+                    self._close_container()
+                elif char in "{[" and not in_target:
+                    self._pos += 1
+                    self._containers.append(char)
+                    self._state = _KEY if char == "{" else _VALUE
+                else:
+                    decoded = self._decode()
+                    if decoded is None:
+                        return events
+                    value, self._pos = decoded
+                    events.append((path, value))
+                    self._finish_value()
+
+            elif state == _KEY:
+                if char == "}":
+                    self._pos += 1
+                    self._close_container()
+                    continue
+                decoded = self._decode()
+                if decoded is None:
+                    return events
+                key, self._pos = decoded
+                if not isinstance(key, str):
+                    raise json.JSONDecodeError("Expected object key", buffer, self._pos)
+                self._keys.append(key)
+                self._state = _COLON
+
+            elif state == _COLON:
+                if char != ":":
+                    raise json.JSONDecodeError("Expected ':'", buffer, self._pos)
+                self._pos += 1
+                self._state = _VALUE
+
+            elif state == _NEXT:
+                self._pos += 1
+                if char == ",":
+                    self._state = _KEY if self._containers[-1] == "{" else _VALUE
+                elif char in "}]":
+                    self._close_container()
+                else:
+                    raise json.JSONDecodeError("Expected ',' or end", buffer, self._pos)
+
+    def _finish_value(self: Self) -> None:
+        """Move past a value that was just read."""
+        if not self._containers:
+            self._state = _END
+            return
+        if self._containers[-1] == "{":
+            self._keys.pop()
+        self._state = _NEXT
+
+    def _close_container(self: Self) -> None:
+        self._containers.pop()
+        self._finish_value()
+
+
+class QueryStream:
+    """Incrementally decode the body of an `api/query` response into questions.
+
+    Feed raw response bytes with `feed()`; each call returns the `Tossup` and `Bonus`
+    objects whose JSON was completed by that chunk. The reported counts and query
+    string are available as attributes once their keys have been read.
+    """
+
+    def __init__(self: Self):
+        self.tossups_found: int = 0
+        self.bonuses_found: int = 0
+        self.query_string: str = ""
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._parser = JSONStreamParser(targets=(_TOSSUPS, _BONUSES))
+        self._metadata = _MetadataCache()
+
+    def feed(self: Self, chunk: bytes) -> list[Union[Tossup, Bonus]]:
+        """Parse another chunk of the response body."""
+        return self._handle(self._parser.feed(self._text.decode(chunk)))
+
+    def close(self: Self) -> list[Union[Tossup, Bonus]]:
+        """Finish parsing the response body."""
+        events = self._parser.feed(self._text.decode(b"", final=True))
+        return self._handle(events + self._parser.close())
+
+    def _handle(
+        self: Self, events: list[tuple[tuple[str, ...], Any]]
+    ) -> list[Union[Tossup, Bonus]]:
+        questions: list[Union[Tossup, Bonus]] = []
+        for path, value in events:
+            if path == _TOSSUPS:
+                questions.append(Tossup._from_json_cached(value, self._metadata))
+            elif path == _BONUSES:
+                questions.append(Bonus._from_json_cached(value, self._metadata))
+            elif path == ("tossups", "count"):
+                self.tossups_found = value
+            elif path == ("bonuses", "count"):
+                self.bonuses_found = value
+            elif path == ("queryString",):
+                self.query_string = value
+        return questions
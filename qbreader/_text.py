@@ -0,0 +1,25 @@
+"""Text normalization shared by the local search, indexing and judging code."""
+
+from __future__ import annotations
+
+import unicodedata
+
+
+def strip_diacritics(text: str) -> str:
+    """Remove diacritics from `text`, e.g. ``"Dvořák"`` becomes ``"Dvorak"``.
+
+    Characters are decomposed with NFKD and combining marks are dropped, so the
+    result may differ in length from `text`.
+    """
+    if text.isascii():
+        return text
+    return "".join(
+        char
+        for char in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(char)
+    )
+
+
+def fold(text: str) -> str:
+    """Remove diacritics from `text` and case-fold it."""
+    return strip_diacritics(text).casefold()
@@ -0,0 +1,409 @@
+"""Parse answerlines into their answers and the clauses that follow them."""
+
+from __future__ import annotations
+
+import functools
+import html
+import re
+from collections.abc import Iterable, Sequence
+from typing import Optional, Self, Type, Union, cast
+
+from qbreader._text import fold
+from qbreader.types import Bonus, Directive, Packet, QueryResponse, Tossup
+
+CACHE_SIZE = 1 << 16
+"""How many parsed answerlines `parse_answerline()` keeps."""
+
+UNDERLINE = 1
+BOLD = 2
+_EMPHASIS = {"u": UNDERLINE, "b": BOLD, "strong": BOLD}
+_TAG = re.compile(r"<(/?)(\w+)[^>]*>")
+_BRACKETS = {"[": "]", "(": ")"}
+
+_CLAUSE = re.compile(
+    r"\s*(?:"
+    r"(?P<reject>(?:do not|don't|dont) (?:accept or prompt|prompt or accept|accept|"
+    r"prompt)(?: on)?|reject|not)"
+    r"|(?P<prompt>(?:anti-?)?prompt(?: on)?)"
+    r"|(?P<accept>(?:also )?accept(?: either)?|or)"
+    r")\b\s*:?",
+    re.IGNORECASE,
+)
+_DIRECTED = re.compile(
+    r"\s*\b(?:by asking(?: for)?|asking for|by saying|with)\s*[\"“'‘](.+?)[\"”'’]",
+    re.IGNORECASE,
+)
+_QUALIFIER = re.compile(r"\s+\b(?:before|until|after|if|when)\b", re.IGNORECASE)
+_SEMICOLON = re.compile(r"\s*;\s*")
+_ALTERNATIVE = re.compile(r"\s*,\s*(?:or\s+)?|\s+or\s+", re.IGNORECASE)
+_APOSTROPHES = re.compile(r"['‘’`]")
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset({"a", "an", "the", "of", "and"})
+
+Marked = tuple[str, bytes]
+"""Plain answerline text and the `UNDERLINE` and `BOLD` marks of each character."""
+
+
+def tokenize(text: str) -> list[str]:
+    """Split `text` into normalized words for judging, without stopwords.
+
+    Words are folded, apostrophes are dropped so ``"Rubik's"`` is one word, and
+    plurals are reduced to their singular.
+    """
+    words = _WORD.findall(_APOSTROPHES.sub("", fold(text)))
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+
+def _stem(word: str) -> str:
+    """Remove a plural ending from `word`."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _markup(answerline: str) -> Marked:
+    """Remove the HTML tags of `answerline`, remembering what was emphasized."""
+    text: list[str] = []
+    marks = bytearray()
+    depth = {UNDERLINE: 0, BOLD: 0}
+    position = 0
+    for match in [*_TAG.finditer(answerline), None]:
+        end = len(answerline) if match is None else match.start()
+        chunk = html.unescape(answerline[position:end])
+        mark = (UNDERLINE if depth[UNDERLINE] else 0) | (BOLD if depth[BOLD] else 0)
+        text.append(chunk)
+        marks.extend(bytes([mark]) * len(chunk))
+        if match is None:
+            break
+        position = match.end()
+        emphasis = _EMPHASIS.get(match[2].lower())
+        if emphasis:
+            depth[emphasis] = max(depth[emphasis] + (-1 if match[1] else 1), 0)
+    return "".join(text), bytes(marks)
+
+
+def _cut(marked: Marked, start: int, stop: int) -> Marked:
+    text, marks = marked
+    return text[start:stop], marks[start:stop]
+
+
+def _split(marked: Marked, separator: re.Pattern) -> list[Marked]:
+    """Split `marked` wherever `separator` matches."""
+    pieces = []
+    start = 0
+    for match in separator.finditer(marked[0]):
+        pieces.append(_cut(marked, start, match.start()))
+        start = match.end()
+    pieces.append(_cut(marked, start, len(marked[0])))
+    return [piece for piece in pieces if piece[0].strip()]
+
+
+def _groups(marked: Marked) -> tuple[Marked, list[tuple[str, Marked]]]:
+    """Separate the top-level bracketed groups of `marked` from the text outside.
+
+    Returns
+    -------
+    tuple[Marked, list[tuple[str, Marked]]]
+        The text outside brackets, and the opening bracket and contents of every
+        group. Unclosed brackets run to the end of the text.
+    """
+    text, marks = marked
+    outside: list[Marked] = []
+    groups: list[tuple[str, Marked]] = []
+    stack: list[str] = []
+    start = 0
+    for i, char in enumerate(text):
+        if char in _BRACKETS:
+            if not stack:
+                outside.append(_cut(marked, start, i))
+                start = i + 1
+            stack.append(char)
+        elif stack and char == _BRACKETS[stack[-1]]:
+            opener = stack.pop()
+            if not stack:
+                groups.append((opener, _cut(marked, start, i)))
+                start = i + 1
+    if stack:
+        groups.append((stack[0], _cut(marked, start, len(text))))
+    else:
+        outside.append(_cut(marked, start, len(text)))
+    return (
+        ("".join(t for t, _ in outside), b"".join(m for _, m in outside)),
+        groups,
+    )
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+class Answer:
+    """One answer in an answerline: a main answer or an alternate in a clause.
+
+    Parameters
+    ----------
+    text : str
+        The answer, without tags or parenthetical remarks.
+    required : str
+        The emphasized words of the answer (``<u>``, or ``<b>`` if nothing is
+        underlined), or all of `text` if nothing is emphasized.
+    optional : str, default = ""
+        Parenthetical remarks, whose words may be given but are not required.
+    directed_prompt : str, optional
+        What to ask when prompting on this answer.
+    """
+
+    def __init__(
+        self: Self,
+        text: str,
+        required: str,
+        optional: str = "",
+        directed_prompt: Optional[str] = None,
+    ):
+        self.text: str = text
+        self.required: str = required
+        self.optional: str = optional
+        self.directed_prompt: Optional[str] = directed_prompt
+        self.required_tokens: tuple[str, ...] = tuple(tokenize(required))
+        self.tokens: tuple[str, ...] = tuple(tokenize(f"{text} {optional}"))
+
+    @classmethod
+    def _parse(
+        cls: Type[Self],
+        marked: Marked,
+        optional: str = "",
+        directed_prompt: Optional[str] = None,
+    ) -> Self:
+        outside, groups = _groups(marked)
+        text, marks = outside
+        emphasis = UNDERLINE if any(m & UNDERLINE for m in marks) else BOLD
+        if any(m & emphasis for m in marks):
+            required = "".join(
+                char if mark & emphasis else " " for char, mark in zip(text, marks)
+            )
+        else:
+            required = text
+        remarks = [group[0] for _, group in groups]
+        if optional:
+            remarks.append(optional)
+        return cls(
+            _squash(text),
+            _squash(required),
+            _squash(" ".join(remarks)),
+            directed_prompt,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether two answers are equal."""
+        if not isinstance(other, Answer):
+            return NotImplemented
+
+        return (
+            self.text == other.text
+            and self.required == other.required
+            and self.optional == other.optional
+            and self.directed_prompt == other.directed_prompt
+        )
+
+    def __repr__(self) -> str:
+        """Return a representation of the answer."""
+        return (
+            f"Answer({self.text!r}, {self.required!r}, {self.optional!r}, "
+            + f"{self.directed_prompt!r})"
+        )
+
+    def __str__(self) -> str:
+        """Return the text of the answer."""
+        return self.text
+
+
+class Answerline:
+    """An answerline split into its answers and the alternates of its clauses.
+
+    Create answerlines with `parse_answerline()`, which caches them. Answerlines
+    are shared between callers, so they should not be modified.
+
+    Parameters
+    ----------
+    answerline : str
+        The answerline that was parsed.
+    answers : Sequence[Answer]
+        The main answers, usually one but several if joined by "or".
+    accept : Sequence[Answer]
+        Alternates to accept.
+    prompt : Sequence[Answer]
+        Alternates to prompt on.
+    reject : Sequence[Answer]
+        Alternates to neither accept nor prompt on.
+    """
+
+    def __init__(
+        self: Self,
+        answerline: str,
+        answers: Sequence[Answer],
+        accept: Sequence[Answer] = (),
+        prompt: Sequence[Answer] = (),
+        reject: Sequence[Answer] = (),
+    ):
+        self.answerline: str = answerline
+        self.answers: tuple[Answer, ...] = tuple(answers)
+        self.accept: tuple[Answer, ...] = tuple(accept)
+        self.prompt: tuple[Answer, ...] = tuple(prompt)
+        self.reject: tuple[Answer, ...] = tuple(reject)
+
+    @property
+    def primary(self: Self) -> Answer:
+        """The first main answer."""
+        return self.answers[0]
+
+    @property
+    def required(self: Self) -> str:
+        """The required words of the primary answer."""
+        return self.primary.required
+
+    def alternates(self: Self, directive: Directive) -> tuple[Answer, ...]:
+        """Return every answer that gets `directive`, main answers included."""
+        if directive == Directive.ACCEPT:
+            return self.answers + self.accept
+        return self.prompt if directive == Directive.PROMPT else self.reject
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether two answerlines are equal."""
+        if not isinstance(other, Answerline):
+            return NotImplemented
+
+        return self.answerline == other.answerline
+
+    def __hash__(self) -> int:
+        """Hash the parsed answerline."""
+        return hash(self.answerline)
+
+    def __str__(self) -> str:
+        """Return the parsed answerline."""
+        return self.answerline
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _parse(answerline: str) -> Answerline:
+    main, groups = _groups(_markup(answerline))
+
+    alternatives = _split(main, _ALTERNATIVE) if any(main[1]) else [main]
+    if not all(any(marks) for _, marks in alternatives):
+        alternatives = [main]
+
+    remarks: list[str] = []
+    answers: dict[Directive, list[Answer]] = {d: [] for d in Directive}
+    for opener, group in groups:
+        directive: Optional[Directive] = Directive.ACCEPT if opener == "[" else None
+        for clause in _split(group, _SEMICOLON):
+            match = _CLAUSE.match(clause[0])
+            if match:
+                directive = Directive(cast(str, match.lastgroup))
+                clause = _cut(clause, match.end(), len(clause[0]))
+            if directive is None:
+                # a parenthetical remark rather than a clause
+                remarks.append(clause[0])
+                continue
+
+            directed_prompt = None
+            prompt = _DIRECTED.search(clause[0])
+            if prompt:
+                directed_prompt = prompt[1] if directive == Directive.PROMPT else None
+                clause = _cut(clause, 0, prompt.start())
+            for qualifier in _QUALIFIER.finditer(clause[0]):
+                start, stop = qualifier.span()
+                if not any(clause[1][start:stop]):
+                    clause = _cut(clause, 0, start)
+                    break
+            answers[directive].extend(
+                Answer._parse(alternative, directed_prompt=directed_prompt)
+                for alternative in _split(clause, _ALTERNATIVE)
+            )
+
+    optional = " ".join(remarks)
+    return Answerline(
+        answerline,
+        [Answer._parse(alternative, optional) for alternative in alternatives],
+        accept=answers[Directive.ACCEPT],
+        prompt=answers[Directive.PROMPT],
+        reject=answers[Directive.REJECT],
+    )
+
+
+def parse_answerline(answerline: str) -> Answerline:
+    """Parse an answerline, or return the cached result of parsing it before.
+
+    Words in ``<u>`` tags, or ``<b>`` tags if nothing is underlined, are required.
+    Clauses in brackets that start with "accept", "prompt on" or "do not accept"
+    (and their variants) list alternate answers separated by "or" or commas, and a
+    prompt clause may direct the prompt with ``by asking "..."``. Other
+    parenthetical remarks are optional words of the main answers.
+
+    Parameters
+    ----------
+    answerline : str
+        The answerline, preferably including the HTML tags <b> and <u>, if they are
+        present.
+
+    Returns
+    -------
+    Answerline
+        The parsed answerline.
+    """
+    if not isinstance(answerline, str):
+        raise TypeError(f"answerline must be a string, not {type(answerline).__name__}")
+    return _parse(answerline)
+
+
+def parse_answerlines(
+    source: Union[Packet, QueryResponse, Iterable[Union[Tossup, Bonus]]],
+) -> list[tuple[Answerline, ...]]:
+    """Parse the answerlines of many questions, parsing each distinct one once.
+
+    Parameters
+    ----------
+    source : Packet | QueryResponse | Iterable[Tossup | Bonus]
+        The questions. The tossups of a `Packet` or `QueryResponse` come before
+        its bonuses.
+
+    Returns
+    -------
+    list[tuple[Answerline, ...]]
+        For every question, the answerline of a tossup or those of each part of a
+        bonus.
+    """
+    if isinstance(source, (Packet, QueryResponse)):
+        source = (*source.tossups, *source.bonuses)
+
+    parsed: dict[str, Answerline] = {}
+    result: list[tuple[Answerline, ...]] = []
+    for question in source:
+        if isinstance(question, Tossup):
+            answerlines: Sequence[str] = (question.answer,)
+        elif isinstance(question, Bonus):
+            answerlines = question.answers
+        else:
+            raise TypeError(
+                "source must contain Tossup or Bonus objects, not "
+                + f"{type(question).__name__}."
+            )
+        for answerline in answerlines:
+            if answerline not in parsed:
+                parsed[answerline] = _parse(answerline)
+        result.append(tuple(parsed[answerline] for answerline in answerlines))
+    return result
+
+
+__all__ = (
+    "Answer",
+    "Answerline",
+    "parse_answerline",
+    "parse_answerlines",
+    "tokenize",
+    "CACHE_SIZE",
+    "STOPWORDS",
+)
@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
-from typing import Optional, Self, Type
+import functools
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Iterable, Optional, Self, Type, Union
 
 import aiohttp
 
 import qbreader._api_utils as api_utils
+import qbreader._parallel as parallel
 from qbreader._consts import BASE_URL
+from qbreader._streaming import CHUNK_SIZE, QueryStream
 from qbreader.types import (
     AnswerJudgement,
     Bonus,
@@ -138,102 +142,175 @@ class Async:
         QueryResponse
             A `QueryResponse` object containing the results of the query.
         """
-        # normalize and type check parameters
-        if questionType == Tossup:
-            questionType = "tossup"
-        elif questionType == Bonus:
-            questionType = "bonus"
-        if questionType not in ["tossup", "bonus", "all"]:
-            raise ValueError("questionType must be either 'tossup', 'bonus', or 'all'.")
-
-        if searchType not in ["question", "answer", "all"]:
-            raise ValueError(
-                "searchType must be either 'question', 'answer', or 'all'."
-            )
+        url = BASE_URL + "/query"
 
-        if not isinstance(queryString, str):
-            raise TypeError(
-                f"queryString must be a string, not {type(queryString).__name__}."
-            )
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            randomize=randomize,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            tossupPagination=tossupPagination,
+            bonusPagination=bonusPagination,
+            min_year=min_year,
+            max_year=max_year,
+        )
 
-        for name, param in tuple(
-            zip(
-                (
-                    "exactPhrase",
-                    "ignoreDiacritics",
-                    "ignoreWordOrder",
-                    "regex",
-                    "randomize",
-                ),
-                (exactPhrase, ignoreDiacritics, ignoreWordOrder, regex, randomize),
-            )
-        ):
-            if not isinstance(param, bool):
-                raise TypeError(
-                    f"{name} must be a boolean, not {type(param).__name__}."
-                )
+        async with self.session.get(url, params=data) as response:
+            if response.status != 200:
+                raise Exception(str(response.status) + " bad request")
 
-        if setName is not None and not isinstance(setName, str):
-            raise TypeError(f"setName must be a string, not {type(setName).__name__}.")
+            json = await response.json()
+            return QueryResponse.from_json(json)
 
-        for name, param in tuple(  # type: ignore
-            zip(
-                ("maxReturnLength", "tossupPagination", "bonusPagination"),
-                (maxReturnLength, tossupPagination, bonusPagination),
-            )
-        ):
-            if not isinstance(param, int):
-                raise TypeError(
-                    f"{name} must be an integer, not {type(param).__name__}."
-                )
-            elif param < 1:
-                raise ValueError(f"{name} must be at least 1.")
+    def iter_query(
+        self: Self,
+        questionType: QuestionType = "all",
+        searchType: SearchType = "all",
+        queryString: Optional[str] = "",
+        exactPhrase: Optional[bool] = False,
+        ignoreDiacritics: Optional[bool] = False,
+        ignoreWordOrder: Optional[bool] = False,
+        regex: Optional[bool] = False,
+        setName: Optional[str] = None,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        maxReturnLength: Optional[int] = 25,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+    ) -> AsyncIterator[Union[Tossup, Bonus]]:
+        """Asynchronously iterate over every question matching a query.
 
-        for name, year in {
-            "minYear": min_year,
-            "maxYear": max_year,
-        }.items():
-            if not isinstance(year, int):
-                raise TypeError(
-                    f"{name} must be an integer, not {type(param).__name__}."
-                )
+        Pages of `maxReturnLength` questions are requested one after another, and each
+        response body is parsed incrementally as it arrives. Every `Tossup` or `Bonus`
+        is yielded as soon as its JSON is complete, so a large page is never held in
+        memory as a whole.
+
+        Parameters
+        ----------
+        See `query()`. `maxReturnLength` is the size of each requested page.
 
+        Returns
+        -------
+        AsyncIterator[Tossup | Bonus]
+            An asynchronous iterator over the matching questions, page by page. Within
+            a page, tossups come before bonuses.
+        """
         url = BASE_URL + "/query"
 
-        (
-            normalized_categories,
-            normalized_subcategories,
-            normalized_alternate_subcategories,
-        ) = api_utils.normalize_cats(categories, subcategories, alternate_subcategories)
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            min_year=min_year,
+            max_year=max_year,
+        )
 
-        data = {
-            "questionType": questionType,
-            "searchType": searchType,
-            "queryString": queryString,
-            "exactPhrase": api_utils.normalize_bool(exactPhrase),
-            "ignoreDiacritics": api_utils.normalize_bool(ignoreDiacritics),
-            "ignoreWordOrder": api_utils.normalize_bool(ignoreWordOrder),
-            "regex": api_utils.normalize_bool(regex),
-            "randomize": api_utils.normalize_bool(randomize),
-            "setName": setName,
-            "difficulties": api_utils.normalize_diff(difficulties),
-            "categories": normalized_categories,
-            "subcategories": normalized_subcategories,
-            "alternateSubcategories": normalized_alternate_subcategories,
-            "maxReturnLength": maxReturnLength,
-            "tossupPagination": tossupPagination,
-            "bonusPagination": bonusPagination,
-            "minYear": min_year,
-            "maxYear": max_year,
-        }
-        data = api_utils.prune_none(data)
+        return self._iter_query_pages(url, data)
+
+    async def _iter_query_pages(
+        self: Self, url: str, data: dict
+    ) -> AsyncIterator[Union[Tossup, Bonus]]:
+        """Request and stream consecutive pages of an `api/query` request."""
+        page = 1
+        while True:
+            data["tossupPagination"] = data["bonusPagination"] = page
+
+            stream = QueryStream()
+            received = 0
+            async with self.session.get(url, params=data) as response:
+                if response.status != 200:
+                    raise Exception(str(response.status) + " bad request")
+
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    for question in stream.feed(chunk):
+                        received += 1
+                        yield question
+            for question in stream.close():
+                received += 1
+                yield question
+
+            found = max(stream.tossups_found, stream.bonuses_found)
+            if received == 0 or page * data["maxReturnLength"] >= found:
+                return
+            page += 1
+
+    def ingest_queries(
+        self: Self,
+        queries: Iterable[dict[str, Any]],
+        workers: Optional[int] = None,
+        concurrency: int = 8,
+        executor: Optional[Executor] = None,
+    ) -> AsyncIterator[QueryResponse]:
+        """Run many queries, decoding the responses in a process pool.
+
+        Responses are downloaded concurrently on the event loop while a
+        `concurrent.futures.ProcessPoolExecutor` parses the JSON and builds the
+        questions, so decoding scales with the number of cores instead of competing
+        with the network for one.
 
-        async with self.session.get(url, params=data) as response:
+        Parameters
+        ----------
+        queries : Iterable[dict[str, Any]]
+            Keyword arguments for `query()`, one dictionary per query. Each is validated
+            just before it is requested.
+        workers : int, optional
+            The number of worker processes. Defaults to the number of CPUs.
+        concurrency : int, default = 8
+            The maximum number of queries being downloaded or decoded at once.
+        executor : concurrent.futures.Executor, optional
+            An existing process pool to use instead of creating one, e.g. to share it
+            between calls. It is not shut down afterwards.
+
+        Returns
+        -------
+        AsyncIterator[QueryResponse]
+            The responses, in the same order as `queries`.
+        """
+        parallel.check_workers(workers, concurrency)
+        url = BASE_URL + "/query"
+
+        async def fetch(query: dict[str, Any]) -> bytes:
+            return await self._get_bytes(url, api_utils.query_params(**query))
+
+        return parallel.pipeline(
+            queries,
+            fetch,
+            parallel.decode_query,
+            lambda query: (),
+            workers,
+            concurrency,
+            executor,
+        )
+
+    async def _get_bytes(self: Self, url: str, params: dict) -> bytes:
+        """Download the raw body of a successful response."""
+        async with self.session.get(url, params=params) as response:
             if response.status != 200:
                 raise Exception(str(response.status) + " bad request")
 
-            json = await response.json()
-            return QueryResponse.from_json(json)
+            return await response.read()
 
     async def random_tossup(
         self: Self,
@@ -474,6 +551,37 @@ class Async:
             json = await response.json()
             return Packet.from_json(json=json, number=packetNumber)
 
+    async def packet_body(self: Self, setName: str, packetNumber: int) -> bytes:
+        """Download the raw JSON body of a packet without decoding it.
+
+        Unlike `packet()`, the packet number is not checked against `num_packets()`
+        first, so this makes a single request. Decode the body with
+        `Packet.from_json()`, e.g. in another process.
+
+        Parameters
+        ----------
+        setName : str
+            The name of the set. See `set_list()` for a list of valid set names.
+        packetNumber : int
+            The number of the packet in the set, starting from 1.
+
+        Returns
+        -------
+        bytes
+            The response body, as returned by the API.
+        """
+        if not isinstance(setName, str):
+            raise TypeError(f"setName must be a string, not {type(setName).__name__}.")
+
+        if not isinstance(packetNumber, int):
+            raise TypeError(
+                f"packetNumber must be an integer, not {type(packetNumber).__name__}."
+            )
+
+        url = BASE_URL + "/packet"
+        data = {"setName": setName, "packetNumber": packetNumber}
+        return await self._get_bytes(url, data)
+
     async def packet_tossups(
         self: Self, setName: str, packetNumber: int
     ) -> tuple[Tossup, ...]:
@@ -566,6 +674,56 @@ class Async:
             json = await response.json()
             return tuple(Bonus.from_json(b) for b in json["bonuses"])
 
+    def ingest_packets(
+        self: Self,
+        packets: Iterable[tuple[str, int]],
+        workers: Optional[int] = None,
+        concurrency: int = 8,
+        executor: Optional[Executor] = None,
+        as_bytes: bool = False,
+    ) -> AsyncIterator[Union[Packet, bytes]]:
+        """Download many packets, decoding them in a process pool.
+
+        Packets are downloaded concurrently on the event loop while a
+        `concurrent.futures.ProcessPoolExecutor` parses the JSON and builds the
+        questions. Unlike `packet()`, packet numbers are not checked against
+        `num_packets()` first.
+
+        Parameters
+        ----------
+        packets : Iterable[tuple[str, int]]
+            `(setName, packetNumber)` pairs.
+        workers : int, optional
+            The number of worker processes. Defaults to the number of CPUs.
+        concurrency : int, default = 8
+            The maximum number of packets being downloaded or decoded at once.
+        executor : concurrent.futures.Executor, optional
+            An existing process pool to use instead of creating one, e.g. to share it
+            between calls. It is not shut down afterwards.
+        as_bytes : bool, default = False
+            Yield each packet in the compact form of `Packet.to_bytes()` instead of as a
+            `Packet`, e.g. to store it without decoding it in this process.
+
+        Returns
+        -------
+        AsyncIterator[Packet | bytes]
+            The packets, in the same order as `packets`.
+        """
+        parallel.check_workers(workers, concurrency)
+
+        async def fetch(packet: tuple[str, int]) -> bytes:
+            return await self.packet_body(*packet)
+
+        return parallel.pipeline(
+            packets,
+            fetch,
+            functools.partial(parallel.decode_packet, as_bytes=as_bytes),
+            lambda packet: (packet[1],),
+            workers,
+            concurrency,
+            executor,
+        )
+
     async def num_packets(self: Self, setName: str) -> int:
         """Get the number of packets in a set.
 
@@ -0,0 +1,255 @@
+"""Suggest answers as they are typed.
+
+An `AnswerCompleter` holds the distinct answers of a set of questions, with the
+number of answerlines each one is the main answer of. Answers are normalized like
+the search index, so a prefix matches regardless of case, diacritics and
+punctuation, and every word of an answer can start a match: "newt" completes to
+"Isaac Newton".
+
+The index is a sorted array of the words-onward suffixes of every answer, and a
+sparse table of the position of the most frequent answer in every power-of-two run
+of it, so the k most frequent completions of a prefix are found with two binary
+searches and about ``2 * k`` constant-time range lookups, however many answers
+share the prefix.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from typing import Self
+
+from qbreader.index import tokenize
+from qbreader.local import Source, iter_source
+from qbreader.types import Bonus, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+_END = "\U0010ffff"
+_REMARK = re.compile(r"\s*(?:\[[^\]]*\]?|\([^)]*\)?)")
+
+
+def main_answer(answerline: str) -> str:
+    """Return an answerline without its bracketed and parenthetical clauses."""
+    return " ".join(_REMARK.sub(" ", answerline).split())
+
+
+def normalize_answer(text: str) -> str:
+    """Return the folded words of an answer, separated by single spaces."""
+    return " ".join(tokenize(text))
+
+
+def _sparse_table(counts: array) -> list[array]:
+    """Return the position of the largest count in every power-of-two run.
+
+    Level ``j`` holds, for every position ``i``, the position of the largest of
+    ``counts[i : i + 2 ** j]``, the first one if there are several.
+    """
+    levels = [array("I", range(len(counts)))]
+    if np is not None:
+        values = np.frombuffer(counts, dtype=np.uint32)
+        previous = np.arange(len(counts), dtype=np.uint32)
+        width = 1
+        while 2 * width <= len(counts):
+            left, right = previous[:-width], previous[width:]
+            previous = np.where(values[right] > values[left], right, left)
+            levels.append(array("I", previous.tobytes()))
+            width *= 2
+        return levels
+
+    width = 1
+    while 2 * width <= len(counts):
+        previous = levels[-1]
+        levels.append(
+            array(
+                "I",
+                (
+                    b if counts[b] > counts[a] else a
+                    for a, b in zip(previous, previous[width:])
+                ),
+            )
+        )
+        width *= 2
+    return levels
+
+
+def _answerlines(source: Source) -> Iterator[tuple[int, str]]:
+    """Yield the number of every question of a source with each of its answerlines.
+
+    Questions are numbered from 0 in the order the source yields them.
+    """
+    questions = iter_source(source)
+    for number, question in enumerate(questions):
+        if isinstance(question, Tossup):
+            yield number, question.answer_sanitized
+        elif isinstance(question, Bonus):
+            for answerline in question.answers_sanitized:
+                yield number, answerline
+        else:
+            raise TypeError(
+                "source must contain Tossup or Bonus objects, not "
+                + f"{type(question).__name__}."
+            )
+
+
+def _group_answers(
+    answerlines: Iterable[tuple[int, str]],
+) -> tuple[list[str], list[list[int]]]:
+    """Group numbered answerlines by their normalized main answer.
+
+    Returns every distinct answer, the way it is most often written, and the
+    numbers of its answerlines.
+    """
+    groups: dict[str, tuple[dict[str, int], list[int]]] = {}
+    for number, answerline in answerlines:
+        answer = main_answer(answerline)
+        key = normalize_answer(answer)
+        if key:
+            spellings, numbers = groups.setdefault(key, ({}, []))
+            spellings[answer] = spellings.get(answer, 0) + 1
+            numbers.append(number)
+
+    answers, documents = [], []
+    for spellings, numbers in groups.values():
+        answers.append(
+            min(spellings, key=lambda spelling: (-spellings[spelling], spelling))
+        )
+        documents.append(numbers)
+    return answers, documents
+
+
+class AnswerCompleter:
+    """Complete prefixes of answers, most frequent answer first.
+
+    Build a completer with `build()` or `from_answerlines()`.
+
+    Parameters
+    ----------
+    answers : list[str]
+        The distinct answers, as they are displayed.
+    counts : list[int]
+        The number of answerlines of each answer.
+    """
+
+    def __init__(self: Self, answers: list[str], counts: list[int]):
+        if len(answers) != len(counts):
+            raise ValueError("answers and counts must have the same length.")
+        self.answers: list[str] = answers
+        self.counts: array = array("I", counts)
+
+        suffixes: list[tuple[str, int]] = []
+        for answer_id, answer in enumerate(answers):
+            key = normalize_answer(answer)
+            start = 0
+            while key:
+                suffixes.append((key[start:], answer_id))
+                start = key.find(" ", start) + 1
+                if not start:
+                    break
+        suffixes.sort()
+        self._keys: list[str] = [key for key, _ in suffixes]
+        self._answer_ids = array("I", [answer_id for _, answer_id in suffixes])
+        self._counts = array("I", [self.counts[i] for i in self._answer_ids])
+        self._table = _sparse_table(self._counts)
+
+    @classmethod
+    def from_answerlines(cls: type[Self], answerlines: Iterable[str]) -> Self:
+        """Count the main answers of answerlines, e.g. ``answer_sanitized`` values.
+
+        Answers are told apart by their normalized text, and each is displayed the
+        way it is most often written.
+        """
+        answers, documents = _group_answers(enumerate(answerlines))
+        return cls(answers, [len(numbers) for numbers in documents])
+
+    @classmethod
+    def build(cls: type[Self], source: Source) -> Self:
+        """Count the answers of the questions of a mirror store or iterable.
+
+        Every tossup answer and every bonus part answer is counted once.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions.
+        """
+        answers, documents = _group_answers(_answerlines(source))
+        return cls(answers, [len(numbers) for numbers in documents])
+
+    def __len__(self: Self) -> int:
+        """Return the number of distinct answers."""
+        return len(self.answers)
+
+    def _best(self: Self, lo: int, hi: int) -> int:
+        """Return the position of the largest count in ``lo:hi``, which is not empty."""
+        level = (hi - lo).bit_length() - 1
+        table = self._table[level]
+        a, b = table[lo], table[hi - (1 << level)]
+        return b if self._counts[b] > self._counts[a] else a
+
+    def complete(self: Self, prefix: str, k: int = 10) -> list[tuple[str, int]]:
+        """Return the most frequent answers with a word that starts with `prefix`.
+
+        Parameters
+        ----------
+        prefix : str
+            What has been typed. It is normalized like the answers, and if it ends
+            with a space or punctuation, its last word must be complete.
+        k : int, default = 10
+            The most completions to return.
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            Pairs of an answer and its count, most frequent first, and in
+            alphabetical order of their matching words between equal counts.
+        """
+        if not isinstance(k, int) or isinstance(k, bool):
+            raise TypeError(f"k must be an int, not {type(k).__name__}.")
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        key = normalize_answer(prefix)
+        if not key:
+            return []
+        if not prefix[-1].isalnum():
+            key += " "
+
+        keys = self._keys
+        lo = bisect_left(keys, key)
+        hi = bisect_left(keys, key + _END, lo)
+        if key[-1] == " ":
+            # a complete last word may also end the answer
+            lo = bisect_left(keys, key[:-1], 0, lo)
+
+        results: list[tuple[str, int]] = []
+        seen: set[int] = set()
+        counts, answer_ids = self._counts, self._answer_ids
+        heap: list[tuple[int, int, int, int]] = []
+        if lo < hi:
+            best = self._best(lo, hi)
+            heap.append((-counts[best], best, lo, hi))
+        while heap and len(results) < k:
+            count, best, lo, hi = heapq.heappop(heap)
+            answer_id = answer_ids[best]
+            if answer_id not in seen:
+                seen.add(answer_id)
+                results.append((self.answers[answer_id], -count))
+            for start, stop in ((lo, best), (best + 1, hi)):
+                if start < stop:
+                    position = self._best(start, stop)
+                    heapq.heappush(heap, (-counts[position], position, start, stop))
+        return results
+
+
+__all__ = (
+    "AnswerCompleter",
+    "main_answer",
+    "normalize_answer",
+)
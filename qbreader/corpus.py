@@ -0,0 +1,582 @@
+"""An append-only corpus file of questions, read through `mmap`.
+
+A corpus file holds questions as fixed-width records of enum codes, metadata
+indexes and offsets into a heap of their text. Readers map the file instead of
+loading it, so any question is decoded on demand by its ordinal or ``_id``
+without touching the others, and every process that maps the file shares the
+same physical pages of the operating system's page cache.
+
+The file is a header followed by blocks, each a tag, the size of its payload and
+the payload padded to 8 bytes. Writers only ever append batches of blocks, each
+ending with an ``END`` block, and readers ignore a trailing batch that is not
+complete, so a crash while writing never corrupts questions already written.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from types import TracebackType
+from typing import Any, Optional, Self, Type, Union
+
+from qbreader._codec import (
+    bonus_from_state,
+    bonus_state,
+    tossup_from_state,
+    tossup_state,
+)
+from qbreader.types import Bonus, PacketMetadata, SetMetadata, Tossup
+
+_MAGIC = b"QBRCPS"
+_VERSION = 1
+_HEADER = struct.Struct("<6sH8x")
+_BLOCK = struct.Struct("<4s4xQ")
+# kind, difficulty, category, subcategory, alternate subcategory, the number of
+# parts, sanitized parts, answers and sanitized answers, the number of values and
+# of difficulty modifiers (each plus one, or zero for none), question number, set
+# index, packet index, the number of strings in the heap entry, and its offset
+_RECORD = struct.Struct("<11BxiIIIQ")
+_COUNT = struct.Struct("<Q")
+_ID = struct.Struct("<QQ")
+
+_META = b"META"
+_HEAP = b"HEAP"
+_RECORDS = b"RECS"
+_IDS = b"IDS "
+_END = b"END "
+
+_TOSSUP = 0
+_BONUS = 1
+
+FLUSH_BYTES = 1 << 26
+"""How many bytes of text a `CorpusWriter` buffers before writing a batch."""
+
+
+def _id_key(_id: str) -> int:
+    """Return the 64-bit hash by which ``_id`` lookups are indexed."""
+    return int.from_bytes(
+        hashlib.blake2b(_id.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % 8)
+
+
+class Corpus:
+    """A read-only view of a corpus file.
+
+    Questions are numbered from 0 in the order they were appended, and can be
+    looked up by that ordinal with ``corpus[ordinal]`` or by ``_id`` with
+    `by_id()`. Each lookup decodes one question from the mapped file; nothing else
+    is read.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The corpus file, which must have been written by `CorpusWriter`.
+
+    Notes
+    -----
+    The file is mapped as it was when opened. Call `refresh()` to see batches that
+    have been appended since.
+    """
+
+    def __init__(self: Self, path: Union[str, os.PathLike]):
+        self.path: str = os.fspath(path)
+        self.sets: list[SetMetadata] = []
+        self.packets: list[PacketMetadata] = []
+        self._map: Optional[mmap.mmap] = None
+        self.refresh()
+
+    def refresh(self: Self) -> None:
+        """Map the file again, including any batches appended since it was opened."""
+        with open(self.path, "rb") as file:
+            prefix = file.read(_HEADER.size)
+            if len(prefix) < _HEADER.size:
+                raise ValueError(f"{self.path} is not a qbreader corpus.")
+            magic, version = _HEADER.unpack(prefix)
+            if magic != _MAGIC:
+                raise ValueError(f"{self.path} is not a qbreader corpus.")
+            if version != _VERSION:
+                raise ValueError(
+                    f"Unsupported corpus version {version} in {self.path}."
+                )
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        sets: list[SetMetadata] = []
+        packets: list[PacketMetadata] = []
+        # the payload offset and first ordinal of each block of records and ids
+        records: list[int] = []
+        starts: list[int] = []
+        ids: list[tuple[int, int]] = []
+        pending: list[tuple[bytes, int, int]] = []
+        count = 0
+        offset = end = _HEADER.size
+        while offset + _BLOCK.size <= len(data):
+            tag, size = _BLOCK.unpack_from(data, offset)
+            payload = offset + _BLOCK.size
+            offset = payload + size + (-size % 8)
+            if offset > len(data):
+                break
+            if tag != _END:
+                pending.append((tag, payload, size))
+                continue
+            for tag, payload, size in pending:
+                if tag == _META:
+                    stop = payload + size
+                    for entry in json.loads(data[payload:stop]):
+                        if entry[0] == "set":
+                            sets.append(SetMetadata(*entry[1:]))
+                        else:
+                            packets.append(PacketMetadata(*entry[1:]))
+                elif tag == _RECORDS:
+                    records.append(payload)
+                    starts.append(count)
+                    count += size // _RECORD.size
+                elif tag == _IDS:
+                    ids.append((payload, size // _ID.size))
+            pending.clear()
+            end = offset
+
+        if self._map is not None:
+            self._map.close()
+        self._map = data
+        self._records = records
+        self._starts = starts
+        self._ids = ids
+        self._length = count
+        self.sets = sets
+        self.packets = packets
+        # where the last complete batch ends, and so where the next one is written
+        self._end = end
+
+    def close(self: Self) -> None:
+        """Unmap the file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self: Self) -> Self:
+        """Return the corpus."""
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Unmap the file."""
+        self.close()
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions."""
+        return self._length
+
+    def _record(self: Self, ordinal: int) -> tuple[int, ...]:
+        if ordinal < 0:
+            ordinal += self._length
+        if not 0 <= ordinal < self._length:
+            raise IndexError("corpus index out of range")
+        block = bisect_right(self._starts, ordinal) - 1
+        offset = self._records[block] + (ordinal - self._starts[block]) * _RECORD.size
+        return _RECORD.unpack_from(self._data, offset)
+
+    @property
+    def _data(self: Self) -> mmap.mmap:
+        if self._map is None:
+            raise ValueError("I/O operation on a closed corpus.")
+        return self._map
+
+    def _strings(self: Self, offset: int, count: int) -> tuple[list[str], int]:
+        """Read a heap entry, returning its strings and where it ends."""
+        data = self._data
+        lengths = struct.unpack_from(f"<{count}I", data, offset)
+        offset += 4 * count
+        size = _COUNT.unpack_from(data, offset)[0]
+        start = offset + _COUNT.size
+        stop = start + size
+        text = str(data[start:stop], "utf-8")
+        strings = []
+        position = 0
+        for length in lengths:
+            end = position + length
+            strings.append(text[position:end])
+            position = end
+        return strings, stop
+
+    def __getitem__(self: Self, ordinal: int) -> Union[Tossup, Bonus]:
+        """Decode the question with the given ordinal."""
+        (
+            kind,
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            parts,
+            parts_sanitized,
+            answers,
+            answers_sanitized,
+            values,
+            modifiers,
+            number,
+            set,
+            packet,
+            count,
+            offset,
+        ) = self._record(ordinal)
+        strings, offset = self._strings(offset, count)
+        if kind == _TOSSUP:
+            return tossup_from_state(
+                Tossup,
+                strings[1],
+                strings[2],
+                strings[3],
+                strings[4],
+                difficulty,
+                category,
+                subcategory,
+                alternate,
+                self.sets[set],
+                self.packets[packet],
+                number,
+            )
+
+        texts = iter(strings[3:])
+        parts_text, parts_sanitized_text, answers_text, answers_sanitized_text = (
+            tuple(next(texts) for _ in range(length))
+            for length in (parts, parts_sanitized, answers, answers_sanitized)
+        )
+        data = self._data
+        integers = struct.unpack_from(f"<{max(values - 1, 0)}i", data, offset)
+        codes = struct.unpack_from(
+            f"<{max(modifiers - 1, 0)}B", data, offset + 4 * len(integers)
+        )
+        return bonus_from_state(
+            Bonus,
+            strings[1],
+            strings[2],
+            parts_text,
+            parts_sanitized_text,
+            answers_text,
+            answers_sanitized_text,
+            difficulty,
+            category,
+            subcategory,
+            alternate,
+            self.sets[set],
+            self.packets[packet],
+            number,
+            integers if values else None,
+            codes if modifiers else None,
+        )
+
+    def __iter__(self: Self) -> Iterator[Union[Tossup, Bonus]]:
+        """Decode every question in order."""
+        for ordinal in range(self._length):
+            yield self[ordinal]
+
+    def questions(self: Self) -> Iterator[Union[Tossup, Bonus]]:
+        """Decode every question in order, like `qbreader.mirror.Store.questions()`."""
+        return iter(self)
+
+    def id_of(self: Self, ordinal: int) -> Optional[str]:
+        """Return the ``_id`` the question with the given ordinal was written with."""
+        record = self._record(ordinal)
+        strings, _ = self._strings(record[-1], record[-2])
+        return strings[0] or None
+
+    def ordinal(self: Self, _id: str) -> int:
+        """Return the ordinal of the question last written with an ``_id``.
+
+        Raises
+        ------
+        KeyError
+            If no question has that ``_id``.
+        """
+        key = _id_key(_id)
+        data = self._data
+        # later batches override earlier ones
+        for offset, size in reversed(self._ids):
+            low, high = 0, size
+            while low < high:
+                middle = (low + high) // 2
+                if _ID.unpack_from(data, offset + middle * _ID.size)[0] < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            candidates = []
+            while low < size:
+                found, ordinal = _ID.unpack_from(data, offset + low * _ID.size)
+                if found != key:
+                    break
+                candidates.append(ordinal)
+                low += 1
+            for ordinal in sorted(candidates, reverse=True):
+                if self.id_of(ordinal) == _id:
+                    return ordinal
+        raise KeyError(_id)
+
+    def by_id(self: Self, _id: str) -> Union[Tossup, Bonus]:
+        """Decode the question last written with an ``_id``.
+
+        Raises
+        ------
+        KeyError
+            If no question has that ``_id``.
+        """
+        return self[self.ordinal(_id)]
+
+
+class CorpusWriter:
+    """Append questions to a corpus file, creating it if needed.
+
+    Questions are buffered and written in batches by `flush()`, which is called
+    when the buffer holds `FLUSH_BYTES` of text and when the writer is closed.
+    Readers see a batch once it has been completely written. Only one writer may
+    append to a file at a time.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The corpus file.
+
+    Examples
+    --------
+    >>> with CorpusWriter("questions.corpus") as writer:  # doctest: +SKIP
+    ...     writer.extend(store.questions_with_ids())
+    """
+
+    def __init__(self: Self, path: Union[str, os.PathLike]):
+        self.path: str = os.fspath(path)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as file:
+                file.write(_HEADER.pack(_MAGIC, _VERSION))
+
+        corpus = Corpus(self.path)
+        self._length = len(corpus)
+        self._sets = {
+            (s._id, s.name, s.year, s.standard): index
+            for index, s in enumerate(corpus.sets)
+        }
+        self._packets = {
+            (p._id, p.name, p.number): index for index, p in enumerate(corpus.packets)
+        }
+        end = corpus._end
+        corpus.close()
+
+        self._file = open(self.path, "r+b")
+        # drop any incomplete batch left by a writer that crashed
+        self._file.truncate(end)
+        self._file.seek(end)
+        self._meta: list[list[Any]] = []
+        self._heap: list[bytes] = []
+        self._heap_size = 0
+        self._records: list[tuple[int, ...]] = []
+        self._ids: list[tuple[int, int]] = []
+
+    def __enter__(self: Self) -> Self:
+        """Return the writer."""
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the writer."""
+        self.close()
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions written or buffered."""
+        return self._length
+
+    def _set(self: Self, set: SetMetadata) -> int:
+        key = (set._id, set.name, set.year, set.standard)
+        index = self._sets.get(key)
+        if index is None:
+            index = self._sets[key] = len(self._sets)
+            self._meta.append(["set", *key])
+        return index
+
+    def _packet(self: Self, packet: PacketMetadata) -> int:
+        key = (packet._id, packet.name, packet.number)
+        index = self._packets.get(key)
+        if index is None:
+            index = self._packets[key] = len(self._packets)
+            self._meta.append(["packet", *key])
+        return index
+
+    def _entry(self: Self, strings: Iterable[str], tail: bytes = b"") -> tuple:
+        """Buffer a heap entry, returning its string count and offset in the batch."""
+        strings = list(strings)
+        blob = "".join(strings).encode()
+        entry = b"".join(
+            (
+                struct.pack(f"<{len(strings)}I", *map(len, strings)),
+                _COUNT.pack(len(blob)),
+                blob,
+                tail,
+            )
+        )
+        offset = self._heap_size
+        self._heap.append(entry)
+        self._heap_size += len(entry)
+        return len(strings), offset
+
+    def append(self: Self, question: Union[Tossup, Bonus], _id: str = "") -> int:
+        """Append a question, returning its ordinal.
+
+        Parameters
+        ----------
+        question : Tossup | Bonus
+            The question to append.
+        _id : str, default = ""
+            The ``_id`` of the question in the qbreader database, if known, by
+            which it can be looked up with `Corpus.by_id()`.
+        """
+        if isinstance(question, Tossup):
+            state = tossup_state(question)
+            count, offset = self._entry((_id, *state[:4]))
+            record: tuple[int, ...] = (
+                _TOSSUP,
+                *state[4:8],
+                0,
+                0,
+                0,
+                0,
+                0,
+                0,
+                state[10],
+                self._set(state[8]),
+                self._packet(state[9]),
+                count,
+                offset,
+            )
+        elif isinstance(question, Bonus):
+            state = bonus_state(question)
+            lengths = tuple(len(texts) for texts in state[2:6])
+            if max(lengths) > 0xFF:
+                raise ValueError("Bonuses may have at most 255 parts.")
+            values, modifiers = state[13], state[14]
+            tail = b""
+            if values is not None:
+                tail += struct.pack(f"<{len(values)}i", *values)
+            if modifiers is not None:
+                tail += bytes(modifiers)
+            count, offset = self._entry(
+                (_id, *state[:2], *(text for texts in state[2:6] for text in texts)),
+                tail,
+            )
+            record = (
+                _BONUS,
+                *state[6:10],
+                *lengths,
+                0 if values is None else len(values) + 1,
+                0 if modifiers is None else len(modifiers) + 1,
+                state[12],
+                self._set(state[10]),
+                self._packet(state[11]),
+                count,
+                offset,
+            )
+        else:
+            raise TypeError(
+                f"question must be a Tossup or Bonus, not {type(question).__name__}"
+            )
+
+        ordinal = self._length
+        self._records.append(record)
+        if _id:
+            self._ids.append((_id_key(_id), ordinal))
+        self._length += 1
+        if self._heap_size >= FLUSH_BYTES:
+            self.flush()
+        return ordinal
+
+    def append_json(self: Self, json: dict[str, Any]) -> int:
+        """Append a question in the JSON format of the API, keeping its ``_id``."""
+        if "parts" in json:
+            return self.append(Bonus.from_json(json), json.get("_id", ""))
+        return self.append(Tossup.from_json(json), json.get("_id", ""))
+
+    def extend(
+        self: Self,
+        questions: Iterable[Union[Tossup, Bonus, tuple[str, Union[Tossup, Bonus]]]],
+    ) -> None:
+        """Append questions in order.
+
+        Parameters
+        ----------
+        questions : Iterable[Tossup | Bonus | tuple[str, Tossup | Bonus]]
+            The questions, or ``(_id, question)`` pairs such as those of
+            `qbreader.mirror.Store.questions_with_ids()`, so that they can be looked
+            up with `Corpus.by_id()`.
+        """
+        for question in questions:
+            if isinstance(question, tuple):
+                self.append(question[1], question[0])
+            else:
+                self.append(question)
+
+    def flush(self: Self) -> None:
+        """Durably write the buffered questions as one batch."""
+        if not self._records and not self._meta:
+            return
+
+        blocks: list[tuple[bytes, bytes]] = []
+        if self._meta:
+            blocks.append((_META, json.dumps(self._meta).encode()))
+
+        position = self._file.tell()
+        for tag, payload in blocks:
+            position += _BLOCK.size + len(payload) + (-len(payload) % 8)
+        heap = position + _BLOCK.size
+        blocks.append((_HEAP, b"".join(self._heap)))
+        blocks.append(
+            (
+                _RECORDS,
+                b"".join(
+                    _RECORD.pack(*record[:-1], heap + record[-1])
+                    for record in self._records
+                ),
+            )
+        )
+        if self._ids:
+            blocks.append(
+                (_IDS, b"".join(_ID.pack(*entry) for entry in sorted(self._ids)))
+            )
+        blocks.append((_END, b""))
+
+        for tag, payload in blocks:
+            self._file.write(_BLOCK.pack(tag, len(payload)))
+            self._file.write(payload)
+            self._file.write(_padding(len(payload)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._meta.clear()
+        self._heap.clear()
+        self._heap_size = 0
+        self._records.clear()
+        self._ids.clear()
+
+    def close(self: Self) -> None:
+        """Write the buffered questions and close the file."""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+__all__ = (
+    "Corpus",
+    "CorpusWriter",
+    "FLUSH_BYTES",
+)
@@ -0,0 +1,413 @@
+"""Find recycled and lightly edited questions with MinHash and LSH.
+
+Every question is reduced to a MinHash signature of the word shingles of its
+sanitized question text, and only the signature is kept, so questions can be
+streamed from `Sync.iter_query()`, a mirror store, or a `qbreader.corpus.Corpus`
+with memory that does not depend on the length of their text. Signatures are then
+cut into bands, questions that share a band become candidates, and candidates whose
+estimated Jaccard similarity reaches a threshold are merged into clusters.
+
+Signatures are computed in batches with NumPy when it is installed, and with plain
+Python otherwise. Both give the same signatures.
+"""
+
+from __future__ import annotations
+
+import operator
+import random
+import zlib
+from array import array
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Self, Union
+
+from qbreader.index import tokenize
+from qbreader.local import Source, iter_source
+from qbreader.similarity import question_text
+from qbreader.types import Bonus, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+_MASK = (1 << 64) - 1
+_EMPTY = (1 << 32) - 1
+
+BATCH_SHINGLES = 1 << 15
+"""The number of pending shingles that are hashed together with NumPy."""
+
+MAX_BUCKET = 32
+"""Buckets larger than this are only compared against their first question."""
+
+
+class DuplicateCluster:
+    """Questions that are near-duplicates of each other.
+
+    Parameters
+    ----------
+    documents : list[int]
+        The document numbers of the questions, in increasing order.
+    similarities : list[float]
+        The estimated Jaccard similarity of every question to the first one, which
+        is 1 for the first question itself.
+    """
+
+    def __init__(self: Self, documents: list[int], similarities: list[float]):
+        self.documents: list[int] = documents
+        self.similarities: list[float] = similarities
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions in the cluster."""
+        return len(self.documents)
+
+    def __iter__(self: Self) -> Iterator[tuple[int, float]]:
+        """Iterate over pairs of a document number and its similarity."""
+        return zip(self.documents, self.similarities)
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether two clusters are equal."""
+        if not isinstance(other, DuplicateCluster):
+            return NotImplemented
+
+        return (
+            self.documents == other.documents
+            and self.similarities == other.similarities
+        )
+
+    def __repr__(self) -> str:
+        """Return a representation of the cluster."""
+        return f"DuplicateCluster({self.documents!r}, {self.similarities!r})"
+
+
+class MinHashLSH:
+    """MinHash signatures of questions, banded for locality-sensitive hashing.
+
+    Add questions with `add()` or `update()`; they are numbered from 0 in the order
+    they were added, so the numbers are ordinals of the source. Each question keeps
+    ``4 * num_perm`` bytes of signature and nothing else.
+
+    Two questions whose shingles have Jaccard similarity ``s`` share at least one
+    band with probability ``1 - (1 - s ** rows) ** bands``, where
+    ``rows = num_perm // bands``. The similarity at which this is about one half is
+    roughly ``(1 / bands) ** (1 / rows)``, which should be well below the threshold
+    passed to `clusters()`.
+
+    Parameters
+    ----------
+    num_perm : int, default = 128
+        The length of each signature.
+    bands : int, default = 32
+        The number of bands, which must divide `num_perm`.
+    shingle_size : int, default = 3
+        The number of consecutive words in a shingle. Questions with fewer words are
+        a single shingle.
+    seed : int, default = 1
+        The seed of the hash functions. Signatures are only comparable between
+        instances with the same `num_perm`, `shingle_size` and `seed`.
+    """
+
+    def __init__(
+        self: Self,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 3,
+        seed: int = 1,
+    ):
+        if num_perm < 1 or bands < 1 or num_perm % bands:
+            raise ValueError("bands must be a positive divisor of num_perm.")
+        if shingle_size < 1:
+            raise ValueError("shingle_size must be at least 1.")
+
+        self.num_perm: int = num_perm
+        self.bands: int = bands
+        self.shingle_size: int = shingle_size
+        generator = random.Random(seed)
+        # words are combined into shingles, and shingles are permuted, by
+        # multiply-shift hashing with odd 64-bit multipliers
+        self._combine = [generator.getrandbits(64) | 1 for _ in range(shingle_size)]
+        self._multipliers = [generator.getrandbits(64) | 1 for _ in range(num_perm)]
+        self._increments = [generator.getrandbits(64) for _ in range(num_perm)]
+        self._band_multipliers = [generator.getrandbits(64) | 1 for _ in range(bands)]
+
+        self._signatures = array("I")
+        self._empty: set[int] = set()
+        self._count = 0
+        self._pending: list[list[int]] = []
+        self._pending_shingles = 0
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions that have been added."""
+        return self._count
+
+    def _word_hashes(self: Self, text: str) -> list[int]:
+        return [zlib.crc32(word.encode()) for word in tokenize(text)]
+
+    def _shingles(self: Self, words: list[int]) -> list[int]:
+        """Return the hashes of the shingles of a question in plain Python."""
+        size = self.shingle_size
+        padded = words + [0] * (size - 1)
+        windows = zip(*(padded[j:] for j in range(size)))
+        return [
+            (sum(map(operator.mul, self._combine, window)) & _MASK) >> 32
+            for window in islice(windows, max(len(words) - size + 1, 1))
+        ]
+
+    def _minhash(self: Self, shingles: list[int]) -> list[int]:
+        """Return the signature of a question's shingles in plain Python."""
+        return [
+            min(((a * x + b) & _MASK) >> 32 for x in shingles)
+            for a, b in zip(self._multipliers, self._increments)
+        ]
+
+    def signature(self: Self, text: str) -> list[int]:
+        """Return the MinHash signature of a text.
+
+        A text with no words has a signature of ``2 ** 32 - 1`` everywhere, and is
+        never a duplicate of anything.
+        """
+        words = self._word_hashes(text)
+        if not words:
+            return [_EMPTY] * self.num_perm
+        return self._minhash(self._shingles(words))
+
+    def add(self: Self, question: Union[Tossup, Bonus, str]) -> int:
+        """Add a question, or its sanitized question text, and return its number.
+
+        A bonus' question text is its leadin and parts.
+        """
+        if not isinstance(question, str):
+            question = question_text(question)
+        document = self._count
+        self._count += 1
+        words = self._word_hashes(question)
+        if not words:
+            self._flush()
+            self._signatures.extend([_EMPTY] * self.num_perm)
+            self._empty.add(document)
+        elif np is None:
+            self._signatures.extend(self._minhash(self._shingles(words)))
+        else:
+            self._pending.append(words)
+            self._pending_shingles += max(len(words) - self.shingle_size + 1, 1)
+            if self._pending_shingles >= BATCH_SHINGLES:
+                self._flush()
+        return document
+
+    def update(self: Self, questions: Iterable[Union[Tossup, Bonus, str]]) -> None:
+        """Add every question of an iterable, in order."""
+        for question in questions:
+            self.add(question)
+
+    def _flush(self: Self) -> None:
+        """Compute the signatures of the pending questions with NumPy."""
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_shingles = self._pending, [], 0
+        size = self.shingle_size
+
+        # every question is followed by size - 1 zero words, so that each of its
+        # shingles, including the only shingle of a short question, is a window
+        padding = [0] * (size - 1)
+        words_and_padding: list[int] = []
+        for words in pending:
+            words_and_padding += words
+            words_and_padding += padding
+        padded = np.array(words_and_padding, dtype=np.uint64)
+        lengths = np.array([len(words) for words in pending], dtype=np.int64)
+        windows = len(padded) - size + 1
+        combined = np.zeros(windows, dtype=np.uint64)
+        for j, c in enumerate(self._combine):
+            combined += padded[j:][:windows] * np.uint64(c)
+
+        counts = np.maximum(lengths - size + 1, 1)
+        offsets = np.cumsum(lengths + size - 1) - (lengths + size - 1)
+        first = np.cumsum(counts) - counts
+        positions = np.repeat(offsets - first, counts) + np.arange(counts.sum())
+        shingles = combined[positions] >> np.uint64(32)
+
+        multipliers = np.array(self._multipliers, dtype=np.uint64)[:, None]
+        increments = np.array(self._increments, dtype=np.uint64)[:, None]
+        hashed = multipliers * shingles
+        hashed += increments
+        hashed >>= np.uint64(32)
+        minimums = np.minimum.reduceat(hashed, first, axis=1)
+        self._signatures.frombytes(minimums.T.astype(np.uint32).tobytes())
+
+    def _matrix(self: Self):
+        """Return every signature as a NumPy array of shape (questions, num_perm)."""
+        self._flush()
+        return np.frombuffer(self._signatures, dtype=np.uint32).reshape(
+            self._count, self.num_perm
+        )
+
+    def _row(self: Self, document: int) -> array:
+        self._flush()
+        start = document * self.num_perm
+        stop = start + self.num_perm
+        return self._signatures[start:stop]
+
+    def similarity(self: Self, a: int, b: int) -> float:
+        """Return the estimated Jaccard similarity of two added questions."""
+        for document in (a, b):
+            if not 0 <= document < self._count:
+                raise IndexError(f"document {document} has not been added.")
+        if a in self._empty or b in self._empty:
+            return 0.0
+        equal = sum(x == y for x, y in zip(self._row(a), self._row(b)))
+        return equal / self.num_perm
+
+    def _buckets(self: Self) -> Iterator[list[int]]:
+        """Yield every group of two or more questions that share a band."""
+        rows = self.num_perm // self.bands
+        if np is not None:
+            signatures = self._matrix()
+            documents = np.arange(self._count)
+            if self._empty:
+                documents = np.delete(documents, sorted(self._empty))
+            for band, multiplier in enumerate(self._band_multipliers):
+                first = band * rows
+                last = first + rows
+                # a view of the band, copied only to drop empty questions
+                columns = signatures[:, first:last]
+                if self._empty:
+                    columns = columns[documents]
+                keys = np.zeros(len(documents), dtype=np.uint64)
+                for column in columns.T:
+                    keys = keys * np.uint64(multiplier) + column
+                order = np.argsort(keys, kind="stable")
+                keys = keys[order]
+                edges = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+                edges = np.concatenate(([0], edges, [len(keys)]))
+                for start in np.flatnonzero(np.diff(edges) > 1):
+                    lo, hi = edges[start], edges[start + 1]
+                    yield documents[order[lo:hi]].tolist()
+            return
+
+        self._flush()
+        for band in range(self.bands):
+            buckets: dict[tuple[int, ...], list[int]] = {}
+            for document in range(self._count):
+                if document in self._empty:
+                    continue
+                start = document * self.num_perm + band * rows
+                stop = start + rows
+                key = tuple(self._signatures[start:stop])
+                buckets.setdefault(key, []).append(document)
+            for bucket in buckets.values():
+                if len(bucket) > 1:
+                    yield bucket
+
+    def candidates(self: Self) -> set[tuple[int, int]]:
+        """Return the pairs of questions that share at least one band.
+
+        Every pair ``(a, b)`` has ``a < b``. The questions of a bucket with more than
+        `MAX_BUCKET` questions are only paired with its first question, so that a
+        text repeated thousands of times does not make millions of pairs.
+        """
+        pairs: set[tuple[int, int]] = set()
+        for bucket in self._buckets():
+            if len(bucket) > MAX_BUCKET:
+                pairs.update((bucket[0], other) for other in bucket[1:])
+            else:
+                pairs.update(
+                    (a, b) for i, a in enumerate(bucket, 1) for b in bucket[i:]
+                )
+        return pairs
+
+    def _similarities(self: Self, pairs: list[tuple[int, int]]) -> list[float]:
+        """Return the estimated similarity of many pairs of non-empty questions."""
+        if np is None:
+            return [self.similarity(a, b) for a, b in pairs]
+        signatures = self._matrix()
+        similarities: list[float] = []
+        for start in range(0, len(pairs), 1 << 14):
+            stop = start + (1 << 14)
+            chunk = np.array(pairs[start:stop], dtype=np.int64)
+            equal = signatures[chunk[:, 0]] == signatures[chunk[:, 1]]
+            similarities.extend((equal.sum(axis=1) / self.num_perm).tolist())
+        return similarities
+
+    def clusters(self: Self, threshold: float = 0.8) -> list[DuplicateCluster]:
+        """Return the clusters of near-duplicate questions.
+
+        Candidate pairs whose estimated Jaccard similarity is at least `threshold`
+        are linked, and each connected group of two or more questions is a cluster.
+        Linking is transitive, so a question in a long chain of edits can be less
+        similar than `threshold` to the first question of its cluster.
+
+        Returns
+        -------
+        list[DuplicateCluster]
+            The clusters, ordered by their first question.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be greater than 0 and at most 1.")
+        pairs = sorted(self.candidates())
+        parents: dict[int, int] = {}
+
+        def find(document: int) -> int:
+            parent = parents.setdefault(document, document)
+            while parent != document:
+                grandparent = parents[parent]
+                parents[document] = grandparent
+                document, parent = parent, grandparent
+            return document
+
+        for (a, b), similarity in zip(pairs, self._similarities(pairs)):
+            if similarity >= threshold:
+                a, b = find(a), find(b)
+                if a != b:
+                    parents[max(a, b)] = min(a, b)
+
+        groups: dict[int, list[int]] = {}
+        for document in sorted(parents):
+            groups.setdefault(find(document), []).append(document)
+        groups = {root: group for root, group in groups.items() if len(group) > 1}
+
+        pairs = [(group[0], other) for group in groups.values() for other in group]
+        similarities = iter(self._similarities(pairs))
+        return [
+            DuplicateCluster(group, [next(similarities) for _ in group])
+            for group in groups.values()
+        ]
+
+
+def find_duplicates(
+    source: Source,
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    bands: int = 32,
+    shingle_size: int = 3,
+) -> list[DuplicateCluster]:
+    """Find the clusters of near-duplicate questions of a source.
+
+    Questions are numbered in the order the source yields them, so for a mirror
+    store or a `qbreader.corpus.Corpus` the numbers are ordinals of the store or
+    corpus. See `MinHashLSH` for the other parameters.
+
+    Parameters
+    ----------
+    source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+        A mirror store, the directory of a `DirectoryStore`, or any iterable of
+        questions, such as the output of `Sync.iter_query()`.
+    threshold : float, default = 0.8
+        The estimated Jaccard similarity at which two questions are duplicates.
+
+    Returns
+    -------
+    list[DuplicateCluster]
+        The clusters, ordered by their first question.
+    """
+    questions = iter_source(source)
+
+    lsh = MinHashLSH(num_perm, bands, shingle_size)
+    lsh.update(questions)
+    return lsh.clusters(threshold)
+
+
+__all__ = (
+    "DuplicateCluster",
+    "MinHashLSH",
+    "find_duplicates",
+)
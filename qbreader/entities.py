@@ -0,0 +1,349 @@
+"""Group the surface forms of answers into entities.
+
+The same answer is written in many ways: "Mozart", "Wolfgang Amadeus Mozart" and
+"W. A. Mozart" are one composer. `AnswerEntities.build()` reads every answerline
+of a corpus with `qbreader.answerline.parse_answerline()` and merges the main
+answer of each answerline with its variants, using union-find:
+
+- the other main answers, when an answerline has several,
+- the alternates it accepts,
+- the required (underlined) words of these answers, which are accepted alone,
+- answers that are equal once stopwords and plurals are ignored.
+
+A variant can be accepted for different answers, e.g. "Requiem" for Mozart's and
+for Verdi's, and merging through it would chain unrelated answers together. So a
+variant is only merged with the main answer it is a variant of in more than
+`dominance` of the answerlines that list it as a variant of something else.
+
+The result maps every normalized answer, like
+`qbreader.autocomplete.normalize_answer()`, to an entity id, numbered from the
+entity with the most answerlines. It can be saved to a file that `load()` maps
+instead of reading, and searched without decoding anything but the few keys a
+binary search compares.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Self, Union
+
+from qbreader._mmapfile import read_sections, write_sections
+from qbreader.answerline import _markup, parse_answerline, tokenize
+from qbreader.autocomplete import main_answer, normalize_answer
+from qbreader.frame import MappedTextColumn, TextColumn
+from qbreader.local import Source, iter_source
+from qbreader.types import Bonus, Tossup
+
+_MAGIC = b"QBRENT"
+_VERSION = 1
+
+
+def _answerlines(source: Source) -> Iterator[str]:
+    """Yield every answerline of a source, with its HTML tags."""
+    questions = iter_source(source)
+    for question in questions:
+        if isinstance(question, Tossup):
+            yield question.answer
+        elif isinstance(question, Bonus):
+            yield from question.answers
+        else:
+            raise TypeError(
+                "source must contain Tossup or Bonus objects, not "
+                + f"{type(question).__name__}."
+            )
+
+
+class _Grouping:
+    """Collect the answers and variants of answerlines and merge them."""
+
+    def __init__(self: Self, dominance: float):
+        self.dominance = dominance
+        self.ids: dict[str, int] = {}
+        self.first: list[str] = []
+        # how often each node is the main answer, and how it is written then
+        self.counts: list[int] = []
+        self.spellings: dict[int, dict[str, int]] = {}
+        # (variant << 32 | answer) -> the number of answerlines with both
+        self.pairs: dict[int, int] = {}
+        # answerlines repeat, and are only parsed once
+        self.parsed: dict[str, Any] = {}
+
+    def _id(self: Self, key: str, spelling: str) -> int:
+        """Return the node of a key, adding it if it is new."""
+        node = self.ids.get(key)
+        if node is None:
+            node = self.ids[key] = len(self.ids)
+            self.first.append(spelling)
+            self.counts.append(0)
+        return node
+
+    def add(self: Self, answerline: str) -> None:
+        """Count the main answer of an answerline and pair it with its variants."""
+        parsed = self.parsed.get(answerline)
+        if parsed is None:
+            parsed = self.parsed[answerline] = self._parse(answerline)
+        if parsed is None:
+            return
+        (key, spelling), variants = parsed
+        node = self._id(key, spelling)
+        self.counts[node] += 1
+        spellings = self.spellings.setdefault(node, {})
+        spellings[spelling] = spellings.get(spelling, 0) + 1
+        for variant, text in variants:
+            pair = self._id(variant, text) << 32 | node
+            self.pairs[pair] = self.pairs.get(pair, 0) + 1
+
+    @staticmethod
+    def _parse(answerline: str) -> Optional[tuple[tuple[str, str], tuple]]:
+        """Return the key and text of the main answer and of every variant."""
+        parsed = parse_answerline(answerline)
+        key = normalize_answer(parsed.primary.text)
+        if not key:
+            return None
+        variants = {
+            normalize_answer(text): text
+            for answer in (*parsed.answers, *parsed.accept)
+            for text in (answer.text, answer.required)
+        }
+        if len(parsed.answers) > 1:
+            whole = main_answer(_markup(answerline)[0])
+            variants.setdefault(normalize_answer(whole), whole)
+        variants.pop(key, None)
+        variants.pop("", None)
+        return (key, parsed.primary.text), tuple(variants.items())
+
+    def merge(self: Self) -> list[int]:
+        """Return the root of every node after merging."""
+        parents = list(range(len(self.ids)))
+
+        def find(node: int) -> int:
+            while parents[node] != node:
+                parents[node] = parents[parents[node]]
+                node = parents[node]
+            return node
+
+        def union(a: int, b: int) -> None:
+            a, b = find(a), find(b)
+            if a != b:
+                parents[max(a, b)] = min(a, b)
+
+        totals: dict[int, int] = {}
+        best: dict[int, tuple[int, int]] = {}
+        for pair, count in self.pairs.items():
+            variant, node = pair >> 32, pair & 0xFFFFFFFF
+            totals[variant] = totals.get(variant, 0) + count
+            if count > best.get(variant, (0, 0))[0]:
+                best[variant] = count, node
+        for variant, (count, node) in best.items():
+            if count > self.dominance * totals[variant]:
+                union(variant, node)
+
+        loose: dict[str, int] = {}
+        for key, node in self.ids.items():
+            union(node, loose.setdefault(" ".join(tokenize(key)) or key, node))
+        return [find(node) for node in range(len(parents))]
+
+
+def _encode(strings: Iterable[str]) -> tuple[memoryview, memoryview]:
+    """Return the UTF-8 buffer and byte offsets of a column of strings."""
+    encoded = [string.encode() for string in strings]
+    offsets = array("q", [0])
+    offsets.extend(itertools.accumulate(map(len, encoded)))
+    return memoryview(b"".join(encoded)), memoryview(offsets).cast("B")
+
+
+class AnswerEntities:
+    """A mapping from answers to the entities they name.
+
+    Build the mapping with `build()` or `from_answerlines()`, or open a saved one
+    with `load()`.
+
+    Parameters
+    ----------
+    keys : TextColumn
+        The normalized answers, sorted.
+    entity_ids : array | memoryview
+        The entity of every key.
+    names : TextColumn
+        The name of every entity: the most common spelling of its most common main
+        answer.
+    counts : array | memoryview
+        The number of answerlines whose main answer is in every entity.
+    members : array | memoryview
+        The positions of the keys of every entity, entity by entity.
+    member_starts : array | memoryview
+        Where the keys of every entity start in `members`, and their end.
+    """
+
+    def __init__(
+        self: Self,
+        keys: TextColumn,
+        entity_ids: Union[array, memoryview],
+        names: TextColumn,
+        counts: Union[array, memoryview],
+        members: Union[array, memoryview],
+        member_starts: Union[array, memoryview],
+    ):
+        if not len(keys) == len(entity_ids) == len(members):
+            raise ValueError("keys, entity_ids and members must have the same length.")
+        if not len(names) == len(counts) == len(member_starts) - 1:
+            raise ValueError("names and counts must have one value per entity.")
+        self.keys: TextColumn = keys
+        self.entity_ids: Union[array, memoryview] = entity_ids
+        self.names: TextColumn = names
+        self.counts: Union[array, memoryview] = counts
+        self._members = members
+        self._member_starts = member_starts
+
+    @classmethod
+    def from_answerlines(
+        cls: type[Self], answerlines: Iterable[str], dominance: float = 0.5
+    ) -> Self:
+        """Group the answers of answerlines, preferably with their HTML tags.
+
+        Parameters
+        ----------
+        answerlines : Iterable[str]
+            The answerlines. Their ``<u>`` and ``<b>`` tags mark the words that
+            are accepted alone.
+        dominance : float, default = 0.5
+            The share of the answerlines listing a variant that must list it for
+            the same main answer for the two to be merged. It must be at least 0.5,
+            so that a variant is merged with a single main answer.
+        """
+        if not 0.5 <= dominance < 1:
+            raise ValueError("dominance must be at least 0.5 and less than 1.")
+        grouping = _Grouping(dominance)
+        for answerline in answerlines:
+            grouping.add(answerline)
+        roots = grouping.merge()
+
+        # an entity's name is the most common spelling of its most common answer
+        heads: dict[int, int] = {}
+        counts: dict[int, int] = {}
+        for node, root in enumerate(roots):
+            counts[root] = counts.get(root, 0) + grouping.counts[node]
+            head = heads.setdefault(root, node)
+            if grouping.counts[node] > grouping.counts[head]:
+                heads[root] = node
+        names = {}
+        for root, head in heads.items():
+            spellings = grouping.spellings.get(head)
+            names[root] = (
+                min(spellings, key=lambda spelling: (-spellings[spelling], spelling))
+                if spellings
+                else grouping.first[head]
+            )
+        order = sorted(heads, key=lambda root: (-counts[root], names[root]))
+        entity_of = {root: entity_id for entity_id, root in enumerate(order)}
+
+        keys = sorted(grouping.ids)
+        entity_ids = array("I", [entity_of[roots[grouping.ids[key]]] for key in keys])
+        members = array("I", sorted(range(len(keys)), key=entity_ids.__getitem__))
+        starts = array("q", [0] * (len(order) + 1))
+        for entity_id in entity_ids:
+            starts[entity_id + 1] += 1
+        starts = array("q", itertools.accumulate(starts))
+        return cls(
+            TextColumn.from_strings(keys),
+            entity_ids,
+            TextColumn.from_strings(names[root] for root in order),
+            array("I", [counts[root] for root in order]),
+            members,
+            starts,
+        )
+
+    @classmethod
+    def build(cls: type[Self], source: Source, dominance: float = 0.5) -> Self:
+        """Group the answers of the questions of a mirror store or iterable.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions. Every tossup answer and bonus part answer is read.
+        dominance : float, default = 0.5
+            See `from_answerlines()`.
+        """
+        return cls.from_answerlines(_answerlines(source), dominance)
+
+    def __len__(self: Self) -> int:
+        """Return the number of entities."""
+        return len(self.names)
+
+    def entity(self: Self, answer: str) -> Optional[int]:
+        """Return the entity of an answer, or None if it is not known.
+
+        Bracketed and parenthetical clauses of `answer` are ignored, so it can be an
+        answerline.
+        """
+        return self.entity_of_key(normalize_answer(main_answer(answer)))
+
+    def entity_of_key(self: Self, key: str) -> Optional[int]:
+        """Return the entity of a normalized answer, or None if it is not known.
+
+        `key` must already be normalized with `normalize_answer()`, like the
+        variants that `variants()` returns.
+        """
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.entity_ids[position]
+        return None
+
+    def name(self: Self, entity_id: int) -> str:
+        """Return the name of an entity."""
+        return self.names[entity_id]
+
+    def variants(self: Self, entity_id: int) -> list[str]:
+        """Return the normalized answers of an entity, sorted."""
+        lo, hi = self._member_starts[entity_id], self._member_starts[entity_id + 1]
+        return [self.keys[position] for position in self._members[lo:hi]]
+
+    def save(self: Self, path: Union[str, os.PathLike]) -> None:
+        """Atomically write the mapping to a file that `load()` can map."""
+        keys_buffer, keys_offsets = _encode(self.keys)
+        names_buffer, names_offsets = _encode(self.names)
+        write_sections(
+            path,
+            _MAGIC,
+            _VERSION,
+            {},
+            [
+                ("keys.offsets", keys_offsets),
+                ("keys.buffer", keys_buffer),
+                ("entity_ids", self.entity_ids),
+                ("names.offsets", names_offsets),
+                ("names.buffer", names_buffer),
+                ("counts", self.counts),
+                ("members", self._members),
+                ("member_starts", self._member_starts),
+            ],
+        )
+
+    @classmethod
+    def load(cls: type[Self], path: Union[str, os.PathLike]) -> Self:
+        """Open a mapping written by `save()`.
+
+        The file is memory-mapped read-only rather than read, so a lookup only reads
+        the pages of the keys its binary search compares.
+        """
+        _, sections = read_sections(path, _MAGIC, _VERSION, "entity file")
+        return cls(
+            MappedTextColumn(
+                sections["keys.buffer"], sections["keys.offsets"].cast("q")
+            ),
+            sections["entity_ids"].cast("I"),
+            MappedTextColumn(
+                sections["names.buffer"], sections["names.offsets"].cast("q")
+            ),
+            sections["counts"].cast("I"),
+            sections["members"].cast("I"),
+            sections["member_starts"].cast("q"),
+        )
+
+
+__all__ = ("AnswerEntities",)
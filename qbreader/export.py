@@ -0,0 +1,459 @@
+"""Stream questions to JSONL, Arrow IPC, and Parquet files.
+
+The writers consume questions one at a time, e.g. from `Sync.iter_query()`, and only
+ever buffer a single row group, so exports of any size run in constant memory. Arrow
+and Parquet output requires `pyarrow`.
+
+Arrow IPC files are written uncompressed so that downstream readers can memory-map them
+without copying, e.g. ``pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()``.
+"""
+
+from __future__ import annotations
+
+import io
+import itertools
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterable, Iterable, Iterator
+from types import TracebackType
+from typing import IO, Any, Optional, Self, Type, Union
+
+from qbreader._codec import (
+    ALTERNATE_SUBCATEGORIES,
+    ALTERNATE_SUBCATEGORY_CODES,
+    CATEGORIES,
+    CATEGORY_CODES,
+    SUBCATEGORIES,
+    SUBCATEGORY_CODES,
+)
+from qbreader.types import Bonus, Packet, QueryResponse, Tossup, _MetadataCache
+
+DEFAULT_ROW_GROUP_SIZE = 10_000
+"""Default number of rows buffered before a row group is written."""
+
+File = Union[str, os.PathLike, IO[bytes]]
+Questions = Union[Iterable[Union[Tossup, Bonus]], QueryResponse, Packet]
+
+_FORMATS = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".parquet": "parquet",
+}
+
+
+def _questions(questions: Questions) -> Iterable[Union[Tossup, Bonus]]:
+    """Flatten a QueryResponse or Packet into its tossups followed by its bonuses."""
+    if isinstance(questions, (QueryResponse, Packet)):
+        return itertools.chain(questions.tossups, questions.bonuses)
+    return questions
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow  # type: ignore
+    except ImportError as e:
+        raise ImportError(
+            "Arrow and Parquet export requires pyarrow to be installed."
+        ) from e
+    return pyarrow
+
+
+class QuestionWriter(ABC):
+    """Base class for writers that stream questions to a file.
+
+    Writers are context managers; the file is finalized when the block exits.
+    """
+
+    def __init__(self: Self):
+        self.rows_written: int = 0
+
+    @abstractmethod
+    def write(self: Self, question: Union[Tossup, Bonus]) -> None:
+        """Write a single question."""
+
+    def write_many(self: Self, questions: Questions) -> int:
+        """Write every question of an iterable, `QueryResponse`, or `Packet`.
+
+        Returns
+        -------
+        int
+            The number of questions written by this call.
+        """
+        before = self.rows_written
+        for question in _questions(questions):
+            self.write(question)
+        return self.rows_written - before
+
+    @abstractmethod
+    def close(self: Self) -> None:
+        """Flush any buffered rows and close the file."""
+
+    def __enter__(self: Self) -> Self:
+        """Return the writer."""
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the writer."""
+        self.close()
+
+
+class JSONLWriter(QuestionWriter):
+    """Write questions as JSON lines, one `to_json()` object per line.
+
+    Parameters
+    ----------
+    file : str | os.PathLike | IO[bytes]
+        A path, or a binary file object that is left open on `close()`.
+    """
+
+    def __init__(self: Self, file: File):
+        super().__init__()
+        self._owned = isinstance(file, (str, os.PathLike))
+        binary: IO[bytes] = open(file, "wb") if self._owned else file  # type: ignore
+        self._file = io.TextIOWrapper(binary, encoding="utf-8", newline="\n")
+
+    def write(self: Self, question: Union[Tossup, Bonus]) -> None:
+        """Write a single question."""
+        self._file.write(json.dumps(question.to_json(), ensure_ascii=False))
+        self._file.write("\n")
+        self.rows_written += 1
+
+    def close(self: Self) -> None:
+        """Flush the file, and close it if it was opened by the writer."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.detach()
+
+
+class ArrowWriter(QuestionWriter):
+    """Write questions to an Arrow IPC file in bounded-size record batches.
+
+    Tossups and bonuses share one flat schema: fields that only exist on the other
+    kind of question are null. Categories, subcategories and alternate subcategories
+    are dictionary-encoded against the full list of enum values.
+
+    Parameters
+    ----------
+    file : str | os.PathLike | IO[bytes]
+        A path, or a binary file object.
+    row_group_size : int, default = DEFAULT_ROW_GROUP_SIZE
+        The number of rows buffered in memory before a record batch is written.
+    """
+
+    def __init__(self: Self, file: File, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__()
+        if not isinstance(row_group_size, int) or isinstance(row_group_size, bool):
+            raise TypeError(
+                "row_group_size must be an int, not "
+                + f"{type(row_group_size).__name__}."
+            )
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be at least 1.")
+
+        self._pa = _import_pyarrow()
+        self.row_group_size: int = row_group_size
+        self.schema = self._schema()
+        self._rows: dict[str, list[Any]] = {name: [] for name in self.schema.names}
+        self._buffered: int = 0
+        self._closed: bool = False
+        self._writer = self._open(file)
+
+    def _open(self: Self, file: File) -> Any:
+        if isinstance(file, (str, os.PathLike)):
+            file = os.fspath(file)
+        return self._pa.ipc.new_file(file, self.schema)
+
+    def _schema(self: Self) -> Any:
+        pa = self._pa
+        strings = pa.list_(pa.string())
+        return pa.schema(
+            [
+                ("kind", pa.dictionary(pa.int8(), pa.string())),
+                ("question", pa.string()),
+                ("question_sanitized", pa.string()),
+                ("answer", pa.string()),
+                ("answer_sanitized", pa.string()),
+                ("leadin", pa.string()),
+                ("leadin_sanitized", pa.string()),
+                ("parts", strings),
+                ("parts_sanitized", strings),
+                ("answers", strings),
+                ("answers_sanitized", strings),
+                ("values", pa.list_(pa.int32())),
+                ("difficulty_modifiers", strings),
+                ("difficulty", pa.int8()),
+                ("category", pa.dictionary(pa.int8(), pa.string())),
+                ("subcategory", pa.dictionary(pa.int8(), pa.string())),
+                ("alternate_subcategory", pa.dictionary(pa.int8(), pa.string())),
+                ("number", pa.int32()),
+                ("packet_id", pa.string()),
+                ("packet_name", pa.string()),
+                ("packet_number", pa.int32()),
+                ("set_id", pa.string()),
+                ("set_name", pa.string()),
+                ("set_year", pa.int16()),
+                ("set_standard", pa.bool_()),
+            ]
+        )
+
+    def write(self: Self, question: Union[Tossup, Bonus]) -> None:
+        """Buffer a single question, writing a record batch once the buffer is full."""
+        rows = self._rows
+        if isinstance(question, Tossup):
+            rows["kind"].append(0)
+            for name in (
+                "question",
+                "question_sanitized",
+                "answer",
+                "answer_sanitized",
+            ):
+                rows[name].append(getattr(question, name))
+            for name in (
+                "leadin",
+                "leadin_sanitized",
+                "parts",
+                "parts_sanitized",
+                "answers",
+                "answers_sanitized",
+                "values",
+                "difficulty_modifiers",
+            ):
+                rows[name].append(None)
+        elif isinstance(question, Bonus):
+            rows["kind"].append(1)
+            for name in (
+                "question",
+                "question_sanitized",
+                "answer",
+                "answer_sanitized",
+            ):
+                rows[name].append(None)
+            for name in ("leadin", "leadin_sanitized"):
+                rows[name].append(getattr(question, name))
+            for name in ("parts", "parts_sanitized", "answers", "answers_sanitized"):
+                rows[name].append(list(getattr(question, name)))
+            rows["values"].append(list(question.values) if question.values else None)
+            modifiers = question.difficultyModifiers
+            rows["difficulty_modifiers"].append(
+                [str(m) for m in modifiers] if modifiers else None
+            )
+        else:
+            raise TypeError(
+                f"Expected a Tossup or Bonus, not {type(question).__name__}."
+            )
+
+        rows["difficulty"].append(int(question.difficulty))
+        rows["category"].append(CATEGORY_CODES[question.category])
+        rows["subcategory"].append(SUBCATEGORY_CODES[question.subcategory])
+        alternate = question.alternate_subcategory
+        rows["alternate_subcategory"].append(
+            ALTERNATE_SUBCATEGORY_CODES[alternate] - 1 if alternate else None
+        )
+        rows["number"].append(question.number)
+        rows["packet_id"].append(question.packet._id)
+        rows["packet_name"].append(question.packet.name)
+        rows["packet_number"].append(question.packet.number)
+        rows["set_id"].append(question.set._id)
+        rows["set_name"].append(question.set.name)
+        rows["set_year"].append(question.set.year)
+        rows["set_standard"].append(question.set.standard)
+
+        self._buffered += 1
+        self.rows_written += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self: Self) -> None:
+        """Write the buffered rows as a record batch."""
+        if not self._buffered:
+            return
+        pa = self._pa
+        dictionaries = {
+            "kind": ("tossup", "bonus"),
+            "category": CATEGORIES,
+            "subcategory": SUBCATEGORIES,
+            "alternate_subcategory": ALTERNATE_SUBCATEGORIES,
+        }
+        arrays = []
+        for field in self.schema:
+            values = self._rows[field.name]
+            if field.name in dictionaries:
+                arrays.append(
+                    pa.DictionaryArray.from_arrays(
+                        pa.array(values, type=pa.int8()),
+                        pa.array([str(v) for v in dictionaries[field.name]]),
+                    )
+                )
+            else:
+                arrays.append(pa.array(values, type=field.type))
+            values.clear()
+        self._write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self._buffered = 0
+
+    def _write_batch(self: Self, batch: Any) -> None:
+        self._writer.write_batch(batch)
+
+    def close(self: Self) -> None:
+        """Write any buffered rows and finalize the file."""
+        if self._closed:
+            return
+        self.flush()
+        self._writer.close()
+        self._closed = True
+
+
+class ParquetWriter(ArrowWriter):
+    """Write questions to a Parquet file, one row group per `row_group_size` rows.
+
+    Uses the same schema as `ArrowWriter`.
+
+    Parameters
+    ----------
+    file : str | os.PathLike | IO[bytes]
+        A path, or a binary file object.
+    row_group_size : int, default = DEFAULT_ROW_GROUP_SIZE
+        The number of rows in each row group.
+    compression : str, default = "zstd"
+        The compression codec passed to `pyarrow.parquet.ParquetWriter`.
+    """
+
+    def __init__(
+        self: Self,
+        file: File,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression: str = "zstd",
+    ):
+        self.compression: str = compression
+        super().__init__(file, row_group_size)
+
+    def _open(self: Self, file: File) -> Any:
+        import pyarrow.parquet as pq  # type: ignore
+
+        if isinstance(file, (str, os.PathLike)):
+            file = os.fspath(file)
+        return pq.ParquetWriter(file, self.schema, compression=self.compression)
+
+    def _write_batch(self: Self, batch: Any) -> None:
+        self._writer.write_batch(batch, row_group_size=self.row_group_size)
+
+
+def writer(
+    file: File,
+    format: Optional[str] = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> QuestionWriter:
+    """Create a writer for `file`.
+
+    Parameters
+    ----------
+    file : str | os.PathLike | IO[bytes]
+        A path, or a binary file object.
+    format : str, optional
+        One of `"jsonl"`, `"arrow"`, or `"parquet"`. Inferred from the file extension
+        (``.jsonl``, ``.ndjson``, ``.arrow``, ``.feather``, ``.ipc``, ``.parquet``) if
+        not given.
+    row_group_size : int, default = DEFAULT_ROW_GROUP_SIZE
+        The number of rows per Arrow record batch or Parquet row group.
+    """
+    if format is None:
+        if not isinstance(file, (str, os.PathLike)):
+            raise ValueError("format must be given when writing to a file object.")
+        extension = os.path.splitext(os.fspath(file))[1].lower()
+        if extension not in _FORMATS:
+            raise ValueError(f"Cannot infer the export format of {file!r}.")
+        format = _FORMATS[extension]
+
+    if format == "jsonl":
+        return JSONLWriter(file)
+    if format == "arrow":
+        return ArrowWriter(file, row_group_size)
+    if format == "parquet":
+        return ParquetWriter(file, row_group_size)
+    raise ValueError("format must be either 'jsonl', 'arrow', or 'parquet'.")
+
+
+def export(
+    questions: Questions,
+    file: File,
+    format: Optional[str] = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """Stream questions to `file`.
+
+    Parameters
+    ----------
+    questions : Iterable[Tossup | Bonus] | QueryResponse | Packet
+        The questions to write, e.g. the generator returned by `Sync.iter_query()`.
+    file, format, row_group_size
+        See `writer()`.
+
+    Returns
+    -------
+    int
+        The number of questions written.
+    """
+    with writer(file, format, row_group_size) as out:
+        return out.write_many(questions)
+
+
+async def export_async(
+    questions: Union[AsyncIterable[Union[Tossup, Bonus]], Questions],
+    file: File,
+    format: Optional[str] = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> int:
+    """Stream questions from an async iterable, e.g. `Async.iter_query()`, to `file`.
+
+    See `export()` for the parameters.
+    """
+    if not isinstance(questions, AsyncIterable):
+        return export(questions, file, format, row_group_size)
+    with writer(file, format, row_group_size) as out:
+        async for question in questions:
+            out.write(question)
+        return out.rows_written
+
+
+def read_jsonl(file: File) -> Iterator[Union[Tossup, Bonus]]:
+    """Lazily read the questions in a JSONL file written by `JSONLWriter`."""
+    owned = isinstance(file, (str, os.PathLike))
+    binary: IO[bytes] = open(file, "rb") if owned else file  # type: ignore
+    metadata = _MetadataCache()
+    try:
+        for line in binary:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if "leadin" in data:
+                yield Bonus._from_json_cached(data, metadata)
+            else:
+                yield Tossup._from_json_cached(data, metadata)
+    finally:
+        if owned:
+            binary.close()
+
+
+__all__ = (
+    "DEFAULT_ROW_GROUP_SIZE",
+    "QuestionWriter",
+    "JSONLWriter",
+    "ArrowWriter",
+    "ParquetWriter",
+    "writer",
+    "export",
+    "export_async",
+    "read_jsonl",
+)
@@ -0,0 +1,635 @@
+"""Columnar storage for analysing large numbers of questions.
+
+A `QuestionFrame` stores questions as a struct of arrays rather than an array of
+objects: enum fields are small-integer codes, years and numbers are integer arrays, and
+text is kept in one contiguous string per column. Filtering and grouping then operate
+on whole columns at a time, using NumPy when it is installed and C-level `bytes`
+operations otherwise.
+
+A frame can be written to a file once with `QuestionFrame.save()` and opened by any
+number of processes with `QuestionFrame.load()`, which maps the file read-only
+instead of copying it, so that every process shares the same physical pages.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Optional, Self, Union
+
+from qbreader import _api_utils as api_utils
+from qbreader._codec import (
+    ALTERNATE_SUBCATEGORIES,
+    CATEGORIES,
+    CATEGORY_CODES,
+    DIFFICULTIES,
+    DIFFICULTY_CODES,
+    SUBCATEGORIES,
+    SUBCATEGORY_CODES,
+)
+from qbreader._mmapfile import read_sections, write_sections
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    QueryResponse,
+    QuestionType,
+    Subcategory,
+    Tossup,
+    UnnormalizedAlternateSubcategory,
+    UnnormalizedCategory,
+    UnnormalizedDifficulty,
+    UnnormalizedSubcategory,
+)
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+TOSSUP = 0
+"""Value of the `kind` column for tossups."""
+BONUS = 1
+"""Value of the `kind` column for bonuses."""
+
+# unlike in the binary codec, a missing alternate subcategory is stored as -1
+_ALTERNATE_SUBCATEGORY_CODES = {
+    member: code for code, member in enumerate(ALTERNATE_SUBCATEGORIES)
+}
+
+# name -> array typecode of every integer column
+_INT_COLUMNS = {
+    "kind": "b",
+    "difficulty": "b",
+    "category": "b",
+    "subcategory": "b",
+    "alternate_subcategory": "b",
+    "year": "h",
+    "packet_number": "i",
+    "number": "i",
+    "set": "i",
+}
+_TEXT_COLUMNS = ("question", "answer")
+_GROUP_COLUMNS = (
+    "kind",
+    "difficulty",
+    "category",
+    "subcategory",
+    "alternate_subcategory",
+    "year",
+    "set",
+)
+
+_MAGIC = b"QBRFRM"
+_VERSION = 1
+
+
+class TextColumn:
+    """A column of strings stored in one contiguous buffer.
+
+    String ``i`` is ``buffer[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self: Self, buffer: str = "", offsets: Optional[array] = None):
+        self.buffer: str = buffer
+        self.offsets: array = offsets if offsets is not None else array("q", [0])
+
+    @classmethod
+    def from_strings(cls: type[Self], strings: Iterable[str]) -> Self:
+        """Pack an iterable of strings into a column."""
+        strings = list(strings)
+        offsets = array("q", [0])
+        offsets.extend(itertools.accumulate(map(len, strings)))
+        return cls("".join(strings), offsets)
+
+    def __len__(self: Self) -> int:
+        """Return the number of strings in the column."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self: Self, index: int) -> str:
+        """Return the string at `index`."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TextColumn index out of range")
+        start = self.offsets[index]
+        stop = self.offsets[index + 1]
+        return self.buffer[start:stop]
+
+    def __iter__(self: Self) -> Iterator[str]:
+        """Iterate over the strings in the column."""
+        buffer = self.buffer
+        offsets = self.offsets
+        for start, stop in zip(offsets, itertools.islice(offsets, 1, None)):
+            yield buffer[start:stop]
+
+    def take(self: Self, indices: Iterable[int]) -> TextColumn:
+        """Return a new column made of the strings at `indices`."""
+        rows = list(indices)
+        buffer = self.buffer
+        starts = map(self.offsets.__getitem__, rows)
+        stops = map(self.offsets[1:].__getitem__, rows)
+        return TextColumn.from_strings(
+            buffer[start:stop] for start, stop in zip(starts, stops)
+        )
+
+
+class MappedTextColumn(TextColumn):
+    """A `TextColumn` read from the UTF-8 text of a file written by `save()`.
+
+    String ``i`` is the decoded ``buffer[offsets[i]:offsets[i + 1]]``, where
+    `buffer` is a read-only `memoryview` of the mapped file and `offsets` are byte
+    offsets. Strings are only decoded when they are read.
+    """
+
+    def __init__(self: Self, buffer: memoryview, offsets: memoryview):
+        self.buffer: memoryview = buffer  # type: ignore[assignment]
+        self.offsets: memoryview = offsets  # type: ignore[assignment]
+
+    def __getitem__(self: Self, index: int) -> str:
+        """Return the string at `index`."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("TextColumn index out of range")
+        start = self.offsets[index]
+        stop = self.offsets[index + 1]
+        return str(self.buffer[start:stop], "utf-8")
+
+    def __iter__(self: Self) -> Iterator[str]:
+        """Iterate over the strings in the column."""
+        buffer = self.buffer
+        offsets = self.offsets
+        for start, stop in zip(offsets, itertools.islice(offsets, 1, None)):
+            yield str(buffer[start:stop], "utf-8")
+
+    def take(self: Self, indices: Iterable[int]) -> TextColumn:
+        """Return a new in-memory column made of the strings at `indices`."""
+        return TextColumn.from_strings(map(self.__getitem__, indices))
+
+
+class QuestionFrame:
+    """A columnar table of tossups and bonuses.
+
+    Every row is one question. The integer columns, accessible with ``frame[name]``
+    as `array.array` objects, are:
+
+    - ``kind``: `TOSSUP` or `BONUS`.
+    - ``difficulty``, ``category``, ``subcategory``: the index of the value in the
+      pinned tables ``_codec.DIFFICULTIES``, ``_codec.CATEGORIES`` and
+      ``_codec.SUBCATEGORIES``, which do not change when the enums do.
+    - ``alternate_subcategory``: the index in ``_codec.ALTERNATE_SUBCATEGORIES``, or
+      -1.
+    - ``year``, ``packet_number``, ``number``: the set year, packet number and
+      question number.
+    - ``set``: an index into `set_names`.
+
+    The columns of a frame opened with `load()` are read-only `memoryview` objects
+    of the mapped file instead.
+
+    The text columns, ``question`` and ``answer``, are `TextColumn` objects holding the
+    sanitized text. A bonus' question is its leadin and parts, and its answer is its
+    answers, each joined by newlines.
+
+    Parameters
+    ----------
+    questions : Iterable[Tossup | Bonus] | QueryResponse
+        The questions to store. The tossups and bonuses of a `QueryResponse` are both
+        included, tossups first.
+    """
+
+    def __init__(
+        self: Self,
+        questions: Union[Iterable[Union[Tossup, Bonus]], QueryResponse] = (),
+    ):
+        if isinstance(questions, QueryResponse):
+            questions = itertools.chain(questions.tossups, questions.bonuses)
+
+        columns: dict[str, list[int]] = {name: [] for name in _INT_COLUMNS}
+        kinds = columns["kind"]
+        difficulties = columns["difficulty"]
+        categories = columns["category"]
+        subcategories = columns["subcategory"]
+        alternate_subcategories = columns["alternate_subcategory"]
+        years = columns["year"]
+        packet_numbers = columns["packet_number"]
+        numbers = columns["number"]
+        sets = columns["set"]
+        texts: list[str] = []
+        answers: list[str] = []
+        set_codes: dict[str, int] = {}
+
+        for question in questions:
+            if isinstance(question, Tossup):
+                kinds.append(TOSSUP)
+                texts.append(question.question_sanitized)
+                answers.append(question.answer_sanitized)
+            elif isinstance(question, Bonus):
+                kinds.append(BONUS)
+                texts.append(
+                    "\n".join((question.leadin_sanitized, *question.parts_sanitized))
+                )
+                answers.append("\n".join(question.answers_sanitized))
+            else:
+                raise TypeError(
+                    "questions must contain Tossup or Bonus objects, not "
+                    + f"{type(question).__name__}."
+                )
+            difficulties.append(DIFFICULTY_CODES[question.difficulty])
+            categories.append(CATEGORY_CODES[question.category])
+            subcategories.append(SUBCATEGORY_CODES[question.subcategory])
+            alternate = question.alternate_subcategory
+            alternate_subcategories.append(
+                -1 if alternate is None else _ALTERNATE_SUBCATEGORY_CODES[alternate]
+            )
+            years.append(question.set.year)
+            packet_numbers.append(question.packet.number)
+            numbers.append(question.number)
+            sets.append(set_codes.setdefault(question.set.name, len(set_codes)))
+
+        self._columns: dict[str, Union[array, memoryview]] = {
+            name: array(typecode, columns[name])
+            for name, typecode in _INT_COLUMNS.items()
+        }
+        self._text: dict[str, TextColumn] = {
+            "question": TextColumn.from_strings(texts),
+            "answer": TextColumn.from_strings(answers),
+        }
+        self.set_names: list[str] = list(set_codes)
+
+    @classmethod
+    def _from_columns(
+        cls: type[Self],
+        columns: dict[str, Union[array, memoryview]],
+        text: dict[str, TextColumn],
+        set_names: list[str],
+    ) -> Self:
+        frame = cls.__new__(cls)
+        frame._columns = columns
+        frame._text = text
+        frame.set_names = set_names
+        return frame
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions in the frame."""
+        return len(self._columns["kind"])
+
+    def __getitem__(self: Self, name: str) -> Union[array, memoryview, TextColumn]:
+        """Return the column called `name`."""
+        if name in self._columns:
+            return self._columns[name]
+        if name in self._text:
+            return self._text[name]
+        raise KeyError(name)
+
+    @property
+    def columns(self: Self) -> tuple[str, ...]:
+        """The names of all columns in the frame."""
+        return (*_INT_COLUMNS, *_TEXT_COLUMNS)
+
+    def row(self: Self, index: int) -> dict[str, Any]:
+        """Return the decoded values of row `index` as a dictionary."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("QuestionFrame index out of range")
+        row: dict[str, Any] = {
+            name: self._decode(name, column[index])
+            for name, column in self._columns.items()
+        }
+        for name, text in self._text.items():
+            row[name] = text[index]
+        return row
+
+    def _decode(self: Self, name: str, code: int) -> Any:
+        """Convert a column code back into its value."""
+        if name == "kind":
+            return "tossup" if code == TOSSUP else "bonus"
+        if name == "difficulty":
+            return DIFFICULTIES[code]
+        if name == "category":
+            return CATEGORIES[code]
+        if name == "subcategory":
+            return SUBCATEGORIES[code]
+        if name == "alternate_subcategory":
+            return None if code < 0 else ALTERNATE_SUBCATEGORIES[code]
+        if name == "set":
+            return self.set_names[code]
+        return code
+
+    def take(self: Self, indices: Iterable[int]) -> QuestionFrame:
+        """Return a new frame made of the rows at `indices`, in order."""
+        if np is not None:
+            positions = np.asarray(
+                indices if isinstance(indices, (Sequence, np.ndarray)) else [*indices],
+                dtype=np.intp,
+            )
+            columns: dict[str, Union[array, memoryview]] = {}
+            for name, column in self._columns.items():
+                typecode = _INT_COLUMNS[name]
+                taken = array(typecode)
+                taken.frombytes(
+                    np.frombuffer(column, dtype=typecode)[positions].tobytes()
+                )
+                columns[name] = taken
+            rows: Sequence[int] = positions.tolist()
+        else:
+            rows = list(indices)
+            columns = {
+                name: array(_INT_COLUMNS[name], map(column.__getitem__, rows))
+                for name, column in self._columns.items()
+            }
+        text = {name: column.take(rows) for name, column in self._text.items()}
+        return QuestionFrame._from_columns(columns, text, self.set_names)
+
+    def mask(
+        self: Self,
+        questionType: QuestionType = "all",
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        setName: Optional[str] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None,
+    ) -> Any:
+        """Return which rows match all of the given conditions.
+
+        See `filter()` for the parameters. The result is a boolean `numpy.ndarray` if
+        NumPy is installed, and otherwise a `bytes` object of zeros and ones.
+        """
+        conditions = self._conditions(
+            questionType,
+            difficulties,
+            categories,
+            subcategories,
+            alternate_subcategories,
+            setName,
+        )
+        if np is not None:
+            result = np.ones(len(self), dtype=bool)
+            for name, codes in conditions.items():
+                column = np.frombuffer(self._columns[name], dtype=_INT_COLUMNS[name])
+                if column.dtype.itemsize == 1:
+                    table = np.zeros(256, dtype=bool)
+                    table[[code & 0xFF for code in codes]] = True
+                    result &= table[column.view(np.uint8)]
+                else:
+                    result &= np.isin(column, codes)
+            if min_year is not None or max_year is not None:
+                years = np.frombuffer(self._columns["year"], dtype="h")
+                if min_year is not None:
+                    result &= years >= min_year
+                if max_year is not None:
+                    result &= years <= max_year
+            return result
+
+        # each condition is a bytes object of zeros and ones, combined as big integers
+        size = len(self)
+        combined = (1 << (8 * size)) // 255  # every byte set to one
+        for name, codes in conditions.items():
+            if _INT_COLUMNS[name] == "b":
+                table = bytearray(256)
+                for code in codes:
+                    table[code & 0xFF] = 1
+                matches = self._columns[name].tobytes().translate(table)
+            else:
+                allowed = set(codes)
+                matches = bytes(code in allowed for code in self._columns[name])
+            combined &= int.from_bytes(matches, "little")
+        if min_year is not None or max_year is not None:
+            low = min_year if min_year is not None else -(1 << 15)
+            high = max_year if max_year is not None else (1 << 15) - 1
+            matches = bytes(low <= year <= high for year in self._columns["year"])
+            combined &= int.from_bytes(matches, "little")
+        return combined.to_bytes(size, "little")
+
+    def _conditions(
+        self: Self,
+        questionType: QuestionType,
+        difficulties: UnnormalizedDifficulty,
+        categories: UnnormalizedCategory,
+        subcategories: UnnormalizedSubcategory,
+        alternate_subcategories: UnnormalizedAlternateSubcategory,
+        setName: Optional[str],
+    ) -> dict[str, list[int]]:
+        """Convert filter arguments into the allowed codes of each column."""
+        conditions: dict[str, list[int]] = {}
+
+        if questionType == Tossup:
+            questionType = "tossup"
+        elif questionType == Bonus:
+            questionType = "bonus"
+        if questionType not in ["tossup", "bonus", "all"]:
+            raise ValueError("questionType must be either 'tossup', 'bonus', or 'all'.")
+        if questionType != "all":
+            conditions["kind"] = [TOSSUP if questionType == "tossup" else BONUS]
+
+        for name, unnormalized, enum_type, codes in (
+            ("difficulty", difficulties, Difficulty, DIFFICULTY_CODES),
+            ("category", categories, Category, CATEGORY_CODES),
+            ("subcategory", subcategories, Subcategory, SUBCATEGORY_CODES),
+            (
+                "alternate_subcategory",
+                alternate_subcategories,
+                AlternateSubcategory,
+                _ALTERNATE_SUBCATEGORY_CODES,
+            ),
+        ):
+            normalized = api_utils.normalize_enumlike(unnormalized, enum_type)
+            if normalized:
+                conditions[name] = [
+                    codes[enum_type(value)]  # type: ignore[index]
+                    for value in normalized.split(",")
+                ]
+
+        if setName is not None:
+            if not isinstance(setName, str):
+                raise TypeError(
+                    f"setName must be a string, not {type(setName).__name__}."
+                )
+            conditions["set"] = [
+                code for code, name in enumerate(self.set_names) if name == setName
+            ]
+
+        return conditions
+
+    def filter(
+        self: Self,
+        questionType: QuestionType = "all",
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        setName: Optional[str] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None,
+    ) -> QuestionFrame:
+        """Return a new frame with the rows that match all of the given conditions.
+
+        Parameters
+        ----------
+        questionType : qbreader.types.QuestionType
+            Keep only tossups or bonuses. Either `"tossup"`, `"bonus"`, or `"all"`.
+        difficulties : qbreader.types.UnnormalizedDifficulty, optional
+            The difficulties to keep.
+        categories : qbreader.types.UnnormalizedCategory, optional
+            The categories to keep.
+        subcategories : qbreader.types.UnnormalizedSubcategory, optional
+            The subcategories to keep.
+        alternate_subcategories : qbreader.types.UnnormalizedAlternateSubcategory, optional
+            The alternate subcategories to keep.
+        setName : str, optional
+            Keep only questions from the set with this name.
+        min_year : int, optional
+            The oldest year to keep.
+        max_year : int, optional
+            The most recent year to keep.
+
+        Returns
+        -------
+        QuestionFrame
+            The matching rows, in their original order.
+        """  # noqa: E501
+        selected = self.mask(
+            questionType,
+            difficulties,
+            categories,
+            subcategories,
+            alternate_subcategories,
+            setName,
+            min_year,
+            max_year,
+        )
+        if np is not None:
+            return self.take(np.flatnonzero(selected))
+        return self.take(itertools.compress(range(len(self)), selected))
+
+    def counts(self: Self, column: str) -> dict[Any, int]:
+        """Count the rows with each value of `column`, in order of the column codes."""
+        self._check_group_column(column)
+        if np is not None:
+            codes, sizes = np.unique(
+                np.frombuffer(self._columns[column], dtype=_INT_COLUMNS[column]),
+                return_counts=True,
+            )
+            counted = zip(codes.tolist(), sizes.tolist())
+        else:
+            counted = iter(sorted(Counter(self._columns[column]).items()))
+        return {self._decode(column, code): size for code, size in counted}
+
+    def group_by(self: Self, column: str) -> dict[Any, QuestionFrame]:
+        """Split the frame into one frame per value of `column`.
+
+        Parameters
+        ----------
+        column : str
+            One of ``"kind"``, ``"difficulty"``, ``"category"``, ``"subcategory"``,
+            ``"alternate_subcategory"``, ``"year"``, or ``"set"``.
+
+        Returns
+        -------
+        dict[Any, QuestionFrame]
+            Frames keyed by the decoded column value (e.g. a `Category` or a set name),
+            in order of the column codes. Rows keep their original order.
+        """
+        self._check_group_column(column)
+        groups: dict[int, Any]
+        if np is not None:
+            codes = np.frombuffer(self._columns[column], dtype=_INT_COLUMNS[column])
+            order = np.argsort(codes, kind="stable")
+            values, starts = np.unique(codes[order], return_index=True)
+            groups = dict(zip(values.tolist(), np.split(order, starts[1:])))
+        else:
+            lists: dict[int, list[int]] = {}
+            for index, code in enumerate(self._columns[column]):
+                lists.setdefault(code, []).append(index)
+            groups = dict(sorted(lists.items()))
+        return {
+            self._decode(column, code): self.take(rows) for code, rows in groups.items()
+        }
+
+    def _check_group_column(self: Self, column: str) -> None:
+        if column not in _GROUP_COLUMNS:
+            raise ValueError(
+                f"Cannot group by {column!r}. Valid columns are {_GROUP_COLUMNS}."
+            )
+
+    def to_numpy(self: Self) -> dict[str, Any]:
+        """Return the integer columns as NumPy arrays.
+
+        The arrays are read-only views of the frame's own buffers, so no data is
+        copied.
+
+        Raises
+        ------
+        ImportError
+            If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError(
+                "QuestionFrame.to_numpy() requires numpy to be installed."
+            )
+        arrays = {}
+        for name, column in self._columns.items():
+            arrays[name] = np.frombuffer(column, dtype=_INT_COLUMNS[name])
+            arrays[name].flags.writeable = False
+        return arrays
+
+    def save(self: Self, path: Union[str, os.PathLike]) -> None:
+        """Atomically write the frame to a file that `load()` can map.
+
+        Write it to a RAM-backed file system such as ``/dev/shm`` to share a frame
+        between processes without ever touching the disk.
+        """
+        sections: list[tuple[str, memoryview]] = [
+            (name, memoryview(column).cast("B"))
+            for name, column in self._columns.items()
+        ]
+        for name, text in self._text.items():
+            if isinstance(text, MappedTextColumn):
+                buffer = text.buffer
+                offsets = array("q", text.offsets)
+            else:
+                encoded = [string.encode() for string in text]
+                buffer = memoryview(b"".join(encoded))
+                offsets = array("q", [0])
+                offsets.extend(itertools.accumulate(map(len, encoded)))
+            sections += [(f"{name}.offsets", memoryview(offsets).cast("B"))]
+            sections += [(f"{name}.buffer", buffer)]
+
+        write_sections(path, _MAGIC, _VERSION, {"set_names": self.set_names}, sections)
+
+    @classmethod
+    def load(cls: type[Self], path: Union[str, os.PathLike]) -> Self:
+        """Open a frame written by `save()`.
+
+        The file is memory-mapped read-only rather than read, so opening a frame takes
+        no memory of its own, and processes that open the same file share its pages.
+        Frames derived from it, e.g. by `filter()`, are ordinary in-memory frames.
+        """
+        header, sections = read_sections(path, _MAGIC, _VERSION, "question frame")
+        columns: dict[str, Union[array, memoryview]] = {
+            name: sections[name].cast(typecode)  # type: ignore[call-overload]
+            for name, typecode in _INT_COLUMNS.items()
+        }
+        text: dict[str, TextColumn] = {
+            name: MappedTextColumn(
+                sections[f"{name}.buffer"], sections[f"{name}.offsets"].cast("q")
+            )
+            for name in _TEXT_COLUMNS
+        }
+        return cls._from_columns(columns, text, header["set_names"])
+
+
+__all__ = (
+    "QuestionFrame",
+    "TextColumn",
+    "MappedTextColumn",
+    "TOSSUP",
+    "BONUS",
+)
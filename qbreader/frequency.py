@@ -0,0 +1,332 @@
+"""Rank how often answers come up, in a single pass and bounded memory.
+
+A `FrequencyLists` aggregator reads questions one at a time, e.g. from
+`Sync.iter_query()` or a local mirror, and counts the main answer of every tossup
+and bonus part for each category, subcategory, difficulty, or any combination of
+them. Answers are told apart by their normalized text, like
+`qbreader.autocomplete.normalize_answer()`, so "Dvořák" and "dvorak" are counted
+together.
+
+Counts are exact by default. With a `capacity`, each list is a `HeavyHitters`
+sketch that keeps only that many answers, using the Space-Saving algorithm: an
+answer that is not counted yet replaces the one with the lowest count and inherits
+that count as its possible overcount. Every answer that makes up more than
+``1 / capacity`` of a list is then guaranteed to be kept, and no count is more
+than ``total / capacity`` too high, however long the stream is.
+
+Given a `qbreader.entities.AnswerEntities` mapping, answers are counted by the
+entity they name instead, so "Mozart" and "Wolfgang Amadeus Mozart" share a count.
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections.abc import Hashable, Iterable, Sequence
+from operator import attrgetter
+from typing import Any, Optional, Self, Union
+
+from qbreader.autocomplete import main_answer, normalize_answer
+from qbreader.entities import AnswerEntities
+from qbreader.local import Source, iter_source
+from qbreader.types import Bonus, Tossup
+
+FIELDS = ("category", "subcategory", "alternate_subcategory", "difficulty")
+"""The question fields that frequency lists can be grouped by."""
+
+Grouping = Union[str, Sequence[str]]
+
+
+def _everything(question: Union[Tossup, Bonus]) -> tuple:
+    """Return the group of every question of the grouping by no fields."""
+    return ()
+
+
+def _capacity(capacity: Optional[int]) -> Optional[int]:
+    """Check that a capacity is a positive int or None."""
+    if capacity is not None:
+        if not isinstance(capacity, int) or isinstance(capacity, bool):
+            raise TypeError(f"capacity must be an int, not {type(capacity).__name__}.")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+    return capacity
+
+
+class HeavyHitters:
+    """Count keys exactly, or only the most frequent ones in bounded memory.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        The most keys to keep. Without it, every key is counted exactly.
+    """
+
+    def __init__(self: Self, capacity: Optional[int] = None):
+        self.capacity: Optional[int] = _capacity(capacity)
+        self.total: int = 0
+        self._counts: dict[Hashable, int] = {}
+        self._errors: dict[Hashable, int] = {}
+        # one entry per kept key, with a count that may be lower than its current
+        # one, since entries are only refreshed when they reach the top
+        self._heap: list[tuple[int, int, Hashable]] = []
+        self._order = 0
+
+    def __len__(self: Self) -> int:
+        """Return the number of keys kept."""
+        return len(self._counts)
+
+    def __contains__(self: Self, key: Hashable) -> bool:
+        """Return whether a key is kept."""
+        return key in self._counts
+
+    def __getitem__(self: Self, key: Hashable) -> int:
+        """Return the count of a key, which may be too high by `error()`."""
+        return self._counts.get(key, 0)
+
+    def error(self: Self, key: Hashable) -> int:
+        """Return how much the count of a key may be too high."""
+        return self._errors.get(key, 0)
+
+    def add(self: Self, key: Hashable, count: int = 1) -> None:
+        """Count a key `count` more times."""
+        if count < 1:
+            raise ValueError("count must be at least 1.")
+        self.total += count
+        counts = self._counts
+        if key in counts:
+            counts[key] += count
+            return
+        if self.capacity is None or len(counts) < self.capacity:
+            counts[key] = count
+            if self.capacity is not None:
+                self._push(count, key)
+            return
+
+        heap = self._heap
+        while True:
+            stale, _, smallest = heap[0]
+            current = counts[smallest]
+            if current == stale:
+                break
+            heapq.heapreplace(heap, (current, self._next(), smallest))
+        heapq.heappop(heap)
+        del counts[smallest]
+        self._errors.pop(smallest, None)
+        counts[key] = current + count
+        self._errors[key] = current
+        self._push(current + count, key)
+
+    def _next(self: Self) -> int:
+        """Return an increasing number that breaks ties between heap entries."""
+        self._order += 1
+        return self._order
+
+    def _push(self: Self, count: int, key: Hashable) -> None:
+        heapq.heappush(self._heap, (count, self._next(), key))
+
+    def update(self: Self, keys: Iterable[Hashable]) -> None:
+        """Count every key of an iterable once."""
+        for key in keys:
+            self.add(key)
+
+    def most_common(self: Self, k: Optional[int] = None) -> list[tuple[Any, int]]:
+        """Return the `k` keys with the highest counts, or all kept keys.
+
+        Keys with equal counts are ordered by how much their counts may be too
+        high, least first, so exact counts come before estimates, and then by when
+        they were first kept.
+        """
+        items = self._counts.items()
+        errors = self._errors
+
+        def rank(item: tuple[Hashable, int]) -> tuple[int, int]:
+            return -item[1], errors.get(item[0], 0)
+
+        if k is None:
+            return sorted(items, key=rank)
+        return heapq.nsmallest(k, items, key=rank)
+
+
+def _grouping(grouping: Grouping) -> tuple[str, ...]:
+    """Return a grouping as a tuple of field names."""
+    fields = (grouping,) if isinstance(grouping, str) else tuple(grouping)
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError(
+                f"cannot group by {field!r}, must be one of {', '.join(FIELDS)}."
+            )
+    return fields
+
+
+class FrequencyLists:
+    """Count the answers of a stream of questions for groups of questions.
+
+    Parameters
+    ----------
+    by : Sequence[str | Sequence[str]], default = ("category", "subcategory",
+    "difficulty")
+        The groupings to count answers for. Each is a field of `FIELDS`, giving a
+        list for every value of that field, or a sequence of fields, giving a list
+        for every combination of their values. The empty sequence counts every
+        question in a single list.
+    capacity : int, optional
+        The most answers to keep for each list. Without it, counts are exact.
+    entities : AnswerEntities, optional
+        Count answers by their entity, shown by its name. Answers that are not in
+        the mapping are counted by their normalized text.
+    """
+
+    def __init__(
+        self: Self,
+        by: Sequence[Grouping] = ("category", "subcategory", "difficulty"),
+        capacity: Optional[int] = None,
+        entities: Optional[AnswerEntities] = None,
+    ):
+        if isinstance(by, str):
+            by = (by,)
+        self.by: tuple[tuple[str, ...], ...] = tuple(map(_grouping, by))
+        self.capacity: Optional[int] = _capacity(capacity)
+        self.entities: Optional[AnswerEntities] = entities
+        self._lists: dict[tuple[str, ...], dict[Any, HeavyHitters]] = {
+            fields: {} for fields in self.by
+        }
+        # the group of a question is the value of the field of a grouping, or the
+        # tuple of the values of its fields if it has none or several
+        self._keys = [
+            (attrgetter(*fields) if fields else _everything, self._lists[fields])
+            for fields in self.by
+        ]
+        # the first spelling of every answer that may still be kept in a list
+        self._spellings: dict[Union[str, int], str] = {}
+        self._prune_at = 1024
+
+    @classmethod
+    def build(
+        cls: type[Self],
+        source: Source,
+        by: Sequence[Grouping] = ("category", "subcategory", "difficulty"),
+        capacity: Optional[int] = None,
+        entities: Optional[AnswerEntities] = None,
+    ) -> Self:
+        """Count the answers of the questions of a mirror store or iterable.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions, such as the output of `Sync.iter_query()`.
+
+        See the class for the other parameters.
+        """
+        lists = cls(by, capacity, entities)
+        lists.update(iter_source(source))
+        return lists
+
+    def add(self: Self, question: Union[Tossup, Bonus]) -> None:
+        """Count the answer of a tossup, or the answer of every part of a bonus."""
+        if isinstance(question, Tossup):
+            answerlines: Sequence[str] = [question.answer_sanitized]
+        elif isinstance(question, Bonus):
+            answerlines = question.answers_sanitized
+        else:
+            raise TypeError(
+                f"question must be a Tossup or Bonus, not {type(question).__name__}."
+            )
+
+        keys: list[Union[str, int]] = []
+        for answerline in answerlines:
+            answer = main_answer(answerline)
+            key = normalize_answer(answer)
+            if not key:
+                continue
+            if self.entities is not None:
+                entity_id = self.entities.entity_of_key(key)
+                if entity_id is not None:
+                    keys.append(entity_id)
+                    self._spellings.setdefault(entity_id, self.entities.name(entity_id))
+                    continue
+            keys.append(key)
+            self._spellings.setdefault(key, answer)
+        if not keys:
+            return
+
+        for group_of, lists in self._keys:
+            group = group_of(question)
+            if group is None or type(group) is tuple and None in group:
+                continue
+            counter = lists.get(group)
+            if counter is None:
+                counter = lists[group] = HeavyHitters(self.capacity)
+            for counted in keys:
+                counter.add(counted)
+
+        if self.capacity is not None and len(self._spellings) > self._prune_at:
+            self._prune()
+
+    def _prune(self: Self) -> None:
+        """Forget the spellings of answers that no list keeps anymore."""
+        kept: set[Any] = {
+            key
+            for lists in self._lists.values()
+            for counter in lists.values()
+            for key in counter._counts
+        }
+        self._spellings = {key: self._spellings[key] for key in kept}
+        self._prune_at = max(1024, 2 * len(self._spellings))
+
+    def update(self: Self, questions: Iterable[Union[Tossup, Bonus]]) -> None:
+        """Count the answers of every question of an iterable."""
+        for question in questions:
+            self.add(question)
+
+    def groups(self: Self, by: Grouping) -> list[Any]:
+        """Return the groups of a grouping that have a list, in order of appearance."""
+        return list(self._lists[self._known(by)])
+
+    def _known(self: Self, by: Grouping) -> tuple[str, ...]:
+        fields = _grouping(by)
+        if fields not in self._lists:
+            raise ValueError(f"answers are not counted by {by!r}.")
+        return fields
+
+    def ranked(
+        self: Self, by: Grouping, k: Optional[int] = None
+    ) -> dict[Any, list[tuple[str, int]]]:
+        """Return the most frequent answers of every group of a grouping.
+
+        Parameters
+        ----------
+        by : str | Sequence[str]
+            One of the groupings that answers are counted by.
+        k : int, optional
+            The most answers to return for each group. Without it, every answer
+            that is kept is returned.
+
+        Returns
+        -------
+        dict[Any, list[tuple[str, int]]]
+            The answers of every group with their counts, most frequent first, by
+            the value of the field of the grouping, e.g. a `Category`, or by the
+            tuple of values of its fields if it has several. Answers are shown as
+            they were first written.
+        """
+        fields = self._known(by)
+        spellings = self._spellings
+        return {
+            group: [(spellings[key], count) for key, count in counter.most_common(k)]
+            for group, counter in self._lists[fields].items()
+        }
+
+    def counter(self: Self, by: Grouping, group: Any) -> HeavyHitters:
+        """Return the counts of the normalized answers, or entity ids, of a group.
+
+        `group` is a value of the field of the grouping, or a tuple of values of its
+        fields if it has several.
+        """
+        return self._lists[self._known(by)][group]
+
+
+__all__ = (
+    "FIELDS",
+    "FrequencyLists",
+    "HeavyHitters",
+)
@@ -0,0 +1,268 @@
+"""Look up answers despite typos.
+
+A `FuzzyAnswerIndex` finds the answers within a small edit distance of a string,
+and the questions whose answerlines have them as their main answer, e.g. to suggest
+what a misspelled answer meant, or to find the answerlines worth passing to
+`qbreader.judge.check_answer()`. Both the string and the answers are normalized
+like `qbreader.autocomplete.normalize_answer()`, and distances count insertions,
+deletions, substitutions and swaps of adjacent characters, like
+`qbreader.judge.check_answer()`.
+
+Every answer is indexed as a whole, without its stopwords, and by each of its
+other words, so "nweton" finds "Isaac Newton" and "magic flute" finds "The Magic
+Flute". Terms are found through the postings of their padded character trigrams: a
+string within distance ``d`` of a term shares at least ``g - 4 * d`` of its ``g``
+distinct trigrams with it, so only terms sharing that many are compared. Strings too
+short for that bound to exclude anything are compared with every term of a close
+enough length instead, all at once with NumPy when it is installed.
+"""
+
+from __future__ import annotations
+
+import heapq
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from itertools import chain
+from typing import Self
+
+from qbreader.answerline import STOPWORDS
+from qbreader.autocomplete import _answerlines, _group_answers, normalize_answer
+from qbreader.judge import _distance
+from qbreader.local import Source
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+GRAM = 3
+"""The length of the character n-grams that terms are indexed by."""
+
+_START, _END = "\x02" * (GRAM - 1), "\x03" * (GRAM - 1)
+
+
+def _grams(term: str) -> set[str]:
+    padded = _START + term + _END
+    return set(map("".join, zip(*(padded[i:] for i in range(GRAM)))))
+
+
+def _distances(term: str, candidates: Sequence[str], limit: int) -> list[int]:
+    """Return the edit distance of `term` to terms that all have the same length.
+
+    Distances above `limit` are reported as ``limit + 1``. With NumPy, each cell
+    of the dynamic programming table is computed for every candidate at once.
+    """
+    if np is None or len(candidates) < 16:
+        return [
+            min(_distance(term, candidate, limit), limit + 1)
+            for candidate in candidates
+        ]
+
+    width = len(candidates[0])
+    codes = np.frombuffer(
+        "".join(candidates).encode("utf-32-le"), dtype=np.uint32
+    ).reshape(len(candidates), width)
+    count = len(candidates)
+    previous2 = np.zeros((count, width + 1), dtype=np.int32)
+    previous = np.broadcast_to(np.arange(width + 1, dtype=np.int32), (count, width + 1))
+    for i, char in enumerate(term, 1):
+        x = ord(char)
+        current = np.empty((count, width + 1), dtype=np.int32)
+        current[:, 0] = i
+        for j in range(1, width + 1):
+            cost = np.minimum(previous[:, j], current[:, j - 1]) + 1
+            np.minimum(cost, previous[:, j - 1] + (codes[:, j - 1] != x), out=cost)
+            if i > 1 and j > 1 and ord(term[i - 2]) != x:
+                swapped = (codes[:, j - 2] == x) & (codes[:, j - 1] == ord(term[i - 2]))
+                np.minimum(
+                    cost, np.where(swapped, previous2[:, j - 2] + 1, cost), out=cost
+                )
+            current[:, j] = cost
+        previous2, previous = previous, current
+    return np.minimum(previous[:, -1], limit + 1).tolist()
+
+
+class FuzzyAnswerIndex:
+    """Find the answers within an edit distance of a string.
+
+    Build an index with `build()` or `from_answerlines()`.
+
+    Parameters
+    ----------
+    answers : list[str]
+        The distinct answers, as they are displayed.
+    documents : list[list[int]]
+        The numbers of the questions or answerlines of each answer.
+    """
+
+    def __init__(self: Self, answers: list[str], documents: list[list[int]]):
+        if len(answers) != len(documents):
+            raise ValueError("answers and documents must have the same length.")
+        self.answers: list[str] = answers
+        self._document_starts = array("Q", [0])
+        self._documents = array("I")
+        for numbers in documents:
+            self._documents.extend(numbers)
+            self._document_starts.append(len(self._documents))
+
+        # every answer is a term, with and without its stopwords, and so is every
+        # word of it that is not a stopword
+        term_ids: dict[str, int] = {}
+        term_answers: list[list[int]] = []
+        for answer_id, answer in enumerate(answers):
+            key = normalize_answer(answer)
+            words = [word for word in key.split(" ") if word not in STOPWORDS]
+            for term in dict.fromkeys([key, " ".join(words), *words]):
+                if not term:
+                    continue
+                term_id = term_ids.setdefault(term, len(term_ids))
+                if term_id == len(term_answers):
+                    term_answers.append([])
+                term_answers[term_id].append(answer_id)
+        self.terms: list[str] = list(term_ids)
+        self._term_starts = array("Q", [0])
+        self._term_answers = array("I")
+        for answer_ids in term_answers:
+            self._term_answers.extend(answer_ids)
+            self._term_starts.append(len(self._term_answers))
+
+        self._postings: dict[str, array] = {}
+        self._lengths: dict[int, tuple[list[int], list[str]]] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in _grams(term):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    posting = self._postings[gram] = array("I")
+                posting.append(term_id)
+            same_length = self._lengths.setdefault(len(term), ([], []))
+            same_length[0].append(term_id)
+            same_length[1].append(term)
+        self._term_lengths = array("I", map(len, self.terms))
+
+    @classmethod
+    def from_answerlines(cls: type[Self], answerlines: Iterable[str]) -> Self:
+        """Index the main answers of answerlines, numbered in iteration order."""
+        return cls(*_group_answers(enumerate(answerlines)))
+
+    @classmethod
+    def build(cls: type[Self], source: Source) -> Self:
+        """Index the answers of the questions of a mirror store or iterable.
+
+        Questions are numbered in the order the source yields them, and a bonus is
+        listed under the answer of each of its parts.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions.
+        """
+        return cls(*_group_answers(_answerlines(source)))
+
+    def __len__(self: Self) -> int:
+        """Return the number of distinct answers."""
+        return len(self.answers)
+
+    def count(self: Self, answer_id: int) -> int:
+        """Return the number of answerlines of an answer."""
+        return self._document_starts[answer_id + 1] - self._document_starts[answer_id]
+
+    def documents(self: Self, answer_id: int) -> list[int]:
+        """Return the numbers of the questions or answerlines of an answer."""
+        lo, hi = self._document_starts[answer_id], self._document_starts[answer_id + 1]
+        return list(dict.fromkeys(self._documents[lo:hi]))
+
+    def _shared(self: Self, postings: list[array], shared: int) -> list[int]:
+        """Return the terms that are in at least `shared` of the postings."""
+        if np is None:
+            counts = Counter(chain.from_iterable(postings))
+            return [term_id for term_id, count in counts.items() if count >= shared]
+        if not postings:
+            return []
+        term_ids = np.concatenate(
+            [np.frombuffer(posting, dtype=np.uint32) for posting in postings]
+        )
+        counts = np.bincount(term_ids, minlength=len(self.terms))
+        return np.flatnonzero(counts >= shared).tolist()
+
+    def _terms_within(self: Self, key: str, max_distance: int) -> dict[int, int]:
+        """Return the distance of every term within `max_distance` of `key`."""
+        grams = _grams(key)
+        shared = len(grams) - max_distance * (GRAM + 1)
+        if shared > 0:
+            postings = [
+                self._postings[gram] for gram in grams if gram in self._postings
+            ]
+            by_length: dict[int, list[int]] = {}
+            for term_id in self._shared(postings, shared):
+                length = self._term_lengths[term_id]
+                if abs(length - len(key)) <= max_distance:
+                    by_length.setdefault(length, []).append(term_id)
+            groups = [
+                (term_ids, [self.terms[term_id] for term_id in term_ids])
+                for term_ids in by_length.values()
+            ]
+        else:
+            lengths = range(len(key) - max_distance, len(key) + max_distance + 1)
+            groups = [self._lengths[n] for n in lengths if n in self._lengths]
+
+        found: dict[int, int] = {}
+        for term_ids, candidates in groups:
+            distances = _distances(key, candidates, max_distance)
+            for term_id, distance in zip(term_ids, distances):
+                if distance <= max_distance:
+                    found[term_id] = distance
+        return found
+
+    def lookup(
+        self: Self, text: str, max_distance: int = 2, k: int = 10
+    ) -> list[tuple[int, int]]:
+        """Find the answers that an answer, or a word of it, could be a typo of.
+
+        Parameters
+        ----------
+        text : str
+            The given answer.
+        max_distance : int, default = 2
+            The most edits between the normalized text and a whole answer or one of
+            its words.
+        k : int, default = 10
+            The most answers to return.
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            Pairs of an answer id and its distance, closest first, then by the
+            number of answerlines of the answer, most first. Answers are
+            ``self.answers[answer_id]``, and `documents()` lists their questions.
+        """
+        if not isinstance(max_distance, int) or isinstance(max_distance, bool):
+            raise TypeError(
+                f"max_distance must be an int, not {type(max_distance).__name__}."
+            )
+        if max_distance < 0:
+            raise ValueError("max_distance must not be negative.")
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        key = normalize_answer(text)
+        if not key:
+            return []
+
+        best: dict[int, int] = {}
+        for term_id, distance in self._terms_within(key, max_distance).items():
+            lo, hi = self._term_starts[term_id], self._term_starts[term_id + 1]
+            for answer_id in self._term_answers[lo:hi]:
+                if distance < best.get(answer_id, max_distance + 1):
+                    best[answer_id] = distance
+        return heapq.nsmallest(
+            k,
+            best.items(),
+            key=lambda item: (item[1], -self.count(item[0]), item[0]),
+        )
+
+
+__all__ = (
+    "FuzzyAnswerIndex",
+    "GRAM",
+)
@@ -0,0 +1,579 @@
+"""Indexes for fast search and filtering of local questions."""
+
+from __future__ import annotations
+
+import os
+import re
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import chain, repeat
+from operator import rshift
+from typing import Any, Optional, Self, Union
+
+from qbreader._mmapfile import read_sections, write_sections
+from qbreader._text import fold
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    Subcategory,
+    Tossup,
+)
+
+TOKEN = re.compile(r"\w+")
+"""What counts as a token, applied to diacritic- and case-folded text."""
+
+MAX_EXPANSION = 2048
+"""The most tokens a partial query word may match before it is ignored."""
+
+_MAGIC = b"QBRIDX"
+_VERSION = 2
+_SECTIONS = ("starts", "occurrences")
+_CHUNK = 1024
+_NONZERO = re.compile(rb"[^\x00]+")
+_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+def tokenize(text: str) -> list[str]:
+    """Split `text` into diacritic- and case-folded tokens."""
+    return TOKEN.findall(fold(text))
+
+
+class InvertedIndex:
+    """A positional inverted index.
+
+    Every document is a sequence of text fields, e.g. the leadin and parts of a
+    bonus. Each token has a sorted posting list of its occurrences, each encoded as
+    ``doc << 32 | position``. Positions of consecutive fields are one apart from
+    each other, so phrases never match across fields.
+
+    Tokens are diacritic- and case-folded. Searches return a superset of the
+    documents matched by the equivalent `qbreader.local.compile_query()` pattern,
+    which should be used to check the candidates.
+    """
+
+    def __init__(
+        self: Self,
+        num_documents: int,
+        tokens: list[str],
+        starts: memoryview,
+        occurrences: memoryview,
+    ):
+        self.num_documents: int = num_documents
+        self.tokens: list[str] = tokens
+        self._starts = starts
+        self._occurrences = occurrences
+        self._vocabulary = "\n" + "\n".join(tokens) + "\n"
+
+    @classmethod
+    def build(cls: type[Self], documents: Iterable[Sequence[str]]) -> Self:
+        """Index `documents`, numbering them from 0 in iteration order."""
+        postings: dict[str, array] = {}
+        num_documents = 0
+        for doc, fields in enumerate(documents):
+            num_documents += 1
+            key = doc << 32
+            for field in fields:
+                for token in tokenize(field):
+                    occurrences = postings.get(token)
+                    if occurrences is None:
+                        occurrences = postings[token] = array("Q")
+                    occurrences.append(key)
+                    key += 1
+                key += 1
+
+        tokens = sorted(postings)
+        starts, occurrences = array("Q", [0]), array("Q")
+        for token in tokens:
+            occurrences.extend(postings.pop(token))
+            starts.append(len(occurrences))
+
+        return cls(num_documents, tokens, memoryview(starts), memoryview(occurrences))
+
+    def __len__(self: Self) -> int:
+        """Return the number of distinct tokens."""
+        return len(self.tokens)
+
+    def tokens_matching(
+        self: Self, term: str, start: bool = True, end: bool = True
+    ) -> Optional[list[int]]:
+        """Find the tokens that contain `term`.
+
+        Parameters
+        ----------
+        term : str
+            A folded token.
+        start : bool, default = True
+            Whether matching tokens must start with `term`.
+        end : bool, default = True
+            Whether matching tokens must end with `term`.
+
+        Returns
+        -------
+        list[int] | None
+            The ids of the matching tokens, or None if there are more than
+            `MAX_EXPANSION` of them.
+        """
+        tokens = self.tokens
+        if start and end:
+            i = bisect_left(tokens, term)
+            return [i] if i < len(tokens) and tokens[i] == term else []
+
+        vocabulary = self._vocabulary
+        needle = ("\n" if start else "") + term + ("\n" if end else "")
+        ids: list[int] = []
+        hit = vocabulary.find(needle)
+        while hit != -1:
+            begin = hit + 1 if start else hit
+            token_start = vocabulary.rfind("\n", 0, begin) + 1
+            token_end = vocabulary.find("\n", begin)
+            ids.append(bisect_left(tokens, vocabulary[token_start:token_end]))
+            if len(ids) > MAX_EXPANSION:
+                return None
+            hit = vocabulary.find(needle, token_end)
+        return ids
+
+    def documents(self: Self, ids: Iterable[int]) -> set[int]:
+        """Return the documents that contain any of the tokens `ids`."""
+        occurrences, starts = self._occurrences, self._starts
+        result: set[int] = set()
+        for i in ids:
+            lo, hi = starts[i], starts[i + 1]
+            result.update(map(rshift, occurrences[lo:hi], repeat(32)))
+        return result
+
+    def _occurrence_set(self: Self, ids: list[int]) -> set[int]:
+        occurrences, starts = self._occurrences, self._starts
+        result: set[int] = set()
+        for i in ids:
+            lo, hi = starts[i], starts[i + 1]
+            result.update(occurrences[lo:hi])
+        return result
+
+    def _occurs(self: Self, ids: list[int], key: int) -> bool:
+        occurrences, starts = self._occurrences, self._starts
+        for i in ids:
+            j = bisect_left(occurrences, key, starts[i], starts[i + 1])
+            if j < starts[i + 1] and occurrences[j] == key:
+                return True
+        return False
+
+    def phrase(self: Self, terms: Sequence[Optional[list[int]]]) -> Optional[set[int]]:
+        """Return the documents where the terms occur at consecutive positions.
+
+        Each term is a list of alternative token ids, or None to match any token.
+        Returns None if every term is None.
+        """
+        constrained = [(k, ids) for k, ids in enumerate(terms) if ids is not None]
+        if not constrained:
+            return None
+        if len(constrained) == 1:
+            return self.documents(constrained[0][1])
+
+        # keep the occurrences of the rarest term that every other term is at the
+        # right distance from, checking few of them by bisection
+        (first, first_ids), *rest = sorted(
+            constrained, key=lambda term: self._frequency(term[1])
+        )
+        keys: list[int] = []
+        for i in first_ids:
+            lo, hi = self._starts[i], self._starts[i + 1]
+            keys += self._occurrences[lo:hi]
+        for k, ids in rest:
+            offset = k - first
+            if len(keys) * len(ids) * 16 < self._frequency(ids):
+                keys = [key for key in keys if self._occurs(ids, key + offset)]
+            else:
+                following = self._occurrence_set(ids)
+                keys = [key for key in keys if key + offset in following]
+        return {key >> 32 for key in keys}
+
+    def _frequency(self: Self, ids: list[int]) -> int:
+        return sum(self._starts[i + 1] - self._starts[i] for i in ids)
+
+    def search(
+        self: Self,
+        queryString: str,
+        exactPhrase: bool = False,
+        ignoreWordOrder: bool = False,
+    ) -> Optional[set[int]]:
+        """Find the documents with a field that may match a query string.
+
+        The parameters have the same meaning as in `qbreader.local.compile_query()`.
+        Words at the edges of the query may be parts of longer tokens unless
+        `exactPhrase` is set.
+
+        Returns
+        -------
+        set[int] | None
+            A superset of the matching documents, or None if the query does not
+            narrow them down.
+        """
+        text = fold(queryString)
+        words = text.split() if ignoreWordOrder else [text.strip()]
+        result: Optional[set[int]] = None
+        for word in words:
+            docs = self._search_word(word, exactPhrase)
+            if docs is None:
+                continue
+            result = docs if result is None else result & docs
+            if not result:
+                break
+        return result
+
+    def _search_word(self: Self, word: str, exactPhrase: bool) -> Optional[set[int]]:
+        matches = list(TOKEN.finditer(word))
+        last = len(matches) - 1
+        terms = [
+            self.tokens_matching(
+                match.group(),
+                start=exactPhrase or k > 0 or match.start() > 0,
+                end=exactPhrase or k < last or match.end() < len(word),
+            )
+            for k, match in enumerate(matches)
+        ]
+        return self.phrase(terms)
+
+    def _sections(self: Self) -> dict[str, memoryview]:
+        return {"starts": self._starts, "occurrences": self._occurrences}
+
+
+def fingerprint(tossups: Sequence[Tossup], bonuses: Sequence[Bonus]) -> int:
+    """Return a checksum of the identity and order of indexed questions."""
+    checksum = zlib.crc32(f"{len(tossups)},{len(bonuses)}".encode())
+    questions: Iterable[Union[Tossup, Bonus]] = chain(tossups, bonuses)
+    for question in questions:
+        key = f"\n{question.set.name}\t{question.packet.number}\t{question.number}"
+        checksum = zlib.crc32(key.encode(), checksum)
+    return checksum
+
+
+class SearchIndex:
+    """The inverted indexes of the questions of a `qbreader.Local`.
+
+    Tossups and bonuses each have an index of their question text (tossup
+    questions, and bonus leadins and parts) and of their answers, with documents
+    numbered in query order.
+
+    Parameters
+    ----------
+    indexes : dict[str, InvertedIndex]
+        The indexes, keyed by ``"tossup.question"``, ``"tossup.answer"``,
+        ``"bonus.question"`` and ``"bonus.answer"``.
+    fingerprint : int
+        The `fingerprint()` of the indexed questions.
+    """
+
+    KEYS = ("tossup.question", "tossup.answer", "bonus.question", "bonus.answer")
+
+    def __init__(self: Self, indexes: dict[str, InvertedIndex], fingerprint: int):
+        self.indexes: dict[str, InvertedIndex] = indexes
+        self.fingerprint: int = fingerprint
+
+    @classmethod
+    def build(
+        cls: type[Self], tossups: Sequence[Tossup], bonuses: Sequence[Bonus]
+    ) -> Self:
+        """Index questions, which must be in query order."""
+        indexes = {
+            "tossup.question": InvertedIndex.build(
+                (tossup.question_sanitized,) for tossup in tossups
+            ),
+            "tossup.answer": InvertedIndex.build(
+                (tossup.answer_sanitized,) for tossup in tossups
+            ),
+            "bonus.question": InvertedIndex.build(
+                (bonus.leadin_sanitized, *bonus.parts_sanitized) for bonus in bonuses
+            ),
+            "bonus.answer": InvertedIndex.build(
+                bonus.answers_sanitized for bonus in bonuses
+            ),
+        }
+        return cls(indexes, fingerprint(tossups, bonuses))
+
+    def search(
+        self: Self,
+        questionType: str,
+        searchType: str,
+        queryString: str,
+        exactPhrase: bool = False,
+        ignoreWordOrder: bool = False,
+    ) -> Optional[set[int]]:
+        """Find the tossups or bonuses that may match a query.
+
+        Parameters
+        ----------
+        questionType : str
+            Either ``"tossup"`` or ``"bonus"``.
+        searchType : str
+            Either ``"question"``, ``"answer"`` or ``"all"``.
+
+        See `InvertedIndex.search()` for the other parameters and the return value.
+        """
+        fields = ("question", "answer") if searchType == "all" else (searchType,)
+        result: set[int] = set()
+        for field in fields:
+            docs = self.indexes[f"{questionType}.{field}"].search(
+                queryString, exactPhrase, ignoreWordOrder
+            )
+            if docs is None:
+                return None
+            result |= docs
+        return result
+
+    def save(self: Self, path: Union[str, os.PathLike]) -> None:
+        """Atomically write the index to a file."""
+        sections: list[tuple[str, Any]] = []
+        for key in self.KEYS:
+            index = self.indexes[key]
+            sections.append((f"{key}.tokens", "\n".join(index.tokens).encode()))
+            sections += [
+                (f"{key}.{name}", data) for name, data in index._sections().items()
+            ]
+        header = {
+            "fingerprint": self.fingerprint,
+            "documents": {key: self.indexes[key].num_documents for key in self.KEYS},
+        }
+        write_sections(path, _MAGIC, _VERSION, header, sections)
+
+    @classmethod
+    def load(cls: type[Self], path: Union[str, os.PathLike]) -> Self:
+        """Open an index written by `save()`.
+
+        The file is memory-mapped, so posting lists are only read from disk when they
+        are searched.
+        """
+        header, sections = read_sections(path, _MAGIC, _VERSION, "search index")
+        indexes = {}
+        for key in cls.KEYS:
+            tokens = bytes(sections[f"{key}.tokens"]).decode()
+            indexes[key] = InvertedIndex(
+                header["documents"][key],
+                tokens.split("\n") if tokens else [],
+                *(sections[f"{key}.{name}"].cast("Q") for name in _SECTIONS),
+            )
+        return cls(indexes, header["fingerprint"])
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    """Yield the positions of the set bits of `bitmap`, in increasing order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for run in _NONZERO.finditer(data):
+        for offset, byte in enumerate(run.group(), run.start()):
+            for bit in _BITS[byte]:
+                yield offset * 8 + bit
+
+
+def select_bits(bitmap: int, ranks: Iterable[int]) -> list[int]:
+    """Return the positions of the set bits of `bitmap` with the given ranks.
+
+    The rank of a set bit is the number of set bits below it. Only the parts of
+    `bitmap` that contain the selected bits are expanded, so selecting a page of a
+    large bitmap is cheap.
+
+    Parameters
+    ----------
+    bitmap : int
+        The bitmap.
+    ranks : Iterable[int]
+        Ranks in increasing order, each less than ``bitmap.bit_count()``.
+
+    Returns
+    -------
+    list[int]
+        The bit positions, in the order of `ranks`.
+    """
+    pending = iter(ranks)
+    rank = next(pending, None)
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    result: list[int] = []
+    seen = 0  # set bits before the current chunk
+    for start in range(0, len(data), _CHUNK):
+        if rank is None:
+            break
+        stop = min(start + _CHUNK, len(data))
+        count = int.from_bytes(data[start:stop], "little").bit_count()
+        while rank is not None and rank < seen + count:
+            # bisect the chunk by popcount down to the byte with the bit
+            lo, hi, before = start, stop, seen
+            while hi - lo > 1:
+                middle = (lo + hi) // 2
+                left = int.from_bytes(data[lo:middle], "little").bit_count()
+                if rank < before + left:
+                    hi = middle
+                else:
+                    lo, before = middle, before + left
+            result.append(lo * 8 + _BITS[data[lo]][rank - before])
+            rank = next(pending, None)
+        seen += count
+    return result
+
+
+def filter_bits(bitmap: int, positions: Iterable[int]) -> list[int]:
+    """Return the `positions` whose bits are set in `bitmap`, in the same order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    size = len(data) * 8
+    return [
+        position
+        for position in positions
+        if position < size and data[position >> 3] >> (position & 7) & 1
+    ]
+
+
+def _range(start: int, stop: int) -> int:
+    """Return the bitmap of the positions from `start` up to `stop`."""
+    return ((1 << (stop - start)) - 1) << start
+
+
+Runs = tuple[tuple[int, int], ...]
+
+
+class FilterIndex:
+    """Compressed bitmap indexes of the filterable columns of questions.
+
+    A bitmap is an `int` whose bit ``i`` is set when question ``i`` matches, so
+    filters are combined with ``&`` and ``|`` on whole bitmaps and counted with
+    `int.bit_count()`. Difficulty, category, subcategory and alternate subcategory
+    values are stored as bitmaps. Years and sets, whose questions are contiguous
+    when they are in query order, are stored as runs of question numbers and only
+    expanded into bitmaps when filtered on.
+
+    Parameters
+    ----------
+    size : int
+        The number of questions.
+    bitmaps : dict[str, dict[Any, int]]
+        The bitmap of every value of each enum column.
+    runs : dict[str, dict[Any, Runs]]
+        The ``(start, stop)`` runs of every ``"year"`` and ``"set"`` value.
+    """
+
+    ENUMS = ("difficulty", "category", "subcategory", "alternate_subcategory")
+
+    def __init__(
+        self: Self,
+        size: int,
+        bitmaps: dict[str, dict[Any, int]],
+        runs: dict[str, dict[Any, Runs]],
+    ):
+        self.size: int = size
+        self.bitmaps: dict[str, dict[Any, int]] = bitmaps
+        self.runs: dict[str, dict[Any, Runs]] = runs
+
+    @classmethod
+    def build(cls: type[Self], questions: Sequence[Union[Tossup, Bonus]]) -> Self:
+        """Index the columns of `questions`."""
+        codes: dict[str, dict[Any, int]] = {name: {} for name in cls.ENUMS}
+        columns = {name: bytearray() for name in cls.ENUMS}
+        runs: dict[str, dict[Any, list[list[int]]]] = {"year": {}, "set": {}}
+        for i, question in enumerate(questions):
+            for name, column in columns.items():
+                value = getattr(question, name)
+                code = codes[name].get(value)
+                if code is None:
+                    code = codes[name][value] = len(codes[name])
+                column.append(code)
+            for name, value in (
+                ("year", question.set.year),
+                ("set", question.set.name),
+            ):
+                value_runs = runs[name].setdefault(value, [])
+                if value_runs and value_runs[-1][1] == i:
+                    value_runs[-1][1] = i + 1
+                else:
+                    value_runs.append([i, i + 1])
+
+        # "1" where a row has the value, most significant row first
+        bitmaps: dict[str, dict[Any, int]] = {}
+        for name, column in columns.items():
+            reversed_column = bytes(column[::-1])
+            bitmaps[name] = {}
+            for value, code in codes[name].items():
+                table = bytearray(b"0" * 256)
+                table[code] = ord("1")
+                bitmaps[name][value] = int(reversed_column.translate(table), 2)
+
+        return cls(
+            len(questions),
+            bitmaps,
+            {
+                name: {
+                    value: tuple((start, stop) for start, stop in value_runs)
+                    for value, value_runs in column_runs.items()
+                }
+                for name, column_runs in runs.items()
+            },
+        )
+
+    def all(self: Self) -> int:
+        """Return the bitmap of every question."""
+        return _range(0, self.size)
+
+    def any_of(self: Self, name: str, values: Iterable[Any]) -> int:
+        """Return the bitmap of the questions whose `name` column is one of `values`.
+
+        `name` is an enum column, ``"year"`` or ``"set"``.
+        """
+        result = 0
+        if name in self.bitmaps:
+            for value in values:
+                result |= self.bitmaps[name].get(value, 0)
+        else:
+            for value in values:
+                for start, stop in self.runs[name].get(value, ()):
+                    result |= _range(start, stop)
+        return result
+
+    def select(
+        self: Self,
+        difficulties: Optional[Iterable[Difficulty]] = None,
+        categories: Optional[Iterable[Category]] = None,
+        subcategories: Optional[Iterable[Subcategory]] = None,
+        alternate_subcategories: Optional[Iterable[AlternateSubcategory]] = None,
+        setName: Optional[str] = None,
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None,
+    ) -> int:
+        """Return the bitmap of the questions that pass every given filter.
+
+        Empty or missing enum filters allow every value, and the year range is
+        inclusive.
+        """
+        result = self.all()
+        for name, values in (
+            ("difficulty", difficulties),
+            ("category", categories),
+            ("subcategory", subcategories),
+            ("alternate_subcategory", alternate_subcategories),
+        ):
+            allowed = list(values or ())
+            if allowed:
+                result &= self.any_of(name, allowed)
+        if setName is not None:
+            result &= self.any_of("set", (setName,))
+        if min_year is not None or max_year is not None:
+            years = [
+                year
+                for year in self.runs["year"]
+                if (min_year is None or year >= min_year)
+                and (max_year is None or year <= max_year)
+            ]
+            result &= self.any_of("year", years)
+        return result
+
+
+__all__ = (
+    "InvertedIndex",
+    "SearchIndex",
+    "FilterIndex",
+    "iter_bits",
+    "select_bits",
+    "filter_bits",
+    "tokenize",
+    "fingerprint",
+    "TOKEN",
+    "MAX_EXPANSION",
+)
@@ -0,0 +1,121 @@
+"""Judge answers offline, like `api/check-answer`."""
+
+from __future__ import annotations
+
+from typing import Union
+
+from qbreader.answerline import Answer, Answerline, parse_answerline, tokenize
+from qbreader.types import AnswerJudgement, Directive
+
+STRICTNESS = 7
+"""Answer tokens get one typo per this many characters."""
+
+
+def _distance(a: str, b: str, limit: int) -> int:
+    """Return the edit distance between `a` and `b`, counting swaps as one edit.
+
+    Distances above `limit` are reported as ``limit + 1``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: list[int] = []
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (x != y),
+            )
+            if i > 1 and j > 1 and x == b[j - 2] and a[i - 2] == y:
+                cost = min(cost, previous2[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _close(given: str, expected: str, strictness: int) -> bool:
+    """Return whether `given` is `expected`, allowing for typos in long words."""
+    if given == expected:
+        return True
+    limit = len(expected) // strictness
+    return limit > 0 and _distance(given, expected, limit) <= limit
+
+
+def _matches(answer: Answer, given: list[str], strictness: int) -> bool:
+    """Return whether the tokens of a given answer match `answer`.
+
+    Every required word must be given, and every given word must be in the answer.
+    """
+    required = answer.required_tokens
+    if not required or not given:
+        return False
+    if _close("".join(given), "".join(required), strictness):
+        return True
+    return all(
+        any(_close(word, expected, strictness) for word in given)
+        for expected in required
+    ) and all(
+        any(_close(word, allowed, strictness) for allowed in answer.tokens)
+        for word in given
+    )
+
+
+def check_answer(
+    answerline: Union[str, Answerline],
+    givenAnswer: str,
+    strictness: int = STRICTNESS,
+) -> AnswerJudgement:
+    """Judge an answer to be correct, incorrect, or prompt (can be directed).
+
+    Works like `api/check-answer`, but offline. The emphasized (``<u>``, or
+    ``<b>`` if nothing is underlined) words of an answer are required, and any
+    other words of the answer may also be given. Clauses in brackets that start
+    with "accept", "prompt on" or "do not accept" (and their variants) give
+    alternate answers, and a prompt clause may direct the prompt with ``by asking
+    "..."``. Case, diacritics, punctuation, plurals and small typos are ignored.
+
+    Answerlines are parsed with `qbreader.answerline.parse_answerline()`, so judging
+    many answers against one answerline parses it once.
+
+    Parameters
+    ----------
+    answerline : str | Answerline
+        The answerline to check against, or its parsed form. Preferably including
+        the HTML tags <b> and <u>, if they are present.
+    givenAnswer : str
+        The answer to check.
+    strictness : int, default = STRICTNESS
+        Words of an answer allow one typo per `strictness` characters.
+
+    Returns
+    -------
+    AnswerJudgement
+        A `AnswerJudgement` object containing the judgement.
+    """
+    if not isinstance(answerline, Answerline):
+        answerline = parse_answerline(answerline)
+
+    if not isinstance(givenAnswer, str):
+        raise TypeError(
+            f"givenAnswer must be a string, not {type(givenAnswer).__name__}"
+        )
+
+    given = tokenize(givenAnswer)
+    if not given:
+        return AnswerJudgement(Directive.REJECT)
+
+    for directive in (Directive.REJECT, Directive.ACCEPT, Directive.PROMPT):
+        for answer in answerline.alternates(directive):
+            if _matches(answer, given, strictness):
+                return AnswerJudgement(directive, answer.directed_prompt)
+    return AnswerJudgement(Directive.REJECT)
+
+
+__all__ = (
+    "check_answer",
+    "STRICTNESS",
+)
@@ -0,0 +1,630 @@
+"""Answer qbreader API calls from a local mirror instead of the network."""
+
+from __future__ import annotations
+
+import os
+import random
+import re
+from collections.abc import Iterable
+from typing import Optional, Self, Union, cast
+
+import qbreader._api_utils as api_utils
+from qbreader._query import (
+    compile_query,
+    enum_set,
+    order_key,
+    page_ranks,
+    query_flags,
+    random_params,
+)
+from qbreader._text import strip_diacritics
+from qbreader.index import (
+    FilterIndex,
+    SearchIndex,
+    filter_bits,
+    fingerprint,
+    iter_bits,
+    select_bits,
+)
+from qbreader.judge import check_answer
+from qbreader.mirror.store import DirectoryStore, Store
+from qbreader.rank import BM25Ranker
+from qbreader.types import (
+    AlternateSubcategory,
+    AnswerJudgement,
+    Bonus,
+    Category,
+    Difficulty,
+    Packet,
+    QueryResponse,
+    QuestionType,
+    SearchType,
+    Subcategory,
+    Tossup,
+    UnnormalizedAlternateSubcategory,
+    UnnormalizedCategory,
+    UnnormalizedDifficulty,
+    UnnormalizedSubcategory,
+    Year,
+)
+
+Source = Union[Store, str, os.PathLike, Iterable[Union[Tossup, Bonus]]]
+
+
+def open_source(source: Source) -> Union[Store, Iterable[Union[Tossup, Bonus]]]:
+    """Open a path as a `DirectoryStore`, and return any other source unchanged."""
+    if isinstance(source, (str, os.PathLike)):
+        return DirectoryStore(source)
+    return source
+
+
+def iter_source(source: Source) -> Iterable[Union[Tossup, Bonus]]:
+    """Iterate over the questions of a store, a mirror directory, or an iterable."""
+    source = open_source(source)
+    return source.questions() if isinstance(source, Store) else source
+
+
+class _QuestionTable:
+    """Questions of one type, in query order, with their searchable text."""
+
+    def __init__(self: Self, questions: list[Union[Tossup, Bonus]]):
+        questions.sort(key=order_key)
+        self.questions: list[Union[Tossup, Bonus]] = questions
+        self.question_text: list[tuple[str, ...]] = []
+        self.answer_text: list[tuple[str, ...]] = []
+        for question in questions:
+            if isinstance(question, Tossup):
+                self.question_text.append((question.question_sanitized,))
+                self.answer_text.append((question.answer_sanitized,))
+            else:
+                self.question_text.append(
+                    (question.leadin_sanitized, *question.parts_sanitized)
+                )
+                self.answer_text.append(question.answers_sanitized)
+        self._folded: dict[str, list[tuple[str, ...]]] = {}
+        self._rows: Optional[dict[tuple, int]] = None
+        self.filters: FilterIndex = FilterIndex.build(questions)
+
+    def __len__(self: Self) -> int:
+        return len(self.questions)
+
+    def text(self: Self, field: str, ignoreDiacritics: bool) -> list[tuple[str, ...]]:
+        """Return the "question" or "answer" text of every question."""
+        text = self.question_text if field == "question" else self.answer_text
+        if not ignoreDiacritics:
+            return text
+        if field not in self._folded:
+            self._folded[field] = [
+                tuple(map(strip_diacritics, fields)) for fields in text
+            ]
+        return self._folded[field]
+
+    def row(self: Self, question: Union[Tossup, Bonus]) -> Optional[int]:
+        """Return the position of a question in the table, or None if it is absent."""
+        if self._rows is None:
+            self._rows = {
+                (q.set.name, q.packet.number, q.number): row
+                for row, q in enumerate(self.questions)
+            }
+        row = self._rows.get(
+            (question.set.name, question.packet.number, question.number)
+        )
+        if row is None or self.questions[row] != question:
+            return None
+        return row
+
+    def filter(self: Self, data: dict) -> int:
+        """Return the bitmap of the questions that pass the filters of a query."""
+        return self.filters.select(
+            difficulties=enum_set(data.get("difficulties"), Difficulty),
+            categories=enum_set(data.get("categories"), Category),
+            subcategories=enum_set(data.get("subcategories"), Subcategory),
+            alternate_subcategories=enum_set(
+                data.get("alternateSubcategories"), AlternateSubcategory
+            ),
+            setName=data.get("setName"),
+            min_year=data["minYear"],
+            max_year=data["maxYear"],
+        )
+
+    def search(
+        self: Self,
+        indices: Iterable[int],
+        pattern: re.Pattern,
+        searchType: str,
+        ignoreDiacritics: bool,
+    ) -> list[int]:
+        """Return the indices whose searched text matches `pattern`."""
+        fields = ["question", "answer"] if searchType == "all" else [searchType]
+        texts = [self.text(field, ignoreDiacritics) for field in fields]
+        search = pattern.search
+        return [
+            index
+            for index in indices
+            if any(search(value) for text in texts for value in text[index])
+        ]
+
+
+def _select(bitmap: int, ranks: list[int]) -> list[int]:
+    """Return the positions of the set bits of `bitmap` with `ranks`, in any order."""
+    order = sorted(ranks)
+    positions = dict(zip(order, select_bits(bitmap, order)))
+    return [positions[rank] for rank in ranks]
+
+
+class Local:
+    """A qbreader API backend that runs entirely on local data.
+
+    Methods take the same arguments and return the same types as their counterparts
+    on `qbreader.Sync`, but never make a network request.
+
+    Parameters
+    ----------
+    source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+        A mirror store, the directory of a `DirectoryStore`, or any iterable of
+        questions.
+
+    Notes
+    -----
+    Searches scan every question unless a `SearchIndex` has been built with
+    `build_index()` or opened with `load_index()`, in which case only the candidates
+    it finds are checked. Regular expression searches always scan. Save a built
+    index with `SearchIndex.save()` to avoid rebuilding it.
+    """
+
+    def __init__(self: Self, source: Source):
+        questions = iter_source(source)
+
+        tossups: list[Union[Tossup, Bonus]] = []
+        bonuses: list[Union[Tossup, Bonus]] = []
+        for question in questions:
+            if isinstance(question, Tossup):
+                tossups.append(question)
+            elif isinstance(question, Bonus):
+                bonuses.append(question)
+            else:
+                raise TypeError(
+                    "source must contain Tossup or Bonus objects, not "
+                    + f"{type(question).__name__}."
+                )
+        self._tossups = _QuestionTable(tossups)
+        self._bonuses = _QuestionTable(bonuses)
+        self.index: Optional[SearchIndex] = None
+        self._three_parts: Optional[int] = None
+        self._ranker: Optional[BM25Ranker] = None
+
+        self._packets: dict[str, dict[int, tuple[list[Tossup], list[Bonus]]]] = {}
+        for question in (*tossups, *bonuses):
+            packets = self._packets.setdefault(question.set.name, {})
+            packet = packets.setdefault(question.packet.number, ([], []))
+            if isinstance(question, Tossup):
+                packet[0].append(question)
+            else:
+                packet[1].append(question)
+        for packets in self._packets.values():
+            for packet_tossups, packet_bonuses in packets.values():
+                packet_tossups.sort(key=order_key)
+                packet_bonuses.sort(key=order_key)
+
+    def query(
+        self: Self,
+        questionType: QuestionType = "all",
+        searchType: SearchType = "all",
+        queryString: Optional[str] = "",
+        exactPhrase: Optional[bool] = False,
+        ignoreDiacritics: Optional[bool] = False,
+        ignoreWordOrder: Optional[bool] = False,
+        regex: Optional[bool] = False,
+        randomize: Optional[bool] = False,
+        setName: Optional[str] = None,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        maxReturnLength: Optional[int] = 25,
+        tossupPagination: Optional[int] = 1,
+        bonusPagination: Optional[int] = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+    ) -> QueryResponse:
+        """Query the local questions.
+
+        See `qbreader.Sync.query()` for the parameters. Every filter that is given must
+        match, and results come newest set first, then by set name, packet number and
+        question number, like the API.
+
+        Returns
+        -------
+        QueryResponse
+            A `QueryResponse` object containing the results of the query.
+        """
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            randomize=randomize,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            tossupPagination=tossupPagination,
+            bonusPagination=bonusPagination,
+            min_year=min_year,
+            max_year=max_year,
+        )
+        flags = query_flags(data)
+        pattern = compile_query(
+            data["queryString"],
+            exactPhrase=flags["exactPhrase"],
+            ignoreDiacritics=flags["ignoreDiacritics"],
+            ignoreWordOrder=flags["ignoreWordOrder"],
+            regex=flags["regex"],
+        )
+
+        results: dict[str, tuple[list, int]] = {}
+        for kind, table, page in (
+            ("tossup", self._tossups, data["tossupPagination"]),
+            ("bonus", self._bonuses, data["bonusPagination"]),
+        ):
+            if data["questionType"] not in (kind, "all"):
+                results[kind] = ([], 0)
+                continue
+            selected = table.filter(data)
+            if pattern is None:
+                found = selected.bit_count()
+                rows = _select(selected, page_ranks(found, page, data, flags))
+            else:
+                indices = self._search(kind, table, selected, data, flags, pattern)
+                found = len(indices)
+                rows = [indices[rank] for rank in page_ranks(found, page, data, flags)]
+            results[kind] = ([table.questions[row] for row in rows], found)
+
+        return QueryResponse(
+            tossups=results["tossup"][0],
+            bonuses=results["bonus"][0],
+            tossups_found=results["tossup"][1],
+            bonuses_found=results["bonus"][1],
+            query_string=data["queryString"],
+        )
+
+    def _search(
+        self: Self,
+        kind: str,
+        table: _QuestionTable,
+        selected: int,
+        data: dict,
+        flags: dict[str, bool],
+        pattern: re.Pattern,
+    ) -> list[int]:
+        """Return the selected questions in `table` that match the query string."""
+        candidates = None
+        if self.index is not None and not flags["regex"]:
+            candidates = self.index.search(
+                kind,
+                data["searchType"],
+                data["queryString"],
+                exactPhrase=flags["exactPhrase"],
+                ignoreWordOrder=flags["ignoreWordOrder"],
+            )
+        indices = (
+            iter_bits(selected)
+            if candidates is None
+            else filter_bits(selected, sorted(candidates))
+        )
+        return table.search(
+            indices,
+            pattern,
+            data["searchType"],
+            flags["ignoreDiacritics"],
+        )
+
+    def random_tossup(
+        self: Self,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        number: int = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+        seed: Optional[int] = None,
+    ) -> tuple[Tossup, ...]:
+        """Get random local tossups.
+
+        See `qbreader.Sync.random_tossup()` for the other parameters. Tossups are
+        drawn without replacement, so fewer than `number` are returned if fewer
+        match.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Seed for the draw. The same seed draws the same tossups from the same
+            questions.
+
+        Returns
+        -------
+        tuple[Tossup, ...]
+            A tuple of `Tossup` objects.
+        """
+        selected = self._tossups.filter(
+            random_params(
+                difficulties,
+                categories,
+                subcategories,
+                alternate_subcategories,
+                number,
+                min_year,
+                max_year,
+            )
+        )
+        return tuple(
+            cast(Tossup, self._tossups.questions[row])
+            for row in self._draw(selected, number, seed)
+        )
+
+    def random_bonus(
+        self: Self,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        number: int = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+        three_part_bonuses: bool = False,
+        seed: Optional[int] = None,
+    ) -> tuple[Bonus, ...]:
+        """Get random local bonuses.
+
+        See `qbreader.Sync.random_bonus()` for the other parameters. Bonuses are
+        drawn without replacement, so fewer than `number` are returned if fewer
+        match.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Seed for the draw. The same seed draws the same bonuses from the same
+            questions.
+
+        Returns
+        -------
+        tuple[Bonus, ...]
+            A tuple of `Bonus` objects.
+        """
+        selected = self._bonuses.filter(
+            random_params(
+                difficulties,
+                categories,
+                subcategories,
+                alternate_subcategories,
+                number,
+                min_year,
+                max_year,
+                three_part_bonuses,
+            )
+        )
+        if three_part_bonuses:
+            selected &= self._three_part_bonuses()
+        return tuple(
+            cast(Bonus, self._bonuses.questions[row])
+            for row in self._draw(selected, number, seed)
+        )
+
+    @staticmethod
+    def _draw(selected: int, number: int, seed: Optional[int]) -> list[int]:
+        """Draw up to `number` distinct rows from the bitmap `selected`.
+
+        Only ranks are sampled, and `select_bits` finds their rows without expanding
+        the rest of the bitmap, so the draw does not depend on how many questions
+        match.
+        """
+        found = selected.bit_count()
+        rng = random if seed is None else random.Random(seed)
+        return _select(selected, rng.sample(range(found), min(number, found)))
+
+    def _three_part_bonuses(self: Self) -> int:
+        """Return the bitmap of the bonuses with exactly three parts."""
+        if self._three_parts is None:
+            self._three_parts = int(
+                "".join(
+                    "1" if len(cast(Bonus, bonus).parts) == 3 else "0"
+                    for bonus in reversed(self._bonuses.questions)
+                )
+                or "0",
+                2,
+            )
+        return self._three_parts
+
+    def check_answer(self: Self, answerline: str, givenAnswer: str) -> AnswerJudgement:
+        """Judge an answer to be correct, incorrect, or prompt (can be directed).
+
+        See `qbreader.judge.check_answer()`, which judges answers like
+        `qbreader.Sync.check_answer()` without a network request.
+        """
+        return check_answer(answerline, givenAnswer)
+
+    def build_index(self: Self) -> SearchIndex:
+        """Build a `SearchIndex` of the local questions and search with it.
+
+        Returns
+        -------
+        SearchIndex
+            The new index, which can be saved with `SearchIndex.save()`.
+        """
+        self.index = SearchIndex.build(
+            cast(list[Tossup], self._tossups.questions),
+            cast(list[Bonus], self._bonuses.questions),
+        )
+        return self.index
+
+    def load_index(self: Self, path: Union[str, os.PathLike]) -> SearchIndex:
+        """Search with a `SearchIndex` saved by `SearchIndex.save()`.
+
+        Parameters
+        ----------
+        path : str | os.PathLike
+            The index file.
+
+        Returns
+        -------
+        SearchIndex
+            The loaded index.
+
+        Raises
+        ------
+        ValueError
+            If the index was built from different questions.
+        """
+        index = SearchIndex.load(path)
+        if index.fingerprint != self._fingerprint():
+            raise ValueError(
+                f"The search index {os.fspath(path)} does not match these questions."
+            )
+        self.index = index
+        return index
+
+    def rerank(
+        self: Self, response: QueryResponse, searchType: SearchType = "all"
+    ) -> QueryResponse:
+        """Order the questions of a query response by BM25 relevance.
+
+        Questions are scored against the response's query string with the term
+        statistics of the search index. Without one, an index is built for ranking
+        only, and searches keep scanning.
+        Local questions are scored from the index, and any other question, e.g. from
+        `qbreader.Sync.query()`, by tokenizing its text.
+
+        Parameters
+        ----------
+        response : QueryResponse
+            The response of a query.
+        searchType : SearchType, default = "all"
+            The ``searchType`` of the query.
+
+        Returns
+        -------
+        QueryResponse
+            A new response with the same questions, most relevant first. See
+            `qbreader.rank.BM25Ranker.rerank()`.
+        """
+        index = self.index
+        if self._ranker is None or index not in (None, self._ranker.index):
+            if index is None:
+                index = SearchIndex.build(
+                    cast(list[Tossup], self._tossups.questions),
+                    cast(list[Bonus], self._bonuses.questions),
+                )
+            self._ranker = BM25Ranker(index)
+        return self._ranker.rerank(
+            response,
+            searchType,
+            tossup_documents=[self._tossups.row(q) for q in response.tossups],
+            bonus_documents=[self._bonuses.row(q) for q in response.bonuses],
+        )
+
+    def _fingerprint(self: Self) -> int:
+        return fingerprint(
+            cast(list[Tossup], self._tossups.questions),
+            cast(list[Bonus], self._bonuses.questions),
+        )
+
+    def set_list(self: Self) -> tuple[str, ...]:
+        """Get a list of all the local sets.
+
+        Returns
+        -------
+        tuple[str, ...]
+            The names of the sets, sorted in reverse alphanumeric order like the API.
+        """
+        return tuple(sorted(self._packets, reverse=True))
+
+    def num_packets(self: Self, setName: str) -> int:
+        """Get the number of packets in a set.
+
+        Parameters
+        ----------
+        setName : str
+            The name of the set.
+
+        Returns
+        -------
+        int
+            The number of packets in the set.
+        """
+        if setName not in self._packets:
+            raise ValueError(f"Requested set, {setName}, not found.")
+        return max(self._packets[setName])
+
+    def packet(self: Self, setName: str, packetNumber: int) -> Packet:
+        """Get a specific packet from a set.
+
+        Parameters
+        ----------
+        setName : str
+            The name of the set. See `set_list()` for a list of valid set names.
+        packetNumber : int
+            The number of the packet in the set, starting from 1.
+
+        Returns
+        -------
+        Packet
+            A `Packet` object containing the packet's tossups and bonuses.
+        """
+        tossups, bonuses = self._packet(setName, packetNumber)
+        year = (tossups[0] if tossups else bonuses[0]).set.year
+        return Packet(
+            tossups=tossups,
+            bonuses=bonuses,
+            number=packetNumber,
+            name=setName,
+            year=year,
+        )
+
+    def packet_tossups(
+        self: Self, setName: str, packetNumber: int
+    ) -> tuple[Tossup, ...]:
+        """Get only tossups from a packet.
+
+        See `packet()` for the parameters.
+        """
+        return tuple(self._packet(setName, packetNumber)[0])
+
+    def packet_bonuses(
+        self: Self, setName: str, packetNumber: int
+    ) -> tuple[Bonus, ...]:
+        """Get only bonuses from a packet.
+
+        See `packet()` for the parameters.
+        """
+        return tuple(self._packet(setName, packetNumber)[1])
+
+    def _packet(
+        self: Self, setName: str, packetNumber: int
+    ) -> tuple[list[Tossup], list[Bonus]]:
+        if not isinstance(setName, str):
+            raise TypeError(f"setName must be a string, not {type(setName).__name__}.")
+
+        if not isinstance(packetNumber, int):
+            raise TypeError(
+                f"packetNumber must be an integer, not {type(packetNumber).__name__}."
+            )
+
+        packets = self._packets.get(setName, {})
+        if packetNumber not in packets:
+            raise ValueError(
+                f"packetNumber must be between 1 and {self.num_packets(setName)} "
+                + f"inclusive for {setName}."
+            )
+        return packets[packetNumber]
+
+
+__all__ = (
+    "Local",
+    "compile_query",
+)
@@ -0,0 +1,412 @@
+"""Compute statistics over a local corpus in parallel.
+
+`map_reduce()` splits a mirror store, a `qbreader.corpus.Corpus` or any iterable of
+questions into shards, maps every question of a shard, or the whole shard as a
+`qbreader.frame.QuestionFrame`, to values in a pool of worker processes, and
+combines the values with a `Reducer`:
+
+>>> from operator import attrgetter
+>>> from qbreader.mapreduce import Count, Mean, map_reduce
+>>> map_reduce(
+...     "qbreader-mirror",
+...     {"category": attrgetter("category"), "year": attrgetter("set.year")},
+...     {"category": Count(), "year": Count()},
+... )
+
+Workers are sent where their shard is, e.g. packet keys or a range of ordinals,
+rather than the questions themselves, and send back a single partial result, so
+little but the questions' decoding and mapping happens outside the workers. Shards
+are many and small, so that workers stay busy until the end.
+
+Mappers and reducers are pickled to reach the workers, so they must be defined at
+the top level of a module, or be picklable callables like `operator.attrgetter`.
+"""
+
+from __future__ import annotations
+
+import collections
+import math
+import os
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Optional, Self, Union
+
+from qbreader.corpus import Corpus
+from qbreader.frame import QuestionFrame
+from qbreader.local import Source, open_source
+from qbreader.mirror import DirectoryStore, SQLiteStore, Store
+from qbreader.types import Bonus, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+PACKETS_PER_SHARD = 32
+"""How many packets of a mirror store a shard holds by default."""
+
+QUESTIONS_PER_SHARD = 1024
+"""How many questions of a corpus or iterable a shard holds by default."""
+
+Mapper = Callable[[Any], Any]
+
+
+class Reducer(ABC):
+    """Base class of the ways to combine mapped values.
+
+    A reducer folds the values of each shard into a state with `add()`, combines
+    the states of shards with `merge()`, and turns the final state into a result
+    with `finish()`. States travel between processes, so they must be picklable.
+    """
+
+    @abstractmethod
+    def start(self: Self) -> Any:
+        """Return the state of no values."""
+
+    @abstractmethod
+    def add(self: Self, state: Any, values: Sequence[Any]) -> Any:
+        """Return a state with the values of a shard added."""
+
+    @abstractmethod
+    def merge(self: Self, state: Any, other: Any) -> Any:
+        """Return the state of the values of two states."""
+
+    def finish(self: Self, state: Any) -> Any:
+        """Return the result of a state."""
+        return state
+
+
+class Count(Reducer):
+    """Count how many times every value occurs.
+
+    The result is a `collections.Counter`, in the order values were first seen.
+    """
+
+    def start(self: Self) -> Counter:
+        """Return an empty counter."""
+        return Counter()
+
+    def add(self: Self, state: Counter, values: Sequence[Any]) -> Counter:
+        """Count the values of a shard."""
+        state.update(values)
+        return state
+
+    def merge(self: Self, state: Counter, other: Counter) -> Counter:
+        """Add the counts of another shard."""
+        state.update(other)
+        return state
+
+
+class TopK(Count):
+    """Find the most common values and how many times they occur.
+
+    The result is a list of pairs of a value and its count, most common first.
+
+    Parameters
+    ----------
+    k : int, default = 10
+        The most values to return.
+    """
+
+    def __init__(self: Self, k: int = 10):
+        if not isinstance(k, int) or isinstance(k, bool):
+            raise TypeError(f"k must be an int, not {type(k).__name__}.")
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        self.k: int = k
+
+    def finish(self: Self, state: Counter) -> list[tuple[Any, int]]:
+        """Return the `k` most common values."""
+        return state.most_common(self.k)
+
+
+class Histogram(Reducer):
+    """Count the numbers that fall between consecutive edges.
+
+    The result is a list of the counts of every bin ``[edges[i], edges[i + 1])``.
+    Numbers outside of the edges are not counted.
+
+    Parameters
+    ----------
+    edges : Sequence[float]
+        At least two increasing numbers.
+    """
+
+    def __init__(self: Self, edges: Sequence[float]):
+        self.edges: list[float] = list(edges)
+        if len(self.edges) < 2:
+            raise ValueError("edges must have at least two numbers.")
+        if any(a >= b for a, b in zip(self.edges, self.edges[1:])):
+            raise ValueError("edges must be increasing.")
+
+    def start(self: Self) -> list[int]:
+        """Return empty bins."""
+        return [0] * (len(self.edges) - 1)
+
+    def add(self: Self, state: list[int], values: Sequence[float]) -> list[int]:
+        """Count the numbers of a shard, at once with NumPy when it is installed."""
+        bins = len(state)
+        if np is not None:
+            positions = np.searchsorted(
+                self.edges, np.asarray(values, dtype=np.float64), side="right"
+            )
+            counts = np.bincount(positions, minlength=bins + 2)[1:][:bins]
+            return [a + b for a, b in zip(state, counts.tolist())]
+
+        for value in values:
+            position = bisect_right(self.edges, value) - 1
+            if 0 <= position < bins:
+                state[position] += 1
+        return state
+
+    def merge(self: Self, state: list[int], other: list[int]) -> list[int]:
+        """Add the bins of another shard."""
+        return [a + b for a, b in zip(state, other)]
+
+
+class Mean(Reducer):
+    """Average numbers.
+
+    The result is a float, which is NaN if there are no numbers.
+    """
+
+    def start(self: Self) -> tuple[float, int]:
+        """Return a sum and a count of zero."""
+        return 0.0, 0
+
+    def add(
+        self: Self, state: tuple[float, int], values: Sequence[float]
+    ) -> tuple[float, int]:
+        """Add the sum and count of the numbers of a shard."""
+        total, count = state
+        if np is not None:
+            numbers = np.asarray(values, dtype=np.float64)
+            return total + float(numbers.sum()), count + numbers.size
+        return total + math.fsum(values), count + len(values)
+
+    def merge(
+        self: Self, state: tuple[float, int], other: tuple[float, int]
+    ) -> tuple[float, int]:
+        """Add the sum and count of another shard."""
+        return state[0] + other[0], state[1] + other[1]
+
+    def finish(self: Self, state: tuple[float, int]) -> float:
+        """Return the mean."""
+        total, count = state
+        return total / count if count else math.nan
+
+
+def _shards(
+    source: Source, shard_size: Optional[int]
+) -> tuple[Any, Any, Iterator[Any]]:
+    """Return a source, how workers open it, and the items of each of its shards.
+
+    Workers open stores and corpora from their files, while the shards of an
+    iterable are the questions themselves.
+    """
+    source = open_source(source)
+    if isinstance(source, Store):
+        sets = source.load_state()["sets"]
+        keys = [
+            (setName, packetNumber)
+            for setName in source.set_names()
+            for packetNumber in range(1, sets[setName]["num_packets"] + 1)
+        ]
+        opener: Any = source
+        if type(source) is DirectoryStore:
+            opener = (DirectoryStore, (source.path,))
+        elif type(source) is SQLiteStore:
+            opener = (SQLiteStore, (source.path, True, source.mmap_size))
+        return source, opener, _chunks(keys, shard_size or PACKETS_PER_SHARD)
+
+    if isinstance(source, Corpus):
+        size = shard_size or QUESTIONS_PER_SHARD
+        ranges = (
+            range(start, min(start + size, len(source)))
+            for start in range(0, len(source), size)
+        )
+        return source, (Corpus, (source.path,)), ranges
+
+    return None, None, _chunks(source, shard_size or QUESTIONS_PER_SHARD)
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# the stores and corpora opened by a worker process, reused by its later shards
+_opened: dict[tuple, Any] = {}
+
+
+def _open(opener: Any) -> Any:
+    """Return the source of a shard in a worker process."""
+    if not isinstance(opener, tuple):
+        return opener
+    source = _opened.get(opener)
+    if source is None:
+        factory, args = opener
+        source = _opened[opener] = factory(*args)
+    return source
+
+
+def _questions(source: Any, items: Iterable[Any]) -> list[Union[Tossup, Bonus]]:
+    """Return the questions of a shard."""
+    if isinstance(source, Store):
+        questions: list[Union[Tossup, Bonus]] = []
+        for setName, packetNumber in items:
+            packet = source.get_packet(setName, packetNumber)
+            questions.extend(packet.tossups)
+            questions.extend(packet.bonuses)
+        return questions
+    if isinstance(source, Corpus):
+        return [source[ordinal] for ordinal in items]
+    return list(items)
+
+
+def _map_shard(
+    source: Any,
+    items: Iterable[Any],
+    mappers: dict[Any, Mapper],
+    reducers: dict[Any, Reducer],
+    batched: bool,
+) -> dict[Any, Any]:
+    """Return the state of every reducer for the values of a shard."""
+    questions = _questions(source, items)
+    batch = QuestionFrame(questions) if batched else None
+    states = {}
+    for name, mapper in mappers.items():
+        if batch is not None:
+            values = mapper(batch)
+        else:
+            values = [value for value in map(mapper, questions) if value is not None]
+        reducer = reducers[name]
+        states[name] = reducer.add(reducer.start(), values)
+    return states
+
+
+def _work(
+    opener: Any,
+    items: Iterable[Any],
+    mappers: dict[Any, Mapper],
+    reducers: dict[Any, Reducer],
+    batched: bool,
+) -> dict[Any, Any]:
+    """Map a shard in a worker process."""
+    return _map_shard(_open(opener), items, mappers, reducers, batched)
+
+
+def map_reduce(
+    source: Source,
+    mapper: Union[Mapper, Mapping[Any, Mapper]],
+    reducer: Union[Reducer, Mapping[Any, Reducer]],
+    batched: bool = False,
+    shard_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Any:
+    """Map the questions of a source to values and reduce them in worker processes.
+
+    Parameters
+    ----------
+    source : Store | Corpus | str | os.PathLike | Iterable[Tossup | Bonus]
+        A mirror store, the directory of a `DirectoryStore`, a corpus file, or any
+        iterable of questions, which are sent to the workers shard by shard.
+    mapper : Callable | Mapping[Any, Callable]
+        Maps a `Tossup` or `Bonus` to a value, or to None to skip the question.
+        With `batched`, it maps the `QuestionFrame` of a shard to a sequence or
+        array of values instead. A mapping of mappers computes several results in
+        one pass, each reduced by the reducer of the same key.
+    reducer : Reducer | Mapping[Any, Reducer]
+        Combines the values, e.g. `Count`, `TopK`, `Histogram` or `Mean`.
+    batched : bool, default = False
+        Whether mappers take a whole shard as a `QuestionFrame`.
+    shard_size : int, optional
+        How many packets of a store, or questions of a corpus or iterable, a shard
+        holds. Defaults to `PACKETS_PER_SHARD` or `QUESTIONS_PER_SHARD`.
+    workers : int, optional
+        The number of worker processes. Defaults to `os.cpu_count()`. With a single
+        worker and no `executor`, shards are mapped in this process.
+    executor : concurrent.futures.Executor, optional
+        An existing pool to use instead of creating one. It is not shut down.
+
+    Returns
+    -------
+    Any
+        The result of the reducer, or a dict of the result of every reducer if
+        they are given as a mapping.
+    """
+    mappers: dict[Any, Mapper]
+    reducers: dict[Any, Reducer]
+    several = isinstance(reducer, Mapping)
+    if isinstance(mapper, Mapping) and isinstance(reducer, Mapping):
+        mappers, reducers = dict(mapper), dict(reducer)
+    elif not isinstance(mapper, Mapping) and not isinstance(reducer, Mapping):
+        mappers, reducers = {None: mapper}, {None: reducer}
+    else:
+        raise TypeError("mapper and reducer must both be mappings, or neither.")
+    if mappers.keys() != reducers.keys():
+        raise ValueError("mapper and reducer must have the same keys.")
+    for value in reducers.values():
+        if not isinstance(value, Reducer):
+            raise TypeError(
+                f"reducers must be Reducer objects, not {type(value).__name__}."
+            )
+    if shard_size is not None and shard_size < 1:
+        raise ValueError("shard_size must be at least 1.")
+    if workers is not None:
+        if not isinstance(workers, int) or isinstance(workers, bool):
+            raise TypeError(f"workers must be an int, not {type(workers).__name__}.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+
+    source, opener, shards = _shards(source, shard_size)
+    workers = workers or os.cpu_count() or 1
+    states = {name: reducers[name].start() for name in reducers}
+
+    def merge(shard_states: dict[Any, Any]) -> None:
+        for name, state in shard_states.items():
+            states[name] = reducers[name].merge(states[name], state)
+
+    if workers == 1 and executor is None:
+        for items in shards:
+            merge(_map_shard(source, items, mappers, reducers, batched))
+    else:
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        # a few shards per worker are in flight, so that an iterable source is
+        # never read far ahead of the workers
+        pending: collections.deque[Future] = collections.deque()
+        try:
+            for items in shards:
+                pending.append(
+                    pool.submit(_work, opener, items, mappers, reducers, batched)
+                )
+                if len(pending) >= 2 * workers:
+                    merge(pending.popleft().result())
+            while pending:
+                merge(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is None:
+                pool.shutdown(cancel_futures=True)
+
+    results = {name: reducers[name].finish(state) for name, state in states.items()}
+    return results if several else results[None]
+
+
+__all__ = (
+    "Count",
+    "Histogram",
+    "Mean",
+    "PACKETS_PER_SHARD",
+    "QUESTIONS_PER_SHARD",
+    "Reducer",
+    "TopK",
+    "map_reduce",
+)
@@ -0,0 +1,21 @@
+"""A resumable local mirror of the whole qbreader database.
+
+>>> from qbreader.mirror import Mirror
+>>> Mirror("qbreader-mirror", concurrency=4, rate_limit=20, progress=print).run()
+
+Packets are stored in a `Store`, by default a `DirectoryStore`, from which they can be
+read back without network access. A `SQLiteStore` keeps the mirror in one database
+file that can also be queried in place.
+"""
+
+from qbreader.mirror.mirror import Mirror, SyncProgress
+from qbreader.mirror.sqlite import SQLiteStore
+from qbreader.mirror.store import DirectoryStore, Store
+
+__all__ = (
+    "Mirror",
+    "SyncProgress",
+    "Store",
+    "DirectoryStore",
+    "SQLiteStore",
+)
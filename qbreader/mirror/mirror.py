@@ -0,0 +1,235 @@
+"""Download the qbreader database into a local store, resumably and incrementally."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor
+from typing import Any, Optional, Self, Union
+
+import qbreader._parallel as parallel
+from qbreader.asynchronous import Async
+from qbreader.mirror.store import DirectoryStore, Store
+
+
+class SyncProgress:
+    """Progress and throughput of a `Mirror.sync()` run.
+
+    A snapshot is passed to the progress callback after every stored packet, and the
+    final one is returned by `Mirror.sync()`.
+    """
+
+    def __init__(self: Self):
+        self.sets_total: int = 0
+        self.sets_done: int = 0
+        self.packets_total: int = 0
+        self.packets_done: int = 0
+        self.bytes_downloaded: int = 0
+        self.requests: int = 0
+        self.pending_sets: list[str] = []
+        self.started: float = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self: Self) -> float:
+        """Seconds since the sync started, or its total duration once finished."""
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def packets_per_second(self: Self) -> float:
+        """Average number of packets stored per second."""
+        return self.packets_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self: Self) -> float:
+        """Average number of response bytes downloaded per second."""
+        return self.bytes_downloaded / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self: Self) -> str:
+        """Return a one-line summary of the progress."""
+        return (
+            f"{self.sets_done}/{self.sets_total} sets, "
+            + f"{self.packets_done}/{self.packets_total} packets, "
+            + f"{self.bytes_downloaded / 1e6:.1f} MB in {self.elapsed:.1f} s "
+            + f"({self.packets_per_second:.1f} packets/s, "
+            + f"{self.bytes_per_second / 1e6:.2f} MB/s)"
+        )
+
+
+class _RateLimiter:
+    """Space out request start times to at most `rate` per second."""
+
+    def __init__(self: Self, rate: Optional[float]):
+        self.interval: float = 1 / rate if rate else 0.0
+        self._next: float = 0.0
+
+    async def wait(self: Self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class Mirror:
+    """A local copy of every set in the qbreader database.
+
+    `sync()` walks `Async.set_list()`, `Async.num_packets()` and the packet endpoint
+    to download every packet into `store`. Progress is checkpointed in the store: a
+    set is only marked complete once all of its packets are stored, and packets that
+    are already stored are never downloaded again. An interrupted sync therefore
+    resumes where it stopped, and later syncs only fetch sets that are new in the set
+    list.
+
+    Parameters
+    ----------
+    store : Store | str | os.PathLike
+        Where to keep the mirror. A path is opened as a `DirectoryStore`.
+    client : Async, optional
+        The client to download with. If none is provided, one is created and closed
+        for each sync.
+    concurrency : int, default = 8
+        The maximum number of requests in flight at once.
+    rate_limit : float, optional
+        The maximum number of requests started per second. Unlimited by default.
+    workers : int, optional
+        The number of processes that decode packets. Defaults to the number of CPUs.
+    executor : concurrent.futures.Executor, optional
+        An existing process pool to decode packets in instead of creating one.
+    progress : Callable[[SyncProgress], None], optional
+        Called after every stored packet.
+    """
+
+    def __init__(
+        self: Self,
+        store: Union[Store, str, os.PathLike],
+        client: Optional[Async] = None,
+        concurrency: int = 8,
+        rate_limit: Optional[float] = None,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        progress: Optional[Callable[[SyncProgress], None]] = None,
+    ):
+        parallel.check_workers(workers, concurrency)
+        if rate_limit is not None:
+            if not isinstance(rate_limit, (int, float)) or isinstance(rate_limit, bool):
+                raise TypeError(
+                    f"rate_limit must be a number, not {type(rate_limit).__name__}."
+                )
+            if rate_limit <= 0:
+                raise ValueError("rate_limit must be positive.")
+
+        self.store: Store = store if isinstance(store, Store) else DirectoryStore(store)
+        self.client: Optional[Async] = client
+        self.concurrency: int = concurrency
+        self.rate_limit: Optional[float] = rate_limit
+        self.workers: Optional[int] = workers
+        self.executor: Optional[Executor] = executor
+        self.progress: Optional[Callable[[SyncProgress], None]] = progress
+
+    def run(self: Self) -> SyncProgress:
+        """Run `sync()` to completion in a new event loop."""
+        return asyncio.run(self.sync())
+
+    async def sync(self: Self) -> SyncProgress:
+        """Download every set that is not yet completely mirrored.
+
+        Returns
+        -------
+        SyncProgress
+            The final progress of the sync.
+        """
+        if self.client is not None:
+            return await self._sync(self.client)
+        async with await Async.create() as client:
+            return await self._sync(client)
+
+    async def _sync(self: Self, client: Async) -> SyncProgress:
+        limiter = _RateLimiter(self.rate_limit)
+        progress = SyncProgress()
+        state = self.store.load_state()
+        sets: dict[str, dict[str, Any]] = state["sets"]
+
+        await limiter.wait()
+        set_list = await client.set_list()
+        progress.requests += 1
+        pending = [name for name in set_list if not sets.get(name, {}).get("complete")]
+
+        # learn the size of every pending set
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def count(setName: str) -> None:
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    number = await client.num_packets(setName)
+                except ValueError:  # the set was removed since set_list()
+                    return
+                finally:
+                    progress.requests += 1
+            sets[setName] = {"num_packets": number, "complete": False}
+
+        await asyncio.gather(*(count(name) for name in pending if name not in sets))
+        pending = [name for name in pending if name in sets]
+        progress.pending_sets = pending
+        progress.sets_total = len(pending)
+
+        missing: list[tuple[str, int]] = []
+        remaining: dict[str, int] = {}
+        for setName in pending:
+            numbers = [
+                number
+                for number in range(1, sets[setName]["num_packets"] + 1)
+                if not self.store.has_packet(setName, number)
+            ]
+            missing += [(setName, number) for number in numbers]
+            remaining[setName] = len(numbers)
+            if not numbers:
+                sets[setName]["complete"] = True
+                progress.sets_done += 1
+        progress.packets_total = len(missing)
+        self.store.save_state(state)
+
+        async def fetch(packet: tuple[str, int]) -> bytes:
+            setName, packetNumber = packet
+            await limiter.wait()
+            body = await client.packet_body(setName, packetNumber)
+            progress.requests += 1
+            progress.bytes_downloaded += len(body)
+            return body
+
+        results = parallel.pipeline(
+            missing,
+            fetch,
+            parallel.decode_mirror_packet,
+            lambda packet: (packet[1],),
+            self.workers,
+            self.concurrency,
+            self.executor,
+        )
+        index = 0
+        async for data, ids in results:
+            setName, packetNumber = missing[index]
+            index += 1
+            self.store.put_packet(setName, packetNumber, data, ids)
+            progress.packets_done += 1
+            remaining[setName] -= 1
+            if remaining[setName] == 0:
+                sets[setName]["complete"] = True
+                progress.sets_done += 1
+                self.store.save_state(state)
+            if self.progress is not None:
+                self.progress(progress)
+
+        progress.finished = time.monotonic()
+        return progress
+
+
+__all__ = (
+    "Mirror",
+    "SyncProgress",
+)
@@ -0,0 +1,956 @@
+"""A mirror store in a single SQLite database that can be queried in place."""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from itertools import zip_longest
+from typing import Any, Optional, Self, Union
+
+import qbreader._api_utils as api_utils
+from qbreader._query import (
+    compile_query,
+    enum_set,
+    page_ranks,
+    query_flags,
+    random_params,
+)
+from qbreader._text import strip_diacritics
+from qbreader.mirror.store import STATE_VERSION, Store
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    DifficultyModifier,
+    Packet,
+    PacketMetadata,
+    QueryResponse,
+    QuestionType,
+    SearchType,
+    SetMetadata,
+    Subcategory,
+    Tossup,
+    UnnormalizedAlternateSubcategory,
+    UnnormalizedCategory,
+    UnnormalizedDifficulty,
+    UnnormalizedSubcategory,
+    Year,
+)
+
+SCHEMA_VERSION = 2
+"""Version of the database schema, kept in ``PRAGMA user_version``."""
+
+_TOKENIZER = "unicode61 remove_diacritics 2"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    json TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sets (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    year INTEGER NOT NULL,
+    set_id TEXT,
+    standard INTEGER
+);
+CREATE INDEX IF NOT EXISTS sets_year ON sets (year);
+
+CREATE TABLE IF NOT EXISTS packets (
+    id INTEGER PRIMARY KEY,
+    set_id INTEGER NOT NULL REFERENCES sets (id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,
+    packet_id TEXT,
+    name TEXT,
+    UNIQUE (set_id, number)
+);
+
+CREATE TABLE IF NOT EXISTS tossups (
+    id INTEGER PRIMARY KEY,
+    packet_id INTEGER NOT NULL REFERENCES packets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    question_id TEXT,
+    question TEXT NOT NULL,
+    question_sanitized TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    answer_sanitized TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    alternate_subcategory TEXT
+);
+CREATE INDEX IF NOT EXISTS tossups_packet ON tossups (packet_id, position);
+CREATE INDEX IF NOT EXISTS tossups_category ON tossups (category, subcategory);
+CREATE INDEX IF NOT EXISTS tossups_filters ON tossups (
+    packet_id, difficulty, category, subcategory, alternate_subcategory, number
+);
+
+CREATE TABLE IF NOT EXISTS bonuses (
+    id INTEGER PRIMARY KEY,
+    packet_id INTEGER NOT NULL REFERENCES packets (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    question_id TEXT,
+    leadin TEXT NOT NULL,
+    leadin_sanitized TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    alternate_subcategory TEXT
+);
+CREATE INDEX IF NOT EXISTS bonuses_packet ON bonuses (packet_id, position);
+CREATE INDEX IF NOT EXISTS bonuses_category ON bonuses (category, subcategory);
+CREATE INDEX IF NOT EXISTS bonuses_filters ON bonuses (
+    packet_id, difficulty, category, subcategory, alternate_subcategory, number
+);
+
+CREATE TABLE IF NOT EXISTS bonus_parts (
+    id INTEGER PRIMARY KEY,
+    bonus_id INTEGER NOT NULL REFERENCES bonuses (id) ON DELETE CASCADE,
+    part INTEGER NOT NULL,
+    text TEXT,
+    text_sanitized TEXT,
+    answer TEXT,
+    answer_sanitized TEXT,
+    value INTEGER,
+    difficulty_modifier TEXT,
+    UNIQUE (bonus_id, part)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tossups_fts USING fts5 (
+    question_sanitized, answer_sanitized,
+    content = 'tossups', content_rowid = 'id',
+    tokenize = '{_TOKENIZER}', prefix = '2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS bonuses_fts USING fts5 (
+    leadin_sanitized,
+    content = 'bonuses', content_rowid = 'id',
+    tokenize = '{_TOKENIZER}', prefix = '2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS bonus_parts_fts USING fts5 (
+    text_sanitized, answer_sanitized,
+    content = 'bonus_parts', content_rowid = 'id',
+    tokenize = '{_TOKENIZER}', prefix = '2 3'
+);
+"""
+
+_FTS_TABLES = {
+    "tossups_fts": ("tossups", ("question_sanitized", "answer_sanitized")),
+    "bonuses_fts": ("bonuses", ("leadin_sanitized",)),
+    "bonus_parts_fts": ("bonus_parts", ("text_sanitized", "answer_sanitized")),
+}
+
+# keep the external-content FTS tables in sync with the tables they index
+_TRIGGERS = "".join(
+    f"""
+CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {fts} (rowid, {", ".join(columns)})
+    VALUES (new.id, {", ".join(f"new.{column}" for column in columns)});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {fts} ({fts}, rowid, {", ".join(columns)})
+    VALUES ('delete', old.id, {", ".join(f"old.{column}" for column in columns)});
+END;
+"""
+    for fts, (table, columns) in _FTS_TABLES.items()
+)
+
+
+# the sets that the checkpoint state marks as complete
+_COMPLETE = """
+s.name IN (
+    SELECT key FROM json_each((SELECT json FROM state), '$.sets')
+    WHERE json_extract(value, '$.complete')
+)
+"""
+
+_TOSSUP_COLUMNS = """
+q.id, q.question, q.question_sanitized, q.answer, q.answer_sanitized,
+q.difficulty, q.category, q.subcategory, q.alternate_subcategory, q.number,
+p.id, p.packet_id, p.name, p.number, s.set_id, s.name, s.year, s.standard
+"""
+_BONUS_COLUMNS = """
+q.id, q.leadin, q.leadin_sanitized,
+q.difficulty, q.category, q.subcategory, q.alternate_subcategory, q.number,
+p.id, p.packet_id, p.name, p.number, s.set_id, s.name, s.year, s.standard
+"""
+_FROM = """
+FROM {table} q
+JOIN packets p ON p.id = q.packet_id
+JOIN sets s ON s.id = p.set_id
+"""
+
+
+def fts_query(
+    queryString: str, exactPhrase: bool = False, ignoreWordOrder: bool = False
+) -> Optional[str]:
+    """Translate a literal `api/query` query string into an FTS5 query.
+
+    The FTS5 query finds every row that the query string can match, and maybe
+    more. A word at the start of the query may be the end of a longer word, and a
+    word at the end may be the start of one, unless `exactPhrase` is set. The
+    former cannot be looked up in FTS5 and the latter become prefix queries.
+
+    Returns
+    -------
+    str | None
+        The FTS5 query, or None if no word of the query can be looked up.
+    """
+    phrases = queryString.split() if ignoreWordOrder else [queryString.strip()]
+    terms = []
+    for phrase in phrases:
+        tokens = _tokens(phrase)
+        for i, (start, end) in enumerate(tokens):
+            starts = i > 0 or start > 0 or exactPhrase
+            ends = i < len(tokens) - 1 or end < len(phrase) or exactPhrase
+            if starts:
+                terms.append(f'"{phrase[start:end]}"' + ("" if ends else " *"))
+    return " AND ".join(terms) if terms else None
+
+
+def _tokens(text: str) -> list[tuple[int, int]]:
+    """Return the spans of the words of `text`, as the FTS5 tokenizer splits it.
+
+    Letters, numbers, marks and private use characters make up words, and every
+    other character separates them.
+    """
+    spans = []
+    start = None
+    for i, char in enumerate(f"{text} "):
+        if unicodedata.category(char)[0] in "LNM" or unicodedata.category(char) == "Co":
+            if start is None:
+                start = i
+        elif start is not None:
+            spans.append((start, i))
+            start = None
+    return spans
+
+
+class SQLiteStore(Store):
+    """Store a mirror in a single SQLite database file.
+
+    Sets, packets, tossups, bonuses and bonus parts are kept in normalized tables,
+    with indexes on difficulty, category and year and FTS5 indexes over the
+    sanitized text. Questions can be searched with `query()`, `random_tossup()` and
+    `random_bonus()` without loading the database into memory, like `qbreader.Local`
+    does.
+
+    The database uses write-ahead logging, so one writer and any number of readers
+    in other processes can use it at once. Every thread and process gets its own
+    connection, so a store can be created before a server forks its workers. Reads
+    go through a memory map, which lets processes share the operating system's page
+    cache.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The database file. It is created if it does not exist, unless `readonly`.
+    readonly : bool, default = False
+        Open the database read-only, e.g. in web server workers.
+    mmap_size : int, default = 1 << 30
+        How many bytes of the database to memory map.
+    """
+
+    def __init__(
+        self: Self,
+        path: Union[str, os.PathLike],
+        readonly: bool = False,
+        mmap_size: int = 1 << 30,
+    ):
+        self.path: str = os.fspath(path)
+        self.readonly: bool = readonly
+        self.mmap_size: int = mmap_size
+        self._local = threading.local()
+
+        db = self._connection()
+        version = self._version(db)
+        if version == 0 and not readonly:
+            # the schema is idempotent, so racing writers can both run it
+            db.executescript(
+                "BEGIN IMMEDIATE;"
+                + _SCHEMA
+                + _TRIGGERS
+                + f"PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;"
+            )
+            version = self._version(db)
+        if version == 1 and not readonly:
+            # version 1 did not keep the _id of questions
+            with self._transaction() as db:
+                if self._version(db) == 1:
+                    db.execute("ALTER TABLE tossups ADD COLUMN question_id TEXT")
+                    db.execute("ALTER TABLE bonuses ADD COLUMN question_id TEXT")
+                    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            version = self._version(db)
+        if version != SCHEMA_VERSION:
+            raise ValueError(
+                f"Unsupported mirror schema version {version} in {self.path}."
+            )
+
+    @staticmethod
+    def _version(db: sqlite3.Connection) -> int:
+        return db.execute("PRAGMA user_version").fetchone()[0]
+
+    def _connection(self: Self) -> sqlite3.Connection:
+        """Return the connection of this thread and process."""
+        if getattr(self._local, "pid", None) != os.getpid():
+            if self.readonly:
+                uri = "file:" + self.path.replace("?", "%3F").replace("#", "%23")
+                db = sqlite3.connect(
+                    uri + "?mode=ro", uri=True, isolation_level=None, timeout=30
+                )
+            else:
+                db = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+                db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA foreign_keys = ON")
+            db.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    @contextmanager
+    def _transaction(self: Self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, rolling it back if it fails."""
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def close(self: Self) -> None:
+        """Close the connection of this thread, which is reopened if needed."""
+        if getattr(self._local, "pid", None) == os.getpid():
+            self._local.db.close()
+        self._local.pid = None
+
+    def load_state(self: Self) -> dict[str, Any]:
+        """Return the checkpoint state, or an empty state if there is none."""
+        row = self._connection().execute("SELECT json FROM state").fetchone()
+        if row is None:
+            return self.empty_state()
+        state = json.loads(row[0])
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(
+                f"Unsupported mirror state version {state.get('version')!r} in "
+                + f"{self.path}."
+            )
+        return state
+
+    def save_state(self: Self, state: dict[str, Any]) -> None:
+        """Durably replace the checkpoint state."""
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO state (id, json) VALUES (0, ?)",
+                (json.dumps(state, ensure_ascii=False),),
+            )
+        # keep the planner's statistics current as sets are added
+        db.execute("PRAGMA optimize")
+
+    def has_packet(self: Self, setName: str, packetNumber: int) -> bool:
+        """Return whether a packet has been stored."""
+        return self._packet_row(setName, packetNumber) is not None
+
+    def _packet_row(self: Self, setName: str, packetNumber: int) -> Optional[tuple]:
+        return (
+            self._connection()
+            .execute(
+                "SELECT p.id, p.packet_id, p.name, p.number, s.set_id, s.name, s.year,"
+                + " s.standard FROM packets p JOIN sets s ON s.id = p.set_id"
+                + " WHERE s.name = ? AND p.number = ?",
+                (setName, packetNumber),
+            )
+            .fetchone()
+        )
+
+    def put_packet(
+        self: Self,
+        setName: str,
+        packetNumber: int,
+        data: bytes,
+        ids: Sequence[str] = (),
+    ) -> None:
+        """Durably store the output of `Packet.to_bytes()` for a packet.
+
+        The packet is split into rows of the normalized tables, replacing any
+        packet stored before under the same set name and number. `ids` are the
+        ``_id`` of its tossups and then its bonuses in the qbreader database, if
+        known. Raises `ValueError` if there are ids but not one for every question.
+        """
+        packet = Packet.from_bytes(data)
+        questions: list[Union[Tossup, Bonus]] = [*packet.tossups, *packet.bonuses]
+        if ids and len(ids) != len(questions):
+            raise ValueError("ids must have one _id for every question of the packet.")
+        question_ids = [_id or None for _id in ids] or [None] * len(questions)
+        metadata = questions[0] if questions else None
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO sets (name, year, set_id, standard) VALUES (?, ?, ?, ?)"
+                + " ON CONFLICT (name) DO UPDATE SET year = excluded.year,"
+                + " set_id = excluded.set_id, standard = excluded.standard",
+                (
+                    setName,
+                    metadata.set.year if metadata else packet.year,
+                    metadata.set._id if metadata else None,
+                    metadata.set.standard if metadata else None,
+                ),
+            )
+            db.execute(
+                "DELETE FROM packets WHERE number = ?"
+                + " AND set_id = (SELECT id FROM sets WHERE name = ?)",
+                (packetNumber, setName),
+            )
+            packet_id = db.execute(
+                "INSERT INTO packets (set_id, number, packet_id, name)"
+                + " SELECT id, ?, ?, ? FROM sets WHERE name = ?",
+                (
+                    packetNumber,
+                    metadata.packet._id if metadata else None,
+                    metadata.packet.name if metadata else None,
+                    setName,
+                ),
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO tossups (packet_id, position, number, question_id,"
+                + " question, question_sanitized, answer, answer_sanitized,"
+                + " difficulty, category, subcategory, alternate_subcategory)"
+                + " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        packet_id,
+                        position,
+                        tossup.number,
+                        question_ids[position],
+                        tossup.question,
+                        tossup.question_sanitized,
+                        tossup.answer,
+                        tossup.answer_sanitized,
+                        int(tossup.difficulty),
+                        str(tossup.category),
+                        str(tossup.subcategory),
+                        tossup.alternate_subcategory,
+                    )
+                    for position, tossup in enumerate(packet.tossups)
+                ),
+            )
+            for position, bonus in enumerate(packet.bonuses):
+                bonus_id = db.execute(
+                    "INSERT INTO bonuses (packet_id, position, number, question_id,"
+                    + " leadin, leadin_sanitized, difficulty, category, subcategory,"
+                    + " alternate_subcategory) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        packet_id,
+                        position,
+                        bonus.number,
+                        question_ids[len(packet.tossups) + position],
+                        bonus.leadin,
+                        bonus.leadin_sanitized,
+                        int(bonus.difficulty),
+                        str(bonus.category),
+                        str(bonus.subcategory),
+                        bonus.alternate_subcategory,
+                    ),
+                ).lastrowid
+                db.executemany(
+                    "INSERT INTO bonus_parts (bonus_id, part, text, text_sanitized,"
+                    + " answer, answer_sanitized, value, difficulty_modifier)"
+                    + " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (bonus_id, part, *columns)
+                        for part, columns in enumerate(
+                            zip_longest(
+                                bonus.parts,
+                                bonus.parts_sanitized,
+                                bonus.answers,
+                                bonus.answers_sanitized,
+                                bonus.values or (),
+                                bonus.difficultyModifiers or (),
+                            )
+                        )
+                    ),
+                )
+
+    def get_packet_bytes(self: Self, setName: str, packetNumber: int) -> bytes:
+        """Return the stored bytes of a packet, raising `KeyError` if missing."""
+        return self.get_packet(setName, packetNumber).to_bytes()
+
+    def get_packet_ids(self: Self, setName: str, packetNumber: int) -> list[str]:
+        """Return the ``_id`` of the tossups and then the bonuses of a stored packet.
+
+        The ``_id`` of a question is an empty string if it was not stored. Raises
+        `KeyError` if the packet is missing.
+        """
+        row = self._packet_row(setName, packetNumber)
+        if row is None:
+            raise KeyError((setName, packetNumber))
+        return [
+            question_id or ""
+            for table in ("tossups", "bonuses")
+            for (question_id,) in self._connection().execute(
+                f"SELECT question_id FROM {table} WHERE packet_id = ?"
+                + " ORDER BY position",
+                (row[0],),
+            )
+        ]
+
+    def get_packet(self: Self, setName: str, packetNumber: int) -> Packet:
+        """Return a stored packet, raising `KeyError` if missing."""
+        row = self._packet_row(setName, packetNumber)
+        if row is None:
+            raise KeyError((setName, packetNumber))
+        packet_id = row[0]
+        tossups = self._tossups(
+            f"SELECT {_TOSSUP_COLUMNS} {_FROM.format(table='tossups')}"
+            + " WHERE q.packet_id = ? ORDER BY q.position",
+            (packet_id,),
+        )
+        bonuses = self._bonuses(
+            f"SELECT {_BONUS_COLUMNS} {_FROM.format(table='bonuses')}"
+            + " WHERE q.packet_id = ? ORDER BY q.position",
+            (packet_id,),
+        )
+        return Packet(
+            tossups=tossups,
+            bonuses=bonuses,
+            number=packetNumber,
+            name=setName,
+            year=row[6],
+        )
+
+    def _tossups(self: Self, sql: str, parameters: tuple) -> list[Tossup]:
+        """Create the tossups of the rows selected by `sql`."""
+        metadata = _Metadata()
+        return [
+            Tossup(
+                question=row[1],
+                question_sanitized=row[2],
+                answer=row[3],
+                answer_sanitized=row[4],
+                difficulty=Difficulty(str(row[5])),
+                category=Category(row[6]),
+                subcategory=Subcategory(row[7]),
+                alternate_subcategory=(
+                    AlternateSubcategory(row[8]) if row[8] else None
+                ),
+                number=row[9],
+                packet=metadata.packet(row),
+                set=metadata.set(row),
+            )
+            for row in self._connection().execute(sql, parameters)
+        ]
+
+    def _bonuses(self: Self, sql: str, parameters: tuple) -> list[Bonus]:
+        """Create the bonuses of the rows selected by `sql`, with their parts."""
+        db = self._connection()
+        rows = db.execute(sql, parameters).fetchall()
+        parts: dict[int, list[tuple]] = {row[0]: [] for row in rows}
+        for part in db.execute(
+            "SELECT bonus_id, text, text_sanitized, answer, answer_sanitized, value,"
+            + " difficulty_modifier FROM bonus_parts"
+            + " WHERE bonus_id IN (SELECT value FROM json_each(?)) ORDER BY part",
+            (json.dumps(list(parts)),),
+        ):
+            parts[part[0]].append(part)
+
+        metadata = _Metadata()
+        bonuses = []
+        for row in rows:
+            columns = [
+                [value for value in column if value is not None]
+                for column in zip(*parts[row[0]])
+            ] or [[]] * 7
+            bonuses.append(
+                Bonus(
+                    leadin=row[1],
+                    leadin_sanitized=row[2],
+                    parts=columns[1],
+                    parts_sanitized=columns[2],
+                    answers=columns[3],
+                    answers_sanitized=columns[4],
+                    values=columns[5] or None,
+                    difficultyModifiers=[DifficultyModifier(m) for m in columns[6]]
+                    or None,
+                    difficulty=Difficulty(str(row[3])),
+                    category=Category(row[4]),
+                    subcategory=Subcategory(row[5]),
+                    alternate_subcategory=(
+                        AlternateSubcategory(row[6]) if row[6] else None
+                    ),
+                    number=row[7],
+                    packet=metadata.packet(row),
+                    set=metadata.set(row),
+                )
+            )
+        return bonuses
+
+    def _load(self: Self, kind: str, ids: list[int]) -> list[Union[Tossup, Bonus]]:
+        """Load questions by id, in the order of `ids`."""
+        table, columns = _TABLES[kind]
+        load = self._tossups if kind == "tossup" else self._bonuses
+        return list(
+            load(
+                f"SELECT {columns} {_FROM.format(table=table)}"
+                + " JOIN json_each(?) j ON j.value = q.id ORDER BY j.key",
+                (json.dumps(ids),),
+            )
+        )
+
+    def _filter(self: Self, data: dict) -> tuple[list[str], list[Any]]:
+        """Return the SQL conditions and parameters of the filters of a query."""
+        conditions = [_COMPLETE, "s.year BETWEEN ? AND ?"]
+        parameters: list[Any] = [data["minYear"], data["maxYear"]]
+        for column, key, enum_type, value in (
+            ("difficulty", "difficulties", Difficulty, int),
+            ("category", "categories", Category, str),
+            ("subcategory", "subcategories", Subcategory, str),
+            (
+                "alternate_subcategory",
+                "alternateSubcategories",
+                AlternateSubcategory,
+                str,
+            ),
+        ):
+            values = enum_set(data.get(key), enum_type)
+            if values:
+                # bound lists, unlike json_each(), let the planner use the indexes
+                conditions.append(f"q.{column} IN ({', '.join('?' * len(values))})")
+                parameters.extend(sorted(map(value, values)))
+        if data.get("setName") is not None:
+            conditions.append("s.name = ?")
+            parameters.append(data["setName"])
+        return conditions, parameters
+
+    def _search(
+        self: Self,
+        kind: str,
+        data: dict,
+        flags: dict[str, bool],
+        pattern: Optional[re.Pattern],
+    ) -> list[int]:
+        """Return the ids of the questions that match a query, in query order."""
+        conditions, parameters = self._filter(data)
+        if pattern is not None:
+            searchType = data["searchType"]
+            candidates = None
+            if not flags["regex"]:
+                candidates = fts_query(
+                    data["queryString"],
+                    exactPhrase=flags["exactPhrase"],
+                    ignoreWordOrder=flags["ignoreWordOrder"],
+                )
+            if candidates is not None:
+                condition, fts_parameters = _candidates(kind, searchType, candidates)
+                conditions.append(condition)
+                parameters.extend(fts_parameters)
+            conditions.append(_MATCHES[kind][searchType])
+
+            search = pattern.search
+            if flags["ignoreDiacritics"]:
+                self._connection().create_function(
+                    "qbreader_search",
+                    1,
+                    lambda text: text is not None
+                    and search(strip_diacritics(text)) is not None,
+                    deterministic=True,
+                )
+            else:
+                self._connection().create_function(
+                    "qbreader_search",
+                    1,
+                    lambda text: text is not None and search(text) is not None,
+                    deterministic=True,
+                )
+
+        table = _TABLES[kind][0]
+        return [
+            row[0]
+            for row in self._connection().execute(
+                f"SELECT q.id {_FROM.format(table=table)}"
+                + f" WHERE {' AND '.join(conditions)}"
+                + " ORDER BY s.year DESC, s.name, p.number, q.number",
+                parameters,
+            )
+        ]
+
+    def query(
+        self: Self,
+        questionType: QuestionType = "all",
+        searchType: SearchType = "all",
+        queryString: Optional[str] = "",
+        exactPhrase: Optional[bool] = False,
+        ignoreDiacritics: Optional[bool] = False,
+        ignoreWordOrder: Optional[bool] = False,
+        regex: Optional[bool] = False,
+        randomize: Optional[bool] = False,
+        setName: Optional[str] = None,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        maxReturnLength: Optional[int] = 25,
+        tossupPagination: Optional[int] = 1,
+        bonusPagination: Optional[int] = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+    ) -> QueryResponse:
+        """Query the questions of the complete sets in the database.
+
+        Takes the same parameters and returns the same results as
+        `qbreader.Local.query()`. Query strings are looked up in the FTS5 indexes
+        and the rows found are then matched exactly, unless `regex` is set, in which
+        case every row that passes the filters is matched.
+
+        Returns
+        -------
+        QueryResponse
+            A `QueryResponse` object containing the results of the query.
+        """
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            randomize=randomize,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            tossupPagination=tossupPagination,
+            bonusPagination=bonusPagination,
+            min_year=min_year,
+            max_year=max_year,
+        )
+        flags = query_flags(data)
+        pattern = compile_query(
+            data["queryString"],
+            exactPhrase=flags["exactPhrase"],
+            ignoreDiacritics=flags["ignoreDiacritics"],
+            ignoreWordOrder=flags["ignoreWordOrder"],
+            regex=flags["regex"],
+        )
+
+        results: dict[str, tuple[list, int]] = {}
+        for kind, page in (
+            ("tossup", data["tossupPagination"]),
+            ("bonus", data["bonusPagination"]),
+        ):
+            if data["questionType"] not in (kind, "all"):
+                results[kind] = ([], 0)
+                continue
+            ids = self._search(kind, data, flags, pattern)
+            ranks = page_ranks(len(ids), page, data, flags)
+            results[kind] = (self._load(kind, [ids[rank] for rank in ranks]), len(ids))
+
+        return QueryResponse(
+            tossups=results["tossup"][0],
+            bonuses=results["bonus"][0],
+            tossups_found=results["tossup"][1],
+            bonuses_found=results["bonus"][1],
+            query_string=data["queryString"],
+        )
+
+    def random_tossup(
+        self: Self,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        number: int = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+        seed: Optional[int] = None,
+    ) -> tuple[Tossup, ...]:
+        """Get random tossups from the complete sets in the database.
+
+        See `qbreader.Local.random_tossup()` for the parameters.
+
+        Returns
+        -------
+        tuple[Tossup, ...]
+            A tuple of `Tossup` objects.
+        """
+        data = random_params(
+            difficulties,
+            categories,
+            subcategories,
+            alternate_subcategories,
+            number,
+            min_year,
+            max_year,
+        )
+        return tuple(self._draw("tossup", data, [], number, seed))
+
+    def random_bonus(
+        self: Self,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        number: int = 1,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+        three_part_bonuses: bool = False,
+        seed: Optional[int] = None,
+    ) -> tuple[Bonus, ...]:
+        """Get random bonuses from the complete sets in the database.
+
+        See `qbreader.Local.random_bonus()` for the parameters.
+
+        Returns
+        -------
+        tuple[Bonus, ...]
+            A tuple of `Bonus` objects.
+        """
+        data = random_params(
+            difficulties,
+            categories,
+            subcategories,
+            alternate_subcategories,
+            number,
+            min_year,
+            max_year,
+            three_part_bonuses,
+        )
+        conditions = [_THREE_PARTS] if three_part_bonuses else []
+        return tuple(self._draw("bonus", data, conditions, number, seed))
+
+    def _draw(
+        self: Self,
+        kind: str,
+        data: dict,
+        conditions: list[str],
+        number: int,
+        seed: Optional[int],
+    ) -> list:
+        """Draw up to `number` distinct questions that pass the filters of `data`."""
+        filters, parameters = self._filter(data)
+        if seed is None:
+            order = "random()"
+        else:
+            # a seeded shuffle of the ids, so that seeded draws do not depend on the
+            # query plan
+            self._connection().create_function(
+                "qbreader_shuffle", 2, _shuffle, deterministic=True
+            )
+            order = "qbreader_shuffle(?, q.id), q.id"
+            parameters.append(random.Random(seed).getrandbits(63))
+        ids = [
+            row[0]
+            for row in self._connection().execute(
+                f"SELECT q.id {_FROM.format(table=_TABLES[kind][0])}"
+                + f" WHERE {' AND '.join(filters + conditions)}"
+                + f" ORDER BY {order} LIMIT ?",
+                [*parameters, number],
+            )
+        ]
+        return self._load(kind, ids)
+
+
+def _shuffle(salt: int, key: int) -> int:
+    """Hash an id with a salt, to sort ids in an order that depends on the salt."""
+    z = (key + salt) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    # SQLite integers are signed 64-bit
+    return (z ^ (z >> 31)) >> 1
+
+
+def _candidates(kind: str, searchType: str, fts: str) -> tuple[str, list[str]]:
+    """Return an SQL condition that selects the questions that FTS5 finds."""
+    columns = {
+        "question": ("question_sanitized", "text_sanitized"),
+        "answer": ("answer_sanitized", "answer_sanitized"),
+        "all": (None, None),
+    }[searchType]
+    if kind == "tossup":
+        column = columns[0]
+        return (
+            "q.id IN (SELECT rowid FROM tossups_fts WHERE tossups_fts MATCH ?)",
+            [f"{column} : ({fts})" if column else fts],
+        )
+    column = columns[1]
+    condition = (
+        "q.id IN (SELECT bp.bonus_id FROM bonus_parts_fts f"
+        + " JOIN bonus_parts bp ON bp.id = f.rowid WHERE bonus_parts_fts MATCH ?)"
+    )
+    parameters = [f"{column} : ({fts})" if column else fts]
+    if searchType != "answer":
+        condition += (
+            " OR q.id IN (SELECT rowid FROM bonuses_fts WHERE bonuses_fts MATCH ?)"
+        )
+        parameters.append(fts)
+    return f"({condition})", parameters
+
+
+class _Metadata:
+    """Set and packet metadata shared between the questions of a result."""
+
+    def __init__(self: Self):
+        self.packets: dict[int, PacketMetadata] = {}
+        self.sets: dict[str, SetMetadata] = {}
+
+    def packet(self: Self, row: tuple) -> PacketMetadata:
+        """Return the packet metadata of a question row."""
+        packet_id, _id, name, number = row[-8:-4]
+        if packet_id not in self.packets:
+            self.packets[packet_id] = PacketMetadata(_id, name, number)
+        return self.packets[packet_id]
+
+    def set(self: Self, row: tuple) -> SetMetadata:
+        """Return the set metadata of a question row."""
+        _id, name, year, standard = row[-4:]
+        if name not in self.sets:
+            self.sets[name] = SetMetadata(_id, name, year, bool(standard))
+        return self.sets[name]
+
+
+_TABLES = {"tossup": ("tossups", _TOSSUP_COLUMNS), "bonus": ("bonuses", _BONUS_COLUMNS)}
+
+_PARTS_MATCH = "EXISTS (SELECT 1 FROM bonus_parts bp WHERE bp.bonus_id = q.id AND ({}))"
+_MATCHES = {
+    "tossup": {
+        "question": "qbreader_search(q.question_sanitized)",
+        "answer": "qbreader_search(q.answer_sanitized)",
+        "all": "(qbreader_search(q.question_sanitized)"
+        + " OR qbreader_search(q.answer_sanitized))",
+    },
+    "bonus": {
+        "question": "(qbreader_search(q.leadin_sanitized) OR "
+        + _PARTS_MATCH.format("qbreader_search(bp.text_sanitized)")
+        + ")",
+        "answer": _PARTS_MATCH.format("qbreader_search(bp.answer_sanitized)"),
+        "all": "(qbreader_search(q.leadin_sanitized) OR "
+        + _PARTS_MATCH.format(
+            "qbreader_search(bp.text_sanitized)"
+            + " OR qbreader_search(bp.answer_sanitized)"
+        )
+        + ")",
+    },
+}
+_THREE_PARTS = (
+    "(SELECT COUNT(*) FROM bonus_parts bp"
+    + " WHERE bp.bonus_id = q.id AND bp.text IS NOT NULL) = 3"
+)
+
+
+__all__ = (
+    "SQLiteStore",
+    "fts_query",
+    "SCHEMA_VERSION",
+)
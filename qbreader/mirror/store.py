@@ -0,0 +1,237 @@
+"""Storage backends for a local mirror of the qbreader database."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import urllib.parse
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Sequence
+from typing import Any, Self, Union
+
+from qbreader.types import Bonus, Packet, Tossup
+
+STATE_VERSION = 1
+"""Version of the checkpoint state written by `Mirror`."""
+
+
+class Store(ABC):
+    """Base class of mirror storage backends.
+
+    A store holds every downloaded packet, keyed by set name and packet number, plus
+    the checkpoint state of the mirror: a JSON object of the form
+    ``{"version": 1, "sets": {setName: {"num_packets": int, "complete": bool}}}``.
+
+    Packets are stored and returned in the compact form of `Packet.to_bytes()`,
+    which does not keep the ``_id`` of questions, so stores keep those separately.
+    """
+
+    @abstractmethod
+    def load_state(self: Self) -> dict[str, Any]:
+        """Return the checkpoint state, or an empty state if there is none."""
+
+    @abstractmethod
+    def save_state(self: Self, state: dict[str, Any]) -> None:
+        """Durably replace the checkpoint state."""
+
+    @abstractmethod
+    def has_packet(self: Self, setName: str, packetNumber: int) -> bool:
+        """Return whether a packet has been stored."""
+
+    @abstractmethod
+    def put_packet(
+        self: Self,
+        setName: str,
+        packetNumber: int,
+        data: bytes,
+        ids: Sequence[str] = (),
+    ) -> None:
+        """Durably store the output of `Packet.to_bytes()` for a packet.
+
+        `ids` are the ``_id`` of its tossups and then its bonuses in the qbreader
+        database, if known. Raises `ValueError` if there are ids but not one for
+        every question.
+        """
+
+    @abstractmethod
+    def get_packet_bytes(self: Self, setName: str, packetNumber: int) -> bytes:
+        """Return the stored bytes of a packet, raising `KeyError` if missing."""
+
+    @abstractmethod
+    def get_packet_ids(self: Self, setName: str, packetNumber: int) -> list[str]:
+        """Return the ``_id`` of the tossups and then the bonuses of a stored packet.
+
+        The ``_id`` of a question is an empty string if it was not stored. Raises
+        `KeyError` if the packet is missing.
+        """
+
+    def get_packet(self: Self, setName: str, packetNumber: int) -> Packet:
+        """Return a stored packet, raising `KeyError` if missing."""
+        return Packet.from_bytes(self.get_packet_bytes(setName, packetNumber))
+
+    def set_names(self: Self) -> list[str]:
+        """Return the names of the completely mirrored sets, in sorted order."""
+        sets = self.load_state()["sets"]
+        return sorted(name for name, info in sets.items() if info["complete"])
+
+    def packets(self: Self) -> Iterator[Packet]:
+        """Iterate over every packet of every complete set, in set and packet order."""
+        sets = self.load_state()["sets"]
+        for setName in self.set_names():
+            for packetNumber in range(1, sets[setName]["num_packets"] + 1):
+                yield self.get_packet(setName, packetNumber)
+
+    def questions(self: Self) -> Iterator[Union[Tossup, Bonus]]:
+        """Iterate over every question in the store, packet by packet.
+
+        Within a packet, tossups come before bonuses.
+        """
+        for packet in self.packets():
+            yield from packet.tossups
+            yield from packet.bonuses
+
+    def questions_with_ids(self: Self) -> Iterator[tuple[str, Union[Tossup, Bonus]]]:
+        """Iterate over every question in the store with its ``_id``.
+
+        Questions come in the order of `questions()`, each in a ``(_id, question)``
+        pair that `qbreader.corpus.CorpusWriter.extend()` accepts. The ``_id`` is an
+        empty string if it was not stored.
+        """
+        sets = self.load_state()["sets"]
+        for setName in self.set_names():
+            for packetNumber in range(1, sets[setName]["num_packets"] + 1):
+                packet = self.get_packet(setName, packetNumber)
+                ids = self.get_packet_ids(setName, packetNumber)
+                yield from zip(ids, (*packet.tossups, *packet.bonuses))
+
+    @staticmethod
+    def empty_state() -> dict[str, Any]:
+        """Return the state of a store that has never been synced."""
+        return {"version": STATE_VERSION, "sets": {}}
+
+
+class DirectoryStore(Store):
+    """Store a mirror as a directory of files.
+
+    ``state.json`` holds the checkpoint state, and every packet is a separate file
+    under ``packets/<quoted set name>/<packet number>.qbp``, next to a JSON list of
+    the ``_id`` of its questions in ``<packet number>.ids``, if they are known.
+    Files are written to a temporary name and then atomically renamed, so a crash
+    never leaves a partially written packet or state behind.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The directory of the mirror. It is created if it does not exist.
+    """
+
+    def __init__(self: Self, path: Union[str, os.PathLike]):
+        self.path: str = os.fspath(path)
+        os.makedirs(os.path.join(self.path, "packets"), exist_ok=True)
+
+    def _state_path(self: Self) -> str:
+        return os.path.join(self.path, "state.json")
+
+    def _packet_path(self: Self, setName: str, packetNumber: int) -> str:
+        directory = urllib.parse.quote(setName, safe=" ")
+        if directory.startswith("."):  # never "." or ".."
+            directory = "%2E" + directory[1:]
+        return os.path.join(self.path, "packets", directory, f"{packetNumber}.qbp")
+
+    def _write_atomic(self: Self, path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def load_state(self: Self) -> dict[str, Any]:
+        """Return the checkpoint state, or an empty state if there is none."""
+        try:
+            with open(self._state_path(), "rb") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return self.empty_state()
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(
+                f"Unsupported mirror state version {state.get('version')!r} in "
+                + f"{self._state_path()}."
+            )
+        return state
+
+    def save_state(self: Self, state: dict[str, Any]) -> None:
+        """Durably replace the checkpoint state."""
+        data = json.dumps(state, ensure_ascii=False, indent=1).encode()
+        self._write_atomic(self._state_path(), data)
+
+    def has_packet(self: Self, setName: str, packetNumber: int) -> bool:
+        """Return whether a packet has been stored."""
+        return os.path.exists(self._packet_path(setName, packetNumber))
+
+    def _ids_path(self: Self, setName: str, packetNumber: int) -> str:
+        return self._packet_path(setName, packetNumber)[: -len(".qbp")] + ".ids"
+
+    def put_packet(
+        self: Self,
+        setName: str,
+        packetNumber: int,
+        data: bytes,
+        ids: Sequence[str] = (),
+    ) -> None:
+        """Durably store the output of `Packet.to_bytes()` for a packet.
+
+        `ids` are the ``_id`` of its tossups and then its bonuses in the qbreader
+        database, if known. Raises `ValueError` if there are ids but not one for
+        every question.
+        """
+        if ids:
+            packet = Packet.from_bytes(data)
+            if len(ids) != len(packet.tossups) + len(packet.bonuses):
+                raise ValueError(
+                    "ids must have one _id for every question of the packet."
+                )
+        # the ids are written first, so a stored packet always has its own ids
+        ids_path = self._ids_path(setName, packetNumber)
+        if any(ids):
+            self._write_atomic(ids_path, json.dumps(list(ids)).encode())
+        elif os.path.exists(ids_path):
+            os.unlink(ids_path)
+        self._write_atomic(self._packet_path(setName, packetNumber), data)
+
+    def get_packet_bytes(self: Self, setName: str, packetNumber: int) -> bytes:
+        """Return the stored bytes of a packet, raising `KeyError` if missing."""
+        try:
+            with open(self._packet_path(setName, packetNumber), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            raise KeyError((setName, packetNumber)) from None
+
+    def get_packet_ids(self: Self, setName: str, packetNumber: int) -> list[str]:
+        """Return the ``_id`` of the tossups and then the bonuses of a stored packet.
+
+        The ``_id`` of a question is an empty string if it was not stored. Raises
+        `KeyError` if the packet is missing.
+        """
+        if not self.has_packet(setName, packetNumber):
+            raise KeyError((setName, packetNumber))
+        try:
+            with open(self._ids_path(setName, packetNumber), "rb") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            packet = self.get_packet(setName, packetNumber)
+            return [""] * (len(packet.tossups) + len(packet.bonuses))
+
+
+__all__ = (
+    "Store",
+    "DirectoryStore",
+    "STATE_VERSION",
+)
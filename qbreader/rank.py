@@ -0,0 +1,410 @@
+"""Rank questions by relevance to a query string with Okapi BM25.
+
+`qbreader.Sync.query()` and `qbreader.Local.query()` return questions in set and
+packet order. A `BM25Ranker` orders them by relevance instead, using the term
+statistics of a `qbreader.index.SearchIndex`: the length of every indexed document
+and the inverse document frequency of every token are computed once, so scoring a
+query only reads the posting lists of its own tokens.
+
+Query strings are tokenized like the index, and only whole tokens count towards a
+score, so a word that only matches as part of a longer token adds nothing.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from itertools import repeat
+from operator import rshift
+from typing import Optional, Self, Union
+
+from qbreader.index import InvertedIndex, SearchIndex, tokenize
+from qbreader.types import Bonus, QueryResponse, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+Questions = Sequence[Union[Tossup, Bonus]]
+
+
+def _statistics(index: InvertedIndex) -> tuple[array, array]:
+    """Return the length of every document and the frequency of every token."""
+    occurrences, starts = index._occurrences, index._starts
+    lengths, frequencies = array("I"), array("I")
+    if np is not None:
+        documents = (np.frombuffer(occurrences, dtype=np.uint64) >> 32).astype(np.intp)
+        counts = np.bincount(documents, minlength=index.num_documents)
+        lengths.frombytes(counts.astype(np.uint32).tobytes())
+        if len(index.tokens):
+            # an occurrence is new for its token if it starts the posting list or
+            # follows an occurrence in another document
+            new = np.ones(len(documents), dtype=np.uint32)
+            new[1:] = documents[1:] != documents[:-1]
+            offsets = np.frombuffer(starts, dtype=np.uint64)[:-1].astype(np.intp)
+            new[offsets] = 1
+            counts = np.add.reduceat(new, offsets)
+            frequencies.frombytes(counts.astype(np.uint32).tobytes())
+        return lengths, frequencies
+
+    counts = Counter(map(rshift, occurrences, repeat(32)))
+    lengths.extend(counts.get(document, 0) for document in range(index.num_documents))
+    for i in range(len(index.tokens)):
+        lo, hi = starts[i], starts[i + 1]
+        frequencies.append(len(set(map(rshift, occurrences[lo:hi], repeat(32)))))
+    return lengths, frequencies
+
+
+class BM25:
+    """The BM25 scores of the documents of one `qbreader.index.InvertedIndex`.
+
+    The score of a document is the sum, over the distinct tokens of the query, of
+    ``idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))``,
+    where ``tf`` is the number of occurrences of the token in the document and
+    ``idf = log(1 + (n - df + 0.5) / (df + 0.5))``.
+
+    Parameters
+    ----------
+    index : InvertedIndex
+        The indexed documents.
+    k1 : float, default = 1.2
+        How quickly repeated occurrences of a token stop adding to the score.
+    b : float, default = 0.75
+        How much longer documents are penalized, from 0 (not at all) to 1.
+    """
+
+    def __init__(self: Self, index: InvertedIndex, k1: float = 1.2, b: float = 0.75):
+        if k1 < 0:
+            raise ValueError("k1 must not be negative.")
+        if not 0 <= b <= 1:
+            raise ValueError("b must be between 0 and 1.")
+        self.index: InvertedIndex = index
+        self.k1: float = k1
+        self.b: float = b
+
+        lengths, frequencies = _statistics(index)
+        self.lengths: array = lengths
+        """The number of tokens in every document."""
+        total = sum(lengths)
+        self.average_length: float = total / len(lengths) if total else 1.0
+        self.idf: array = array("d", map(self._idf, frequencies))
+        """The inverse document frequency of every token of the index."""
+        scale = k1 * b / self.average_length
+        self._norms = array("d", [k1 * (1 - b) + scale * n for n in self.lengths])
+
+    def _idf(self: Self, frequency: int) -> float:
+        n = self.index.num_documents
+        return math.log(1 + (n - frequency + 0.5) / (frequency + 0.5))
+
+    def _term_ids(self: Self, tokens: Iterable[str]) -> list[int]:
+        ids = []
+        for token in tokens:
+            matches = self.index.tokens_matching(token)
+            if matches:
+                ids += matches
+        return ids
+
+    def scores(
+        self: Self, queryString: str, documents: Optional[Iterable[int]] = None
+    ) -> dict[int, float]:
+        """Score indexed documents against a query string.
+
+        Parameters
+        ----------
+        queryString : str
+            The query, whose distinct tokens are scored.
+        documents : Iterable[int], optional
+            Only score these documents. Every other document is scored by default.
+
+        Returns
+        -------
+        dict[int, float]
+            The score of every document with a positive score.
+        """
+        candidates = None if documents is None else set(documents)
+        ids = self._term_ids(set(tokenize(queryString)))
+        if np is not None:
+            return self._numpy_scores(ids, candidates)
+
+        occurrences, starts = self.index._occurrences, self.index._starts
+        factor = self.k1 + 1
+        norms = self._norms
+        scores: dict[int, float] = {}
+        for i in ids:
+            lo, hi = starts[i], starts[i + 1]
+            if candidates is not None and len(candidates) * 32 < hi - lo:
+                # few candidates in a long posting list are looked up by bisection
+                counts: dict[int, int] = {}
+                for document in candidates:
+                    first = bisect_left(occurrences, document << 32, lo, hi)
+                    last = bisect_left(occurrences, (document + 1) << 32, first, hi)
+                    if last > first:
+                        counts[document] = last - first
+            else:
+                counts = Counter(map(rshift, occurrences[lo:hi], repeat(32)))
+                if candidates is not None:
+                    counts = {d: n for d, n in counts.items() if d in candidates}
+            weight = self.idf[i] * factor
+            for document, tf in counts.items():
+                score = weight * tf / (tf + norms[document])
+                scores[document] = scores.get(document, 0.0) + score
+        return scores
+
+    def _numpy_scores(
+        self: Self, ids: list[int], candidates: Optional[set[int]]
+    ) -> dict[int, float]:
+        """Score documents with NumPy, reading each posting list in one pass."""
+        occurrences = np.frombuffer(self.index._occurrences, dtype=np.uint64)
+        norms = np.frombuffer(self._norms, dtype=np.float64)
+        starts = self.index._starts
+        factor = self.k1 + 1
+        if candidates is not None:
+            # the occurrences of each candidate are found by binary search
+            n = self.index.num_documents
+            documents = np.array(
+                sorted(d for d in candidates if 0 <= d < n), dtype=np.uint64
+            )
+            lower, upper = documents << np.uint64(32), documents + np.uint64(1)
+            upper <<= np.uint64(32)
+            totals = np.zeros(len(documents))
+            candidate_norms = norms[documents]
+            for i in ids:
+                lo, hi = starts[i], starts[i + 1]
+                posting = occurrences[lo:hi]
+                tf = np.searchsorted(posting, upper) - np.searchsorted(posting, lower)
+                totals += self.idf[i] * factor * tf / (tf + candidate_norms)
+        else:
+            totals = np.zeros(self.index.num_documents)
+            for i in ids:
+                lo, hi = starts[i], starts[i + 1]
+                posting = (occurrences[lo:hi] >> np.uint64(32)).astype(np.intp)
+                first = np.flatnonzero(np.diff(posting, prepend=-1))
+                tf = np.diff(first, append=len(posting))
+                found = posting[first]
+                totals[found] += self.idf[i] * factor * tf / (tf + norms[found])
+            documents = np.arange(len(totals), dtype=np.uint64)
+        hits = np.flatnonzero(totals)
+        return dict(zip(documents[hits].tolist(), totals[hits].tolist()))
+
+    def score_text(self: Self, queryString: str, fields: Sequence[str]) -> float:
+        """Score a document that is not in the index with the index's statistics.
+
+        Parameters
+        ----------
+        queryString : str
+            The query, whose distinct tokens are scored.
+        fields : Sequence[str]
+            The text fields of the document, e.g. the leadin and parts of a bonus.
+        """
+        tokens = [token for field in fields for token in tokenize(field)]
+        counts = Counter(tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.average_length)
+        score = 0.0
+        for token in set(tokenize(queryString)):
+            tf = counts.get(token)
+            if tf:
+                ids = self.index.tokens_matching(token)
+                idf = self.idf[ids[0]] if ids else self._idf(0)
+                score += idf * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+
+def _fields(question: Union[Tossup, Bonus], field: str) -> Sequence[str]:
+    """Return the text fields of a question as they are indexed."""
+    if isinstance(question, Tossup):
+        if field == "question":
+            return (question.question_sanitized,)
+        return (question.answer_sanitized,)
+    if field == "question":
+        return (question.leadin_sanitized, *question.parts_sanitized)
+    return question.answers_sanitized
+
+
+class BM25Ranker:
+    """Rank tossups and bonuses with the BM25 statistics of a `SearchIndex`.
+
+    Each of the four indexes of the search index is scored separately, and a
+    ``searchType`` of ``"all"`` adds the scores of the question text and answer.
+    Statistics are computed the first time an index is used.
+
+    Parameters
+    ----------
+    index : SearchIndex
+        The search index, e.g. from `qbreader.Local.build_index()`.
+    k1 : float, default = 1.2
+        See `BM25`.
+    b : float, default = 0.75
+        See `BM25`.
+    """
+
+    def __init__(self: Self, index: SearchIndex, k1: float = 1.2, b: float = 0.75):
+        if k1 < 0:
+            raise ValueError("k1 must not be negative.")
+        if not 0 <= b <= 1:
+            raise ValueError("b must be between 0 and 1.")
+        self.index: SearchIndex = index
+        self.k1: float = k1
+        self.b: float = b
+        self._scorers: dict[str, BM25] = {}
+
+    def scorer(self: Self, questionType: str, field: str) -> BM25:
+        """Return the `BM25` scorer of one of the indexes of the search index.
+
+        Parameters
+        ----------
+        questionType : str
+            Either ``"tossup"`` or ``"bonus"``.
+        field : str
+            Either ``"question"`` or ``"answer"``.
+        """
+        key = f"{questionType}.{field}"
+        if key not in SearchIndex.KEYS:
+            raise ValueError(f"There is no {key!r} index.")
+        if key not in self._scorers:
+            self._scorers[key] = BM25(self.index.indexes[key], self.k1, self.b)
+        return self._scorers[key]
+
+    @staticmethod
+    def _fields(searchType: str) -> tuple[str, ...]:
+        if searchType not in ("question", "answer", "all"):
+            raise ValueError(
+                f"searchType must be 'question', 'answer' or 'all', not {searchType!r}."
+            )
+        return ("question", "answer") if searchType == "all" else (searchType,)
+
+    def rank(
+        self: Self,
+        questionType: str,
+        queryString: str,
+        searchType: str = "all",
+        documents: Optional[Iterable[int]] = None,
+        k: Optional[int] = None,
+    ) -> list[tuple[int, float]]:
+        """Rank indexed tossups or bonuses by their relevance to a query string.
+
+        Parameters
+        ----------
+        questionType : str
+            Either ``"tossup"`` or ``"bonus"``.
+        queryString : str
+            The query.
+        searchType : str, default = "all"
+            Score the ``"question"`` text, the ``"answer"``, or ``"all"`` of both.
+        documents : Iterable[int], optional
+            The candidates to rank, e.g. the result of `SearchIndex.search()`. All of
+            them are returned, even if they score 0. By default, every question with
+            a positive score is ranked.
+        k : int, optional
+            Only return the `k` best documents.
+
+        Returns
+        -------
+        list[tuple[int, float]]
+            Pairs of a document number and its score, best first, and in document
+            order between equal scores. Document numbers are positions in query
+            order, like those of `SearchIndex`.
+        """
+        candidates = None if documents is None else set(documents)
+        scores: dict[int, float] = dict.fromkeys(candidates or (), 0.0)
+        for field in self._fields(searchType):
+            found = self.scorer(questionType, field).scores(queryString, candidates)
+            for document, score in found.items():
+                scores[document] = scores.get(document, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if k is None else ranked[:k]
+
+    def score(
+        self: Self,
+        question: Union[Tossup, Bonus],
+        queryString: str,
+        searchType: str = "all",
+    ) -> float:
+        """Score any question against a query string with the index's statistics."""
+        questionType = "tossup" if isinstance(question, Tossup) else "bonus"
+        return sum(
+            self.scorer(questionType, field).score_text(
+                queryString, _fields(question, field)
+            )
+            for field in self._fields(searchType)
+        )
+
+    def _order(
+        self: Self,
+        questions: Questions,
+        questionType: str,
+        queryString: str,
+        searchType: str,
+        documents: Optional[Sequence[Optional[int]]],
+    ) -> list:
+        if documents is None:
+            documents = [None] * len(questions)
+        indexed = [document for document in documents if document is not None]
+        found = dict(self.rank(questionType, queryString, searchType, indexed))
+        scores = [
+            (
+                found[document]
+                if document is not None
+                else self.score(question, queryString, searchType)
+            )
+            for question, document in zip(questions, documents)
+        ]
+        order = sorted(range(len(questions)), key=lambda i: -scores[i])
+        return [questions[i] for i in order]
+
+    def rerank(
+        self: Self,
+        response: QueryResponse,
+        searchType: str = "all",
+        tossup_documents: Optional[Sequence[Optional[int]]] = None,
+        bonus_documents: Optional[Sequence[Optional[int]]] = None,
+    ) -> QueryResponse:
+        """Reorder the questions of a query response by relevance.
+
+        Questions are scored against the response's query string, and questions
+        with equal scores keep their order.
+
+        Parameters
+        ----------
+        response : QueryResponse
+            A response from `qbreader.Sync.query()` or `qbreader.Local.query()`.
+        searchType : str, default = "all"
+            The ``searchType`` of the query.
+        tossup_documents, bonus_documents : Sequence[int | None], optional
+            The document number of each tossup or bonus of the response in the search
+            index, or None if it is not indexed. Indexed questions are scored from
+            their posting lists, and the others by tokenizing their text.
+
+        Returns
+        -------
+        QueryResponse
+            A new response with the same questions and counts.
+        """
+        return QueryResponse(
+            tossups=self._order(
+                response.tossups,
+                "tossup",
+                response.query_string,
+                searchType,
+                tossup_documents,
+            ),
+            bonuses=self._order(
+                response.bonuses,
+                "bonus",
+                response.query_string,
+                searchType,
+                bonus_documents,
+            ),
+            tossups_found=response.tossups_found,
+            bonuses_found=response.bonuses_found,
+            query_string=response.query_string,
+        )
+
+
+__all__ = (
+    "BM25",
+    "BM25Ranker",
+)
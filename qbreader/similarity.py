@@ -0,0 +1,323 @@
+"""Find similar questions offline with TF-IDF vectors.
+
+A `SimilarityIndex` stores one sparse TF-IDF vector per question, over the folded
+tokens of its sanitized question text or answer, and finds the questions whose
+vectors have the highest cosine similarity to a question or a piece of text. Use the
+question text for "more like this", and the answer to find questions about the same
+answerline.
+
+Vectors are stored by term, as posting lists of documents and weights, so a query
+only reads the postings of its own terms. Scores are accumulated with NumPy when it
+is installed, and with plain Python otherwise.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import os
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterable
+from itertools import accumulate
+from typing import Any, Self, Union
+
+from qbreader._mmapfile import read_sections, write_sections
+from qbreader.index import tokenize
+from qbreader.local import Source, iter_source
+from qbreader.types import Bonus, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+FIELDS = ("question", "answer")
+"""The text fields that questions can be indexed by."""
+
+_MAGIC = b"QBRSIM"
+_VERSION = 1
+_SECTIONS = {"starts": "Q", "documents": "I", "weights": "f"}
+
+
+def question_text(question: Union[Tossup, Bonus], field: str = "question") -> str:
+    """Return the sanitized text of a question that is indexed for `field`.
+
+    A bonus' question text is its leadin and parts, and its answer is its answers.
+    """
+    if field not in FIELDS:
+        raise ValueError(f"field must be one of {FIELDS}, not {field!r}.")
+    if isinstance(question, Tossup):
+        if field == "question":
+            return question.question_sanitized
+        return question.answer_sanitized
+    if isinstance(question, Bonus):
+        if field == "question":
+            return "\n".join((question.leadin_sanitized, *question.parts_sanitized))
+        return "\n".join(question.answers_sanitized)
+    raise TypeError(
+        f"question must be a Tossup or Bonus, not {type(question).__name__}."
+    )
+
+
+def _term_weights(counts: Counter[str]) -> dict[str, float]:
+    """Return the sublinear term frequencies of a document."""
+    return {token: 1.0 + math.log(count) for token, count in counts.items()}
+
+
+class SimilarityIndex:
+    """TF-IDF vectors of questions, searched by cosine similarity.
+
+    Documents are numbered from 0 in the order they were indexed, so the numbers
+    are ordinals of the source, e.g. of a `qbreader.corpus.Corpus`. Term weights are
+    ``(1 + log tf) * idf`` with ``idf = 1 + log((1 + n) / (1 + df))``, and every
+    document vector has unit length.
+
+    Parameters
+    ----------
+    field : str
+        Either ``"question"`` or ``"answer"``.
+    num_documents : int
+        The number of indexed documents.
+    tokens : list[str]
+        The sorted vocabulary.
+    starts : Sequence[int]
+        The postings of token ``i`` are ``starts[i]:starts[i + 1]``.
+    documents : Sequence[int]
+        The document of each posting, increasing within each token.
+    weights : Sequence[float]
+        The weight of each posting.
+    """
+
+    def __init__(
+        self: Self,
+        field: str,
+        num_documents: int,
+        tokens: list[str],
+        starts: Any,
+        documents: Any,
+        weights: Any,
+    ):
+        self.field: str = field
+        self.num_documents: int = num_documents
+        self.tokens: list[str] = tokens
+        self._starts = starts
+        self._documents = documents
+        self._weights = weights
+
+    @classmethod
+    def build(
+        cls: type[Self],
+        source: Source,
+        field: str = "question",
+        max_df: float = 0.5,
+    ) -> Self:
+        """Index the questions of a mirror store or iterable.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions.
+        field : str, default = "question"
+            Index the question text (``"question"``) or the answer (``"answer"``).
+        max_df : float, default = 0.5
+            Tokens in more than this fraction of the documents are not indexed, as
+            they say little about similarity but make up most of the postings.
+        """
+        if field not in FIELDS:
+            raise ValueError(f"field must be one of {FIELDS}, not {field!r}.")
+        if not 0 < max_df <= 1:
+            raise ValueError("max_df must be greater than 0 and at most 1.")
+        questions = iter_source(source)
+
+        postings: dict[str, tuple[array, array]] = {}
+        num_documents = 0
+        for document, question in enumerate(questions):
+            num_documents += 1
+            frequencies = _term_weights(
+                Counter(tokenize(question_text(question, field)))
+            )
+            for token, weight in frequencies.items():
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = (array("I"), array("d"))
+                posting[0].append(document)
+                posting[1].append(weight)
+
+        limit = max_df * num_documents
+        tokens = sorted(
+            token for token, (docs, _) in postings.items() if len(docs) <= limit
+        )
+        frequencies_of = [len(postings[token][0]) for token in tokens]
+        starts = array("Q", [0])
+        starts.extend(accumulate(frequencies_of))
+        documents, normalized = array("I"), array("f")
+        for token in tokens:
+            documents.extend(postings[token][0])
+
+        # every weight is multiplied by its idf and then by the inverse norm of its
+        # document, which needs every idf first
+        if np is not None:
+            df = np.asarray(frequencies_of, dtype=np.float64)
+            idf = 1.0 + np.log((1 + num_documents) / (1 + df))
+            weights = np.concatenate(
+                [np.frombuffer(postings.pop(token)[1]) for token in tokens]
+                or [np.zeros(0)]
+            )
+            weights *= np.repeat(idf, frequencies_of)
+            docs = np.frombuffer(documents, dtype=np.uint32)
+            norms = np.sqrt(np.bincount(docs, weights * weights, num_documents))
+            weights /= norms[docs]
+            normalized.frombytes(weights.astype(np.float32).tobytes())
+            return cls(field, num_documents, tokens, starts, documents, normalized)
+
+        squares = array("d", bytes(8 * num_documents))
+        for token, df in zip(tokens, frequencies_of):
+            factor = 1.0 + math.log((1 + num_documents) / (1 + df))
+            docs, values = postings[token]
+            for k, document in enumerate(docs):
+                weight = values[k] * factor
+                values[k] = weight
+                squares[document] += weight * weight
+        scales = [1 / math.sqrt(square) if square else 0.0 for square in squares]
+        for token in tokens:
+            docs, values = postings.pop(token)
+            normalized.extend(map(float.__mul__, values, map(scales.__getitem__, docs)))
+        return cls(field, num_documents, tokens, starts, documents, normalized)
+
+    def __len__(self: Self) -> int:
+        """Return the number of indexed documents."""
+        return self.num_documents
+
+    def vector(self: Self, text: str) -> dict[int, float]:
+        """Return the unit TF-IDF vector of `text`, keyed by token id.
+
+        Tokens that are not in the vocabulary are ignored.
+        """
+        n = self.num_documents
+        tokens, starts = self.tokens, self._starts
+        vector: dict[int, float] = {}
+        for token, weight in _term_weights(Counter(tokenize(text))).items():
+            i = bisect_left(tokens, token)
+            if i < len(tokens) and tokens[i] == token:
+                df = starts[i + 1] - starts[i]
+                vector[i] = weight * (1.0 + math.log((1 + n) / (1 + df)))
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {i: weight / norm for i, weight in vector.items()}
+
+    def similar(
+        self: Self,
+        query: Union[Tossup, Bonus, str],
+        k: int = 10,
+        exclude: Iterable[int] = (),
+    ) -> list[tuple[int, float]]:
+        """Find the documents most similar to a question or text.
+
+        Parameters
+        ----------
+        query : Tossup | Bonus | str
+            A question, whose text for this index's `field` is used, or any text.
+            An indexed question is usually its own best match; pass its number in
+            `exclude` to skip it.
+        k : int, default = 10
+            The most documents to return.
+        exclude : Iterable[int], default = ()
+            Documents to leave out of the results.
+
+        Returns
+        -------
+        list[tuple[int, float]]
+            Up to `k` pairs of a document number and its cosine similarity, most
+            similar first. Documents with nothing in common are never returned.
+        """
+        if not isinstance(k, int) or isinstance(k, bool):
+            raise TypeError(f"k must be an int, not {type(k).__name__}.")
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        if not isinstance(query, str):
+            query = question_text(query, self.field)
+
+        vector = self.vector(query)
+        excluded = set(exclude)
+        if not vector:
+            return []
+        starts, documents, weights = self._starts, self._documents, self._weights
+
+        if np is not None:
+            all_documents = np.frombuffer(documents, dtype=np.uint32)
+            all_weights = np.frombuffer(weights, dtype=np.float32)
+            slices = [slice(starts[i], starts[i + 1]) for i in vector]
+            scores = np.bincount(
+                np.concatenate([all_documents[s] for s in slices]),
+                np.concatenate(
+                    [w * all_weights[s] for s, w in zip(slices, vector.values())]
+                ),
+                minlength=self.num_documents,
+            )
+            if excluded:
+                scores[[d for d in excluded if 0 <= d < len(scores)]] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                top = np.argpartition(-scores[candidates], k - 1)[:k]
+                candidates = candidates[top]
+            order = np.lexsort((candidates, -scores[candidates]))
+            return [
+                (int(document), float(scores[document]))
+                for document in candidates[order]
+            ]
+
+        totals: dict[int, float] = {}
+        for i, weight in vector.items():
+            lo, hi = starts[i], starts[i + 1]
+            for document, posting in zip(documents[lo:hi], weights[lo:hi]):
+                totals[document] = totals.get(document, 0.0) + weight * posting
+        for document in excluded:
+            totals.pop(document, None)
+        best = heapq.nsmallest(
+            k,
+            ((-score, document) for document, score in totals.items() if score > 0),
+        )
+        return [(document, -score) for score, document in best]
+
+    def save(self: Self, path: Union[str, os.PathLike]) -> None:
+        """Atomically write the index to a file that `load()` can map."""
+        write_sections(
+            path,
+            _MAGIC,
+            _VERSION,
+            {"field": self.field, "documents": self.num_documents},
+            [
+                ("tokens", "\n".join(self.tokens).encode()),
+                ("starts", self._starts),
+                ("documents", self._documents),
+                ("weights", self._weights),
+            ],
+        )
+
+    @classmethod
+    def load(cls: type[Self], path: Union[str, os.PathLike]) -> Self:
+        """Open an index written by `save()`.
+
+        The file is memory-mapped, so postings are only read from disk when they are
+        searched, and processes that open the same file share its pages.
+        """
+        header, sections = read_sections(path, _MAGIC, _VERSION, "similarity index")
+        tokens = bytes(sections["tokens"]).decode()
+        return cls(
+            header["field"],
+            header["documents"],
+            tokens.split("\n") if tokens else [],
+            *(
+                sections[name].cast(code)  # type: ignore[call-overload]
+                for name, code in _SECTIONS.items()
+            ),
+        )
+
+
+__all__ = (
+    "SimilarityIndex",
+    "question_text",
+    "FIELDS",
+)
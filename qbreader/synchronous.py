@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
-from typing import Optional, Self
+from typing import Iterator, Optional, Self, Union
 
 import requests
 
 import qbreader._api_utils as api_utils
 from qbreader._consts import BASE_URL
+from qbreader._streaming import CHUNK_SIZE, QueryStream
 from qbreader.types import (
     AnswerJudgement,
     Bonus,
@@ -103,95 +104,28 @@ class Sync:
         QueryResponse
             A `QueryResponse` object containing the results of the query.
         """
-        # normalize and type check parameters
-        if questionType == Tossup:
-            questionType = "tossup"
-        elif questionType == Bonus:
-            questionType = "bonus"
-        if questionType not in ["tossup", "bonus", "all"]:
-            raise ValueError("questionType must be either 'tossup', 'bonus', or 'all'.")
-
-        if searchType not in ["question", "answer", "all"]:
-            raise ValueError(
-                "searchType must be either 'question', 'answer', or 'all'."
-            )
-
-        if not isinstance(queryString, str):
-            raise TypeError(
-                f"queryString must be a string, not {type(queryString).__name__}."
-            )
-
-        for name, param in tuple(
-            zip(
-                (
-                    "exactPhrase",
-                    "ignoreDiacritics",
-                    "ignoreWordOrder",
-                    "regex",
-                    "randomize",
-                ),
-                (exactPhrase, ignoreDiacritics, ignoreWordOrder, regex, randomize),
-            )
-        ):
-            if not isinstance(param, bool):
-                raise TypeError(
-                    f"{name} must be a boolean, not {type(param).__name__}."
-                )
-
-        if setName is not None and not isinstance(setName, str):
-            raise TypeError(f"setName must be a string, not {type(setName).__name__}.")
-
-        for name, param in tuple(  # type: ignore
-            zip(
-                ("maxReturnLength", "tossupPagination", "bonusPagination"),
-                (maxReturnLength, tossupPagination, bonusPagination),
-            )
-        ):
-            if not isinstance(param, int):
-                raise TypeError(
-                    f"{name} must be an integer, not {type(param).__name__}."
-                )
-            elif param < 1:
-                raise ValueError(f"{name} must be at least 1.")
-
-        for name, year in {
-            "minYear": min_year,
-            "maxYear": max_year,
-        }.items():
-            if not isinstance(year, int):
-                raise TypeError(
-                    f"{name} must be an integer, not {type(param).__name__}."
-                )
-
         url = BASE_URL + "/query"
 
-        (
-            normalized_categories,
-            normalized_subcategories,
-            normalized_alternate_subcategories,
-        ) = api_utils.normalize_cats(categories, subcategories, alternate_subcategories)
-
-        data = {
-            "questionType": questionType,
-            "searchType": searchType,
-            "queryString": queryString,
-            "exactPhrase": api_utils.normalize_bool(exactPhrase),
-            "ignoreDiacritics": api_utils.normalize_bool(ignoreDiacritics),
-            "ignoreWordOrder": api_utils.normalize_bool(ignoreWordOrder),
-            "regex": api_utils.normalize_bool(regex),
-            "randomize": api_utils.normalize_bool(randomize),
-            "setName": setName,
-            "difficulties": api_utils.normalize_diff(difficulties),
-            "categories": normalized_categories,
-            "subcategories": normalized_subcategories,
-            "alternateSubcategories": normalized_alternate_subcategories,
-            "maxReturnLength": maxReturnLength,
-            "tossupPagination": tossupPagination,
-            "bonusPagination": bonusPagination,
-            "minYear": min_year,
-            "maxYear": max_year,
-        }
-        data = api_utils.prune_none(data)
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            randomize=randomize,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            tossupPagination=tossupPagination,
+            bonusPagination=bonusPagination,
+            min_year=min_year,
+            max_year=max_year,
+        )
 
         response: requests.Response = requests.get(url, params=data)
 
@@ -200,6 +134,92 @@ class Sync:
 
         return QueryResponse.from_json(response.json())
 
+    def iter_query(
+        self: Self,
+        questionType: QuestionType = "all",
+        searchType: SearchType = "all",
+        queryString: Optional[str] = "",
+        exactPhrase: Optional[bool] = False,
+        ignoreDiacritics: Optional[bool] = False,
+        ignoreWordOrder: Optional[bool] = False,
+        regex: Optional[bool] = False,
+        setName: Optional[str] = None,
+        difficulties: UnnormalizedDifficulty = None,
+        categories: UnnormalizedCategory = None,
+        subcategories: UnnormalizedSubcategory = None,
+        alternate_subcategories: UnnormalizedAlternateSubcategory = None,
+        maxReturnLength: Optional[int] = 25,
+        min_year: int = Year.MIN_YEAR,
+        max_year: int = Year.CURRENT_YEAR,
+    ) -> Iterator[Union[Tossup, Bonus]]:
+        """Iterate over every question matching a query.
+
+        Pages of `maxReturnLength` questions are requested one after another, and each
+        response body is parsed incrementally as it arrives. Every `Tossup` or `Bonus`
+        is yielded as soon as its JSON is complete, so a large page is never held in
+        memory as a whole.
+
+        Parameters
+        ----------
+        See `query()`. `maxReturnLength` is the size of each requested page.
+
+        Returns
+        -------
+        Iterator[Tossup | Bonus]
+            An iterator over the matching questions, page by page. Within a page,
+            tossups come before bonuses.
+        """
+        url = BASE_URL + "/query"
+
+        data = api_utils.query_params(
+            questionType=questionType,
+            searchType=searchType,
+            queryString=queryString,
+            exactPhrase=exactPhrase,
+            ignoreDiacritics=ignoreDiacritics,
+            ignoreWordOrder=ignoreWordOrder,
+            regex=regex,
+            setName=setName,
+            difficulties=difficulties,
+            categories=categories,
+            subcategories=subcategories,
+            alternate_subcategories=alternate_subcategories,
+            maxReturnLength=maxReturnLength,
+            min_year=min_year,
+            max_year=max_year,
+        )
+
+        return self._iter_query_pages(url, data)
+
+    def _iter_query_pages(
+        self: Self, url: str, data: dict
+    ) -> Iterator[Union[Tossup, Bonus]]:
+        """Request and stream consecutive pages of an `api/query` request."""
+        page = 1
+        while True:
+            data["tossupPagination"] = data["bonusPagination"] = page
+
+            response: requests.Response = requests.get(url, params=data, stream=True)
+
+            if response.status_code != 200:
+                raise Exception(str(response.status_code) + " bad request")
+
+            stream = QueryStream()
+            received = 0
+            with response:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    questions = stream.feed(chunk)
+                    received += len(questions)
+                    yield from questions
+            questions = stream.close()
+            received += len(questions)
+            yield from questions
+
+            found = max(stream.tossups_found, stream.bonuses_found)
+            if received == 0 or page * data["maxReturnLength"] >= found:
+                return
+            page += 1
+
     def random_tossup(
         self: Self,
         difficulties: UnnormalizedDifficulty = None,
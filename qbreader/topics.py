@@ -0,0 +1,447 @@
+"""Cluster questions into topics with mini-batch k-means.
+
+`TopicClusters.build()` reads questions once, e.g. the questions of a subcategory
+from `Sync.iter_query()` or a filtered local mirror, and turns the sanitized text
+of each into a unit TF-IDF vector. Tokens are hashed into a fixed number of
+features instead of being numbered by a vocabulary, so memory does not grow with
+the number of distinct tokens. The vectors are written to temporary files that are
+memory-mapped while clustering, so only a few dozen bytes per question, the idf of
+every feature and the cluster centers are kept in memory.
+
+Centers are seeded with k-means++ on a sample of questions. Then every batch of
+randomly drawn questions is assigned to the nearest centers, and each center moves
+to the mean of its seed and every question that was ever assigned to it. Each
+feature is named by the token it stands for in most of the questions that have it,
+found with a majority vote, so the heaviest features of a center are the top terms
+of its cluster. NumPy is required.
+"""
+
+from __future__ import annotations
+
+import math
+import mmap
+import tempfile
+import zlib
+from array import array
+from collections import Counter
+from typing import Any, Optional, Self, Union, cast
+
+from qbreader.index import tokenize
+from qbreader.local import Source, iter_source
+from qbreader.similarity import FIELDS, question_text
+from qbreader.types import Bonus, Tossup
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+FEATURES = 1 << 17
+"""The default number of features that tokens are hashed into."""
+
+_CHUNK = 1 << 16
+
+
+def _counts(tokens: list[str], n_features: int) -> dict[int, int]:
+    """Return the number of tokens of a document that hash to each feature."""
+    counts: dict[int, int] = {}
+    for token, count in Counter(tokens).items():
+        feature = zlib.crc32(token.encode()) % n_features
+        counts[feature] = counts.get(feature, 0) + count
+    return counts
+
+
+class _Vectors:
+    """The TF-IDF vectors of documents, as rows of a memory-mapped sparse matrix.
+
+    The features of row ``i`` are ``features[starts[i]:starts[i + 1]]``, and their
+    weights are at the same positions of `weights`.
+    """
+
+    def __init__(self: Self, n_features: int):
+        self.n_features = n_features
+        self.starts = array("q", [0])
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.names: list[Optional[str]] = [None] * n_features
+        self._votes = array("I", bytes(4 * n_features))
+        self._files = (tempfile.TemporaryFile(), tempfile.TemporaryFile())
+        self._features, self._weights = array("I"), array("f")
+        self._spilled = 0
+        self.features: Any = np.zeros(0, dtype=np.uint32)
+        self.weights: Any = np.zeros(0, dtype=np.float32)
+
+    def __len__(self: Self) -> int:
+        return len(self.starts) - 1
+
+    def add(self: Self, text: str) -> None:
+        """Add the token counts of a text as a row."""
+        names, votes, n_features = self.names, self._votes, self.n_features
+        tokens = tokenize(text)
+        counts = _counts(tokens, n_features)
+        for token in dict.fromkeys(tokens):
+            feature = zlib.crc32(token.encode()) % n_features
+            # a majority vote of the documents of each feature names it by the
+            # token that most of them have, if there is one
+            if names[feature] == token:
+                votes[feature] += 1
+            elif votes[feature]:
+                votes[feature] -= 1
+            else:
+                names[feature] = token
+                votes[feature] = 1
+        self._features.extend(counts)
+        self._weights.extend(counts.values())
+        self.starts.append(self._spilled + len(self._features))
+        if len(self._features) >= _CHUNK:
+            self._spill()
+
+    def _spill(self: Self) -> None:
+        """Write the pending rows to the temporary files."""
+        self.df += np.bincount(
+            np.frombuffer(self._features, dtype=np.uint32), minlength=self.n_features
+        )
+        self._features.tofile(self._files[0])
+        self._weights.tofile(self._files[1])
+        self._spilled += len(self._features)
+        del self._features[:], self._weights[:]
+
+    def finish(self: Self, max_df: float) -> tuple[Any, Any]:
+        """Map the rows, weight their sublinear counts by idf and normalize them.
+
+        Returns the idf of every feature, which is 0 for features in no row or in
+        more than `max_df` of the rows, and the numbers of the rows that have a weight.
+        """
+        self._spill()
+        n = len(self)
+        idf = 1.0 + np.log((1 + n) / (1 + self.df))
+        idf[(self.df == 0) | (self.df > max_df * n)] = 0
+        idf = idf.astype(np.float32)
+        if self._spilled:
+            for file in self._files:
+                file.flush()
+            feature_file, weight_file = self._files
+            self.features = np.frombuffer(
+                mmap.mmap(feature_file.fileno(), 0, access=mmap.ACCESS_READ),
+                dtype=np.uint32,
+            )
+            self.weights = np.frombuffer(
+                mmap.mmap(weight_file.fileno(), 0), dtype=np.float32
+            )
+        for file in self._files:
+            file.close()
+
+        starts = np.frombuffer(self.starts, dtype=np.int64)
+        weighted = []
+        for first in range(0, n, _CHUNK):
+            count = min(_CHUNK, n - first)
+            bounds = starts[first:][: count + 1]
+            lo, hi = bounds[0], bounds[-1]
+            weights = self.weights[lo:hi]
+            np.log(weights, out=weights)
+            weights += 1
+            weights *= idf[self.features[lo:hi]]
+            rows = np.repeat(np.arange(count), np.diff(bounds))
+            norms = np.sqrt(np.bincount(rows, weights * weights, count))
+            scales = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+            weights *= scales[rows].astype(np.float32)
+            weighted.append(first + np.flatnonzero(norms))
+        return idf, np.concatenate(weighted or [np.zeros(0, dtype=np.int64)])
+
+    def rows(self: Self, rows: Any) -> tuple[Any, Any, Any, Any]:
+        """Return the features and weights of some rows, one row after another.
+
+        Also returns where each row starts in them and how many features it has.
+        """
+        starts = np.frombuffer(self.starts, dtype=np.int64)
+        first = starts[rows]
+        lengths = starts[rows + 1] - first
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(first - offsets, lengths) + np.arange(lengths.sum())
+        return self.features[positions], self.weights[positions], offsets, lengths
+
+
+def _scores(
+    sums: Any, counts: Any, norms: Any, features: Any, weights: Any, offsets: Any
+) -> Any:
+    """Return the squared distance minus 1 of rows to every center.
+
+    Rows must not be empty. Center ``j`` is ``sums[:, j] / counts[j]``, and `norms`
+    are the squared norms of `sums`, so distances only need the dot products of the
+    rows with `sums`.
+    """
+    dots = np.add.reduceat(sums[features] * weights[:, None], offsets, axis=0)
+    return norms / (counts * counts) - 2 * dots / counts
+
+
+def _seed(
+    vectors: _Vectors, sample: Any, k: int, generator: Any
+) -> tuple[Any, Any, Any]:
+    """Pick `k` rows of a sample as centers with greedy k-means++.
+
+    Every center after the first is the best of a few candidates drawn with
+    probability proportional to their squared distance to the nearest center so far,
+    the one that leaves the sample closest to its centers. Returns the sums, counts
+    and squared norms of the sums of the centers.
+    """
+    features, weights, offsets, lengths = vectors.rows(sample)
+    sums = np.zeros((vectors.n_features, k), dtype=np.float32)
+    trials = 2 + int(math.log(k))
+    candidates = np.zeros((vectors.n_features, trials), dtype=np.float32)
+    closest = np.full(len(sample), 2.0)
+    chosen = [generator.integers(len(sample))]
+    for j in range(k):
+        for trial, row in enumerate(chosen):
+            lo = offsets[row]
+            hi = lo + lengths[row]
+            candidates[features[lo:hi], trial] = weights[lo:hi]
+        dots = np.add.reduceat(
+            candidates[:, : len(chosen)][features] * weights[:, None], offsets, axis=0
+        )
+        distances = np.minimum(closest[:, None], np.maximum(2 - 2 * dots, 0))
+        best = distances.sum(axis=0).argmin()
+        sums[:, j] = candidates[:, best]
+        closest = distances[:, best]
+        candidates[:] = 0
+
+        total = closest.sum()
+        if total > 0:
+            chosen = generator.choice(len(sample), trials, p=closest / total).tolist()
+        else:
+            chosen = generator.integers(len(sample), size=trials).tolist()
+    return sums, np.ones(k), np.ones(k)
+
+
+def _update(
+    sums: Any,
+    counts: Any,
+    norms: Any,
+    features: Any,
+    weights: Any,
+    lengths: Any,
+    labels: Any,
+) -> None:
+    """Add rows to the sums of the centers they are assigned to."""
+    k = sums.shape[1]
+    cells, inverse = np.unique(
+        features.astype(np.int64) * k + np.repeat(labels, lengths),
+        return_inverse=True,
+    )
+    flat = sums.reshape(-1)
+    old = flat[cells].astype(np.float64)
+    new = (old + np.bincount(inverse, weights)).astype(np.float32)
+    flat[cells] = new
+    norms += np.bincount(cells % k, new.astype(np.float64) ** 2 - old**2, k)
+    counts += np.bincount(labels, minlength=k)
+
+
+class TopicClusters:
+    """Clusters of questions by topic, found with mini-batch k-means.
+
+    Build clusters with `build()`. Questions are numbered from 0 in the order the
+    source yields them, so the numbers are ordinals of the source.
+
+    Parameters
+    ----------
+    field : str
+        Either ``"question"`` or ``"answer"``.
+    names : list[str | None]
+        The token that names each feature, if any token hashes to it.
+    idf : numpy.ndarray
+        The inverse document frequency of each feature.
+    centers : numpy.ndarray
+        The center of each cluster, as a column of shape ``(n_features, k)``.
+    labels : Sequence[int]
+        The cluster of each question, or -1 for questions without any token that
+        has a weight.
+    inertia : float, default = 0.0
+        The sum of the squared distances of the questions to their centers.
+    """
+
+    def __init__(
+        self: Self,
+        field: str,
+        names: list[Optional[str]],
+        idf: Any,
+        centers: Any,
+        labels: Any,
+        inertia: float = 0.0,
+    ):
+        self.field: str = field
+        self.names: list[Optional[str]] = names
+        self.idf: Any = idf
+        self.centers: Any = centers
+        self.labels: array = labels if isinstance(labels, array) else array("i", labels)
+        self.inertia: float = inertia
+        self._norms = (centers.astype(np.float64) ** 2).sum(axis=0)
+
+    @classmethod
+    def build(
+        cls: type[Self],
+        source: Source,
+        k: int = 20,
+        field: str = "question",
+        n_features: int = FEATURES,
+        max_df: float = 0.5,
+        batch_size: int = 1024,
+        epochs: int = 3,
+        seed: int = 1,
+    ) -> Self:
+        """Cluster the questions of a mirror store or iterable.
+
+        Parameters
+        ----------
+        source : Store | str | os.PathLike | Iterable[Tossup | Bonus]
+            A mirror store, the directory of a `DirectoryStore`, or any iterable of
+            questions, such as the questions of one subcategory. It is read once.
+        k : int, default = 20
+            The number of clusters.
+        field : str, default = "question"
+            Cluster by the question text (``"question"``) or the answer
+            (``"answer"``), like `qbreader.similarity.question_text()`.
+        n_features : int, default = FEATURES
+            The number of features that tokens are hashed into. Each center takes
+            ``4 * n_features`` bytes.
+        max_df : float, default = 0.5
+            Tokens in more than this fraction of the questions are ignored.
+        batch_size : int, default = 1024
+            The number of questions that move the centers at a time.
+        epochs : int, default = 3
+            The number of times each question is drawn into a batch.
+        seed : int, default = 1
+            The seed of the random seeding and batches.
+
+        Raises
+        ------
+        ImportError
+            If NumPy is not installed.
+        ValueError
+            If fewer than `k` questions have a token with a weight.
+        """
+        if np is None:
+            raise ImportError("TopicClusters.build() requires numpy to be installed.")
+        for name, value in (
+            ("k", k),
+            ("n_features", n_features),
+            ("batch_size", batch_size),
+            ("epochs", epochs),
+        ):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise TypeError(f"{name} must be an int, not {type(value).__name__}.")
+            if value < 1:
+                raise ValueError(f"{name} must be at least 1.")
+        if field not in FIELDS:
+            raise ValueError(f"field must be one of {FIELDS}, not {field!r}.")
+        if not 0 < max_df <= 1:
+            raise ValueError("max_df must be greater than 0 and at most 1.")
+        questions = iter_source(source)
+
+        vectors = _Vectors(n_features)
+        for question in questions:
+            vectors.add(question_text(question, field))
+        idf, documents = vectors.finish(max_df)
+        if len(documents) < k:
+            raise ValueError(
+                f"cannot make {k} clusters of {len(documents)} questions with a "
+                + "weighted token."
+            )
+
+        generator = np.random.default_rng(seed)
+        size = min(len(documents), max(3 * batch_size, k))
+        sample = np.sort(generator.choice(documents, size, replace=False))
+        sums, counts, norms = _seed(vectors, sample, k, generator)
+        for _ in range(epochs):
+            order = generator.permutation(documents)
+            for first in range(0, len(order), batch_size):
+                features, weights, offsets, lengths = vectors.rows(
+                    order[first:][:batch_size]
+                )
+                scores = _scores(sums, counts, norms, features, weights, offsets)
+                labels = scores.argmin(axis=1)
+                _update(sums, counts, norms, features, weights, lengths, labels)
+
+        assigned = np.full(len(vectors), -1, dtype=np.int32)
+        inertia = 0.0
+        for first in range(0, len(documents), batch_size):
+            rows = documents[first:][:batch_size]
+            features, weights, offsets, _ = vectors.rows(rows)
+            scores = _scores(sums, counts, norms, features, weights, offsets)
+            labels = scores.argmin(axis=1)
+            assigned[rows] = labels
+            best = scores[np.arange(len(rows)), labels]
+            inertia += float(np.maximum(best + 1, 0).sum())
+        centers = (sums / counts.astype(np.float32)).astype(np.float32)
+        labels = array("i", assigned.tobytes())
+        return cls(field, vectors.names, idf, centers, labels, inertia)
+
+    def __len__(self: Self) -> int:
+        """Return the number of questions."""
+        return len(self.labels)
+
+    @property
+    def k(self: Self) -> int:
+        """Return the number of clusters."""
+        return self.centers.shape[1]
+
+    def _check(self: Self, cluster: int) -> None:
+        if not 0 <= cluster < self.k:
+            raise IndexError(f"cluster {cluster} does not exist.")
+
+    def sizes(self: Self) -> list[int]:
+        """Return the number of questions in each cluster."""
+        labels = np.frombuffer(self.labels, dtype=np.int32)
+        return np.bincount(labels[labels >= 0], minlength=self.k).tolist()
+
+    def members(self: Self, cluster: int) -> list[int]:
+        """Return the numbers of the questions of a cluster, in increasing order."""
+        self._check(cluster)
+        labels = np.frombuffer(self.labels, dtype=np.int32)
+        return np.flatnonzero(labels == cluster).tolist()
+
+    def top_terms(self: Self, cluster: int, n: int = 10) -> list[tuple[str, float]]:
+        """Return the `n` tokens with the largest weights in the center of a cluster.
+
+        Returns
+        -------
+        list[tuple[str, float]]
+            Pairs of a token and its weight, largest first. Tokens are the names of
+            the features, so a rare token may stand for a feature that other tokens
+            hash to as well.
+        """
+        self._check(cluster)
+        if n < 1:
+            raise ValueError("n must be at least 1.")
+        names = self.names
+        center = self.centers[:, cluster]
+        top = np.flatnonzero(center > 0)
+        top = top[np.array([names[f] is not None for f in top.tolist()], dtype=bool)]
+        if len(top) > n:
+            top = top[np.argpartition(-center[top], n - 1)[:n]]
+        top = top[np.lexsort((top, -center[top]))]
+        return [
+            (cast(str, names[feature]), float(center[feature]))
+            for feature in top.tolist()
+        ]
+
+    def assign(self: Self, query: Union[Tossup, Bonus, str]) -> int:
+        """Return the cluster whose center is nearest to a question or text.
+
+        Returns -1 if the text has no token with a weight, such as tokens that no
+        clustered question had.
+        """
+        if not isinstance(query, str):
+            query = question_text(query, self.field)
+        counts = _counts(tokenize(query), len(self.idf))
+        features = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights = (1 + np.log(weights)) * self.idf[features]
+        norm = math.sqrt(float(weights @ weights))
+        if not norm:
+            return -1
+        dots = (weights / norm) @ self.centers[features]
+        return int((self._norms - 2 * dots).argmin())
+
+
+__all__ = (
+    "FEATURES",
+    "TopicClusters",
+)
@@ -3,8 +3,8 @@
 from __future__ import annotations
 
 import enum
-from collections.abc import Iterable, Sequence
-from typing import Any, Literal, Optional, Self, Type, TypeAlias, Union
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from typing import Any, Literal, Optional, Self, Type, TypeAlias, TypeVar, Union
 
 import aiohttp
 import requests
@@ -150,6 +150,28 @@ class Year(enum.IntEnum):
     CURRENT_YEAR = 2024
 
 
+_DIFFICULTIES: dict[Any, Difficulty] = {
+    **{d.value: d for d in Difficulty},
+    **{int(d.value): d for d in Difficulty},
+}
+_CATEGORIES: dict[str, Category] = {c.value: c for c in Category}
+_SUBCATEGORIES: dict[str, Subcategory] = {s.value: s for s in Subcategory}
+_ALTERNATE_SUBCATEGORIES: dict[str, AlternateSubcategory] = {
+    a.value: a for a in AlternateSubcategory
+}
+
+
+_E = TypeVar("_E", bound=enum.Enum)
+
+
+def _lookup(table: Mapping[Any, _E], enum_type: Type[_E], value: Any) -> _E:
+    """Resolve an enum value through a lookup table, falling back to the enum."""
+    try:
+        return table[value]
+    except (KeyError, TypeError):
+        return enum_type(value)
+
+
 class AnswerJudgement:
     """A judgement given by `api/check-answer`."""
 
@@ -323,6 +345,86 @@ class Tossup:
             else None,
         )
 
+    @classmethod
+    def from_json_many(cls: Type[Self], jsons: Iterable[dict[str, Any]]) -> list[Self]:
+        """Create Tossups from an iterable of JSON objects.
+
+        Equivalent to calling `from_json()` on every element, but enums are resolved
+        through precomputed lookup tables and set/packet metadata is only constructed
+        once and shared between tossups from the same set/packet.
+        """
+        metadata = _MetadataCache()
+        return [cls._from_json_cached(json, metadata) for json in jsons]
+
+    @classmethod
+    def _from_json_cached(
+        cls: Type[Self], json: dict[str, Any], metadata: _MetadataCache
+    ) -> Self:
+        """Create a Tossup from a JSON object, sharing metadata through `metadata`."""
+        alternate_subcategory = json.get("alternate_subcategory", None)
+        return cls(
+            question=json["question"],
+            question_sanitized=json["question_sanitized"],
+            answer=json["answer"],
+            answer_sanitized=json["answer_sanitized"],
+            difficulty=_lookup(_DIFFICULTIES, Difficulty, json["difficulty"]),
+            category=_lookup(_CATEGORIES, Category, json["category"]),
+            subcategory=_lookup(_SUBCATEGORIES, Subcategory, json["subcategory"]),
+            packet=metadata.packet(json["packet"]),
+            set=metadata.set(json["set"]),
+            number=json["number"],
+            alternate_subcategory=_lookup(
+                _ALTERNATE_SUBCATEGORIES,
+                AlternateSubcategory,
+                alternate_subcategory,
+            )
+            if alternate_subcategory
+            else None,
+        )
+
+    def to_json(self: Self) -> dict[str, Any]:
+        """Convert the tossup into a JSON object accepted by `from_json()`."""
+        json: dict[str, Any] = {
+            "question": self.question,
+            "question_sanitized": self.question_sanitized,
+            "answer": self.answer,
+            "answer_sanitized": self.answer_sanitized,
+            "difficulty": int(self.difficulty),
+            "category": str(self.category),
+            "subcategory": str(self.subcategory),
+            "packet": self.packet.to_json(),
+            "set": self.set.to_json(),
+            "number": self.number,
+        }
+        if self.alternate_subcategory:
+            json["alternate_subcategory"] = str(self.alternate_subcategory)
+        return json
+
+    def to_bytes(self: Self) -> bytes:
+        """Serialize the tossup into a compact, versioned binary format.
+
+        Enums are stored as small integers and set/packet metadata is stored once. See
+        `from_bytes()` for the inverse.
+        """
+        from qbreader import _codec
+
+        encoder = _codec.Encoder()
+        encoder.tossup(self)
+        return encoder.finish(_codec.TOSSUP)
+
+    @classmethod
+    def from_bytes(cls: Type[Self], data: bytes | bytearray | memoryview) -> Self:
+        """Create a Tossup from the output of `to_bytes()`."""
+        from qbreader import _codec
+
+        return _codec.decode(data, _codec.TOSSUP, cls)
+
+    def __reduce__(self: Self) -> tuple[Callable[..., Self], tuple[Any, ...]]:
+        """Pickle the tossup as a flat tuple of strings and enum codes."""
+        from qbreader import _codec
+
+        return (_codec.tossup_from_state, (type(self), *_codec.tossup_state(self)))
+
     def check_answer_sync(self, givenAnswer: str) -> AnswerJudgement:
         """Check whether an answer is correct."""
         return AnswerJudgement.check_answer_sync(self.answer, givenAnswer)
@@ -425,6 +527,96 @@ class Bonus:
             difficultyModifiers=json.get("difficultyModifiers", None),
         )
 
+    @classmethod
+    def from_json_many(cls: Type[Self], jsons: Iterable[dict[str, Any]]) -> list[Self]:
+        """Create Bonuses from an iterable of JSON objects.
+
+        Equivalent to calling `from_json()` on every element, but enums are resolved
+        through precomputed lookup tables and set/packet metadata is only constructed
+        once and shared between bonuses from the same set/packet.
+        """
+        metadata = _MetadataCache()
+        return [cls._from_json_cached(json, metadata) for json in jsons]
+
+    @classmethod
+    def _from_json_cached(
+        cls: Type[Self], json: dict[str, Any], metadata: _MetadataCache
+    ) -> Self:
+        """Create a Bonus from a JSON object, sharing metadata through `metadata`."""
+        alternate_subcategory = json.get("alternate_subcategory", None)
+        return cls(
+            leadin=json["leadin"],
+            leadin_sanitized=json["leadin_sanitized"],
+            parts=json["parts"],
+            parts_sanitized=json["parts_sanitized"],
+            answers=json["answers"],
+            answers_sanitized=json["answers_sanitized"],
+            difficulty=_lookup(_DIFFICULTIES, Difficulty, json["difficulty"]),
+            category=_lookup(_CATEGORIES, Category, json["category"]),
+            subcategory=_lookup(_SUBCATEGORIES, Subcategory, json["subcategory"]),
+            set=metadata.set(json["set"]),
+            packet=metadata.packet(json["packet"]),
+            number=json["number"],
+            alternate_subcategory=_lookup(
+                _ALTERNATE_SUBCATEGORIES,
+                AlternateSubcategory,
+                alternate_subcategory,
+            )
+            if alternate_subcategory
+            else None,
+            values=json.get("values", None),
+            difficultyModifiers=json.get("difficultyModifiers", None),
+        )
+
+    def to_json(self: Self) -> dict[str, Any]:
+        """Convert the bonus into a JSON object accepted by `from_json()`."""
+        json: dict[str, Any] = {
+            "leadin": self.leadin,
+            "leadin_sanitized": self.leadin_sanitized,
+            "parts": list(self.parts),
+            "parts_sanitized": list(self.parts_sanitized),
+            "answers": list(self.answers),
+            "answers_sanitized": list(self.answers_sanitized),
+            "difficulty": int(self.difficulty),
+            "category": str(self.category),
+            "subcategory": str(self.subcategory),
+            "set": self.set.to_json(),
+            "packet": self.packet.to_json(),
+            "number": self.number,
+        }
+        if self.alternate_subcategory:
+            json["alternate_subcategory"] = str(self.alternate_subcategory)
+        if self.values:
+            json["values"] = list(self.values)
+        if self.difficultyModifiers:
+            json["difficultyModifiers"] = [str(m) for m in self.difficultyModifiers]
+        return json
+
+    def to_bytes(self: Self) -> bytes:
+        """Serialize the bonus into a compact, versioned binary format.
+
+        Enums are stored as small integers and set/packet metadata is stored once. See
+        `from_bytes()` for the inverse.
+        """
+        from qbreader import _codec
+
+        encoder = _codec.Encoder()
+        encoder.bonus(self)
+        return encoder.finish(_codec.BONUS)
+
+    @classmethod
+    def from_bytes(cls: Type[Self], data: bytes | bytearray | memoryview) -> Self:
+        """Create a Bonus from the output of `to_bytes()`."""
+        from qbreader import _codec
+
+        return _codec.decode(data, _codec.BONUS, cls)
+
+    def __reduce__(self: Self) -> tuple[Callable[..., Self], tuple[Any, ...]]:
+        """Pickle the bonus as a flat tuple of strings and enum codes."""
+        from qbreader import _codec
+
+        return (_codec.bonus_from_state, (type(self), *_codec.bonus_state(self)))
+
     def check_answer_sync(self, part: int, givenAnswer: str) -> AnswerJudgement:
         """Check whether an answer is correct."""
         return AnswerJudgement.check_answer_sync(self.answers[part], givenAnswer)
@@ -489,12 +681,8 @@ class QueryResponse:
         See https://www.qbreader.org/api-docs/query#returns for schema.
         """
         return cls(
-            tossups=[
-                Tossup.from_json(tossup) for tossup in json["tossups"]["questionArray"]
-            ],
-            bonuses=[
-                Bonus.from_json(bonus) for bonus in json["bonuses"]["questionArray"]
-            ],
+            tossups=Tossup.from_json_many(json["tossups"]["questionArray"]),
+            bonuses=Bonus.from_json_many(json["bonuses"]["questionArray"]),
             tossups_found=json["tossups"]["count"],
             bonuses_found=json["bonuses"]["count"],
             query_string=json["queryString"],
@@ -535,11 +723,36 @@ class Packet:
         See https://www.qbreader.org/api-docs/packet#returns for schema.
         """
         return cls(
-            tossups=[Tossup.from_json(tossup) for tossup in json["tossups"]],
-            bonuses=[Bonus.from_json(bonus) for bonus in json["bonuses"]],
+            tossups=Tossup.from_json_many(json["tossups"]),
+            bonuses=Bonus.from_json_many(json["bonuses"]),
             number=number,
         )
 
+    def to_bytes(self: Self) -> bytes:
+        """Serialize the packet into a compact, versioned binary format.
+
+        Enums are stored as small integers and set/packet metadata is stored once. See
+        `from_bytes()` for the inverse.
+        """
+        from qbreader import _codec
+
+        encoder = _codec.Encoder()
+        encoder.packet(self)
+        return encoder.finish(_codec.PACKET)
+
+    @classmethod
+    def from_bytes(cls: Type[Self], data: bytes | bytearray | memoryview) -> Self:
+        """Create a Packet from the output of `to_bytes()`."""
+        from qbreader import _codec
+
+        return _codec.decode(data, _codec.PACKET, cls)
+
+    def __reduce__(self: Self) -> tuple[Callable[..., Self], tuple[Any, ...]]:
+        """Pickle the packet as a flat tuple of strings and enum codes."""
+        from qbreader import _codec
+
+        return (_codec.packet_from_state, (type(self), *_codec.packet_state(self)))
+
     def paired_questions(self) -> zip[tuple[Tossup, Bonus]]:
         """Yield pairs of tossups and bonuses."""
         return zip(self.tossups, self.bonuses)
@@ -589,6 +802,9 @@ class PacketMetadata:
             number=json["number"],
         )
 
+    def to_json(self: Self) -> dict[str, Any]:
+        return {"_id": self._id, "name": self.name, "number": self.number}
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, PacketMetadata):
             return NotImplemented
@@ -625,6 +841,14 @@ class SetMetadata:
             standard=json["standard"],
         )
 
+    def to_json(self: Self) -> dict[str, Any]:
+        return {
+            "_id": self._id,
+            "name": self.name,
+            "year": self.year,
+            "standard": self.standard,
+        }
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, SetMetadata):
             return NotImplemented
@@ -640,6 +864,30 @@ class SetMetadata:
         return self.name
 
 
+class _MetadataCache:
+    """Share set/packet metadata objects between questions decoded together."""
+
+    def __init__(self: Self):
+        self._packets: dict[tuple, PacketMetadata] = {}
+        self._sets: dict[tuple, SetMetadata] = {}
+
+    def packet(self: Self, json: dict[str, Any]) -> PacketMetadata:
+        key = (json["_id"], json["name"], json["number"])
+        try:
+            return self._packets[key]
+        except KeyError:
+            packet = self._packets[key] = PacketMetadata(*key)
+            return packet
+
+    def set(self: Self, json: dict[str, Any]) -> SetMetadata:
+        key = (json["_id"], json["name"], json["year"], json["standard"])
+        try:
+            return self._sets[key]
+        except KeyError:
+            set = self._sets[key] = SetMetadata(*key)
+            return set
+
+
 QuestionType: TypeAlias = Union[
     Literal["tossup", "bonus", "all"], Type[Tossup], Type[Bonus]
 ]
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Any, Callable
 from urllib.request import urlopen
 
 import pytest
@@ -61,3 +61,75 @@ async def async_assert_warning(
     """Assert that an async function raises a warning."""
     with pytest.warns(warning):
         return await func(*args, **kwargs)
+
+
+def tossup_json(**overrides: Any) -> dict[str, Any]:
+    """Return the JSON for a sample tossup, with `overrides` applied."""
+    return {
+        "_id": "64046cc6de59b8af97422da5",
+        "question": "<b>This quantity is constant in all inertial reference frames."
+        + " (*)</b> For 10 points, name this value symbolized <i>c</i>.",
+        "question_sanitized": "This quantity is constant in all inertial reference"
+        + " frames. (*) For 10 points, name this value symbolized c.",
+        "answer": "<b><u>Speed of Light</u></b>",
+        "answer_sanitized": "Speed of Light",
+        "category": "Science",
+        "subcategory": "Physics",
+        "packet": {"_id": "64046cc6de59b8af97422da2", "name": "03", "number": 3},
+        "set": {
+            "_id": "64046cc6de59b8af97422d4f",
+            "name": "2017 WHAQ",
+            "year": 2017,
+            "standard": True,
+        },
+        "difficulty": 3,
+        "number": 3,
+        **overrides,
+    }
+
+
+def bonus_json(**overrides: Any) -> dict[str, Any]:
+    """Return the JSON for a sample bonus, with `overrides` applied."""
+    return {
+        "_id": "673ec00f90236da031c2cedb",
+        "leadin": "H. L. Mencken co-founded <i>The</i> [this adjective]"
+        + " <i>Mercury</i>. For 10 points each:",
+        "leadin_sanitized": "H. L. Mencken co-founded The [this adjective] Mercury."
+        + " For 10 points each:",
+        "parts": [
+            "Name this adjective in the title of a Mencken book.",
+            "<i>The Baltimore Sun</i> sent Mencken to cover one of these events.",
+            "Henry Drummond picks up a book by Darwin and this book.",
+        ],
+        "parts_sanitized": [
+            "Name this adjective in the title of a Mencken book.",
+            "The Baltimore Sun sent Mencken to cover one of these events.",
+            "Henry Drummond picks up a book by Darwin and this book.",
+        ],
+        "answers": [
+            "<b><u>American</u></b> [accept <i>The <b><u>American</u></b>"
+            + " Mercury</i>]",
+            "<b><u>trial</u></b> [accept Scopes <b><u>trial</u></b>]",
+            "the <b><u>Bible</u></b>",
+        ],
+        "answers_sanitized": [
+            "American [accept The American Mercury]",
+            "trial [accept Scopes trial]",
+            "the Bible",
+        ],
+        "category": "Literature",
+        "subcategory": "American Literature",
+        "alternate_subcategory": "Misc Literature",
+        "values": [10, 10, 10],
+        "difficultyModifiers": ["h", "m", "e"],
+        "difficulty": 7,
+        "number": 1,
+        "packet": {"_id": "673ec00f90236da031c2cec6", "name": "A", "number": 1},
+        "set": {
+            "_id": "673ec00f90236da031c2cec5",
+            "name": "2024 ACF Winter",
+            "year": 2024,
+            "standard": True,
+        },
+        **overrides,
+    }
@@ -0,0 +1,14 @@
+"""Fixtures shared by the tests of several modules."""
+
+import pytest
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    """Run a test with and without NumPy.
+
+    The test module names the module whose NumPy is disabled in `BACKEND_MODULE`.
+    """
+    if request.param == "python":
+        monkeypatch.setattr(request.module.BACKEND_MODULE, "np", None)
+    return request.param
@@ -0,0 +1,101 @@
+"""Test the answerline parser."""
+
+import pytest
+
+from qbreader.answerline import (
+    Answer,
+    Answerline,
+    parse_answerline,
+    parse_answerlines,
+    tokenize,
+)
+from qbreader.types import Bonus, Directive, Packet, QueryResponse, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+from tests.test_judge import MOZART
+
+
+def test_tokenize():
+    """Words are folded, without punctuation, stopwords or plurals."""
+    assert tokenize("The Rubik's Cubes of Dvořák") == ["rubik", "cube", "dvorak"]
+    assert tokenize("glasses and flies") == ["glass", "fly"]
+
+
+class TestAnswerline:
+    """Test parsing answerlines."""
+
+    def test_clauses(self):
+        """Main answers and clauses are separated."""
+        answerline = parse_answerline(MOZART)
+        assert answerline.primary == Answer("Wolfgang Amadeus Mozart", "Mozart")
+        assert answerline.required == "Mozart"
+        assert answerline.accept == (Answer("W. A. Mozart", "W. A. Mozart"),)
+        assert answerline.prompt == (
+            Answer("Wolfgang", "Wolfgang", directed_prompt="which Wolfgang?"),
+        )
+        assert answerline.reject == (Answer("Leopold Mozart", "Leopold"),)
+        assert answerline.alternates(Directive.ACCEPT) == (
+            answerline.primary,
+            *answerline.accept,
+        )
+
+    @pytest.mark.parametrize(
+        "answerline, answers, accept",
+        [
+            ("Rubik's cubes", ["Rubik's cubes"], []),
+            ("<b>Pyotr Ilyich Tchaikovsky</b>", ["Pyotr Ilyich Tchaikovsky"], []),
+            (
+                "<b><u>mitochondria</u></b> or <b><u>mitochondrion</u></b>",
+                ["mitochondria", "mitochondrion"],
+                [],
+            ),
+            (
+                "<b><u>Battle of Hastings</u></b> [or <b><u>Hastings</u></b>, or"
+                + " <b><u>Senlac</u></b> Hill]",
+                ["Battle of Hastings"],
+                ["Hastings", "Senlac"],
+            ),
+            (
+                "Pride and Prejudice (by Jane Austen) [accept <u>P&amp;P</u> until"
+                + " read]",
+                ["Pride and Prejudice"],
+                ["P&P"],
+            ),
+        ],
+    )
+    def test_answers(self, answerline: str, answers: list, accept: list):
+        """Required words are emphasized, or the whole answer if none are."""
+        parsed = parse_answerline(answerline)
+        assert [a.text for a in parsed.answers] == answers
+        assert [a.required for a in parsed.accept] == accept
+
+    def test_remarks(self):
+        """Parenthetical remarks are optional words of the main answers."""
+        answer = parse_answerline("Pride and Prejudice (by Jane Austen)").primary
+        assert answer.required == "Pride and Prejudice"
+        assert answer.optional == "by Jane Austen"
+        assert answer.tokens == ("pride", "prejudice", "by", "jane", "austen")
+
+    def test_cache(self):
+        """Answerlines are parsed once."""
+        assert parse_answerline(MOZART) is parse_answerline(MOZART)
+
+    def test_parse_exception(self):
+        """Only strings are parsed."""
+        assert_exception(parse_answerline, TypeError, 1)
+
+
+def test_parse_answerlines():
+    """Every answerline of many questions is parsed."""
+    tossup = Tossup.from_json(tossup_json())
+    bonus = Bonus.from_json(bonus_json())
+    packet = Packet([tossup, tossup], [bonus], number=1)
+
+    parsed = parse_answerlines(packet)
+    assert [len(answerlines) for answerlines in parsed] == [1, 1, 3]
+    assert parsed[0][0] is parsed[1][0]
+    assert parsed[2][2] == Answerline(bonus.answers[2], [])
+    assert parsed[2][2].required == "Bible"
+
+    response = QueryResponse([tossup], [bonus], 1, 1, "")
+    assert parse_answerlines(response) == parse_answerlines([tossup, bonus])
+    assert_exception(parse_answerlines, TypeError, ["not a question"])
@@ -2,6 +2,7 @@
 not the underlying data structures. See tests/test_types.py for that."""
 
 import asyncio
+import json
 from random import random
 from typing import Any
 
@@ -10,7 +11,12 @@ import pytest_asyncio
 
 import qbreader as qb
 from qbreader import Async
-from tests import async_assert_exception, check_internet_connection
+from tests import (
+    async_assert_exception,
+    bonus_json,
+    check_internet_connection,
+    tossup_json,
+)
 
 
 @pytest.fixture(scope="module")
@@ -190,6 +196,74 @@ class TestAsync:
         mock_get(mock_status_code=404)
         await async_assert_exception(qbr.query, Exception)
 
+    @pytest.mark.asyncio
+    async def test_iter_query(self, qbr):
+        params = {
+            "questionType": "tossup",
+            "setName": "2023 PACE NSC",
+            "queryString": "the",
+        }
+        query = await qbr.query(**params, maxReturnLength=100)
+        questions = [q async for q in qbr.iter_query(**params, maxReturnLength=3)]
+        assert len(questions) == query.tossups_found
+        first_page = len(query.tossups)
+        assert questions[:first_page] == list(query.tossups)
+
+    @pytest.mark.asyncio
+    async def test_iter_query_pages(self, qbr, monkeypatch):
+        """Test that every page is requested and streamed in small chunks."""
+        tossups = [tossup_json(number=i) for i in range(5)]
+        pages = []
+
+        class MockContent:
+            def __init__(self, body: bytes):
+                self.body = body
+
+            async def iter_chunked(self, n: int):
+                for i in range(0, len(self.body), 10):
+                    yield self.body[i:][:10]
+
+        class MockResponse:
+            status = 200
+
+            def __init__(self, page: int):
+                start = (page - 1) * 2
+                self.content = MockContent(
+                    json.dumps(
+                        {
+                            "tossups": {
+                                "count": len(tossups),
+                                "questionArray": tossups[start:][:2],
+                            },
+                            "bonuses": {"count": 0, "questionArray": []},
+                            "queryString": "",
+                        }
+                    ).encode()
+                )
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        def mock_get(url, params, **kwargs):
+            pages.append(params["tossupPagination"])
+            return MockResponse(params["tossupPagination"])
+
+        monkeypatch.setattr(qbr.session, "get", mock_get)
+        questions = [
+            q async for q in qbr.iter_query(questionType="tossup", maxReturnLength=2)
+        ]
+        assert pages == [1, 2, 3]
+        assert questions == [qb.Tossup.from_json(tu) for tu in tossups]
+
+    @pytest.mark.asyncio
+    async def test_iter_query_bad_response(self, qbr, mock_get):
+        mock_get(mock_status_code=404)
+        with pytest.raises(Exception):
+            [q async for q in qbr.iter_query()]
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize("number", [1, 20, 50, 100])
     async def test_random_tossup(self, qbr, number: int):
@@ -478,6 +552,153 @@ class TestAsync:
             qbr.packet_bonuses, Exception, setName="2023 PACE NSC", packetNumber=1
         )
 
+    @pytest.fixture()
+    def mock_bodies(self, monkeypatch, qbr):
+        """Mock aiohttp.ClientSession.get to return a raw body built from params."""
+
+        def _set_get(body, mock_status_code: int = 200):
+            requested = []
+
+            class MockResponse:
+                def __init__(self, params):
+                    self.status = mock_status_code
+                    self.params = params
+
+                async def __aenter__(self):
+                    return self
+
+                async def __aexit__(self, exc_type, exc_val, exc_tb):
+                    pass
+
+                async def read(self):
+                    # finish out of order to check that results are reordered
+                    await asyncio.sleep(random() / 50)
+                    return json.dumps(body(self.params)).encode()
+
+            def get(url, params, **kwargs):
+                requested.append(params)
+                return MockResponse(params)
+
+            monkeypatch.setattr(qbr.session, "get", get)
+            return requested
+
+        return _set_get
+
+    @pytest.mark.asyncio
+    async def test_packet_body(self, qbr, mock_bodies):
+        """Test that a packet is downloaded without being decoded."""
+        body = {"tossups": [tossup_json()], "bonuses": [bonus_json()]}
+        requested = mock_bodies(lambda params: body)
+        assert json.loads(await qbr.packet_body("2017 WHAQ", 3)) == body
+        assert requested == [{"setName": "2017 WHAQ", "packetNumber": 3}]
+        with pytest.raises(TypeError):
+            await qbr.packet_body(1, 1)
+        with pytest.raises(TypeError):
+            await qbr.packet_body("2017 WHAQ", "1")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("as_bytes", [False, True])
+    async def test_ingest_packets(self, qbr, mock_bodies, as_bytes: bool):
+        """Test that packets are decoded in worker processes and kept in order."""
+
+        def packet_body(params):
+            number = params["packetNumber"]
+            return {
+                "tossups": [tossup_json(number=i) for i in range(number)],
+                "bonuses": [bonus_json(number=i) for i in range(number)],
+            }
+
+        requested = mock_bodies(packet_body)
+        packets = [("2017 WHAQ", number) for number in range(1, 11)]
+        results = [
+            packet
+            async for packet in qbr.ingest_packets(
+                packets, workers=2, concurrency=3, as_bytes=as_bytes
+            )
+        ]
+        assert len(requested) == 10
+        if as_bytes:
+            results = [qb.Packet.from_bytes(packet) for packet in results]
+        assert [packet.number for packet in results] == list(range(1, 11))
+        assert results[2] == qb.Packet.from_json(packet_body(requested[2]), number=3)
+
+    @pytest.mark.asyncio
+    async def test_ingest_queries(self, qbr, mock_bodies):
+        """Test that query responses are decoded in worker processes and in order."""
+
+        def query_body(params):
+            return {
+                "tossups": {
+                    "count": 1,
+                    "questionArray": [tossup_json(number=params["maxReturnLength"])],
+                },
+                "bonuses": {"count": 0, "questionArray": []},
+                "queryString": params["queryString"],
+            }
+
+        mock_bodies(query_body)
+        queries = [{"queryString": "light", "maxReturnLength": i} for i in range(1, 6)]
+        responses = [
+            response
+            async for response in qbr.ingest_queries(queries, workers=2, concurrency=2)
+        ]
+        assert [r.tossups[0].number for r in responses] == [1, 2, 3, 4, 5]
+        assert all(r.query_string == "light" for r in responses)
+
+    @pytest.mark.asyncio
+    async def test_ingest_close(self, qbr, mock_bodies, monkeypatch):
+        """Test that closing a pipeline early waits for its cancelled requests."""
+        mock_bodies(lambda params: {"tossups": [tossup_json()], "bonuses": []})
+        get = qbr.session.get
+        stalled = asyncio.Event()
+
+        class StalledResponse:
+            async def __aenter__(self):
+                await stalled.wait()
+
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        def stall(url, params, **kwargs):
+            if params["packetNumber"] == 1:
+                return get(url, params, **kwargs)
+            return StalledResponse()
+
+        monkeypatch.setattr(qbr.session, "get", stall)
+        packets = [("2017 WHAQ", number) for number in range(1, 11)]
+        stream = qbr.ingest_packets(packets, workers=1, concurrency=4)
+        assert (await stream.__anext__()).number == 1
+        await stream.aclose()
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "params, exception",
+        [
+            ({"workers": 0}, ValueError),
+            ({"workers": "2"}, TypeError),
+            ({"concurrency": 0}, ValueError),
+            ({"concurrency": 1.5}, TypeError),
+        ],
+    )
+    async def test_ingest_exception(self, qbr, params, exception):
+        """Test that invalid pipeline settings are rejected eagerly."""
+        with pytest.raises(exception):
+            qbr.ingest_packets([("2017 WHAQ", 1)], **params)
+        with pytest.raises(exception):
+            qbr.ingest_queries([{}], **params)
+
+    @pytest.mark.asyncio
+    async def test_ingest_bad_response(self, qbr, mock_bodies):
+        """Test that a failed request stops the pipeline."""
+        mock_bodies(lambda params: {}, mock_status_code=404)
+        with pytest.raises(Exception):
+            [p async for p in qbr.ingest_packets([("2017 WHAQ", 1)], workers=1)]
+
+        mock_bodies(lambda params: {})
+        with pytest.raises(TypeError):
+            [p async for p in qbr.ingest_packets([(1, 1)], workers=1)]
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
         "setName, expected",
@@ -0,0 +1,124 @@
+"""Test answer autocompletion."""
+
+import random
+
+import pytest
+
+import qbreader.autocomplete
+from qbreader.autocomplete import AnswerCompleter, main_answer, normalize_answer
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.autocomplete
+
+ANSWERLINES = [
+    "Isaac Newton [accept Newton]",
+    "Isaac Newton",
+    "isaac newton (prompt on Newton)",
+    "Newton's laws of motion",
+    "Johannes Kepler",
+    "Isaac Asimov",
+    "Isaac",
+    "Isaacs",
+    "Dvořák",
+    "dvorak",
+    "",
+]
+
+
+@pytest.fixture
+def completer(backend) -> AnswerCompleter:
+    """A completer of a few answerlines, with and without NumPy."""
+    return AnswerCompleter.from_answerlines(ANSWERLINES)
+
+
+def test_main_answer():
+    """Clauses in brackets and parentheses are removed."""
+    assert main_answer("Isaac Newton [accept Newton]") == "Isaac Newton"
+    assert main_answer("The (Magic) Flute (prompt on Flute") == "The Flute"
+    assert main_answer("[or Newton]") == ""
+
+
+def test_normalize_answer():
+    """Answers are folded words."""
+    assert normalize_answer(" Newton’s  Laws!") == "newton s laws"
+
+
+class TestAnswerCompleter:
+    """Test the AnswerCompleter class."""
+
+    def test_from_answerlines(self, completer: AnswerCompleter):
+        """Main answers are counted by their normalized text."""
+        assert len(completer) == 7
+        assert dict(zip(completer.answers, completer.counts))["Isaac Newton"] == 3
+        assert dict(zip(completer.answers, completer.counts))["Dvořák"] == 2
+
+    def test_complete(self, completer: AnswerCompleter):
+        """Completions are the most frequent answers with a matching word."""
+        assert completer.complete("isa") == [
+            ("Isaac Newton", 3),
+            ("Isaac", 1),
+            ("Isaac Asimov", 1),
+            ("Isaacs", 1),
+        ]
+        assert completer.complete("ISAAC ") == [
+            ("Isaac Newton", 3),
+            ("Isaac", 1),
+            ("Isaac Asimov", 1),
+        ]
+        assert completer.complete("newt") == [
+            ("Isaac Newton", 3),
+            ("Newton's laws of motion", 1),
+        ]
+        assert completer.complete("newton’s l") == [("Newton's laws of motion", 1)]
+        assert completer.complete("DVORA") == [("Dvořák", 2)]
+        assert completer.complete("isa", k=1) == [("Isaac Newton", 3)]
+        assert completer.complete("saac") == []
+        assert completer.complete("...") == []
+
+    def test_brute_force(self, completer: AnswerCompleter):
+        """Completions match a scan of every answer."""
+        generator = random.Random(0)
+        words = ["alpha", "beta", "gamma", "delta", "alp", "al"]
+        answers = [
+            " ".join(generator.choices(words, k=generator.randint(1, 4)))
+            for _ in range(300)
+        ]
+        counts = [generator.randint(1, 20) for _ in answers]
+        completer = AnswerCompleter(answers, counts)
+        for prefix in ["a", "al", "alp", "alpha ", "b", "gamma d", "delta alpha al"]:
+            expected = sorted(
+                (
+                    (-count, answer)
+                    for answer, count in zip(answers, counts)
+                    if any(
+                        answer[i:].startswith(prefix)
+                        for i in range(len(answer))
+                        if i == 0 or answer[i - 1] == " "
+                    )
+                    or answer.endswith(" " + prefix.strip())
+                    and prefix.endswith(" ")
+                    or answer == prefix.strip()
+                ),
+            )
+            found = completer.complete(prefix, k=5)
+            assert [count for _, count in found] == [-c for c, _ in expected[:5]]
+            assert {answer for answer, _ in found} <= {a for _, a in expected}
+
+    def test_build(self):
+        """Tossup answers and bonus part answers are counted."""
+        completer = AnswerCompleter.build(
+            [
+                Tossup.from_json(tossup_json(answer_sanitized="Isaac Newton")),
+                Bonus.from_json(bonus_json()),
+            ]
+        )
+        assert len(completer) == 4
+        assert completer.complete("newton") == [("Isaac Newton", 1)]
+
+    def test_exception(self, completer: AnswerCompleter):
+        """Invalid arguments are rejected."""
+        assert_exception(AnswerCompleter, ValueError, ["a"], [])
+        assert_exception(AnswerCompleter.build, TypeError, [tossup_json()])
+        assert_exception(completer.complete, TypeError, "isaac", k=1.0)
+        assert_exception(completer.complete, ValueError, "isaac", k=0)
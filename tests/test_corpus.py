@@ -0,0 +1,121 @@
+"""Test the memory-mapped corpus file."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import qbreader.corpus
+from qbreader.corpus import Corpus, CorpusWriter
+from qbreader.mirror import DirectoryStore, Mirror, SQLiteStore
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+from tests.test_local import sample_questions
+from tests.test_mirror import FakeClient
+
+
+@pytest.fixture
+def questions() -> list:
+    """Questions with every kind of optional field."""
+    return [
+        *sample_questions(),
+        Bonus.from_json(
+            bonus_json(values=[10, 15, 5], difficultyModifiers=["e", "m", "h"])
+        ),
+        Tossup.from_json(tossup_json(question="Ça, c’est \0 le 🎻", number=-1)),
+    ]
+
+
+def test_round_trip(questions: list, tmp_path):
+    """Every question decodes to what was written, in order."""
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.extend(questions)
+        assert len(writer) == len(questions)
+
+    with Corpus(tmp_path / "corpus") as corpus:
+        assert len(corpus) == len(questions)
+        assert list(corpus) == questions
+        assert corpus[-1] == questions[-1]
+        assert corpus[3] == questions[3]
+        assert len(corpus.sets) == 5
+        assert_exception(corpus.__getitem__, IndexError, len(questions))
+    assert_exception(corpus.__getitem__, ValueError, 0)
+
+
+def test_append(questions: list, tmp_path, monkeypatch):
+    """Batches are appended, and readers see them after a refresh."""
+    monkeypatch.setattr(qbreader.corpus, "FLUSH_BYTES", 1000)
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        assert writer.append(questions[0]) == 0
+    corpus = Corpus(tmp_path / "corpus")
+
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        assert len(writer) == 1
+        writer.extend(questions[1:])
+        assert len(Corpus(tmp_path / "corpus")) > 1
+    assert len(corpus) == 1
+    corpus.refresh()
+    assert list(corpus) == questions
+    assert len(corpus._records) > 2
+
+
+def test_ids(tmp_path):
+    """Questions written with an `_id` can be looked up by it."""
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.append_json(tossup_json())
+        writer.append_json(bonus_json())
+        writer.append(Tossup.from_json(tossup_json(number=2)))
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.append(Tossup.from_json(tossup_json(number=3)), tossup_json()["_id"])
+
+    corpus = Corpus(tmp_path / "corpus")
+    assert corpus.by_id(bonus_json()["_id"]) == Bonus.from_json(bonus_json())
+    assert corpus.ordinal(tossup_json()["_id"]) == 3
+    assert corpus.id_of(1) == bonus_json()["_id"]
+    assert corpus.id_of(2) is None
+    assert_exception(corpus.by_id, KeyError, "0" * 24)
+
+
+@pytest.mark.parametrize("store_type", [DirectoryStore, SQLiteStore])
+def test_mirror_ids(store_type, tmp_path):
+    """A corpus written from a mirror store can look its questions up by _id."""
+    store = store_type(tmp_path / "mirror")
+    with ThreadPoolExecutor(2) as executor:
+        Mirror(store, FakeClient({"2024 A": 2}), executor=executor).run()
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.extend(store.questions_with_ids())
+
+    corpus = Corpus(tmp_path / "corpus")
+    assert list(corpus) == list(store.questions())
+    assert corpus.by_id("2024 A/2/b1") == store.get_packet("2024 A", 2).bonuses[0]
+    assert corpus.ordinal("2024 A/1/t2") == 1
+    assert [corpus.id_of(i) for i in range(len(corpus))] == [
+        _id for _id, _ in store.questions_with_ids()
+    ]
+
+
+def test_incomplete(questions: list, tmp_path):
+    """A batch that was not completely written is ignored, then overwritten."""
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.extend(questions[:5])
+    size = (tmp_path / "corpus").stat().st_size
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.extend(questions[5:])
+    data = (tmp_path / "corpus").read_bytes()
+    (tmp_path / "corpus").write_bytes(data[: len(data) - 8])
+
+    assert list(Corpus(tmp_path / "corpus")) == questions[:5]
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        assert (tmp_path / "corpus").stat().st_size == size
+        writer.extend(questions[5:])
+    assert list(Corpus(tmp_path / "corpus")) == questions
+
+
+def test_exception(tmp_path):
+    """Files that are not corpora and objects that are not questions are rejected."""
+    (tmp_path / "short").write_bytes(b"QB")
+    (tmp_path / "other").write_bytes(b"\x00" * 64)
+    assert_exception(Corpus, ValueError, tmp_path / "short")
+    assert_exception(Corpus, ValueError, tmp_path / "other")
+    assert_exception(Corpus, FileNotFoundError, tmp_path / "missing")
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        assert_exception(writer.append, TypeError, tossup_json())
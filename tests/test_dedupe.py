@@ -0,0 +1,96 @@
+"""Test near-duplicate detection with MinHash and LSH."""
+
+import random
+
+import qbreader.dedupe
+from qbreader.dedupe import DuplicateCluster, MinHashLSH, find_duplicates
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.dedupe
+
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def texts() -> list[str]:
+    """Random texts, a copy and an edit of the first, and a copy of the third."""
+    generator = random.Random(0)
+    texts = [" ".join(generator.choices(WORDS, k=80)) for _ in range(200)]
+    edited = texts[0].split()
+    edited[40] = "changed"
+    texts[50] = texts[0]
+    texts[120] = " ".join(edited)
+    texts[199] = texts[2].upper()
+    return texts
+
+
+class TestMinHashLSH:
+    """Test the MinHashLSH class."""
+
+    def test_clusters(self, backend, monkeypatch):
+        """Copies and light edits are clustered, and nothing else is."""
+        monkeypatch.setattr(qbreader.dedupe, "BATCH_SHINGLES", 1000)
+        lsh = MinHashLSH()
+        lsh.update(texts())
+        assert len(lsh) == 200
+
+        clusters = lsh.clusters()
+        assert [cluster.documents for cluster in clusters] == [[0, 50, 120], [2, 199]]
+        assert clusters[0].similarities[:2] == [1, 1]
+        assert 0.8 <= clusters[0].similarities[2] < 1
+        assert list(clusters[1]) == [(2, 1.0), (199, 1.0)]
+        assert lsh.clusters(threshold=1) == [
+            DuplicateCluster([0, 50], [1.0, 1.0]),
+            DuplicateCluster([2, 199], [1.0, 1.0]),
+        ]
+
+    def test_signature(self, backend):
+        """Signatures do not depend on batching, NumPy, or case."""
+        lsh = MinHashLSH(num_perm=16, bands=4)
+        for text in ["one", "one two", "one two three four", "", "One  two!"]:
+            lsh.add(text)
+        assert [list(lsh._row(d)) for d in range(5)] == [
+            lsh.signature(text)
+            for text in ["one", "one two", "one two three four", "", "one two"]
+        ]
+        assert lsh.similarity(1, 4) == 1
+        assert lsh.similarity(2, 2) == 1
+        assert lsh.similarity(2, 4) < 1
+        assert lsh.candidates() == {(1, 4)}
+
+    def test_empty(self, backend):
+        """Questions with no words are never duplicates."""
+        lsh = MinHashLSH()
+        lsh.update(["", "...", "", "some text", "Some text"])
+        assert lsh.similarity(0, 2) == 0
+        assert lsh.clusters() == [DuplicateCluster([3, 4], [1.0, 1.0])]
+
+    def test_bucket(self, monkeypatch):
+        """Large buckets are only paired with their first question."""
+        monkeypatch.setattr(qbreader.dedupe, "MAX_BUCKET", 3)
+        lsh = MinHashLSH()
+        lsh.update(["same text"] * 5)
+        assert lsh.candidates() == {(0, 1), (0, 2), (0, 3), (0, 4)}
+        assert lsh.clusters()[0].documents == [0, 1, 2, 3, 4]
+
+    def test_exception(self):
+        """Invalid arguments are rejected."""
+        assert_exception(MinHashLSH, ValueError, num_perm=100, bands=32)
+        assert_exception(MinHashLSH, ValueError, shingle_size=0)
+        lsh = MinHashLSH()
+        lsh.add("text")
+        assert_exception(lsh.clusters, ValueError, threshold=0)
+        assert_exception(lsh.similarity, IndexError, 0, 1)
+        assert_exception(lsh.add, TypeError, tossup_json())
+
+
+def test_find_duplicates():
+    """Questions are deduplicated by their question text, not their answers."""
+    questions = [
+        Tossup.from_json(tossup_json(question_sanitized=text, answer_sanitized=str(i)))
+        for i, text in enumerate(texts()[:60])
+    ]
+    questions.append(Bonus.from_json(bonus_json()))
+    questions.append(Bonus.from_json(bonus_json(number=2)))
+    clusters = find_duplicates(iter(questions))
+    assert [cluster.documents for cluster in clusters] == [[0, 50], [60, 61]]
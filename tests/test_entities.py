@@ -0,0 +1,115 @@
+"""Test answer entity grouping."""
+
+from qbreader.entities import AnswerEntities
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+ANSWERLINES = [
+    "Wolfgang Amadeus <b><u>Mozart</u></b> [accept W. A. Mozart]",
+    "<b><u>Mozart</u></b>",
+    "<b><u>Mozart</u></b>",
+    "<b><u>Leopold Mozart</u></b>",
+    "<b><u>Requiem</u></b> in D minor [accept Mozart's Requiem]",
+    "<b><u>Requiem</u></b> [accept Messa da Requiem; prompt on mass]",
+    "German <b><u>Requiem</u></b> [accept Ein deutsches Requiem]",
+    "<b><u>The Magic Flute</u></b> or Die <b><u>Zauberflöte</u></b>",
+    "<b><u>Magic Flute</u></b>",
+    "<b><u>Bees</u></b> [prompt on insects]",
+    "the <b><u>bee</u></b>",
+    "",
+]
+
+
+def entities() -> AnswerEntities:
+    """The entities of a few answerlines."""
+    return AnswerEntities.from_answerlines(ANSWERLINES)
+
+
+class TestAnswerEntities:
+    """Test the AnswerEntities class."""
+
+    def test_variants(self):
+        """Main answers are merged with the alternates they accept."""
+        mapping = entities()
+        mozart = mapping.entity("Mozart")
+        assert mozart == 0
+        assert mapping.name(mozart) == "Mozart"
+        assert mapping.counts[mozart] == 3
+        assert mapping.variants(mozart) == [
+            "mozart",
+            "w a mozart",
+            "wolfgang amadeus mozart",
+        ]
+        assert mapping.entity("W. A. Mozart [or Mozart]") == mozart
+        assert mapping.entity("Leopold Mozart") != mozart
+        assert mapping.entity("Salieri") is None
+        assert mapping.entity_of_key("w a mozart") == mozart
+        assert mapping.entity_of_key("W. A. Mozart") is None
+
+    def test_normalization(self):
+        """Answers equal but for stopwords and plurals are merged."""
+        mapping = entities()
+        flute = mapping.entity("Magic Flute")
+        assert mapping.name(flute) == "The Magic Flute"
+        assert mapping.counts[flute] == 2
+        assert mapping.entity("Die Zauberflöte") == flute
+        assert mapping.entity("the magic flute or die zauberflote") == flute
+        assert mapping.entity("bee") == mapping.entity("Bees")
+        assert mapping.entity("insects") is None
+
+    def test_ambiguous(self):
+        """A variant of several answers merges none of them."""
+        mapping = entities()
+        requiems = {
+            mapping.entity(answer)
+            for answer in ("Requiem", "Requiem in D minor", "German Requiem")
+        }
+        assert len(requiems) == 3
+        assert mapping.entity("Mozart's Requiem") == mapping.entity(
+            "Requiem in D minor"
+        )
+
+    def test_dominance(self):
+        """A variant is merged with the answer it mostly belongs to."""
+        answerlines = ["Wolfgang Amadeus <u>Mozart</u>"] * 2 + ["Leopold <u>Mozart</u>"]
+        mapping = AnswerEntities.from_answerlines(answerlines)
+        assert mapping.entity("Mozart") == mapping.entity("Wolfgang Amadeus Mozart")
+        assert mapping.entity("Leopold Mozart") != mapping.entity("Mozart")
+        strict = AnswerEntities.from_answerlines(answerlines, dominance=0.7)
+        assert strict.entity("Mozart") != strict.entity("Wolfgang Amadeus Mozart")
+
+    def test_save(self, tmp_path):
+        """A saved mapping is read back from a mapped file."""
+        mapping = entities()
+        mapping.save(tmp_path / "entities")
+        loaded = AnswerEntities.load(tmp_path / "entities")
+        assert len(loaded) == len(mapping)
+        assert list(loaded.keys) == list(mapping.keys)
+        assert list(loaded.names) == list(mapping.names)
+        for key in mapping.keys:
+            assert loaded.entity(key) == mapping.entity(key)
+        assert loaded.variants(0) == mapping.variants(0)
+        assert loaded.entity("zauberflöte") == mapping.entity("zauberflöte")
+
+        (tmp_path / "other").write_bytes(b"QBRIDX" + bytes(10))
+        assert_exception(AnswerEntities.load, ValueError, tmp_path / "other")
+
+    def test_build(self):
+        """Tossup answers and bonus part answers are read with their tags."""
+        mapping = AnswerEntities.build(
+            [
+                Tossup.from_json(
+                    tossup_json(answer="Isaac <b><u>Newton</u></b> [accept I. Newton]")
+                ),
+                Bonus.from_json(bonus_json()),
+            ]
+        )
+        assert mapping.entity("Newton") == mapping.entity("I. Newton")
+        assert mapping.name(mapping.entity("The American Mercury")) == "American"
+        assert len(mapping) == 4
+
+    def test_exception(self):
+        """Invalid arguments are rejected."""
+        assert_exception(AnswerEntities.from_answerlines, ValueError, [], 0.4)
+        assert_exception(AnswerEntities.from_answerlines, ValueError, [], 1)
+        assert_exception(AnswerEntities.build, TypeError, [tossup_json()])
@@ -0,0 +1,152 @@
+"""Test the streaming question exporters."""
+
+import io
+
+import pytest
+
+from qbreader.export import (
+    ArrowWriter,
+    JSONLWriter,
+    ParquetWriter,
+    QuestionWriter,
+    export,
+    export_async,
+    read_jsonl,
+    writer,
+)
+from qbreader.types import Bonus, QueryResponse, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+
+def sample_questions(count: int = 10) -> list:
+    """Return alternating tossups and bonuses, some without optional fields."""
+    questions: list = []
+    for i in range(count):
+        if i % 2 == 0:
+            questions.append(Tossup.from_json(tossup_json(number=i)))
+        elif i % 3 == 0:
+            json = bonus_json(number=i, values=None, alternate_subcategory="")
+            questions.append(Bonus.from_json(json))
+        else:
+            questions.append(Bonus.from_json(bonus_json(number=i)))
+    return questions
+
+
+class TestJSONL:
+    """Test JSONL export."""
+
+    def test_roundtrip(self, tmp_path):
+        """Exported questions are read back unchanged."""
+        questions = sample_questions()
+        path = tmp_path / "questions.jsonl"
+        assert export(iter(questions), path) == len(questions)
+        assert list(read_jsonl(path)) == questions
+        assert list(read_jsonl(str(path))) == questions
+
+    def test_file_object(self):
+        """Writing to a file object leaves it open."""
+        questions = sample_questions(3)
+        buffer = io.BytesIO()
+        with JSONLWriter(buffer) as out:
+            assert out.write_many(questions) == 3
+        assert not buffer.closed
+        assert buffer.getvalue().count(b"\n") == 3
+        buffer.seek(0)
+        assert list(read_jsonl(buffer)) == questions
+
+    def test_query_response(self, tmp_path):
+        """A QueryResponse is written as its tossups followed by its bonuses."""
+        response = QueryResponse(
+            tossups=[Tossup.from_json(tossup_json())],
+            bonuses=[Bonus.from_json(bonus_json())],
+            tossups_found=1,
+            bonuses_found=1,
+            query_string="",
+        )
+        path = tmp_path / "response.ndjson"
+        assert export(response, path) == 2
+        assert list(read_jsonl(path)) == [*response.tossups, *response.bonuses]
+
+    @pytest.mark.asyncio
+    async def test_export_async(self, tmp_path):
+        """Async iterables are consumed as they are produced."""
+        questions = sample_questions()
+
+        async def generate():
+            for question in questions:
+                yield question
+
+        path = tmp_path / "questions.jsonl"
+        assert await export_async(generate(), path) == len(questions)
+        assert list(read_jsonl(path)) == questions
+        assert await export_async(questions, path) == len(questions)
+
+    def test_writer_exception(self, tmp_path):
+        """Unknown formats are rejected."""
+        assert_exception(writer, ValueError, tmp_path / "questions.csv")
+        assert_exception(writer, ValueError, io.BytesIO())
+        assert_exception(writer, ValueError, io.BytesIO(), format="csv")
+
+
+class TestArrow:
+    """Test Arrow IPC and Parquet export."""
+
+    def test_arrow(self, tmp_path):
+        """Rows are written in batches of at most row_group_size rows."""
+        pa = pytest.importorskip("pyarrow")
+        questions = sample_questions(25)
+        path = tmp_path / "questions.arrow"
+        assert export(questions, path, row_group_size=10) == 25
+
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            assert reader.num_record_batches == 3
+            table = reader.read_all()
+        assert table.num_rows == 25
+        rows = table.to_pylist()
+        assert rows[0]["kind"] == "tossup"
+        assert rows[0]["question"] == questions[0].question
+        assert rows[0]["parts"] is None
+        assert rows[1]["kind"] == "bonus"
+        assert rows[1]["parts"] == list(questions[1].parts)
+        assert rows[1]["alternate_subcategory"] == "Misc Literature"
+        assert rows[3]["alternate_subcategory"] is None
+        assert rows[3]["values"] is None
+        assert rows[1]["category"] == "Literature"
+        assert rows[1]["set_year"] == 2024
+
+    def test_parquet(self, tmp_path):
+        """Each row group holds at most row_group_size rows."""
+        pq = pytest.importorskip("pyarrow.parquet")
+
+        questions = sample_questions(25)
+        path = tmp_path / "questions.parquet"
+        with ParquetWriter(path, row_group_size=10) as out:
+            out.write_many(questions)
+        metadata = pq.ParquetFile(path).metadata
+        assert metadata.num_rows == 25
+        assert metadata.num_row_groups == 3
+        table = pq.read_table(path)
+        assert table.column("number").to_pylist() == list(range(25))
+
+    def test_exception(self, tmp_path):
+        """Invalid row group sizes and questions are rejected."""
+        pytest.importorskip("pyarrow")
+        path = tmp_path / "questions.arrow"
+        assert_exception(ArrowWriter, ValueError, path, row_group_size=0)
+        assert_exception(ArrowWriter, TypeError, path, row_group_size=1.5)
+        with ArrowWriter(path) as out:
+            assert_exception(out.write, TypeError, "not a question")
+
+
+class Unclosable(QuestionWriter):
+    """A writer without a close()."""
+
+    def write(self, question):
+        self.rows_written += 1
+
+
+def test_abstract():
+    """Writers that miss a method cannot be created."""
+    assert_exception(QuestionWriter, TypeError)
+    assert_exception(Unclosable, TypeError)
@@ -0,0 +1,265 @@
+"""Test the columnar QuestionFrame."""
+
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pytest
+
+import qbreader.frame
+from qbreader.frame import BONUS, TOSSUP, MappedTextColumn, QuestionFrame, TextColumn
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    QueryResponse,
+    Subcategory,
+    Tossup,
+)
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.frame
+
+SETS = [
+    {"_id": "a", "name": "2017 WHAQ", "year": 2017, "standard": True},
+    {"_id": "b", "name": "2024 ACF Winter", "year": 2024, "standard": True},
+    {"_id": "c", "name": "2019 PACE NSC", "year": 2019, "standard": True},
+]
+
+
+def sample_questions() -> list:
+    """Return a mix of tossups and bonuses over several sets and categories."""
+    questions: list = []
+    for i in range(12):
+        questions.append(
+            Tossup.from_json(
+                tossup_json(
+                    number=i,
+                    set=SETS[i % 3],
+                    difficulty=i % 4 + 1,
+                    category="Science" if i % 2 else "History",
+                    subcategory="Physics" if i % 2 else "European History",
+                )
+            )
+        )
+    for i in range(6):
+        questions.append(Bonus.from_json(bonus_json(number=i, set=SETS[i % 2])))
+    return questions
+
+
+class TestTextColumn:
+    """Test the TextColumn class."""
+
+    def test_strings(self):
+        """Strings are stored back to back and read out by offset."""
+        column = TextColumn.from_strings(["ab", "", "cde"])
+        assert column.buffer == "abcde"
+        assert list(column.offsets) == [0, 2, 2, 5]
+        assert len(column) == 3
+        assert column[-1] == "cde"
+        assert list(column) == ["ab", "", "cde"]
+        assert list(column.take([2, 0])) == ["cde", "ab"]
+        assert_exception(column.__getitem__, IndexError, 3)
+
+
+class TestQuestionFrame:
+    """Test the QuestionFrame class."""
+
+    def test_columns(self):
+        """Questions are split into integer and text columns."""
+        questions = sample_questions()
+        frame = QuestionFrame(questions)
+        assert len(frame) == 18
+        assert frame["kind"].count(TOSSUP) == 12
+        assert frame["kind"].count(BONUS) == 6
+        assert frame.set_names == ["2017 WHAQ", "2024 ACF Winter", "2019 PACE NSC"]
+        assert frame["question"][0] == questions[0].question_sanitized
+        assert frame["answer"][12] == "\n".join(questions[12].answers_sanitized)
+
+        assert frame.row(12) == {
+            "kind": "bonus",
+            "difficulty": Difficulty.TWO_DOT,
+            "category": Category.LITERATURE,
+            "subcategory": Subcategory.AMERICAN_LITERATURE,
+            "alternate_subcategory": AlternateSubcategory.MISC_LITERATURE,
+            "year": 2017,
+            "packet_number": 1,
+            "number": 0,
+            "set": "2017 WHAQ",
+            "question": "\n".join(
+                (questions[12].leadin_sanitized, *questions[12].parts_sanitized)
+            ),
+            "answer": "\n".join(questions[12].answers_sanitized),
+        }
+        assert frame.row(0)["alternate_subcategory"] is None
+        assert_exception(frame.__getitem__, KeyError, "leadin")
+        assert_exception(frame.row, IndexError, 18)
+        assert_exception(QuestionFrame, TypeError, ["not a question"])
+
+    def test_query_response(self):
+        """A QueryResponse contributes its tossups and then its bonuses."""
+        response = QueryResponse(
+            tossups=[Tossup.from_json(tossup_json())],
+            bonuses=[Bonus.from_json(bonus_json())],
+            tossups_found=1,
+            bonuses_found=1,
+            query_string="",
+        )
+        assert list(QuestionFrame(response)["kind"]) == [TOSSUP, BONUS]
+        assert len(QuestionFrame()) == 0
+
+    @pytest.mark.parametrize(
+        "params, expected",
+        [
+            ({}, 18),
+            ({"questionType": "tossup"}, 12),
+            ({"questionType": Bonus}, 6),
+            ({"categories": "Science"}, 6),
+            ({"categories": ["Science", Category.LITERATURE]}, 12),
+            ({"subcategories": Subcategory.EUROPEAN_HISTORY}, 6),
+            ({"alternate_subcategories": "Misc Literature"}, 6),
+            ({"difficulties": [1, "2"]}, 6),
+            ({"difficulties": 1, "categories": "History"}, 3),
+            ({"setName": "2019 PACE NSC"}, 4),
+            ({"setName": "missing"}, 0),
+            ({"min_year": 2019}, 11),
+            ({"min_year": 2018, "max_year": 2020}, 4),
+        ],
+    )
+    def test_filter(self, backend, params, expected):
+        """Filters match the same rows as a plain loop over the questions."""
+        frame = QuestionFrame(sample_questions())
+        filtered = frame.filter(**params)
+        assert len(filtered) == expected
+        assert sum(frame.mask(**params)) == expected
+        rows = [filtered.row(i) for i in range(len(filtered))]
+        assert rows == [
+            row for row in map(frame.row, range(len(frame))) if row in rows
+        ], "rows should keep their order"
+
+    def test_filter_exception(self, backend):
+        """Invalid filters are rejected."""
+        frame = QuestionFrame(sample_questions())
+        assert_exception(frame.filter, ValueError, questionType="invalid")
+        assert_exception(frame.filter, TypeError, setName=1)
+
+    @pytest.mark.parametrize(
+        "column, expected",
+        [
+            ("kind", {"tossup": 12, "bonus": 6}),
+            (
+                "category",
+                {Category.LITERATURE: 6, Category.HISTORY: 6, Category.SCIENCE: 6},
+            ),
+            ("year", {2017: 7, 2019: 4, 2024: 7}),
+            ("set", {"2017 WHAQ": 7, "2024 ACF Winter": 7, "2019 PACE NSC": 4}),
+        ],
+    )
+    def test_group_by(self, backend, column, expected):
+        """Groups are keyed by decoded values and agree with counts()."""
+        frame = QuestionFrame(sample_questions())
+        groups = frame.group_by(column)
+        assert {key: len(group) for key, group in groups.items()} == expected
+        assert frame.counts(column) == expected
+        for key, group in groups.items():
+            assert all(group.row(i)[column] == key for i in range(len(group)))
+
+    def test_group_by_exception(self):
+        """Only categorical columns can be grouped by."""
+        frame = QuestionFrame(sample_questions())
+        assert_exception(frame.group_by, ValueError, "question")
+        assert_exception(frame.counts, ValueError, "number")
+
+    def test_to_numpy(self):
+        """NumPy arrays are read-only views of the frame's columns."""
+        np = pytest.importorskip("numpy")
+        frame = QuestionFrame(sample_questions())
+        arrays = frame.to_numpy()
+        assert set(arrays) == set(frame.columns) - {"question", "answer"}
+        assert np.shares_memory(arrays["year"], np.asarray(memoryview(frame["year"])))
+        assert arrays["year"].tolist() == list(frame["year"])
+        assert not arrays["year"].flags.writeable
+
+    def test_to_numpy_exception(self, monkeypatch):
+        """to_numpy() requires NumPy."""
+        monkeypatch.setattr(qbreader.frame, "np", None)
+        assert_exception(QuestionFrame().to_numpy, ImportError)
+
+    def test_save(self, backend, tmp_path):
+        """A saved frame loads as a mapped frame with the same rows."""
+        questions = sample_questions()
+        questions.append(Tossup.from_json(tossup_json(question_sanitized="Dvořák 🎻")))
+        frame = QuestionFrame(questions)
+        frame.save(tmp_path / "frame")
+        loaded = QuestionFrame.load(tmp_path / "frame")
+        assert isinstance(loaded["question"], MappedTextColumn)
+        assert isinstance(loaded["year"], memoryview)
+        assert loaded.set_names == frame.set_names
+        assert list(map(loaded.row, range(19))) == list(map(frame.row, range(19)))
+        assert list(loaded["question"]) == list(frame["question"])
+        assert loaded["question"][-1] == "Dvořák 🎻"
+        assert loaded.counts("set") == frame.counts("set")
+
+        filtered = loaded.filter(categories="Science", min_year=2019)
+        expected = frame.filter(categories="Science", min_year=2019)
+        assert len(filtered) == len(expected) > 0
+        assert list(map(filtered.row, range(len(filtered)))) == list(
+            map(expected.row, range(len(expected)))
+        )
+
+        # saving a loaded frame writes the same file
+        loaded.save(tmp_path / "copy")
+        data = (tmp_path / "frame").read_bytes()
+        assert (tmp_path / "copy").read_bytes() == data
+        QuestionFrame().save(tmp_path / "empty")
+        assert len(QuestionFrame.load(tmp_path / "empty")) == 0
+
+    def test_load_exception(self, tmp_path):
+        """Files that are not frames are rejected."""
+        (tmp_path / "short").write_bytes(b"QB")
+        (tmp_path / "other").write_bytes(b"\x00" * 64)
+        assert_exception(QuestionFrame.load, ValueError, tmp_path / "short")
+        assert_exception(QuestionFrame.load, ValueError, tmp_path / "other")
+
+
+def _anonymous_growth(path: str) -> tuple[int, int]:
+    """Load and scan a frame, returning the growth of anonymous memory in bytes."""
+
+    def anonymous() -> int:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+        raise RuntimeError("RssAnon is not reported")
+
+    before = anonymous()
+    frame = QuestionFrame.load(path)
+    frame.counts("category")
+    frame.filter(categories="Science", min_year=2019)
+    column = frame["question"]
+    assert isinstance(column, MappedTextColumn)
+    checksum = zlib.crc32(column.buffer)
+    return anonymous() - before, checksum
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/status"), reason="requires /proc/self/status"
+)
+def test_shared_memory(tmp_path):
+    """Worker processes share a loaded frame instead of each copying it."""
+    text = "inertial reference frames " * 160
+    frame = QuestionFrame(
+        Tossup.from_json(tossup_json(question_sanitized=f"{i} {text}", number=i))
+        for i in range(10_000)
+    )
+    frame.save(tmp_path / "frame")
+    size = (tmp_path / "frame").stat().st_size
+    assert size > 40_000_000
+
+    with ProcessPoolExecutor(4, mp_context=get_context("fork")) as pool:
+        results = list(pool.map(_anonymous_growth, [tmp_path / "frame"] * 4))
+    assert len({checksum for _, checksum in results}) == 1
+    for growth, _ in results:
+        assert growth < size // 10
@@ -0,0 +1,179 @@
+"""Test streaming frequency lists."""
+
+import random
+from collections import Counter
+
+import pytest
+
+from qbreader.entities import AnswerEntities
+from qbreader.frequency import FrequencyLists, HeavyHitters
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    Subcategory,
+    Tossup,
+)
+from tests import assert_exception, bonus_json, tossup_json
+from tests.test_local import sample_questions
+
+
+def zipf_stream(length: int) -> list[int]:
+    """Return keys with a few frequent ones and many rare ones."""
+    generator = random.Random(0)
+    weights = [1 / (key + 1) for key in range(2000)]
+    return generator.choices(range(2000), weights, k=length)
+
+
+class TestHeavyHitters:
+    """Test the HeavyHitters class."""
+
+    def test_exact(self):
+        """Without a capacity, every key is counted exactly."""
+        keys = zipf_stream(5000)
+        counter = HeavyHitters()
+        counter.update(keys)
+        counter.add(0, 3)
+        expected = Counter(keys)
+        expected[0] += 3
+        assert len(counter) == len(expected)
+        assert counter.total == 5003
+        assert dict(counter.most_common()) == expected
+        assert [count for _, count in counter.most_common(5)] == [
+            count for _, count in expected.most_common(5)
+        ]
+        assert counter[-1] == 0 and -1 not in counter
+
+    def test_bounded(self):
+        """With a capacity, counts are overestimates within the error bound."""
+        keys = zipf_stream(20000)
+        counter = HeavyHitters(100)
+        counter.update(keys)
+        expected = Counter(keys)
+        assert len(counter) == 100
+        assert counter.total == 20000
+        for key, count in counter.most_common():
+            assert count - counter.error(key) <= expected[key] <= count
+            assert counter.error(key) <= 20000 / 100
+        for key, count in expected.items():
+            if count > 20000 / 100:
+                assert key in counter
+        top = [key for key, _ in expected.most_common(10)]
+        assert [key for key, _ in counter.most_common(10)] == top
+
+    def test_exception(self):
+        """Invalid arguments are rejected."""
+        assert_exception(HeavyHitters, TypeError, 1.5)
+        assert_exception(HeavyHitters, ValueError, 0)
+        assert_exception(HeavyHitters().add, ValueError, "a", 0)
+
+
+class TestFrequencyLists:
+    """Test the FrequencyLists class."""
+
+    def test_ranked(self):
+        """Answers are ranked for every value of every grouping."""
+        lists = FrequencyLists.build(
+            [
+                *sample_questions(),
+                Tossup.from_json(
+                    tossup_json(
+                        category="History",
+                        subcategory="European History",
+                        answer_sanitized="dvorak [or Dvorak]",
+                    )
+                ),
+            ]
+        )
+        history = lists.ranked("category")[Category.HISTORY]
+        assert len(history) == 6
+        assert history[0] == ("Dvořák", 2)
+        assert lists.ranked("subcategory", k=1)[Subcategory.EUROPEAN_HISTORY] == [
+            ("Dvořák", 2)
+        ]
+        assert lists.groups("difficulty") == [
+            Difficulty.MS,
+            Difficulty.HS_EASY,
+            Difficulty.HS_REGS,
+            Difficulty.HS_HARD,
+            Difficulty.HS_NATS,
+        ]
+        # every part of a bonus is counted
+        assert len(lists.ranked("difficulty")[Difficulty.HS_NATS]) == 3
+        assert lists.counter("category", Category.HISTORY).total == 7
+
+    def test_combined(self):
+        """Groupings of several fields, or of none, have a list per combination."""
+        lists = FrequencyLists(by=[("category", "difficulty"), ()])
+        lists.update(sample_questions())
+        ranked = lists.ranked(("category", "difficulty"))
+        assert ranked[(Category.HISTORY, Difficulty.MS)] == [
+            ("Answer 0", 1),
+            ("Dvořák", 1),
+            ("Answer 8", 1),
+        ]
+        assert lists.groups(()) == [()]
+        assert lists.counter((), ()).total == 12 + 6 * 3
+
+    def test_bounded(self):
+        """Bounded lists keep the most frequent answers and their spellings."""
+        generator = random.Random(0)
+        answers = zipf_stream(10000)
+        questions = [
+            Tossup.from_json(
+                tossup_json(
+                    answer_sanitized=f"Answer {answer} [accept {answer}]",
+                    difficulty=generator.randint(1, 2),
+                )
+            )
+            for answer in answers
+        ]
+        exact = FrequencyLists.build(questions, by="difficulty")
+        bounded = FrequencyLists.build(questions, by="difficulty", capacity=50)
+        for difficulty, ranked in bounded.ranked("difficulty", k=5).items():
+            assert [answer for answer, _ in ranked] == [
+                answer for answer, _ in exact.ranked("difficulty", k=5)[difficulty]
+            ]
+            assert len(bounded.counter("difficulty", difficulty)) == 50
+        assert len(bounded._spellings) < len(exact._spellings)
+
+    def test_entities(self):
+        """Answers can be counted by the entity they name."""
+        answerlines = ["Wolfgang Amadeus <u>Mozart</u>", "Mozart", "Antonio Salieri"]
+        entities = AnswerEntities.from_answerlines(answerlines)
+        questions = [
+            Tossup.from_json(tossup_json(answer_sanitized=answer))
+            for answer in ["Mozart", "W. A. Mozart", "Wolfgang Amadeus Mozart", "Haydn"]
+        ]
+        lists = FrequencyLists.build(questions, by=[()], entities=entities)
+        assert lists.ranked(())[()] == [
+            ("Wolfgang Amadeus Mozart", 2),
+            ("W. A. Mozart", 1),
+            ("Haydn", 1),
+        ]
+
+    def test_exception(self):
+        """Invalid arguments and questions are rejected."""
+        assert_exception(FrequencyLists, ValueError, ["year"])
+        assert_exception(FrequencyLists, ValueError, [("category", "set")])
+        assert_exception(FrequencyLists, TypeError, capacity="10")
+        lists = FrequencyLists(by="category")
+        assert_exception(lists.add, TypeError, tossup_json())
+        assert_exception(lists.ranked, ValueError, "subcategory")
+        lists.add(Bonus.from_json(bonus_json()))
+        assert_exception(lists.counter, KeyError, "category", Category.SCIENCE)
+
+
+@pytest.mark.parametrize("capacity", [None, 10])
+def test_alternate_subcategory(capacity):
+    """Questions without a value for a grouping are left out of it."""
+    lists = FrequencyLists(by="alternate_subcategory", capacity=capacity)
+    lists.update(sample_questions())
+    assert lists.ranked("alternate_subcategory") == {
+        AlternateSubcategory.MISC_LITERATURE: [
+            ("American", 6),
+            ("trial", 6),
+            ("the Bible", 6),
+        ]
+    }
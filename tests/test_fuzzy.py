@@ -0,0 +1,115 @@
+"""Test fuzzy answer lookup."""
+
+import random
+
+import pytest
+
+import qbreader.fuzzy
+from qbreader.answerline import STOPWORDS
+from qbreader.fuzzy import FuzzyAnswerIndex
+from qbreader.judge import _distance
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.fuzzy
+
+ANSWERLINES = [
+    "Isaac Newton [accept Newton]",
+    "Isaac Newton",
+    "The Magic Flute [or Die Zauberflöte]",
+    "Newtonian mechanics",
+    "Johannes Kepler",
+    "Isaac Asimov",
+    "Ra",
+    "",
+]
+
+
+@pytest.fixture
+def index(backend) -> FuzzyAnswerIndex:
+    """An index of a few answerlines."""
+    return FuzzyAnswerIndex.from_answerlines(ANSWERLINES)
+
+
+def answers(index: FuzzyAnswerIndex, found: list[tuple[int, int]]) -> list:
+    """Replace the answer ids of lookup results with the answers."""
+    return [(index.answers[answer_id], distance) for answer_id, distance in found]
+
+
+class TestFuzzyAnswerIndex:
+    """Test the FuzzyAnswerIndex class."""
+
+    def test_from_answerlines(self, index: FuzzyAnswerIndex):
+        """Main answers are grouped by their normalized text."""
+        assert len(index) == 6
+        newton = index.answers.index("Isaac Newton")
+        assert index.count(newton) == 2
+        assert index.documents(newton) == [0, 1]
+
+    def test_lookup(self, index: FuzzyAnswerIndex):
+        """Answers are found by their whole text or by a word."""
+        assert answers(index, index.lookup("isaac nweton")) == [("Isaac Newton", 1)]
+        assert answers(index, index.lookup("nweton")) == [("Isaac Newton", 1)]
+        assert answers(index, index.lookup("newtonain", 1)) == [
+            ("Newtonian mechanics", 1)
+        ]
+        assert answers(index, index.lookup("magic flute", 0)) == [
+            ("The Magic Flute", 0)
+        ]
+        assert answers(index, index.lookup("Keppler", k=1)) == [("Johannes Kepler", 1)]
+        assert answers(index, index.lookup("ISAAC")) == [
+            ("Isaac Newton", 0),
+            ("Isaac Asimov", 0),
+        ]
+        assert answers(index, index.lookup("rb", 1)) == [("Ra", 1)]
+        assert index.lookup("newtn", 0) == []
+        assert index.lookup("!!") == []
+
+    def test_brute_force(self, backend):
+        """Lookups match a scan of every term."""
+        generator = random.Random(0)
+        words = ["".join(generator.choices("abcd", k=generator.randint(1, 6)))]
+        words += [
+            "".join(generator.choices("abcd", k=generator.randint(1, 6)))
+            for _ in range(60)
+        ]
+        answerlines = [
+            " ".join(generator.choices(words, k=generator.randint(1, 2)))
+            for _ in range(200)
+        ]
+        index = FuzzyAnswerIndex.from_answerlines(answerlines)
+        for _ in range(50):
+            query = "".join(generator.choices("abcd", k=generator.randint(1, 8)))
+            for max_distance in range(3):
+                expected = {}
+                for answer_id, answer in enumerate(index.answers):
+                    words = [w for w in answer.split(" ") if w not in STOPWORDS]
+                    terms = [answer, " ".join(words), *words]
+                    distance = min(_distance(query, term, 9) for term in terms)
+                    if distance <= max_distance:
+                        expected[answer_id] = distance
+                found = index.lookup(query, max_distance, k=len(index))
+                assert dict(found) == expected
+                assert found == sorted(
+                    found, key=lambda item: (item[1], -index.count(item[0]), item[0])
+                )
+
+    def test_build(self):
+        """Tossup answers and bonus part answers are indexed."""
+        index = FuzzyAnswerIndex.build(
+            [
+                Tossup.from_json(tossup_json(answer_sanitized="Isaac Newton")),
+                Bonus.from_json(bonus_json()),
+            ]
+        )
+        assert len(index) == 4
+        assert answers(index, index.lookup("newtom")) == [("Isaac Newton", 1)]
+        assert index.documents(index.lookup("newtom")[0][0]) == [0]
+
+    def test_exception(self, index: FuzzyAnswerIndex):
+        """Invalid arguments are rejected."""
+        assert_exception(FuzzyAnswerIndex, ValueError, ["a"], [])
+        assert_exception(FuzzyAnswerIndex.build, TypeError, [tossup_json()])
+        assert_exception(index.lookup, TypeError, "newton", 1.0)
+        assert_exception(index.lookup, ValueError, "newton", -1)
+        assert_exception(index.lookup, ValueError, "newton", k=0)
@@ -0,0 +1,247 @@
+"""Test the inverted search indexes."""
+
+import pytest
+
+from qbreader.index import (
+    FilterIndex,
+    InvertedIndex,
+    SearchIndex,
+    filter_bits,
+    iter_bits,
+    select_bits,
+    tokenize,
+)
+from qbreader.types import (
+    AlternateSubcategory,
+    Bonus,
+    Category,
+    Difficulty,
+    Subcategory,
+    Tossup,
+)
+from tests import assert_exception, bonus_json, tossup_json
+
+DOCUMENTS = [
+    ("The Dvořák symphony", "From the New World"),
+    ("new worlds", "the old world"),
+    ("Symphonie fantastique",),
+    (),
+]
+
+
+@pytest.fixture(scope="module")
+def index() -> InvertedIndex:
+    """An index of a few small documents."""
+    return InvertedIndex.build(DOCUMENTS)
+
+
+def test_tokenize():
+    """Tokens are folded words."""
+    assert tokenize("Dvořák's STRASSE, naïve-ish") == [
+        "dvorak",
+        "s",
+        "strasse",
+        "naive",
+        "ish",
+    ]
+
+
+class TestInvertedIndex:
+    """Test the InvertedIndex class."""
+
+    def test_build(self, index: InvertedIndex):
+        """Every document is numbered and every distinct token is indexed."""
+        assert index.num_documents == 4
+        assert len(index) == 10
+        assert index.tokens == sorted(index.tokens)
+
+    @pytest.mark.parametrize(
+        "term, start, end, expected",
+        [
+            ("world", True, True, ["world"]),
+            ("world", True, False, ["world", "worlds"]),
+            ("ie", False, False, ["symphonie"]),
+            ("sym", False, True, []),
+            ("ony", False, True, ["symphony"]),
+            ("missing", True, True, []),
+        ],
+    )
+    def test_tokens_matching(self, index, term, start, end, expected):
+        """Tokens can be matched exactly or by prefix, suffix or substring."""
+        ids = index.tokens_matching(term, start, end)
+        assert [index.tokens[i] for i in ids] == expected
+
+    @pytest.mark.parametrize(
+        "query, exactPhrase, ignoreWordOrder, expected",
+        [
+            ("new world", False, False, {0, 1}),
+            ("new world", True, False, {0}),
+            ("NEW WORLD", True, False, {0}),
+            ("world new", False, False, set()),
+            ("world new", False, True, {0, 1}),
+            ("dvorak symphony", True, False, {0}),
+            ("symphony from", False, False, set()),
+            ("ymph", False, False, {0, 2}),
+            ("ew worl", False, False, {0, 1}),
+            ("ew worl", True, False, set()),
+            ("the", True, False, {0, 1}),
+            ("", False, False, None),
+            ("!?", False, False, None),
+        ],
+    )
+    def test_search(self, index, query, exactPhrase, ignoreWordOrder, expected):
+        """Searches find every document whose fields may match."""
+        assert index.search(query, exactPhrase, ignoreWordOrder) == expected
+
+    def test_expansion(self, monkeypatch, index: InvertedIndex):
+        """Partial words that match too many tokens do not narrow the search."""
+        monkeypatch.setattr("qbreader.index.MAX_EXPANSION", 1)
+        assert index.tokens_matching("o", False, False) is None
+        assert index.search("o") is None
+        assert index.search("o new", ignoreWordOrder=True) == {0, 1}
+
+
+class TestSearchIndex:
+    """Test the SearchIndex class."""
+
+    @pytest.fixture()
+    def search_index(self) -> SearchIndex:
+        """An index of one tossup and one bonus."""
+        return SearchIndex.build(
+            [Tossup.from_json(tossup_json())], [Bonus.from_json(bonus_json())]
+        )
+
+    @pytest.mark.parametrize(
+        "questionType, searchType, query, expected",
+        [
+            ("tossup", "question", "inertial", {0}),
+            ("tossup", "answer", "inertial", set()),
+            ("tossup", "all", "speed of light", {0}),
+            ("bonus", "question", "scopes", set()),
+            ("bonus", "answer", "scopes trial", {0}),
+            ("bonus", "all", "mencken", {0}),
+            ("bonus", "all", "", None),
+        ],
+    )
+    def test_search(self, search_index, questionType, searchType, query, expected):
+        """Question and answer text are searched separately."""
+        assert search_index.search(questionType, searchType, query) == expected
+
+    def test_save(self, search_index: SearchIndex, tmp_path):
+        """An index round-trips through a file."""
+        search_index.save(tmp_path / "index")
+        loaded = SearchIndex.load(tmp_path / "index")
+        assert loaded.fingerprint == search_index.fingerprint
+        for key in SearchIndex.KEYS:
+            assert loaded.indexes[key].tokens == search_index.indexes[key].tokens
+        assert loaded.search("bonus", "all", "american mercury", True) == {0}
+        assert loaded.search("tossup", "question", "ertial ref") == {0}
+
+    def test_load_exception(self, tmp_path):
+        """Files that are not indexes are rejected."""
+        (tmp_path / "short").write_bytes(b"QB")
+        (tmp_path / "other").write_bytes(b"\x00" * 64)
+        assert_exception(SearchIndex.load, ValueError, tmp_path / "short")
+        assert_exception(SearchIndex.load, ValueError, tmp_path / "other")
+
+
+@pytest.mark.parametrize(
+    "bitmap, ranks, expected",
+    [
+        (0b10110, [0, 1, 2], [1, 2, 4]),
+        (0b10110, [2], [4]),
+        (0b10110, [], []),
+        (1 << 100_000 | 1, [1], [100_000]),
+        ((1 << 70_000) - 1, [0, 40_000, 69_999], [0, 40_000, 69_999]),
+    ],
+    ids=["all", "last", "none", "sparse", "dense"],
+)
+def test_select_bits(bitmap: int, ranks: list, expected: list):
+    """Set bits are selected by rank."""
+    assert select_bits(bitmap, ranks) == expected
+
+
+def test_bits():
+    """Set bits are listed and tested."""
+    assert list(iter_bits(0)) == []
+    assert list(iter_bits(0b1000_0000_0101)) == [0, 2, 11]
+    assert filter_bits(0b1000_0000_0101, [11, 1, 0, 500]) == [11, 0]
+
+
+@pytest.fixture(scope="module")
+def questions() -> list:
+    """Tossups in query order: newest set first."""
+    sets = [
+        {"_id": "b", "name": "2024 B", "year": 2024, "standard": True},
+        {"_id": "a", "name": "2019 A", "year": 2019, "standard": True},
+        {"_id": "c", "name": "2019 C", "year": 2019, "standard": True},
+    ]
+    return [
+        Tossup.from_json(
+            tossup_json(
+                set=sets[i // 4],
+                difficulty=i % 3 + 1,
+                category="History" if i % 2 else "Science",
+                subcategory="European History" if i % 2 else "Physics",
+                alternate_subcategory=None if i % 2 else "Math",
+            )
+        )
+        for i in range(12)
+    ]
+
+
+@pytest.fixture(scope="module")
+def filters(questions) -> FilterIndex:
+    """The filter index of the sample questions."""
+    return FilterIndex.build(questions)
+
+
+class TestFilterIndex:
+    """Test the FilterIndex class."""
+
+    def test_build(self, filters: FilterIndex):
+        """Enum values get bitmaps, and years and sets get runs."""
+        assert filters.size == 12
+        assert filters.bitmaps["category"][Category.SCIENCE] == int("0101" * 3, 2)
+        assert filters.runs["year"] == {2024: ((0, 4),), 2019: ((4, 12),)}
+        assert filters.runs["set"]["2019 C"] == ((8, 12),)
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"difficulties": [Difficulty.MS, Difficulty.HS_REGS]},
+            {"categories": [Category.HISTORY], "setName": "2019 A"},
+            {"subcategories": [Subcategory.PHYSICS], "min_year": 2020},
+            {"alternate_subcategories": [AlternateSubcategory.MATH]},
+            {"max_year": 2019, "difficulties": [Difficulty.HS_EASY]},
+            {"setName": "Missing"},
+            {"min_year": 2030},
+        ],
+    )
+    def test_select(self, questions, filters: FilterIndex, params: dict):
+        """Selections match checking every question."""
+        expected = [
+            i
+            for i, q in enumerate(questions)
+            if q.difficulty in params.get("difficulties", [q.difficulty])
+            and q.category in params.get("categories", [q.category])
+            and q.subcategory in params.get("subcategories", [q.subcategory])
+            and q.alternate_subcategory
+            in params.get("alternate_subcategories", [q.alternate_subcategory])
+            and q.set.name == params.get("setName", q.set.name)
+            and params.get("min_year", 0) <= q.set.year <= params.get("max_year", 9999)
+        ]
+        assert list(iter_bits(filters.select(**params))) == expected
+
+    def test_unordered_runs(self, questions):
+        """Years and sets that are not contiguous are stored as several runs."""
+        filters = FilterIndex.build(questions[4:8] + questions[:4] + questions[8:])
+        assert filters.runs["year"][2019] == ((0, 4), (8, 12))
+        assert list(iter_bits(filters.select(max_year=2019))) == [
+            0,
+            1,
+            2,
+            3,
+            *range(8, 12),
+        ]
@@ -0,0 +1,105 @@
+"""Test the offline answer judge."""
+
+from typing import Optional
+
+import pytest
+
+from qbreader import Local, Sync
+from qbreader.judge import check_answer
+from tests import assert_exception, bonus_json, tossup_json
+
+MOZART = (
+    "Wolfgang Amadeus <b><u>Mozart</u></b> [accept <b><u>W. A. Mozart</u></b>; prompt"
+    + " on <b><u>Wolfgang</u></b> by asking “which Wolfgang?”; do not accept or prompt"
+    + " on <b><u>Leopold</u></b> Mozart]"
+)
+
+# answerline, givenAnswer, and the judgement of api/check-answer
+JUDGEMENTS: list[tuple[str, str, str, Optional[str]]] = [
+    (
+        "Rubik's cubes [prompt on cubes and speedcubing]",
+        "Rubik's cubes",
+        "accept",
+        None,
+    ),
+    ("Rubik's cubes [prompt on cubes and speedcubing]", "rubiks cube", "accept", None),
+    (tossup_json()["answer"], "speed of light", "accept", None),
+    (tossup_json()["answer"], "light", "reject", None),
+    (bonus_json()["answers"][0], "American", "accept", None),
+    (bonus_json()["answers"][0], "The American Mercury", "accept", None),
+    (bonus_json()["answers"][0], "Mercury", "reject", None),
+    (bonus_json()["answers"][1], "Scopes trial", "accept", None),
+    (bonus_json()["answers"][2], "Bible", "accept", None),
+    (bonus_json()["answers"][2], "", "reject", None),
+    (MOZART, "Mozart", "accept", None),
+    (MOZART, "wolfgang amadeus mozart", "accept", None),
+    (MOZART, "W.A. Mozart", "accept", None),
+    (MOZART, "Wolfgang", "prompt", "which Wolfgang?"),
+    (MOZART, "Leopold Mozart", "reject", None),
+    (MOZART, "Haydn", "reject", None),
+    ("<b><u>Antonín Dvořák</u></b>", "antonin dvorak", "accept", None),
+    ("<b><u>Tchaikovsky</u></b>", "Tchaikovksy", "accept", None),
+    (
+        "<b><u>Leo Tolstoy</u></b> [prompt on <b><u>Tolstoy</u></b>]",
+        "Tolstoy",
+        "prompt",
+        None,
+    ),
+    (
+        "<b><u>mitochondria</u></b> [or <b><u>mitochondrion</u></b>]",
+        "mitochondrion",
+        "accept",
+        None,
+    ),
+    (
+        "<b><u>photosynthesis</u></b> (before “Calvin”)",
+        "photosynthesis",
+        "accept",
+        None,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "answerline, givenAnswer, directive, directed_prompt", JUDGEMENTS
+)
+def test_check_answer(
+    answerline: str, givenAnswer: str, directive: str, directed_prompt: Optional[str]
+):
+    """Answers are judged like the API judges them."""
+    judgement = check_answer(answerline, givenAnswer)
+    assert judgement.directive == directive
+    assert judgement.directed_prompt == directed_prompt
+    assert Local([]).check_answer(answerline, givenAnswer).directive == directive
+
+
+@pytest.mark.parametrize(
+    "answerline, givenAnswer, directive, directed_prompt", JUDGEMENTS
+)
+def test_parity(
+    answerline: str, givenAnswer: str, directive: str, directed_prompt: Optional[str]
+):
+    """The recorded judgements are still what the API returns."""
+    if not givenAnswer:
+        pytest.skip("the API requires a given answer")
+    judgement = Sync().check_answer(answerline, givenAnswer)
+    assert judgement.directive == directive
+    assert judgement.directed_prompt == directed_prompt
+
+
+def test_strictness():
+    """Strictness sets how many typos are allowed."""
+    assert not check_answer("<b><u>Tchaikovsky</u></b>", "Tchaikovksy", strictness=20)
+    assert check_answer("<b><u>Mozart</u></b>", "Mozrat", strictness=3)
+
+
+@pytest.mark.parametrize(
+    "answerline, givenAnswer, exception",
+    [
+        ("Rubik's cubes", 1, TypeError),
+        (1, "Rubik's cubes", TypeError),
+    ],
+)
+def test_check_answer_exception(answerline, givenAnswer, exception: Exception):
+    """Invalid arguments raise the same exceptions as the API wrapper."""
+    assert_exception(check_answer, exception, answerline, givenAnswer)
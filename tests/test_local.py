@@ -0,0 +1,326 @@
+"""Test the offline query engine."""
+
+from typing import Any
+
+import pytest
+
+from qbreader import Local, Sync
+from qbreader.local import compile_query
+from qbreader.mirror import DirectoryStore
+from qbreader.types import Bonus, Category, Difficulty, Packet, QueryResponse, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+SETS = [
+    {"_id": "a", "name": "2017 WHAQ", "year": 2017, "standard": True},
+    {"_id": "b", "name": "2024 ACF Winter", "year": 2024, "standard": True},
+    {"_id": "c", "name": "2019 PACE NSC", "year": 2019, "standard": True},
+]
+
+
+def packet_json(number: int) -> dict[str, Any]:
+    """Return the JSON of packet `number` of each set."""
+    return {"_id": f"p{number}", "name": f"{number:02}", "number": number}
+
+
+def sample_questions() -> list:
+    """Return tossups and bonuses spread over several sets, packets and categories."""
+    questions: list = []
+    for i in range(12):
+        questions.append(
+            Tossup.from_json(
+                tossup_json(
+                    number=i // 3 + 1,
+                    set=SETS[i % 3],
+                    packet=packet_json(i % 2 + 1),
+                    difficulty=i % 4 + 1,
+                    category="Science" if i % 2 else "History",
+                    subcategory="Physics" if i % 2 else "European History",
+                    answer_sanitized="Dvořák" if i == 4 else f"Answer {i}",
+                )
+            )
+        )
+    for i in range(6):
+        questions.append(
+            Bonus.from_json(
+                bonus_json(
+                    number=i + 1,
+                    set=SETS[i % 3],
+                    packet=packet_json(1),
+                    difficulty=5,
+                )
+            )
+        )
+    return questions
+
+
+@pytest.fixture(scope="module", params=["scan", "index"])
+def local(request) -> Local:
+    """A local backend over the sample questions, with and without a search index."""
+    local = Local(sample_questions())
+    if request.param == "index":
+        local.build_index()
+    return local
+
+
+class TestLocal:
+    """Test the Local class."""
+
+    def test_order(self, local: Local):
+        """Results are ordered newest set first, then by packet and number."""
+        tossups = local.query(questionType="tossup", maxReturnLength=100).tossups
+        keys = [(t.set.year, t.packet.number, t.number) for t in tossups]
+        assert [year for year, _, _ in keys] == [2024] * 4 + [2019] * 4 + [2017] * 4
+        assert keys[:4] == [(2024, 1, 2), (2024, 1, 4), (2024, 2, 1), (2024, 2, 3)]
+
+    @pytest.mark.parametrize(
+        "params, tossups, bonuses",
+        [
+            ({}, 12, 6),
+            ({"questionType": "tossup"}, 12, 0),
+            ({"questionType": Bonus}, 0, 6),
+            ({"setName": "2017 WHAQ"}, 4, 2),
+            ({"difficulties": [1, 2]}, 6, 0),
+            ({"difficulties": Difficulty.HS_NATS}, 0, 6),
+            ({"categories": Category.SCIENCE}, 6, 0),
+            ({"alternate_subcategories": "Misc Literature"}, 0, 6),
+            ({"categories": "History", "subcategories": "Physics"}, 0, 0),
+            ({"min_year": 2019}, 8, 4),
+            ({"max_year": 2019}, 8, 4),
+            ({"min_year": 2019, "max_year": 2019}, 4, 2),
+        ],
+    )
+    def test_filters(self, local: Local, params: dict, tossups: int, bonuses: int):
+        """Filters are combined with and, like the API."""
+        response = local.query(maxReturnLength=100, **params)
+        assert (response.tossups_found, response.bonuses_found) == (tossups, bonuses)
+        assert len(response.tossups) == tossups and len(response.bonuses) == bonuses
+
+    @pytest.mark.parametrize(
+        "params, tossups, bonuses",
+        [
+            ({"queryString": "inertial reference"}, 12, 0),
+            ({"queryString": "INERTIAL REFERENCE"}, 12, 0),
+            ({"queryString": "reference inertial"}, 0, 0),
+            ({"queryString": "reference inertial", "ignoreWordOrder": True}, 12, 0),
+            ({"queryString": "mencken"}, 0, 6),
+            ({"queryString": "Bible", "searchType": "answer"}, 0, 6),
+            ({"queryString": "Bible", "searchType": "question"}, 0, 0),
+            ({"queryString": "answer 1"}, 3, 0),
+            ({"queryString": "answer 1", "exactPhrase": True}, 1, 0),
+            ({"queryString": "dvorak"}, 0, 0),
+            ({"queryString": "dvorak", "ignoreDiacritics": True}, 1, 0),
+            ({"queryString": "Dvořák", "ignoreDiacritics": True}, 1, 0),
+            ({"queryString": r"answer \d{2}", "regex": True}, 2, 0),
+            ({"queryString": "answer.1"}, 0, 0),
+            ({"queryString": "nswer 1"}, 3, 0),
+            ({"queryString": "nswer 1", "exactPhrase": True}, 0, 0),
+            ({"queryString": "frames. (*) for"}, 12, 0),
+            ({"queryString": "points name"}, 0, 0),
+            ({"queryString": "1 answer", "ignoreWordOrder": True}, 3, 0),
+            ({"queryString": "each: name", "searchType": "question"}, 0, 0),
+        ],
+    )
+    def test_search(self, local: Local, params: dict, tossups: int, bonuses: int):
+        """Query strings are matched like the API matches them."""
+        response = local.query(maxReturnLength=100, **params)
+        assert (response.tossups_found, response.bonuses_found) == (tossups, bonuses)
+        assert response.query_string == params["queryString"]
+
+    def test_pagination(self, local: Local):
+        """Tossups and bonuses are paginated separately."""
+        everything = local.query(maxReturnLength=100)
+        first = local.query(maxReturnLength=5, tossupPagination=2, bonusPagination=2)
+        assert first.tossups == everything.tossups[5:10]
+        assert first.bonuses == everything.bonuses[5:6]
+        assert first.tossups_found == 12
+
+        last = local.query(maxReturnLength=5, tossupPagination=4)
+        assert last.tossups == ()
+
+    def test_randomize(self, local: Local):
+        """Randomized results are a sample of every match."""
+        response = local.query(randomize=True, maxReturnLength=5, categories="Science")
+        assert len(response.tossups) == 5 and response.tossups_found == 6
+        assert all(t.category == Category.SCIENCE for t in response.tossups)
+
+    @pytest.mark.parametrize(
+        "params, expected",
+        [
+            ({"number": 20}, 12),
+            ({"number": 3}, 3),
+            ({"categories": "Science", "number": 20}, 6),
+            ({"difficulties": [1, 2], "max_year": 2019, "number": 20}, 4),
+            ({"min_year": 2030}, 0),
+        ],
+    )
+    def test_random_tossup(self, local: Local, params: dict, expected: int):
+        """Random tossups are distinct and pass the filters."""
+        tossups = local.random_tossup(**params)
+        assert len(tossups) == expected
+        assert len({(t.set.name, t.packet.number, t.number) for t in tossups}) == len(
+            tossups
+        )
+        if "categories" in params:
+            assert all(t.category == Category.SCIENCE for t in tossups)
+
+    def test_random_seed(self, local: Local):
+        """Draws with the same seed are the same."""
+        assert local.random_tossup(number=5, seed=7) == local.random_tossup(
+            number=5, seed=7
+        )
+        assert local.random_bonus(number=3, seed=7) == local.random_bonus(
+            number=3, seed=7
+        )
+        first = local.random_tossup(number=5, seed=0)
+        assert any(
+            local.random_tossup(number=5, seed=seed) != first for seed in range(1, 10)
+        )
+
+    def test_random_bonus(self):
+        """Bonuses can be limited to those with three parts."""
+        two_parts = bonus_json(number=2)
+        two_parts["parts"] = two_parts["parts"][:2]
+        two_parts["parts_sanitized"] = two_parts["parts_sanitized"][:2]
+        two_parts["answers"] = two_parts["answers"][:2]
+        two_parts["answers_sanitized"] = two_parts["answers_sanitized"][:2]
+        local = Local([Bonus.from_json(bonus_json()), Bonus.from_json(two_parts)])
+
+        assert len(local.random_bonus(number=2)) == 2
+        bonuses = local.random_bonus(number=2, three_part_bonuses=True)
+        assert [b.number for b in bonuses] == [1]
+
+    @pytest.mark.parametrize(
+        "params, exception",
+        [
+            ({"number": 0}, ValueError),
+            ({"number": "1"}, TypeError),
+            ({"min_year": "2019"}, TypeError),
+            ({"three_part_bonuses": "true"}, TypeError),
+        ],
+    )
+    def test_random_exception(self, local: Local, params: dict, exception: Exception):
+        """Invalid random requests raise the same exceptions as the API wrapper."""
+        assert_exception(local.random_bonus, exception, **params)
+
+    def test_packets(self, local: Local):
+        """Packets are reassembled from their questions."""
+        assert local.set_list() == ("2024 ACF Winter", "2019 PACE NSC", "2017 WHAQ")
+        assert local.num_packets("2017 WHAQ") == 2
+        packet = local.packet("2017 WHAQ", 1)
+        assert isinstance(packet, Packet)
+        assert [t.number for t in packet.tossups] == [1, 3]
+        assert [b.number for b in packet.bonuses] == [1, 4]
+        assert (
+            local.packet_tossups("2017 WHAQ", 2) == local.packet("2017 WHAQ", 2).tossups
+        )
+        assert local.packet_bonuses("2017 WHAQ", 2) == ()
+
+    def test_store(self, tmp_path):
+        """A mirror directory can be used as the source."""
+        store = DirectoryStore(tmp_path)
+        packet = Packet.from_json(
+            {"tossups": [tossup_json()], "bonuses": [bonus_json()]}, number=1
+        )
+        store.put_packet("2017 WHAQ", 1, packet.to_bytes())
+        store.save_state(
+            {"version": 1, "sets": {"2017 WHAQ": {"num_packets": 1, "complete": True}}}
+        )
+        response = Local(tmp_path).query(queryString="speed of light")
+        assert response.tossups == packet.tossups
+
+    def test_index_file(self, local: Local, tmp_path):
+        """A saved index is only loaded for the questions it was built from."""
+        Local(sample_questions()).build_index().save(tmp_path / "index")
+        other = Local(sample_questions())
+        other.load_index(tmp_path / "index")
+        assert other.query(queryString="mencken").bonuses_found == 6
+
+        assert_exception(
+            Local(sample_questions()[1:]).load_index, ValueError, tmp_path / "index"
+        )
+
+    def test_rerank(self, local: Local):
+        """Responses are ordered by relevance, whether or not questions are local."""
+        index = local.index
+        response = local.query(questionType="tossup", maxReturnLength=100)
+        foreign = Tossup.from_json(tossup_json(answer_sanitized="Answer 7 answer 7"))
+        response = QueryResponse([*response.tossups, foreign], [], 13, 0, "answer 7")
+
+        reranked = local.rerank(response, "answer")
+        assert reranked.tossups[0] == foreign
+        assert reranked.tossups[1].answer_sanitized == "Answer 7"
+        assert reranked.tossups[-1].answer_sanitized == "Dvořák"
+        assert reranked.tossups_found == 13
+        assert local.rerank(response, "question").tossups == response.tossups
+        assert local.index is index
+
+    @pytest.mark.parametrize(
+        "params, exception",
+        [
+            ({"questionType": "invalid"}, ValueError),
+            ({"searchType": "invalid"}, ValueError),
+            ({"max_year": "2019"}, TypeError),
+            ({"maxReturnLength": -1}, ValueError),
+            ({"queryString": "(unclosed", "regex": True}, ValueError),
+            ({"setName": 1}, TypeError),
+        ],
+    )
+    def test_query_exception(self, local: Local, params: dict, exception: Exception):
+        """Invalid queries raise the same exceptions as the API wrapper."""
+        assert_exception(local.query, exception, **params)
+
+    @pytest.mark.parametrize(
+        "args, exception",
+        [
+            (("2017 WHAQ", 3), ValueError),
+            (("Missing", 1), ValueError),
+            ((1, 1), TypeError),
+            (("2017 WHAQ", "1"), TypeError),
+        ],
+    )
+    def test_packet_exception(self, local: Local, args: tuple, exception: Exception):
+        """Invalid packets are rejected."""
+        assert_exception(local.packet, exception, *args)
+
+    def test_source_exception(self):
+        """Only questions are accepted as a source."""
+        assert_exception(Local, TypeError, ["not a question"])
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"queryString": "hashes"},
+            {"queryString": "bell labs", "questionType": "bonus"},
+            {"queryString": "", "categories": "Science"},
+            {"queryString": "the", "exactPhrase": True, "searchType": "answer"},
+        ],
+    )
+    def test_parity(self, params: dict):
+        """Local queries over a set return what the API returns for that set."""
+        qbr = Sync()
+        setName = "2023 PACE NSC"
+        packets = [
+            qbr.packet(setName, number)
+            for number in range(1, qbr.num_packets(setName) + 1)
+        ]
+        local = Local(
+            [
+                *sum((p.tossups for p in packets), ()),
+                *sum((p.bonuses for p in packets), ()),
+            ]
+        )
+        params = {"setName": setName, "maxReturnLength": 1000, **params}
+
+        remote = qbr.query(**params)
+        response = local.query(**params)
+        assert response.tossups_found == remote.tossups_found
+        assert response.bonuses_found == remote.bonuses_found
+        assert response.tossups == remote.tossups
+        assert response.bonuses == remote.bonuses
+
+
+def test_compile_query():
+    """An empty query matches everything."""
+    assert compile_query("") is None
+    assert compile_query("  ", ignoreWordOrder=True) is None
+    assert compile_query("a.b").search("A.B")
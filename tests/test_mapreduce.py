@@ -0,0 +1,193 @@
+"""Test parallel map-reduce over local questions."""
+
+import math
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
+
+import pytest
+
+import qbreader.mapreduce
+from qbreader.corpus import Corpus, CorpusWriter
+from qbreader.mapreduce import Count, Histogram, Mean, Reducer, TopK, map_reduce
+from qbreader.mirror import DirectoryStore, SQLiteStore
+from qbreader.types import Difficulty, Packet, Tossup
+from tests import assert_exception
+from tests.test_local import sample_questions
+
+BACKEND_MODULE = qbreader.mapreduce
+
+MAPPERS = {
+    "category": attrgetter("category"),
+    "difficulty": attrgetter("difficulty"),
+    "year": attrgetter("set.year"),
+    "number": attrgetter("number"),
+}
+
+
+def reducers() -> dict:
+    """Reducers of every kind, one for each of the mappers."""
+    return {
+        "category": Count(),
+        "difficulty": TopK(1),
+        "year": Histogram([2000, 2018, 2020, 2030]),
+        "number": Mean(),
+    }
+
+
+def tossup_length(question) -> int | None:
+    """Map tossups to the length of their text, skipping bonuses."""
+    if isinstance(question, Tossup):
+        return len(question.question_sanitized)
+    return None
+
+
+def frame_numbers(frame) -> list:
+    """Map a batch to the number column."""
+    return frame["number"]
+
+
+@pytest.fixture
+def expected() -> dict:
+    """The results of MAPPERS over the sample questions."""
+    questions = sample_questions()
+    return map_reduce(questions, MAPPERS, reducers(), workers=1)
+
+
+def store(tmp_path, cls=DirectoryStore):
+    """Return a store with the sample questions, a packet of each set and number."""
+    store = cls(tmp_path / "mirror")
+    packets: dict = {}
+    for question in sample_questions():
+        packets.setdefault((question.set.name, question.packet.number), []).append(
+            question
+        )
+    sets: dict = {}
+    for (setName, number), questions in packets.items():
+        packet = Packet(
+            [q for q in questions if isinstance(q, Tossup)],
+            [q for q in questions if not isinstance(q, Tossup)],
+            number,
+            setName,
+            questions[0].set.year,
+        )
+        store.put_packet(setName, number, packet.to_bytes())
+        sets[setName] = max(sets.get(setName, 0), number)
+    store.save_state(
+        {
+            "version": 1,
+            "sets": {
+                name: {"num_packets": count, "complete": True}
+                for name, count in sets.items()
+            },
+        }
+    )
+    return store
+
+
+def test_reducers(backend, expected):
+    """Built-in reducers count, rank, bin and average values."""
+    questions = sample_questions()
+    assert expected["category"] == Counter(question.category for question in questions)
+    assert expected["difficulty"] == [(Difficulty.HS_NATS, 6)]
+    years = [question.set.year for question in questions]
+    assert expected["year"] == [
+        sum(2000 <= year < 2018 for year in years),
+        sum(2018 <= year < 2020 for year in years),
+        sum(2020 <= year < 2030 for year in years),
+    ]
+    assert expected["number"] == pytest.approx(
+        sum(question.number for question in questions) / len(questions)
+    )
+    assert map_reduce(questions, tossup_length, Mean(), workers=1) == pytest.approx(
+        sum(len(q.question_sanitized) for q in questions[:12]) / 12
+    )
+    assert math.isnan(map_reduce([], tossup_length, Mean(), workers=1))
+    assert map_reduce(questions, attrgetter("number"), Histogram([100, 200])) == [0]
+
+
+def test_shards(expected):
+    """Results do not depend on how questions are split into shards."""
+    for shard_size in (1, 2, 5, 1000):
+        assert (
+            map_reduce(
+                sample_questions(),
+                MAPPERS,
+                reducers(),
+                shard_size=shard_size,
+                workers=1,
+            )
+            == expected
+        )
+
+
+def test_batched(backend):
+    """Batched mappers receive a QuestionFrame per shard."""
+    questions = sample_questions()
+    assert map_reduce(
+        questions, frame_numbers, Count(), batched=True, shard_size=4, workers=1
+    ) == Counter(question.number for question in questions)
+
+
+@pytest.mark.parametrize("cls", [DirectoryStore, SQLiteStore])
+def test_store(tmp_path, expected, cls):
+    """Shards of a mirror store are read by the workers."""
+    source = store(tmp_path, cls)
+    assert map_reduce(source, MAPPERS, reducers(), workers=1) == expected
+    assert map_reduce(source, MAPPERS, reducers(), shard_size=1, workers=2) == expected
+    if cls is DirectoryStore:
+        assert map_reduce(tmp_path / "mirror", MAPPERS, reducers()) == expected
+
+
+def test_corpus(tmp_path, expected):
+    """Shards of a corpus are ranges of ordinals."""
+    with CorpusWriter(tmp_path / "corpus") as writer:
+        writer.extend(sample_questions())
+    with Corpus(tmp_path / "corpus") as corpus:
+        assert map_reduce(corpus, MAPPERS, reducers(), shard_size=5) == expected
+        with ProcessPoolExecutor(2) as executor:
+            assert (
+                map_reduce(corpus, MAPPERS, reducers(), shard_size=5, executor=executor)
+                == expected
+            )
+
+
+def test_pool(expected):
+    """Questions of an iterable are sent to the workers shard by shard."""
+    assert (
+        map_reduce(
+            iter(sample_questions()), MAPPERS, reducers(), shard_size=3, workers=2
+        )
+        == expected
+    )
+
+
+def test_exception():
+    """Invalid arguments are rejected."""
+    questions = sample_questions()
+    assert_exception(map_reduce, TypeError, questions, MAPPERS, Count())
+    assert_exception(map_reduce, TypeError, questions, len, {"a": Count()})
+    assert_exception(map_reduce, ValueError, questions, MAPPERS, {"a": Count()})
+    assert_exception(map_reduce, TypeError, questions, len, Counter())
+    assert_exception(map_reduce, ValueError, questions, len, Count(), shard_size=0)
+    assert_exception(map_reduce, TypeError, questions, len, Count(), workers=1.0)
+    assert_exception(map_reduce, ValueError, questions, len, Count(), workers=0)
+    assert_exception(TopK, ValueError, 0)
+    assert_exception(Histogram, ValueError, [1])
+    assert_exception(Histogram, ValueError, [1, 1])
+
+
+class Unmergeable(Reducer):
+    """A reducer without a merge()."""
+
+    def start(self):
+        return 0
+
+    def add(self, state, values):
+        return state + len(values)
+
+
+def test_abstract():
+    """Reducers that miss a method cannot be created."""
+    assert_exception(Reducer, TypeError)
+    assert_exception(Unmergeable, TypeError)
@@ -0,0 +1,423 @@
+"""Test the local mirror and its storage."""
+
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from qbreader import Local
+from qbreader.mirror import DirectoryStore, Mirror, SQLiteStore, Store, SyncProgress
+from qbreader.mirror.sqlite import fts_query
+from qbreader.types import Bonus, Category, Packet, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+from tests.test_local import sample_questions
+
+
+class FakeClient:
+    """Serve a fake database with the parts of the `Async` API the mirror uses."""
+
+    def __init__(self, sets: dict[str, int], fail_after: int = -1):
+        self.sets = dict(sets)
+        self.fail_after = fail_after
+        self.packet_requests: list[tuple[str, int]] = []
+
+    async def set_list(self):
+        return sorted(self.sets, reverse=True)
+
+    async def num_packets(self, setName: str) -> int:
+        if setName not in self.sets:
+            raise ValueError(f"Requested set, {setName}, not found.")
+        return self.sets[setName]
+
+    async def packet_body(self, setName: str, number: int) -> bytes:
+        if len(self.packet_requests) == self.fail_after:
+            raise Exception("500 bad request")
+        self.packet_requests.append((setName, number))
+        metadata = {
+            "set": {"_id": setName, "name": setName, "year": 2024, "standard": True},
+            "packet": {"_id": f"{setName}/{number}", "name": "", "number": number},
+        }
+        return json.dumps(
+            {
+                "tossups": [
+                    tossup_json(_id=f"{setName}/{number}/t{i}", number=i, **metadata)
+                    for i in range(1, 3)
+                ],
+                "bonuses": [
+                    bonus_json(_id=f"{setName}/{number}/b{i}", number=i, **metadata)
+                    for i in range(1, 3)
+                ],
+            }
+        ).encode()
+
+
+@pytest.fixture(scope="module")
+def executor():
+    """Decode packets in threads to keep the tests fast."""
+    with ThreadPoolExecutor(2) as pool:
+        yield pool
+
+
+class TestMirror:
+    """Test the Mirror class."""
+
+    def test_sync(self, tmp_path, executor):
+        """Every packet of every set is stored and the sets are marked complete."""
+        client = FakeClient({"2024 A": 3, "2023 B/C": 2, "Empty": 0})
+        snapshots = []
+        mirror = Mirror(tmp_path, client, executor=executor, progress=snapshots.append)
+        progress = mirror.run()
+
+        assert progress.packets_done == progress.packets_total == 5
+        assert progress.sets_done == progress.sets_total == 3
+        assert progress.bytes_downloaded > 0
+        assert len(snapshots) == 5
+        assert "packets/s" in str(progress)
+
+        store = mirror.store
+        assert store.set_names() == ["2023 B/C", "2024 A", "Empty"]
+        assert store.get_packet("2023 B/C", 2).tossups[0].packet.number == 2
+        assert store.get_packet_ids("2023 B/C", 2) == [
+            f"2023 B/C/2/{kind}" for kind in ("t1", "t2", "b1", "b2")
+        ]
+        assert len(list(store.questions())) == 5 * 4
+        assert [packet.number for packet in store.packets()] == [1, 2, 1, 2, 3]
+
+    def test_resume(self, tmp_path, executor):
+        """An interrupted sync resumes without downloading stored packets again."""
+        client = FakeClient({"2024 A": 4, "2023 B": 4}, fail_after=5)
+        with pytest.raises(Exception):
+            Mirror(tmp_path, client, concurrency=1, executor=executor).run()
+        stored = list(client.packet_requests)
+        assert len(stored) == 5
+
+        client = FakeClient({"2024 A": 4, "2023 B": 4})
+        progress = Mirror(tmp_path, client, executor=executor).run()
+        assert progress.packets_done == 3
+        assert not set(client.packet_requests) & set(stored)
+        assert DirectoryStore(tmp_path).set_names() == ["2023 B", "2024 A"]
+
+    def test_incremental(self, tmp_path, executor):
+        """Later syncs only fetch sets that are new in the set list."""
+        Mirror(tmp_path, FakeClient({"2024 A": 2}), executor=executor).run()
+
+        client = FakeClient({"2024 A": 2, "2025 New": 3})
+        progress = Mirror(tmp_path, client, executor=executor).run()
+        assert progress.pending_sets == ["2025 New"]
+        assert sorted(client.packet_requests) == [("2025 New", n) for n in (1, 2, 3)]
+
+    def test_removed_set(self, tmp_path, executor):
+        """A set that disappears between set_list() and num_packets() is skipped."""
+
+        class VanishingClient(FakeClient):
+            async def set_list(self):
+                return ["Gone", *self.sets]
+
+        progress = Mirror(
+            tmp_path, VanishingClient({"2024 A": 1}), executor=executor
+        ).run()
+        assert progress.pending_sets == ["2024 A"]
+        assert progress.packets_done == 1
+
+    def test_rate_limit(self, tmp_path, executor):
+        """Request starts are spaced out to respect the rate limit."""
+        client = FakeClient({"2024 A": 4})
+        start = time.monotonic()
+        progress = Mirror(tmp_path, client, rate_limit=40, executor=executor).run()
+        # set_list, num_packets, and four packets at 25 ms intervals
+        assert progress.requests == 6
+        assert time.monotonic() - start >= 5 / 40
+
+    def test_process_pool(self, tmp_path):
+        """Packets are decoded in worker processes by default."""
+        progress = Mirror(tmp_path, FakeClient({"2024 A": 2}), workers=1).run()
+        assert progress.packets_done == 2
+
+    @pytest.mark.parametrize(
+        "params, exception",
+        [
+            ({"concurrency": 0}, ValueError),
+            ({"workers": 0}, ValueError),
+            ({"rate_limit": 0}, ValueError),
+            ({"rate_limit": "fast"}, TypeError),
+        ],
+    )
+    def test_exception(self, tmp_path, params, exception):
+        """Invalid settings are rejected."""
+        assert_exception(Mirror, exception, tmp_path, **params)
+
+
+class TestSyncProgress:
+    """Test the SyncProgress class."""
+
+    def test_rates(self):
+        """Rates are averaged over the elapsed time."""
+        progress = SyncProgress()
+        progress.packets_done = 10
+        progress.bytes_downloaded = 2_000_000
+        progress.finished = progress.started + 2
+        assert progress.elapsed == 2
+        assert progress.packets_per_second == 5
+        assert progress.bytes_per_second == 1_000_000
+
+
+class TestDirectoryStore:
+    """Test the DirectoryStore class."""
+
+    def test_packets(self, tmp_path):
+        """Packets are stored by set name and number."""
+        store = DirectoryStore(tmp_path)
+        packet = Packet.from_json(
+            {"tossups": [tossup_json()], "bonuses": [bonus_json()]}, number=1
+        )
+        assert not store.has_packet("../odd/name", 1)
+        store.put_packet("../odd/name", 1, packet.to_bytes())
+        assert store.has_packet("../odd/name", 1)
+        assert store.get_packet("../odd/name", 1) == packet
+        assert store.get_packet_ids("../odd/name", 1) == ["", ""]
+        store.put_packet("../odd/name", 1, packet.to_bytes(), ["t", "b"])
+        assert store.get_packet_ids("../odd/name", 1) == ["t", "b"]
+        assert list(store.questions_with_ids()) == []
+        assert_exception(store.get_packet, KeyError, "../odd/name", 2)
+        assert_exception(store.get_packet_ids, KeyError, "../odd/name", 2)
+        assert_exception(
+            store.put_packet, ValueError, "../odd/name", 1, packet.to_bytes(), ["t"]
+        )
+        assert list((tmp_path / "packets").iterdir()) == [
+            tmp_path / "packets" / "%2E.%2Fodd%2Fname"
+        ]
+
+    def test_state(self, tmp_path):
+        """State round-trips, and unknown versions are rejected."""
+        store = DirectoryStore(tmp_path)
+        assert store.load_state() == {"version": 1, "sets": {}}
+        state = {"version": 1, "sets": {"2024 A": {"num_packets": 1, "complete": True}}}
+        store.save_state(state)
+        assert DirectoryStore(tmp_path).load_state() == state
+
+        store.save_state({"version": 99, "sets": {}})
+        assert_exception(store.load_state, ValueError)
+
+
+@pytest.fixture(scope="module")
+def sqlite_store(tmp_path_factory) -> SQLiteStore:
+    """A database of the questions used to test `Local`, with every set complete."""
+    store = SQLiteStore(tmp_path_factory.mktemp("sqlite") / "mirror.db")
+    packets: dict[tuple[str, int], list] = {}
+    for question in sample_questions():
+        packets.setdefault((question.set.name, question.packet.number), []).append(
+            question
+        )
+    state: dict = {"version": 1, "sets": {}}
+    for (setName, number), questions in packets.items():
+        packet = Packet(
+            [q for q in questions if isinstance(q, Tossup)],
+            [q for q in questions if isinstance(q, Bonus)],
+            number=number,
+            name=setName,
+            year=questions[0].set.year,
+        )
+        store.put_packet(setName, number, packet.to_bytes())
+        state["sets"][setName] = {"num_packets": 2, "complete": True}
+    store.save_state(state)
+    return store
+
+
+class TestSQLiteStore:
+    """Test the SQLiteStore class."""
+
+    def test_packets(self, tmp_path):
+        """Packets round-trip through the normalized tables."""
+        store = SQLiteStore(tmp_path / "mirror.db")
+        tossups = Packet.from_json({"tossups": [tossup_json()], "bonuses": []}, 3)
+        bonus = bonus_json(values=[10, 10, 10], difficultyModifiers=["e", "m", "h"])
+        bonuses = Packet(
+            [],
+            [Bonus.from_json(bonus), Bonus.from_json(bonus_json())],
+            number=1,
+            name="2024 ACF Winter",
+            year=2024,
+        )
+        assert not store.has_packet("2017 WHAQ", 3)
+        store.put_packet("2017 WHAQ", 3, tossups.to_bytes())
+        store.put_packet("2017 WHAQ", 3, tossups.to_bytes(), ["t"])
+        store.put_packet("2024 ACF Winter", 1, bonuses.to_bytes(), ["b1", ""])
+        assert store.has_packet("2017 WHAQ", 3)
+        assert store.get_packet("2017 WHAQ", 3) == tossups
+        assert store.get_packet("2024 ACF Winter", 1) == bonuses
+        assert store.get_packet_bytes("2017 WHAQ", 3) == tossups.to_bytes()
+        assert store.get_packet_ids("2017 WHAQ", 3) == ["t"]
+        assert store.get_packet_ids("2024 ACF Winter", 1) == ["b1", ""]
+        assert_exception(store.get_packet, KeyError, "2017 WHAQ", 2)
+        assert_exception(store.get_packet_ids, KeyError, "2017 WHAQ", 2)
+        assert_exception(
+            store.put_packet, ValueError, "2017 WHAQ", 3, tossups.to_bytes(), ["", ""]
+        )
+
+        empty = Packet([], [], number=2, name="2017 WHAQ", year=2017)
+        store.put_packet("2017 WHAQ", 2, empty.to_bytes())
+        assert store.get_packet("2017 WHAQ", 2) == empty
+
+    def test_migrate(self, tmp_path):
+        """Databases of schema version 1 gain a column for the _id of questions."""
+        store = SQLiteStore(tmp_path / "mirror.db")
+        packet = Packet.from_json({"tossups": [tossup_json()], "bonuses": []}, 3)
+        store.put_packet(packet.name, 3, packet.to_bytes(), ["t"])
+        db = sqlite3.connect(tmp_path / "mirror.db")
+        db.execute("ALTER TABLE tossups DROP COLUMN question_id")
+        db.execute("ALTER TABLE bonuses DROP COLUMN question_id")
+        db.execute("PRAGMA user_version = 1")
+        db.commit()
+        db.close()
+
+        assert_exception(SQLiteStore, ValueError, tmp_path / "mirror.db", readonly=True)
+        store = SQLiteStore(tmp_path / "mirror.db")
+        assert store.get_packet(packet.name, 3) == packet
+        assert store.get_packet_ids(packet.name, 3) == [""]
+        readonly = SQLiteStore(tmp_path / "mirror.db", readonly=True)
+        assert readonly.get_packet(packet.name, 3) == packet
+
+    def test_state(self, tmp_path):
+        """State round-trips, and unknown versions are rejected."""
+        store = SQLiteStore(tmp_path / "mirror.db")
+        assert store.load_state() == {"version": 1, "sets": {}}
+        state = {"version": 1, "sets": {"2024 A": {"num_packets": 1, "complete": True}}}
+        store.save_state(state)
+        assert SQLiteStore(tmp_path / "mirror.db", readonly=True).load_state() == state
+
+        store.save_state({"version": 99, "sets": {}})
+        assert_exception(store.load_state, ValueError)
+
+    def test_mirror(self, tmp_path, executor):
+        """A mirror can be synced into a database."""
+        store = SQLiteStore(tmp_path / "mirror.db")
+        Mirror(store, FakeClient({"2024 A": 3, "2023 B": 2}), executor=executor).run()
+        assert store.set_names() == ["2023 B", "2024 A"]
+        assert len(list(store.questions())) == 5 * 4
+        assert (
+            store.query(queryString="inertial", maxReturnLength=100).tossups_found == 10
+        )
+
+    def test_readonly(self, tmp_path):
+        """Read-only stores cannot be written or created."""
+        SQLiteStore(tmp_path / "mirror.db")
+        store = SQLiteStore(tmp_path / "mirror.db", readonly=True)
+        packet = Packet.from_json({"tossups": [tossup_json()], "bonuses": []})
+        assert_exception(
+            store.put_packet, sqlite3.OperationalError, "A", 1, packet.to_bytes()
+        )
+        assert_exception(
+            SQLiteStore,
+            sqlite3.OperationalError,
+            tmp_path / "missing.db",
+            readonly=True,
+        )
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"questionType": "tossup", "setName": "2017 WHAQ"},
+            {"difficulties": [1, 2], "categories": "Science"},
+            {"alternate_subcategories": "Misc Literature", "min_year": 2019},
+            {"queryString": "inertial reference"},
+            {"queryString": "INERTIAL REFERENCE", "exactPhrase": True},
+            {"queryString": "reference inertial", "ignoreWordOrder": True},
+            {"queryString": "Bible", "searchType": "answer"},
+            {"queryString": "Bible", "searchType": "question"},
+            {"queryString": "mencken", "searchType": "question"},
+            {"queryString": "nswer 1"},
+            {"queryString": "answer 1", "exactPhrase": True},
+            {"queryString": "dvorak", "ignoreDiacritics": True},
+            {"queryString": "Dvořák"},
+            {"queryString": r"answer \d{2}", "regex": True},
+            {"queryString": "frames. (*) for"},
+            {"queryString": "1 answer", "ignoreWordOrder": True},
+            {"maxReturnLength": 5, "tossupPagination": 2, "bonusPagination": 2},
+        ],
+    )
+    def test_query(self, sqlite_store: SQLiteStore, params: dict):
+        """Queries return what `Local` returns for the same questions."""
+        params = {"maxReturnLength": 100, **params}
+        local = Local(sqlite_store).query(**params)
+        response = sqlite_store.query(**params)
+        assert response.tossups_found == local.tossups_found
+        assert response.bonuses_found == local.bonuses_found
+        assert response.tossups == local.tossups
+        assert response.bonuses == local.bonuses
+
+    def test_incomplete(self, sqlite_store: SQLiteStore, tmp_path):
+        """Only complete sets are queried."""
+        state = sqlite_store.load_state()
+        try:
+            sqlite_store.save_state(
+                {**state, "sets": {**state["sets"], "2017 WHAQ": {"complete": False}}}
+            )
+            assert sqlite_store.query(setName="2017 WHAQ").tossups_found == 0
+            assert sqlite_store.query().tossups_found == 8
+        finally:
+            sqlite_store.save_state(state)
+
+    def test_random(self, sqlite_store: SQLiteStore):
+        """Random questions pass the filters and are reproducible with a seed."""
+        tossups = sqlite_store.random_tossup(categories="Science", number=20)
+        assert len(tossups) == 6
+        assert all(t.category == Category.SCIENCE for t in tossups)
+        assert sqlite_store.random_bonus(number=3, seed=1) == sqlite_store.random_bonus(
+            number=3, seed=1
+        )
+        assert len(sqlite_store.random_bonus(number=9, three_part_bonuses=True)) == 6
+        draws = [
+            {(t.set.name, t.packet.number, t.number) for t in tossups}
+            for tossups in (
+                sqlite_store.random_tossup(number=3, seed=seed) for seed in range(10)
+            )
+        ]
+        assert all(len(draw) == 3 for draw in draws)
+        assert len(set().union(*draws)) > 3
+        assert_exception(sqlite_store.random_bonus, ValueError, number=0)
+
+
+@pytest.mark.parametrize(
+    "queryString, exactPhrase, ignoreWordOrder, expected",
+    [
+        ("inertial reference frames", False, False, '"reference" AND "frames" *'),
+        (
+            "inertial reference frames",
+            True,
+            False,
+            '"inertial" AND "reference" AND "frames"',
+        ),
+        ("a b", False, True, None),
+        ("a b", True, True, '"a" AND "b"'),
+        ("nswer 1.", False, False, '"1"'),
+        ("_", False, False, None),
+    ],
+)
+def test_fts_query(queryString, exactPhrase, ignoreWordOrder, expected):
+    """Only words that must be whole or start a word are looked up."""
+    assert fts_query(queryString, exactPhrase, ignoreWordOrder) == expected
+
+
+class StatelessStore(Store):
+    """A store that cannot keep a checkpoint."""
+
+    def has_packet(self, setName, packetNumber):
+        return False
+
+    def put_packet(self, setName, packetNumber, data, ids=()):
+        pass
+
+    def get_packet_bytes(self, setName, packetNumber):
+        raise KeyError((setName, packetNumber))
+
+    def get_packet_ids(self, setName, packetNumber):
+        raise KeyError((setName, packetNumber))
+
+
+def test_abstract_store():
+    """Stores that miss a method cannot be created."""
+    assert_exception(Store, TypeError)
+    assert_exception(StatelessStore, TypeError)
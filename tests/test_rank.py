@@ -0,0 +1,130 @@
+"""Test BM25 ranking."""
+
+import math
+
+import pytest
+
+import qbreader.rank
+from qbreader.index import InvertedIndex, SearchIndex
+from qbreader.rank import BM25, BM25Ranker
+from qbreader.types import Bonus, QueryResponse, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.rank
+
+DOCUMENTS = [
+    ("The New World symphony", "by Dvořák"),
+    ("a symphony", "a symphony, a symphony"),
+    ("the old world and the new world",),
+    (),
+]
+
+TEXTS = [
+    "This composer wrote a symphony From the New World.",
+    "This composer wrote a symphony and a symphony and a symphony.",
+    "This physicist formulated the laws of motion.",
+    "This composer wrote an opera.",
+]
+
+
+def tossups() -> list[Tossup]:
+    """Tossups with different amounts of the word "symphony"."""
+    return [
+        Tossup.from_json(
+            tossup_json(question_sanitized=text, answer_sanitized=f"Answer {i}")
+        )
+        for i, text in enumerate(TEXTS)
+    ]
+
+
+@pytest.fixture
+def ranker() -> BM25Ranker:
+    """A ranker of the tossups and a bonus."""
+    return BM25Ranker(SearchIndex.build(tossups(), [Bonus.from_json(bonus_json())]))
+
+
+class TestBM25:
+    """Test the BM25 class."""
+
+    def test_statistics(self, backend):
+        """Lengths and document frequencies are read from the posting lists."""
+        bm25 = BM25(InvertedIndex.build(DOCUMENTS))
+        assert list(bm25.lengths) == [6, 6, 7, 0]
+        assert bm25.average_length == 4.75
+        new = bm25.index.tokens.index("new")
+        assert bm25.idf[new] == pytest.approx(math.log(1 + 2.5 / 2.5))
+
+    def test_scores(self, backend):
+        """Scores follow the BM25 formula."""
+        bm25 = BM25(InvertedIndex.build(DOCUMENTS), k1=1.5, b=0.5)
+        idf = math.log(1 + 2.5 / 2.5)
+        norm = 1.5 * (1 - 0.5 + 0.5 * 6 / 4.75)
+        scores = bm25.scores("Symphony symphony")
+        assert scores.keys() == {0, 1}
+        assert scores[1] == pytest.approx(idf * 3 * 2.5 / (3 + norm))
+        assert scores[1] > scores[0]
+        assert bm25.scores("symphony", documents=[0, 2]).keys() == {0}
+        assert bm25.scores("sym") == {}
+        assert bm25.scores("") == {}
+
+    def test_candidates(self, backend):
+        """Looking up a few candidates gives the same scores as a full scan."""
+        documents = [("symphony",) * (i % 7) for i in range(500)]
+        bm25 = BM25(InvertedIndex.build([*documents, ()]))
+        expected = bm25.scores("symphony")
+        found = bm25.scores("symphony", [1, 2, 7, 500])
+        assert found == {d: expected[d] for d in (1, 2)}
+        assert bm25.scores("symphony", [-1, 3, 501]) == {3: expected[3]}
+
+    def test_score_text(self):
+        """Unindexed text is scored with the same statistics."""
+        bm25 = BM25(InvertedIndex.build(DOCUMENTS))
+        assert bm25.score_text("symphony", DOCUMENTS[1]) == pytest.approx(
+            bm25.scores("symphony")[1]
+        )
+        assert bm25.score_text("quasar", ["quasar"]) > bm25.score_text(
+            "world", ["world"]
+        )
+        assert bm25.score_text("symphony", []) == 0
+
+    def test_empty(self):
+        """An empty index scores nothing."""
+        bm25 = BM25(InvertedIndex.build([]))
+        assert bm25.scores("symphony") == {}
+        assert bm25.score_text("symphony", ["symphony"]) > 0
+
+
+class TestBM25Ranker:
+    """Test the BM25Ranker class."""
+
+    def test_rank(self, ranker: BM25Ranker):
+        """Documents are ranked by score, then by document number."""
+        ranked = ranker.rank("tossup", "symphony", searchType="question")
+        assert [d for d, _ in ranked] == [1, 0]
+        assert ranker.rank("tossup", "symphony", k=1) == ranked[:1]
+        assert ranker.rank("tossup", "answer 2")[0][0] == 2
+        assert ranker.rank("tossup", "answer 2", "question") == []
+        assert [d for d, _ in ranker.rank("tossup", "opera", documents=[3, 2])] == [
+            3,
+            2,
+        ]
+        assert ranker.rank("bonus", "mencken")[0][0] == 0
+
+    def test_rerank(self, ranker: BM25Ranker):
+        """Responses are reordered whether or not their questions are indexed."""
+        response = QueryResponse(tossups(), [], 4, 0, "symphony world")
+        indexed = ranker.rerank(response, tossup_documents=[0, 1, 2, 3])
+        unindexed = ranker.rerank(response)
+        assert indexed.tossups == unindexed.tossups
+        assert indexed.tossups[:2] == (response.tossups[0], response.tossups[1])
+        assert indexed.tossups[2:] == response.tossups[2:]
+        assert indexed.tossups_found == 4
+        assert indexed.query_string == "symphony world"
+        assert ranker.score(response.tossups[0], "world") > 0
+
+    def test_exception(self, ranker: BM25Ranker):
+        """Invalid parameters are rejected."""
+        assert_exception(BM25Ranker, ValueError, ranker.index, k1=-1)
+        assert_exception(BM25Ranker, ValueError, ranker.index, b=2)
+        assert_exception(ranker.rank, ValueError, "question", "symphony")
+        assert_exception(ranker.rank, ValueError, "tossup", "symphony", "text")
@@ -0,0 +1,109 @@
+"""Test the TF-IDF similarity index."""
+
+import pytest
+
+import qbreader.similarity
+from qbreader.similarity import SimilarityIndex, question_text
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+BACKEND_MODULE = qbreader.similarity
+
+TEXTS = [
+    ("This physicist formulated the laws of motion and gravitation.", "Isaac Newton"),
+    ("This physicist proposed the laws of planetary motion.", "Johannes Kepler"),
+    ("This composer wrote the New World symphony.", "Antonín Dvořák"),
+    ("This composer wrote The Magic Flute and a Requiem.", "Mozart"),
+    ("Name this scientist who described universal gravitation.", "Newton"),
+]
+
+
+def questions() -> list:
+    """Tossups about a few topics, and a bonus."""
+    return [
+        *(
+            Tossup.from_json(
+                tossup_json(question_sanitized=text, answer_sanitized=answer, number=i)
+            )
+            for i, (text, answer) in enumerate(TEXTS)
+        ),
+        Bonus.from_json(bonus_json()),
+    ]
+
+
+@pytest.fixture(scope="module")
+def index() -> SimilarityIndex:
+    """An index of the question text of a few questions."""
+    return SimilarityIndex.build(questions(), max_df=1)
+
+
+def test_question_text():
+    """Bonuses are indexed by their leadin and parts, or by their answers."""
+    bonus = Bonus.from_json(bonus_json())
+    assert question_text(bonus).startswith(bonus.leadin_sanitized + "\n")
+    assert question_text(bonus, "answer").split("\n") == list(bonus.answers_sanitized)
+    assert_exception(question_text, ValueError, bonus, "leadin")
+    assert_exception(question_text, TypeError, tossup_json())
+
+
+class TestSimilarityIndex:
+    """Test the SimilarityIndex class."""
+
+    def test_build(self, index: SimilarityIndex):
+        """Every question is a document, and every token is in the vocabulary."""
+        assert len(index) == 6
+        assert index.tokens == sorted(index.tokens)
+        assert "gravitation" in index.tokens
+        assert "this" not in SimilarityIndex.build(questions()).tokens
+
+    def test_similar(self, backend, index: SimilarityIndex):
+        """Documents are ranked by cosine similarity."""
+        results = index.similar(questions()[0])
+        assert results[0][0] == 0
+        assert results[0][1] == pytest.approx(1, abs=1e-6)
+        assert results[1][0] == 1
+        assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
+
+        assert index.similar("universal gravitation", k=1) == [
+            (4, pytest.approx(index.similar("universal gravitation")[0][1]))
+        ]
+        assert index.similar("composer", exclude=[2])[0][0] == 3
+        assert index.similar("quasar") == []
+        assert index.similar("") == []
+
+    def test_backends(self, index: SimilarityIndex, monkeypatch):
+        """NumPy and plain Python give the same results."""
+        expected = index.similar("the laws of motion", k=3)
+        monkeypatch.setattr(qbreader.similarity, "np", None)
+        results = index.similar("the laws of motion", k=3)
+        assert [d for d, _ in results] == [d for d, _ in expected]
+        assert [s for _, s in results] == pytest.approx([s for _, s in expected])
+
+    def test_answer(self, backend):
+        """Answer indexes find questions about the same answer."""
+        index = SimilarityIndex.build(questions(), field="answer", max_df=1)
+        assert index.field == "answer"
+        assert [d for d, _ in index.similar("Newton")] == [4, 0]
+        assert index.similar(questions()[0], exclude=[0])[0][0] == 4
+
+    def test_save(self, backend, index: SimilarityIndex, tmp_path):
+        """An index round-trips through a file."""
+        index.save(tmp_path / "index")
+        loaded = SimilarityIndex.load(tmp_path / "index")
+        assert loaded.field == index.field
+        assert loaded.tokens == index.tokens
+        assert loaded.similar("laws of motion") == index.similar("laws of motion")
+
+        SimilarityIndex.build([]).save(tmp_path / "empty")
+        assert SimilarityIndex.load(tmp_path / "empty").similar("motion") == []
+
+    def test_exception(self, index: SimilarityIndex, tmp_path):
+        """Invalid arguments and files are rejected."""
+        assert_exception(SimilarityIndex.build, ValueError, [], field="leadin")
+        assert_exception(SimilarityIndex.build, ValueError, [], max_df=0)
+        assert_exception(index.similar, TypeError, "motion", k="1")
+        assert_exception(index.similar, ValueError, "motion", k=0)
+        (tmp_path / "short").write_bytes(b"QB")
+        (tmp_path / "other").write_bytes(b"\x00" * 64)
+        assert_exception(SimilarityIndex.load, ValueError, tmp_path / "short")
+        assert_exception(SimilarityIndex.load, ValueError, tmp_path / "other")
@@ -0,0 +1,109 @@
+"""Test the incremental JSON parser used to stream large API responses."""
+
+import json
+
+import pytest
+
+from qbreader._streaming import JSONStreamParser, QueryStream
+from qbreader.types import QueryResponse
+from tests import bonus_json, tossup_json
+
+
+def query_body(tossups: int = 3, bonuses: int = 2) -> bytes:
+    """Return the body of an `api/query` response."""
+    return json.dumps(
+        {
+            "tossups": {
+                "count": 40,
+                "questionArray": [tossup_json(number=i) for i in range(tossups)],
+            },
+            "bonuses": {
+                "questionArray": [bonus_json(number=i) for i in range(bonuses)],
+                "count": 30,
+            },
+            "queryString": "ünïcödé",
+        },
+        ensure_ascii=False,
+        indent=1,
+    ).encode()
+
+
+def stream_chunks(body: bytes, size: int) -> tuple[QueryStream, list]:
+    """Feed `body` to a QueryStream in chunks of `size` bytes."""
+    stream = QueryStream()
+    questions = []
+    for start in range(0, len(body), size):
+        end = start + size
+        questions += stream.feed(body[start:end])
+    questions += stream.close()
+    return stream, questions
+
+
+class TestJSONStreamParser:
+    """Test the JSONStreamParser class."""
+
+    def test_targets(self):
+        """Elements of targeted arrays are reported whole."""
+        parser = JSONStreamParser(targets=[("a",)])
+        events = parser.feed('{"a": [{"x": [1, 2]}, 3], "b": {"c": [4, 5]}, "d": 1.5}')
+        events += parser.close()
+        assert events == [
+            (("a",), {"x": [1, 2]}),
+            (("a",), 3),
+            (("b", "c"), 4),
+            (("b", "c"), 5),
+            (("d",), 1.5),
+        ]
+
+    def test_split_number(self):
+        """A number split across chunks is not reported early."""
+        parser = JSONStreamParser(targets=[])
+        assert parser.feed('{"count": 12') == []
+        assert parser.feed("34}") == [(("count",), 1234)]
+        assert parser.close() == []
+
+    def test_empty_containers(self):
+        """Empty objects and arrays are walked correctly."""
+        parser = JSONStreamParser(targets=[("a",)])
+        events = parser.feed('{"a": [], "b": {}, "c": [[], {}], "d": null}')
+        assert events + parser.close() == [(("d",), None)]
+
+    @pytest.mark.parametrize(
+        "document", ['{"a": [1, 2}', '{"a" 1}', '{"a": 1', '{"a": 1} x', "[1 2]"]
+    )
+    def test_invalid(self, document):
+        """Malformed documents raise a JSONDecodeError."""
+        parser = JSONStreamParser(targets=[])
+        with pytest.raises(json.JSONDecodeError):
+            parser.feed(document)
+            parser.close()
+
+
+class TestQueryStream:
+    """Test the QueryStream class."""
+
+    @pytest.mark.parametrize("size", [1, 7, 64, 1024, 1 << 20])
+    def test_chunked(self, size):
+        """Any chunking yields the same questions as QueryResponse.from_json()."""
+        body = query_body()
+        expected = QueryResponse.from_json(json.loads(body))
+        stream, questions = stream_chunks(body, size)
+        assert questions == [*expected.tossups, *expected.bonuses]
+        assert stream.tossups_found == 40
+        assert stream.bonuses_found == 30
+        assert stream.query_string == "ünïcödé"
+
+    def test_incremental(self):
+        """Questions are yielded as soon as their JSON is complete."""
+        body = query_body(tossups=2, bonuses=0)
+        stream = QueryStream()
+        second = body.index(b'"question":', body.index(b'"question":') + 1)
+        assert len(stream.feed(body[:second])) == 1
+        assert len(stream.feed(body[second:])) == 1
+        assert stream.close() == []
+
+    def test_shared_metadata(self):
+        """Set and packet metadata is shared between streamed questions."""
+        _, questions = stream_chunks(query_body(), 100)
+        assert questions[0].set is questions[1].set
+        assert questions[0].packet is questions[2].packet
@@ -1,6 +1,7 @@
 """Test the synchronous API functions. This module specifically tests API interaction,
 not the underlying data structures. See tests/test_types.py for that."""
 
+import json
 from time import sleep
 from typing import Any
 
@@ -9,7 +10,7 @@ import requests
 
 import qbreader as qb
 from qbreader import Sync
-from tests import assert_exception, check_internet_connection
+from tests import assert_exception, check_internet_connection, tossup_json
 
 qbr = Sync()
 
@@ -169,6 +170,65 @@ class TestSync:
         mock_get(mock_status_code=404)
         assert_exception(qbr.query, Exception)
 
+    def test_iter_query(self):
+        params = {
+            "questionType": "tossup",
+            "setName": "2023 PACE NSC",
+            "queryString": "the",
+        }
+        query = qbr.query(**params, maxReturnLength=100)
+        questions = list(qbr.iter_query(**params, maxReturnLength=3))
+        assert len(questions) == query.tossups_found
+        first_page = len(query.tossups)
+        assert questions[:first_page] == list(query.tossups)
+
+    def test_iter_query_pages(self, monkeypatch):
+        """Test that every page is requested and streamed in small chunks."""
+        tossups = [tossup_json(number=i) for i in range(5)]
+        pages = []
+
+        class MockResponse:
+            status_code = 200
+
+            def __init__(self, page: int):
+                start = (page - 1) * 2
+                self.body = json.dumps(
+                    {
+                        "tossups": {
+                            "count": len(tossups),
+                            "questionArray": tossups[start:][:2],
+                        },
+                        "bonuses": {"count": 0, "questionArray": []},
+                        "queryString": "",
+                    }
+                ).encode()
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+            def iter_content(self, chunk_size: int):
+                return (self.body[i:][:10] for i in range(0, len(self.body), 10))
+
+        def mock_get(url, params, **kwargs):
+            pages.append(params["tossupPagination"])
+            return MockResponse(params["tossupPagination"])
+
+        monkeypatch.setattr(requests, "get", mock_get)
+        questions = list(qbr.iter_query(questionType="tossup", maxReturnLength=2))
+        assert pages == [1, 2, 3]
+        assert questions == [qb.Tossup.from_json(tu) for tu in tossups]
+
+    def test_iter_query_exception(self):
+        assert_exception(qbr.iter_query, ValueError, questionType="not valid")
+        assert_exception(qbr.iter_query, ValueError, maxReturnLength=0)
+
+    def test_iter_query_bad_response(self, mock_get):
+        mock_get(mock_status_code=404)
+        assert_exception(lambda: list(qbr.iter_query()), Exception)
+
     @pytest.mark.parametrize("number", [1, 20, 50, 100])
     def test_random_tossup(self, number: int):
         assert len(qbr.random_tossup(number=number)) == number
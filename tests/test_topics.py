@@ -0,0 +1,123 @@
+"""Test topic clustering with mini-batch k-means."""
+
+import random
+
+import pytest
+
+import qbreader.topics
+from qbreader.topics import TopicClusters
+from qbreader.types import Bonus, Tossup
+from tests import assert_exception, bonus_json, tossup_json
+
+TOPICS = [
+    "physics gravitation momentum quantum electron particle energy relativity",
+    "composer symphony opera sonata concerto orchestra libretto quartet",
+    "empire dynasty battle treaty emperor revolution parliament conquest",
+]
+COMMON = "name this work person thing which these from where people".split()
+
+
+def questions() -> list[Tossup]:
+    """Tossups about three topics, with words of every topic in all of them."""
+    generator = random.Random(0)
+    topics = [topic.split() for topic in TOPICS]
+    return [
+        Tossup.from_json(
+            tossup_json(
+                question_sanitized=" ".join(
+                    generator.choices(topics[i % 3], k=12)
+                    + generator.choices(COMMON, k=12)
+                ),
+                answer_sanitized=str(i),
+            )
+        )
+        for i in range(90)
+    ]
+
+
+@pytest.fixture(scope="module")
+def clusters() -> TopicClusters:
+    """The three topic clusters of the questions."""
+    return TopicClusters.build(questions(), k=3, batch_size=16)
+
+
+class TestTopicClusters:
+    """Test the TopicClusters class."""
+
+    def test_build(self, clusters: TopicClusters):
+        """Every question is in the cluster of its topic."""
+        assert len(clusters) == 90
+        assert clusters.k == 3
+        assert sorted(clusters.sizes()) == [30, 30, 30]
+        for cluster in range(3):
+            members = clusters.members(cluster)
+            assert len({i % 3 for i in members}) == 1
+        assert clusters.inertia > 0
+
+    def test_top_terms(self, clusters: TopicClusters):
+        """The top terms of a cluster are words of its topic."""
+        for cluster in range(3):
+            topic = TOPICS[clusters.members(cluster)[0] % 3].split()
+            terms = clusters.top_terms(cluster, 5)
+            assert len(terms) == 5
+            assert all(term in topic for term, _ in terms)
+            assert all(a[1] >= b[1] for a, b in zip(terms, terms[1:]))
+        assert len(clusters.top_terms(0, 100)) == 8
+
+    def test_top_terms_unnamed(self, clusters: TopicClusters):
+        """Features without a name are skipped before the top terms are chosen."""
+        terms = clusters.top_terms(0, 3)
+        names = [None if name == terms[0][0] else name for name in clusters.names]
+        unnamed = TopicClusters(
+            clusters.field,
+            names,
+            clusters.idf,
+            clusters.centers,
+            clusters.labels,
+            clusters.inertia,
+        )
+        assert unnamed.top_terms(0, 3) == clusters.top_terms(0, 4)[1:]
+
+    def test_assign(self, clusters: TopicClusters):
+        """New questions and texts are assigned to the nearest cluster."""
+        assert clusters.assign("the opera and the symphony") == clusters.labels[1]
+        assert clusters.assign(questions()[3]) == clusters.labels[0]
+        assert clusters.assign("") == -1
+        assert clusters.assign("name this person") == -1
+        assert clusters.assign("unknown words") == -1
+
+    def test_spill(self, clusters: TopicClusters, monkeypatch):
+        """Clusters do not depend on how vectors are written and normalized."""
+        monkeypatch.setattr(qbreader.topics, "_CHUNK", 7)
+        spilled = TopicClusters.build(questions(), k=3, batch_size=16)
+        assert spilled.labels == clusters.labels
+        assert spilled.inertia == pytest.approx(clusters.inertia, rel=1e-5)
+
+    def test_unweighted(self):
+        """Questions without a weighted token are not clustered."""
+        source = [
+            *questions()[:30],
+            Tossup.from_json(tossup_json(question_sanitized="")),
+            Tossup.from_json(tossup_json(question_sanitized="name this person")),
+            Bonus.from_json(bonus_json()),
+        ]
+        clusters = TopicClusters.build(iter(source), k=4)
+        assert list(clusters.labels[30:32]) == [-1, -1]
+        assert min(clusters.labels[:30]) >= 0
+        assert clusters.labels[32] >= 0
+        assert sum(clusters.sizes()) == 31
+
+    def test_exception(self, clusters: TopicClusters, monkeypatch):
+        """Invalid arguments are rejected."""
+        assert_exception(TopicClusters.build, ValueError, questions(), k=91)
+        assert_exception(TopicClusters.build, ValueError, questions(), k=0)
+        assert_exception(TopicClusters.build, TypeError, questions(), k=2.0)
+        assert_exception(TopicClusters.build, ValueError, questions(), epochs=0)
+        assert_exception(TopicClusters.build, ValueError, questions(), max_df=0)
+        assert_exception(TopicClusters.build, ValueError, questions(), field="leadin")
+        assert_exception(TopicClusters.build, TypeError, [tossup_json()])
+        assert_exception(clusters.members, IndexError, 3)
+        assert_exception(clusters.top_terms, IndexError, -1)
+        assert_exception(clusters.top_terms, ValueError, 0, 0)
+        monkeypatch.setattr(qbreader.topics, "np", None)
+        assert_exception(TopicClusters.build, ImportError, questions())
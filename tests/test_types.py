@@ -1,7 +1,15 @@
 """Test the types, classes, and structures used by the qbreader library."""
 
+import hashlib
+import pickle
+from json import dumps
+
+import pytest
+
 import qbreader as qb
-from qbreader.types import Bonus, PacketMetadata, SetMetadata, Tossup
+from qbreader import _codec
+from qbreader.types import Bonus, Packet, PacketMetadata, SetMetadata, Tossup
+from tests import bonus_json, tossup_json
 
 
 class TestTossup:
@@ -32,6 +40,17 @@ class TestTossup:
         """Test the from_json() classmethod."""
         assert Tossup.from_json(self.tu_json)
 
+    def test_from_json_many(self):
+        """Test the from_json_many() classmethod on a 10k-tossup fixture."""
+        jsons = [
+            {**self.tu_json, "number": i % 20 + 1, "difficulty": i % 11}
+            for i in range(10_000)
+        ]
+        tossups = Tossup.from_json_many(jsons)
+        assert tossups == [Tossup.from_json(json) for json in jsons]
+        assert tossups[0].set is tossups[-1].set
+        assert tossups[0].packet is tossups[-1].packet
+
     def test_eq(self):
         """Test the __eq__ method."""
         tu1 = Tossup.from_json(self.tu_json)
@@ -44,6 +63,41 @@ class TestTossup:
         tu = Tossup.from_json(self.tu_json)
         assert str(tu) == tu.question
 
+    def test_to_json(self):
+        """Test that to_json() round-trips through from_json()."""
+        for json in (self.tu_json, {**self.tu_json, "alternate_subcategory": "Math"}):
+            tu = Tossup.from_json(json)
+            assert Tossup.from_json(tu.to_json()) == tu
+
+    def test_bytes(self):
+        """Test the to_bytes() and from_bytes() methods."""
+        for json in (self.tu_json, {**self.tu_json, "alternate_subcategory": "Math"}):
+            tu = Tossup.from_json(json)
+            assert Tossup.from_bytes(tu.to_bytes()) == tu
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"",
+            b"not a tossup",
+            b"QB\xff" + Tossup.from_json(tu_json).to_bytes()[3:],
+            Tossup.from_json(tu_json).to_bytes()[:6],
+            Tossup.from_json(tu_json).to_bytes()[:100],
+            Tossup.from_json(tu_json).to_bytes()[:-14],
+            Tossup.from_json(tu_json).to_bytes()[:-1],
+            Tossup.from_json(tu_json).to_bytes() + b"junk",
+        ],
+    )
+    def test_from_bytes_exception(self, data: bytes):
+        """Test that from_bytes() rejects data that is not an encoded tossup."""
+        with pytest.raises(ValueError):
+            Tossup.from_bytes(data)
+
+    def test_pickle(self):
+        """Test the __reduce__ method."""
+        tu = Tossup.from_json(self.tu_json)
+        assert pickle.loads(pickle.dumps(tu)) == tu
+
 
 class TestBonus:
     """Test the Bonus class."""
@@ -98,6 +152,16 @@ class TestBonus:
         """Test the from_json() classmethod."""
         assert Bonus.from_json(self.b_json)
 
+    def test_from_json_many(self):
+        """Test the from_json_many() classmethod on a 10k-bonus fixture."""
+        jsons = [
+            {**self.b_json, "number": i % 20 + 1, "difficulty": str(i % 11)}
+            for i in range(10_000)
+        ]
+        bonuses = Bonus.from_json_many(jsons)
+        assert bonuses == [Bonus.from_json(json) for json in jsons]
+        assert bonuses[0].set is bonuses[-1].set
+
     def test_eq(self):
         """Test the __eq__ method."""
         b = Bonus.from_json(self.b_json)
@@ -110,6 +174,34 @@ class TestBonus:
         b = Bonus.from_json(self.b_json)
         assert str(b) == "\n".join(b.parts)
 
+    def test_to_json(self):
+        """Test that to_json() round-trips through from_json()."""
+        for json in (
+            self.b_json,
+            {**self.b_json, "values": None, "difficultyModifiers": None},
+        ):
+            b = Bonus.from_json(json)
+            assert Bonus.from_json(b.to_json()) == b
+            assert b.to_json()["difficulty"] == int(json["difficulty"])
+
+    def test_bytes(self):
+        """Test the to_bytes() and from_bytes() methods."""
+        for json in (
+            self.b_json,
+            {**self.b_json, "values": None, "difficultyModifiers": None},
+            {**self.b_json, "answers": ["contains a \0 character"] * 3},
+        ):
+            b = Bonus.from_json(json)
+            assert Bonus.from_bytes(b.to_bytes()) == b
+
+        with pytest.raises(ValueError):
+            Tossup.from_bytes(Bonus.from_json(self.b_json).to_bytes())
+
+    def test_pickle(self):
+        """Test the __reduce__ method."""
+        b = Bonus.from_json(self.b_json)
+        assert pickle.loads(pickle.dumps(b)) == b
+
 
 class TestPacket:
     """Test the Packet class."""
@@ -133,6 +225,39 @@ class TestPacket:
             assert b == self.packet.bonuses[i]
 
 
+class TestPacketSerialization:
+    """Test the serialization of packets built from local data."""
+
+    packet = Packet(
+        tossups=Tossup.from_json_many(tossup_json(number=i) for i in range(1, 21)),
+        bonuses=Bonus.from_json_many(bonus_json(number=i) for i in range(1, 21)),
+    )
+
+    def test_bytes(self):
+        """Test the to_bytes() and from_bytes() methods."""
+        data = self.packet.to_bytes()
+        packet = Packet.from_bytes(data)
+        assert packet == self.packet
+        # metadata is stored once and shared again after decoding
+        assert packet.tossups[0].set is packet.tossups[-1].set
+        assert len(data) < sum(len(tu.to_bytes()) for tu in self.packet.tossups) + sum(
+            len(b.to_bytes()) for b in self.packet.bonuses
+        )
+
+    def test_pickle(self):
+        """Test that pickling is smaller than pickling the instance dictionaries."""
+        data = pickle.dumps(self.packet)
+        assert pickle.loads(data) == self.packet
+        assert len(data) < len(
+            pickle.dumps(
+                (
+                    [vars(tu) for tu in self.packet.tossups],
+                    [vars(b) for b in self.packet.bonuses],
+                )
+            )
+        )
+
+
 class TestPacketMetadata:
     """Test the PacketMetadata class."""
 
@@ -185,3 +310,22 @@ class TestAnswerJudgement:
     def test_str(self):
         """Test the __str__ method."""
         assert str(self.judgement)
+
+
+# the digest of the enum code tables of each encoding version
+CODE_TABLES = {1: "d9baff9c91ed4f81be58dcf7c4524de903eafbcd8f8d9b85f9c4d6fa5377a48d"}
+
+
+def test_code_tables():
+    """The enum codes of stored questions only change with the encoding version."""
+    tables = (
+        (qb.Difficulty, _codec.DIFFICULTIES),
+        (qb.Category, _codec.CATEGORIES),
+        (qb.Subcategory, _codec.SUBCATEGORIES),
+        (qb.AlternateSubcategory, _codec.ALTERNATE_SUBCATEGORIES),
+        (qb.types.DifficultyModifier, _codec.DIFFICULTY_MODIFIERS),
+    )
+    for enum, table in tables:
+        assert sorted(table) == sorted(enum)
+    values = dumps([[member.value for member in table] for _, table in tables])
+    assert hashlib.sha256(values.encode()).hexdigest() == CODE_TABLES[_codec.VERSION]
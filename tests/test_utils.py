@@ -190,3 +190,22 @@ class TestNormalization:
     )
     def test_prune_none(self, dict, expected):
         assert api_utils.prune_none(dict) == expected
+
+    @pytest.mark.parametrize(
+        "cats, subcats, alt_subcats, expected",
+        [
+            (["Science", "History"], None, None, ("Science,History", "", "")),
+            (None, ["Physics", "Biology"], None, ("", "Physics,Biology", "")),
+            (
+                ["Science"],
+                ["Physics"],
+                ["Math", "Poetry"],
+                ("Science,Literature", "Physics,Other Science", "Math,Poetry"),
+            ),
+        ],
+    )
+    def test_normalize_cats(self, cats, subcats, alt_subcats, expected):
+        normalized = api_utils.normalize_cats(cats, subcats, alt_subcats)
+        assert [set(s.split(",")) for s in normalized] == [
+            set(s.split(",")) for s in expected
+        ]